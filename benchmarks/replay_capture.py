@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""
+Benchmark that replays a recorded capture against a local fake board serving the recorded responses.
+
+Record production traffic by giving a `CaptureWriter` to the `ConnectionPool` (or to each `ControllerSocket`), then
+replay it here to reproduce the same load pattern, such as a morning badge-in rush, without access to the site.
+
+Usage::
+
+   python benchmarks/replay_capture.py CAPTURE [speed]
+
+.. moduleauthor:: Andrew Vaughan <hello@andrewvaughan.io>
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from uhppote_rfid import ReplayServer  # noqa: E402
+from uhppote_rfid.capture import readCapture, replayTraffic  # noqa: E402
+
+
+def main():
+    """
+    Run the replay and print a latency summary.
+    """
+    if len(sys.argv) < 2:
+        print("Usage: python benchmarks/replay_capture.py CAPTURE [speed]")
+        sys.exit(2)
+
+    records = list(readCapture(sys.argv[1]))
+    speed = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+
+    replay = ReplayServer(records, speed=speed)
+    replay.start()
+
+    try:
+        report = replayTraffic(records, '127.0.0.1', replay.getPort(), speed=speed)
+    finally:
+        replay.shutdown()
+
+    samples = sorted(latency * 1000.0 for latency in report["latencies"])
+
+    print("%d sent, %d failed in %.3f s at %gx" % (report["sent"], report["failed"], report["duration"], speed))
+
+    if samples:
+        print("%10s %10s %10s %10s" % ("p50 (ms)", "p95 (ms)", "p99 (ms)", "max (ms)"))
+        print("%10.3f %10.3f %10.3f %10.3f" % (
+            samples[len(samples) // 2],
+            samples[int(len(samples) * 0.95)],
+            samples[int(len(samples) * 0.99)],
+            samples[-1],
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""
+Benchmark of round-trip latency for each ControllerSocket profile over loopback.
+
+Each iteration writes a 64-byte request in two parts (an 8-byte header, then the body) before reading the 64-byte
+response.  This write-write-read pattern is where Nagle's algorithm holds back the second write until the first is
+acknowledged, so it shows the effect of `TCP_NODELAY`.
+
+Usage::
+
+   python benchmarks/socket_profiles.py [iterations]
+
+.. moduleauthor:: Andrew Vaughan <hello@andrewvaughan.io>
+"""
+
+from __future__ import print_function
+
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from uhppote_rfid import ControllerSocket  # noqa: E402
+from uhppote_rfid.controller_socket import SOCKET_PROFILES  # noqa: E402
+
+
+def serve(server):
+    """
+    Echo 64-byte frames back to each connection once they are fully received.
+
+       :param server: the listening socket
+       :type server: socket.socket
+    """
+    while True:
+        try:
+            connection = server.accept()[0]
+        except (socket.error, OSError):
+            return
+
+        buffered = bytearray()
+
+        while True:
+            chunk = connection.recv(2048)
+            if not chunk:
+                break
+
+            buffered.extend(chunk)
+            while len(buffered) >= 64:
+                connection.sendall(bytes(buffered[:64]))
+                del buffered[:64]
+
+        connection.close()
+
+
+def measure(port, profile, iterations):
+    """
+    Return the sorted round-trip times, in milliseconds, for a profile.
+
+       :param port: the port of the echo server
+       :type port: int
+       :param profile: the name of the profile
+       :type profile: str
+       :param iterations: the number of round trips
+       :type iterations: int
+
+       :returns: the sorted round-trip times
+       :rtype: list
+    """
+    controller = ControllerSocket('127.0.0.1', port, profile)
+    controller.connect()
+
+    header = bytearray([0x17, 0x20, 0, 0, 0, 0, 0, 0])
+    body = bytearray(56)
+    samples = []
+
+    for i in range(iterations):
+        start = time.time()
+        controller.send(header)
+        controller.send(body)
+        controller.receive(64)
+        samples.append((time.time() - start) * 1000.0)
+
+    controller.close()
+    return sorted(samples)
+
+
+def main():
+    """
+    Run the benchmark and print a latency table.
+    """
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    server = socket.socket()
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+
+    thread = threading.Thread(target=serve, args=(server,))
+    thread.daemon = True
+    thread.start()
+
+    print("%-12s %10s %10s %10s %10s" % ("profile", "p50 (ms)", "p95 (ms)", "p99 (ms)", "max (ms)"))
+
+    for profile in sorted(SOCKET_PROFILES):
+        samples = measure(server.getsockname()[1], profile, iterations)
+        print("%-12s %10.3f %10.3f %10.3f %10.3f" % (
+            profile,
+            samples[len(samples) // 2],
+            samples[int(len(samples) * 0.95)],
+            samples[int(len(samples) * 0.99)],
+            samples[-1],
+        ))
+
+    server.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+"""
+Benchmark comparing verified writes sent in lockstep with the same writes sent through a pipelined `Transaction`.
+
+A local fake board answers each request after a fixed network delay, handling requests concurrently as a real link
+would, so the difference between the two approaches is the round trips the pipeline hides.
+
+Usage::
+
+   python benchmarks/transaction_pipeline.py [writes] [latency_ms]
+
+.. moduleauthor:: Andrew Vaughan <hello@andrewvaughan.io>
+"""
+
+from __future__ import print_function
+
+import collections
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from uhppote_rfid import ControllerSocket, Transaction  # noqa: E402
+from uhppote_rfid.commands import execute  # noqa: E402
+
+
+def serve(server, latency):
+    """
+    Accept connections, answering door-control requests after the given delay.
+    """
+    while True:
+        try:
+            connection = server.accept()[0]
+        except (socket.error, OSError):
+            return
+
+        thread = threading.Thread(target=board, args=(connection, latency))
+        thread.daemon = True
+        thread.start()
+
+
+def board(connection, latency):
+    """
+    Emulate a control board behind a link with a fixed one-way delay.  Requests are answered in order, each no sooner
+    than the delay after it arrived, without waiting for earlier answers to be delivered.
+    """
+    doors = dict((door, bytearray([3, 3])) for door in range(1, 5))
+    outgoing = collections.deque()
+    ready = threading.Condition()
+
+    thread = threading.Thread(target=deliver, args=(connection, outgoing, ready))
+    thread.daemon = True
+    thread.start()
+
+    buffered = bytearray()
+
+    while True:
+        try:
+            chunk = connection.recv(4096)
+        except (socket.error, OSError):
+            chunk = None
+
+        if not chunk:
+            with ready:
+                outgoing.append(None)
+                ready.notify()
+
+            return
+
+        buffered += chunk
+
+        while len(buffered) >= 64:
+            data, buffered = buffered[:64], buffered[64:]
+
+            if data[1] == 0x80:
+                doors[data[8]] = data[9:11]
+
+            data[9:11] = doors[data[8]]
+
+            with ready:
+                outgoing.append((time.time() + latency, bytes(data)))
+                ready.notify()
+
+
+def deliver(connection, outgoing, ready):
+    """
+    Send queued responses once each is due.
+    """
+    while True:
+        with ready:
+            while not outgoing:
+                ready.wait()
+
+            entry = outgoing.popleft()
+
+        if entry is None:
+            connection.close()
+            return
+
+        time.sleep(max(0.0, entry[0] - time.time()))
+
+        try:
+            connection.sendall(entry[1])
+        except (socket.error, OSError):
+            return
+
+
+def main():
+    """
+    Run both approaches and print their timings.
+    """
+    writes = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = float(sys.argv[2]) / 1000.0 if len(sys.argv) > 2 else 0.005
+
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(8)
+
+    thread = threading.Thread(target=serve, args=(server, latency))
+    thread.daemon = True
+    thread.start()
+
+    controller = ControllerSocket('127.0.0.1', server.getsockname()[1])
+    controller.connect()
+
+    start = time.time()
+    for index in range(writes):
+        execute(controller, 423187757, "set-door-control", [index % 4 + 1, "controlled", index % 256])
+        execute(controller, 423187757, "get-door-control", [index % 4 + 1])
+    lockstep = time.time() - start
+
+    transaction = Transaction(controller, 423187757, window=32)
+    for index in range(writes):
+        transaction.write("set-door-control", [index % 4 + 1, "controlled", (index + 1) % 256])
+
+    start = time.time()
+    outcomes = transaction.commit()
+    pipelined = time.time() - start
+
+    controller.close()
+    server.close()
+
+    print("%d verified writes at %g ms latency" % (writes, latency * 1000.0))
+    print("lockstep:  %8.3f s" % lockstep)
+    print("pipelined: %8.3f s (%d failed)" % (pipelined, len([outcome for outcome in outcomes if not outcome["ok"]])))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+
+import datetime
+import unittest
+
+from uhppote_rfid import AccessPolicy, AccessRuleException, BoardConfig, CardNumber, TimeProfile
+from uhppote_rfid.access_rules import ZONE_ALWAYS, ZONE_FIRST, ZONE_NEVER, getSlot
+
+
+# 2017-01-02 is a Monday
+MONDAY = datetime.datetime(2017, 1, 2)
+
+
+class TestTimeProfile(unittest.TestCase):
+    """
+    Tests compilation of time windows to weekly bitmaps.
+    """
+
+    # TimeProfile.addWindow
+
+    def test_addWindow_Weekdays_Allowed(self):
+        profile = TimeProfile([(range(5), "08:00", "17:30")])
+
+        self.assertTrue(profile.allows(MONDAY.replace(hour=8)))
+        self.assertTrue(profile.allows(MONDAY.replace(day=6, hour=17, minute=29)))
+        self.assertFalse(profile.allows(MONDAY.replace(hour=7, minute=59)))
+        self.assertFalse(profile.allows(MONDAY.replace(hour=17, minute=30)))
+        self.assertFalse(profile.allows(MONDAY.replace(day=7, hour=12)))
+
+    def test_addWindow_PartialSlot_Rounded(self):
+        profile = TimeProfile([(0, "08:10", "08:20")])
+
+        self.assertTrue(profile.allows(MONDAY.replace(hour=8, minute=0)))
+        self.assertTrue(profile.allows(MONDAY.replace(hour=8, minute=29)))
+        self.assertFalse(profile.allows(MONDAY.replace(hour=8, minute=30)))
+
+    def test_addWindow_PastMidnight_NextDay(self):
+        profile = TimeProfile([(6, "22:00", "02:00")])
+
+        self.assertTrue(profile.allows(MONDAY.replace(day=8, hour=23)))
+        self.assertTrue(profile.allows(MONDAY.replace(hour=1, minute=45)))
+        self.assertFalse(profile.allows(MONDAY.replace(hour=2)))
+
+    def test_addWindow_TimeObjects_Allowed(self):
+        profile = TimeProfile([(0, datetime.time(9), "24:00")])
+        self.assertTrue(profile.allows(MONDAY.replace(hour=23, minute=59)))
+
+    def test_addWindow_BadDay_Exception(self):
+        with self.assertRaises(ValueError):
+            TimeProfile([(7, "08:00", "09:00")])
+
+    def test_addWindow_BadTime_Exception(self):
+        with self.assertRaises(ValueError):
+            TimeProfile([(0, "8am", "09:00")])
+
+        with self.assertRaises(ValueError):
+            TimeProfile([(0, "08:00", "24:15")])
+
+
+    # getSlot
+
+    def test_getSlot_Times_Slots(self):
+        self.assertEquals(getSlot(MONDAY), 0)
+        self.assertEquals(getSlot(MONDAY.replace(hour=0, minute=14)), 0)
+        self.assertEquals(getSlot(MONDAY.replace(day=8, hour=23, minute=45)), 671)
+
+
+
+
+class TestAccessPolicy(unittest.TestCase):
+    """
+    Tests compiled permission checks and time-zone planning.
+    """
+
+    def setUp(self):
+        """
+        .. function:: setUp()
+
+           Creates a policy with office-hours and night profiles across two boards.
+        """
+        self.policy = AccessPolicy()
+        self.policy.addProfile("office", TimeProfile([(range(5), "08:00", "18:00")]))
+        self.policy.addProfile("night", TimeProfile([(range(7), "20:00", "23:00")], holidays=True))
+        self.policy.addDoorGroup("lobby", [(123456789, 1), (123456789, 2)])
+
+        self.policy.grant([100, 101], "lobby", "office")
+        self.policy.grant([101], [(123456789, 2)], "night")
+        self.policy.grant([CardNumber("1,00001")], [(987654321, 4)])
+
+
+    # AccessPolicy.allows
+
+    def test_allows_InProfile_Allowed(self):
+        self.assertTrue(self.policy.allows(100, 123456789, 1, MONDAY.replace(hour=9)))
+
+    def test_allows_OutsideProfile_Denied(self):
+        self.assertFalse(self.policy.allows(100, 123456789, 1, MONDAY.replace(hour=19)))
+
+    def test_allows_CombinedProfiles_Allowed(self):
+        self.assertTrue(self.policy.allows(101, 123456789, 2, MONDAY.replace(hour=21)))
+        self.assertFalse(self.policy.allows(101, 123456789, 1, MONDAY.replace(hour=21)))
+
+    def test_allows_NoGrant_Denied(self):
+        self.assertFalse(self.policy.allows(102, 123456789, 1, MONDAY.replace(hour=9)))
+        self.assertFalse(self.policy.allows(100, 123456789, 3, MONDAY.replace(hour=9)))
+
+    def test_allows_Always_Allowed(self):
+        self.assertTrue(self.policy.allows(65537, 987654321, 4, MONDAY.replace(day=8, hour=3)))
+        self.assertTrue(self.policy.allows("1,00001", "987654321", 4, MONDAY))
+
+    def test_allows_Holiday_OnlyHolidayProfiles(self):
+        self.policy.addHoliday(MONDAY.date())
+
+        self.assertFalse(self.policy.allows(101, 123456789, 2, MONDAY.replace(hour=9)))
+        self.assertTrue(self.policy.allows(101, 123456789, 2, MONDAY.replace(hour=21)))
+        self.assertTrue(self.policy.allows(100, 123456789, 1, MONDAY.replace(day=3, hour=9)))
+
+    def test_allows_GrantAdded_Recompiled(self):
+        self.policy.allows(102, 123456789, 1, MONDAY)
+        self.policy.grant([102], "lobby")
+
+        self.assertTrue(self.policy.allows(102, 123456789, 1, MONDAY))
+
+
+    # AccessPolicy.grant
+
+    def test_grant_UnknownProfile_Exception(self):
+        with self.assertRaises(KeyError):
+            self.policy.grant([100], "lobby", "weekend")
+
+    def test_grant_BadDoor_Exception(self):
+        with self.assertRaises(ValueError):
+            self.policy.grant([100], [(123456789, 5)])
+
+
+    # AccessPolicy.compile
+
+    def test_compile_ManyCards_SharedSchedules(self):
+        self.policy.grant(range(1000, 101000), "lobby", "office")
+
+        self.assertEquals(self.policy.compile(), 3)
+        self.assertTrue(self.policy.allows(100999, 123456789, 2, MONDAY.replace(hour=12)))
+
+
+    # AccessPolicy.getTimeZones
+
+    def test_getTimeZones_Board_ZonesAndCards(self):
+        zones = self.policy.getTimeZones(123456789)
+
+        self.assertEquals(sorted(zones["zones"]), [ZONE_FIRST, ZONE_FIRST + 1])
+        self.assertEquals(sorted(zones["cards"]), [100, 101])
+
+        office = zones["cards"][100][0]
+        self.assertEquals(zones["cards"][100], [office, office, ZONE_NEVER, ZONE_NEVER])
+        self.assertEquals(zones["zones"][office], [office])
+        self.assertEquals(zones["profiles"][office], {"weekdays": "1111100", "segments": ["08:00-18:00"], "linked": 0})
+
+        combined = zones["cards"][101][1]
+        first, second = zones["zones"][combined]
+        self.assertEquals(zones["profiles"][first], {"weekdays": "1111100", "segments": ["08:00-18:00", "20:00-23:00"], "linked": second})
+        self.assertEquals(zones["profiles"][second], {"weekdays": "0000011", "segments": ["20:00-23:00"], "linked": 0})
+
+    def test_getTimeZones_Plan_AppliedToConfig(self):
+        self.policy.addProfile("late", TimeProfile([(range(7), "22:00", "24:00")]))
+        self.policy.grant([102], [(123456789, 3)], "late")
+
+        zones = self.policy.getTimeZones(123456789)
+        config = BoardConfig()
+
+        for profile, args in zones["profiles"].items():
+            config.setProfile(profile, **args)
+
+        self.assertEquals(sorted(config.profiles), list(range(ZONE_FIRST, ZONE_FIRST + 4)))
+        self.assertEquals(config.profiles[zones["cards"][102][2]][3:], ("1111111", "22:00-23:59", "linked=0"))
+
+    def test_getTimeZones_AlwaysGrant_NoZoneWritten(self):
+        zones = self.policy.getTimeZones(987654321)
+
+        self.assertEquals(zones["profiles"], {})
+        self.assertEquals(zones["zones"], {})
+        self.assertEquals(zones["cards"], {65537: [ZONE_NEVER, ZONE_NEVER, ZONE_NEVER, ZONE_ALWAYS]})
+
+    def test_getTimeZones_TooManyProfiles_Exception(self):
+        # Each profile differs on every day, so takes seven board profiles
+        for index in range(40):
+            windows = [(day, "%02d:00" % day, "%02d:%02d" % divmod((day + 1) * 60 + index * 15, 60)) for day in range(7)]
+            self.policy.addProfile("shift%d" % index, TimeProfile(windows))
+            self.policy.grant([1000 + index], [(555555555, 1)], "shift%d" % index)
+
+        with self.assertRaises(AccessRuleException):
+            self.policy.getTimeZones(555555555)
+
+    def test_getTimeZones_TooManySegments_Exception(self):
+        windows = [(0, "%02d:00" % hour, "%02d:30" % hour) for hour in range(0, 8, 2)]
+        self.policy.addProfile("split", TimeProfile(windows))
+        self.policy.grant([100], [(555555555, 1)], "split")
+
+        with self.assertRaises(AccessRuleException):
+            self.policy.getTimeZones(555555555)
+
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+
+import json
+import socket
+import threading
+import time
+import unittest
+
+from uhppote_rfid import BatchRunner
+from uhppote_rfid.batch import parseLine
+
+
+class _Output(object):
+    """
+    Collects lines written by the batch runner.
+    """
+
+    def __init__(self):
+        self.lines = []
+
+    def write(self, text):
+        self.lines.append(json.loads(text))
+
+    def flush(self):
+        pass
+
+
+class TestBatchRunner(unittest.TestCase):
+    """
+    Tests batch execution by emulating control boards that echo requests.
+    """
+
+    def setUp(self):
+        """
+        .. function:: setUp()
+
+           Runs an echo server locally on an ephemeral port.
+        """
+        self.server = socket.socket()
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(8)
+        self.port = self.server.getsockname()[1]
+        self.silent = False
+        self.delay = 0.0
+        self.received = []
+
+        thread = threading.Thread(target=self._serve)
+        thread.daemon = True
+        thread.start()
+
+        self.output = _Output()
+        self.runner = BatchRunner(self.output, concurrency=4)
+
+
+    def tearDown(self):
+        """
+        .. function:: tearDown()
+
+           Cleanly shuts down the test suite's server.
+        """
+        self.server.close()
+
+
+    def _serve(self):
+        while True:
+            try:
+                connection = self.server.accept()[0]
+            except (socket.error, OSError):
+                return
+
+            thread = threading.Thread(target=self._echo, args=(connection,))
+            thread.daemon = True
+            thread.start()
+
+    def _echo(self, connection):
+        while True:
+            data = connection.recv(4096)
+            if not data:
+                connection.close()
+                return
+
+            self.received.append(len(data))
+            time.sleep(self.delay)
+
+            if not self.silent:
+                connection.sendall(data)
+
+
+    # parseLine
+
+    def test_parseLine_TooShort_Exception(self):
+        with self.assertRaises(ValueError):
+            parseLine("423187757 127.0.0.1")
+
+    def test_parseLine_BadSerial_Exception(self):
+        with self.assertRaises(ValueError):
+            parseLine("-1 127.0.0.1 get-status")
+
+    def test_parseLine_Arguments_Valid(self):
+        item = parseLine("423187757 10.0.0.1:1234 open-door 2")
+
+        self.assertEquals(item["serial"].getInteger(), 423187757)
+        self.assertEquals((item["host"], item["port"], item["command"], item["args"]), ("10.0.0.1", 1234, "open-door", ["2"]))
+
+
+    # BatchRunner.__init__
+
+    def test_constructor_ZeroConcurrency_Exception(self):
+        with self.assertRaises(ValueError):
+            BatchRunner(self.output, 0)
+
+    def test_constructor_ZeroWindow_Exception(self):
+        with self.assertRaises(ValueError):
+            BatchRunner(self.output, window=0)
+
+
+    # BatchRunner.run
+
+    def test_run_CommentsAndBlanks_Skipped(self):
+        self.assertEquals(self.runner.run(["# comment", "", "   "]), (0, 0))
+        self.assertEquals(self.output.lines, [])
+
+    def test_run_MalformedLine_Error(self):
+        self.assertEquals(self.runner.run(["423187757"]), (0, 1))
+        self.assertEquals(self.output.lines[0]["line"], 1)
+        self.assertFalse(self.output.lines[0]["ok"])
+
+    def test_run_ManyBoards_AllResults(self):
+        lines = ["%d 127.0.0.1:%d open-door %d" % (100000000 + i, self.port, i % 4 + 1) for i in range(40)]
+
+        self.assertEquals(self.runner.run(lines), (40, 0))
+        self.assertEquals(sorted(result["line"] for result in self.output.lines), list(range(1, 41)))
+
+    def test_run_SameBoard_InOrder(self):
+        lines = ["423187757 127.0.0.1:%d open-door %d" % (self.port, door) for door in (1, 2, 3, 4)]
+
+        self.runner.run(lines)
+        self.assertEquals([result["line"] for result in self.output.lines], [1, 2, 3, 4])
+
+    def test_run_SameBoard_Pipelined(self):
+        self.delay = 0.05
+        runner = BatchRunner(self.output, concurrency=4, window=4, timeout=1.0)
+        lines = ["423187757 127.0.0.1:%d get-status" % self.port for i in range(8)]
+
+        self.assertEquals(runner.run(lines), (8, 0))
+        self.assertEquals([result["line"] for result in self.output.lines], list(range(1, 9)))
+
+        # Later requests were sent while the board was still answering earlier ones
+        self.assertTrue(max(self.received) > 64)
+
+    def test_run_SilentBoard_TimedOut(self):
+        silent = socket.socket()
+        silent.bind(('127.0.0.1', 0))
+        silent.listen(8)
+
+        runner = BatchRunner(self.output, concurrency=1, timeout=0.2)
+        lines = [
+            "423187757 127.0.0.1:%d get-status" % silent.getsockname()[1],
+            "423187757 127.0.0.1:%d get-status" % self.port,
+        ]
+        began = time.time()
+
+        try:
+            self.assertEquals(runner.run(lines), (1, 1))
+        finally:
+            silent.close()
+
+        self.assertTrue(time.time() - began < 3.0)
+        self.assertIn("SocketTransmitException", [result for result in self.output.lines if result["line"] == 1][0]["error"])
+
+    def test_run_Unreachable_Error(self):
+        self.assertEquals(self.runner.run(["423187757 127.0.0.1:1 get-status"]), (0, 1))
+        self.assertIn("SocketConnectionException", self.output.lines[0]["error"])
+
+
+
+
+if __name__ == '__main__':
+    unittest.main()
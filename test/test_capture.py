@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+from uhppote_rfid import CaptureException, CaptureWriter, ConnectionPool, ControllerSocket, ReplayServer
+from uhppote_rfid.capture import DIRECTION_RECEIVED, DIRECTION_SENT, getPacketSerial, readCapture, replayTraffic
+from uhppote_rfid.commands import buildRequest
+
+
+class TestCapture(unittest.TestCase):
+    """
+    Tests capture files, recording through sockets, and replay.
+    """
+
+    def setUp(self):
+        """
+        .. function:: setUp()
+
+           Creates a temporary directory for capture files.
+        """
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "traffic.cap")
+
+
+    def tearDown(self):
+        """
+        .. function:: tearDown()
+
+           Removes the temporary directory.
+        """
+        shutil.rmtree(self.directory)
+
+
+    def _serveEcho(self):
+        server = socket.socket()
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+
+        def serve():
+            connection = server.accept()[0]
+
+            while True:
+                data = connection.recv(64)
+                if not data:
+                    connection.close()
+                    return
+
+                connection.sendall(data)
+
+        thread = threading.Thread(target=serve)
+        thread.daemon = True
+        thread.start()
+
+        return server
+
+
+    # getPacketSerial
+
+    def test_getPacketSerial_Request_Serial(self):
+        self.assertEquals(getPacketSerial(buildRequest(0x20, 423187757)), 423187757)
+
+    def test_getPacketSerial_Short_Zero(self):
+        self.assertEquals(getPacketSerial(bytearray(4)), 0)
+
+
+    # CaptureWriter / readCapture
+
+    def test_record_Read_RoundTrip(self):
+        request = buildRequest(0x20, 423187757)
+        response = buildRequest(0x20, 423187757, bytearray([1, 2, 3]))
+
+        writer = CaptureWriter(self.path)
+        writer.record(DIRECTION_SENT, request, 100.0)
+        writer.record(DIRECTION_RECEIVED, response, 100.5)
+        writer.close()
+
+        self.assertEquals(list(readCapture(self.path)), [
+            (100.0, 423187757, DIRECTION_SENT, request),
+            (100.5, 423187757, DIRECTION_RECEIVED, response),
+        ])
+        self.assertEquals(os.path.getsize(self.path), 5 + 2 * 79)
+
+    def test_record_Closed_Dropped(self):
+        writer = CaptureWriter(self.path)
+        writer.close()
+        writer.recordSent(buildRequest(0x20, 423187757))
+
+        self.assertEquals(list(readCapture(self.path)), [])
+
+    def test_readCapture_BadHeader_Exception(self):
+        with open(self.path, "wb") as capture:
+            capture.write(b"NOPE!")
+
+        with self.assertRaises(CaptureException):
+            list(readCapture(self.path))
+
+    def test_readCapture_Truncated_Exception(self):
+        writer = CaptureWriter(self.path)
+        writer.recordSent(buildRequest(0x20, 423187757))
+        writer.close()
+
+        with open(self.path, "rb+") as capture:
+            capture.truncate(40)
+
+        with self.assertRaises(CaptureException):
+            list(readCapture(self.path))
+
+
+    # ControllerSocket.recorder
+
+    def test_recorder_Socket_Recorded(self):
+        server = self._serveEcho()
+        request = buildRequest(0x20, 423187757)
+
+        writer = CaptureWriter(self.path)
+        controller = ControllerSocket('127.0.0.1', server.getsockname()[1])
+        controller.setRecorder(writer)
+
+        try:
+            controller.connect()
+            controller.send(request)
+            controller.receive()
+        finally:
+            controller.close()
+            server.close()
+
+        writer.close()
+
+        records = list(readCapture(self.path))
+
+        self.assertEquals([record[2] for record in records], [DIRECTION_SENT, DIRECTION_RECEIVED])
+        self.assertEquals([record[1] for record in records], [423187757, 423187757])
+        self.assertEquals(records[1][3], request)
+
+    def test_recorder_Pool_Recorded(self):
+        server = self._serveEcho()
+
+        writer = CaptureWriter(self.path)
+        pool = ConnectionPool(recorder=writer)
+
+        try:
+            pool.transmit('127.0.0.1', server.getsockname()[1], buildRequest(0x32, 423187757))
+        finally:
+            pool.close()
+            server.close()
+
+        writer.close()
+
+        self.assertEquals(len(list(readCapture(self.path))), 2)
+
+
+    # ReplayServer
+
+    def test_respond_Recorded_Cycled(self):
+        first = buildRequest(0x20, 423187757, bytearray([1]))
+        second = buildRequest(0x20, 423187757, bytearray([2]))
+
+        replay = ReplayServer([
+            (10.0, 423187757, DIRECTION_SENT, buildRequest(0x20, 423187757)),
+            (10.2, 423187757, DIRECTION_RECEIVED, first),
+            (11.0, 423187757, DIRECTION_SENT, buildRequest(0x20, 423187757)),
+            (11.4, 423187757, DIRECTION_RECEIVED, second),
+        ], speed=2.0)
+
+        request = buildRequest(0x20, 423187757)
+
+        response, delay = replay.respond(request)
+        self.assertEquals(response, bytes(first))
+        self.assertAlmostEqual(delay, 0.1)
+
+        response, delay = replay.respond(request)
+        self.assertEquals(response, bytes(second))
+        self.assertAlmostEqual(delay, 0.2)
+
+        self.assertEquals(replay.respond(request)[0], bytes(first))
+
+    def test_respond_Unknown_Echoed(self):
+        replay = ReplayServer([])
+        request = buildRequest(0x40, 423187757, bytearray([1]))
+
+        self.assertEquals(replay.respond(request), (bytes(request), 0.0))
+
+    def test_constructor_BadSpeed_Exception(self):
+        with self.assertRaises(ValueError):
+            ReplayServer([], speed=0)
+
+
+    # replayTraffic
+
+    def test_replayTraffic_ReplayServer_Served(self):
+        records = []
+        for i in range(5):
+            for serial in (423187757, 423187758):
+                records.append((100.0 + i, serial, DIRECTION_SENT, buildRequest(0x20, serial)))
+                records.append((100.01 + i, serial, DIRECTION_RECEIVED, buildRequest(0x20, serial, bytearray([i]))))
+
+        replay = ReplayServer(records, speed=100.0)
+        replay.start()
+
+        try:
+            report = replayTraffic(records, '127.0.0.1', replay.getPort(), speed=100.0)
+        finally:
+            replay.shutdown()
+
+        self.assertEquals(report["sent"], 10)
+        self.assertEquals(report["failed"], 0)
+        self.assertEquals(len(report["latencies"]), 10)
+        self.assertTrue(report["duration"] >= 0.04)
+
+    def test_replayTraffic_ManyBoards_Concurrent(self):
+        records = []
+        for serial in range(423187750, 423187760):
+            records.append((100.0, serial, DIRECTION_SENT, buildRequest(0x20, serial)))
+            records.append((100.2, serial, DIRECTION_RECEIVED, buildRequest(0x20, serial, bytearray([1]))))
+
+        replay = ReplayServer(records)
+        replay.start()
+
+        try:
+            report = replayTraffic(records, '127.0.0.1', replay.getPort())
+        finally:
+            replay.shutdown()
+
+        # Ten boards answering in 0.2 seconds each, all due at once, overlap rather than queue
+        self.assertEquals(report["sent"], 10)
+        self.assertTrue(report["duration"] < 1.0)
+        self.assertTrue(max(report["latencies"]) < 1.0)
+
+    def test_replayTraffic_BadSpeed_Exception(self):
+        with self.assertRaises(ValueError):
+            replayTraffic([], '127.0.0.1', speed=-1)
+
+
+
+
+if __name__ == '__main__':
+    unittest.main()
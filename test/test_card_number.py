@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+
+import array
+import unittest
+
+from uhppote_rfid import CardNumber, CardNumberException
+from uhppote_rfid.card_number import (WIEGAND_26, WIEGAND_34, combineCards, decodeWiegand, decodeWiegandArray,
+                                      encodeWiegand, encodeWiegandArray, numpy, packCards, parseCards, splitCards,
+                                      unpackCards)
+
+
+class TestCardNumber(unittest.TestCase):
+    """
+    Tests CardNumber parsing and conversion.
+    """
+
+    # CardNumber.__init__
+
+    def test_constructor_Integer_Stored(self):
+        card = CardNumber(8405236)
+
+        self.assertEquals(card.getInteger(), 8405236)
+        self.assertEquals(card.getFacility(), 128)
+        self.assertEquals(card.getCard(), 16628)
+
+    def test_constructor_DecimalString_Stored(self):
+        self.assertEquals(CardNumber("0008405236").getInteger(), 8405236)
+
+    def test_constructor_FacilityString_Stored(self):
+        self.assertEquals(CardNumber("128,16628").getInteger(), 8405236)
+        self.assertEquals(CardNumber("128:16628").getInteger(), 8405236)
+
+    def test_constructor_FacilityParameter_Stored(self):
+        self.assertEquals(CardNumber(16628, facility=128).getInteger(), 8405236)
+
+    def test_constructor_FacilityTwice_Exception(self):
+        with self.assertRaises(CardNumberException):
+            CardNumber("128,16628", facility=128)
+
+    def test_constructor_NotNumeric_Exception(self):
+        with self.assertRaises(CardNumberException):
+            CardNumber("abc")
+
+    def test_constructor_BadFacilityString_MessageWhole(self):
+        with self.assertRaises(CardNumberException) as context:
+            CardNumber("abc,2")
+
+        self.assertTrue("\"abc,2\"" in str(context.exception))
+
+    def test_constructor_OutOfBounds_Exception(self):
+        with self.assertRaises(CardNumberException):
+            CardNumber(-1)
+
+        with self.assertRaises(CardNumberException):
+            CardNumber(1 << 32)
+
+        with self.assertRaises(CardNumberException):
+            CardNumber(65536, facility=1)
+
+    def test_constructor_UnknownType_Exception(self):
+        with self.assertRaises(CardNumberException):
+            CardNumber(1.5)
+
+
+    # CardNumber.getFacilityString / getByteArray
+
+    def test_getFacilityString_Stored_Padded(self):
+        self.assertEquals(CardNumber(65537).getFacilityString(), "1,00001")
+
+    def test_getByteArray_Stored_LittleEndian(self):
+        self.assertEquals(CardNumber(8405236).getByteArray(), bytearray([0xf4, 0x40, 0x80, 0x00]))
+
+
+    # encodeWiegand / decodeWiegand
+
+    def test_encodeWiegand_Known_ParitySet(self):
+        # Upper 12 bits 0x010 have odd parity, so the leading even bit is set; lower 12 bits 0x001 need no odd bit
+        self.assertEquals(encodeWiegand(0x010001), 0x2020002)
+        self.assertEquals(CardNumber(65537).getWiegand(), 0x2020002)
+
+    def test_encodeWiegand_TooLarge_Exception(self):
+        with self.assertRaises(CardNumberException):
+            encodeWiegand(1 << 24)
+
+    def test_encodeWiegand_UnknownFormat_Exception(self):
+        with self.assertRaises(CardNumberException):
+            encodeWiegand(1, 37)
+
+    def test_decodeWiegand_RoundTrip_Equal(self):
+        for card in (0, 1, 8405236, 0xFFFFFF):
+            self.assertEquals(decodeWiegand(encodeWiegand(card)), card)
+
+        for card in (0, 8405236, 0xFFFFFFFF):
+            self.assertEquals(decodeWiegand(encodeWiegand(card, WIEGAND_34), WIEGAND_34), card)
+
+    def test_decodeWiegand_BadParity_Exception(self):
+        with self.assertRaises(CardNumberException):
+            decodeWiegand(encodeWiegand(8405236) ^ 1)
+
+        with self.assertRaises(CardNumberException):
+            decodeWiegand(encodeWiegand(8405236) ^ (1 << 25))
+
+    def test_decodeWiegand_TooLong_Exception(self):
+        with self.assertRaises(CardNumberException):
+            decodeWiegand(1 << 26)
+
+
+
+
+class TestCardColumns(unittest.TestCase):
+    """
+    Tests column-wise card number conversion.
+    """
+
+    def setUp(self):
+        """
+        .. function:: setUp()
+
+           Creates a column of card numbers across the 26-bit range.
+        """
+        self.cards = [0, 1, 8405236, 65537, 0xFFFFFF] + list(range(1000, 100000, 997))
+
+
+    # combineCards / splitCards
+
+    def test_combineCards_Columns_Combined(self):
+        self.assertEquals(list(combineCards([128, 1], [16628, 1])), [8405236, 65537])
+
+    def test_combineCards_FacilityTooLarge_Exception(self):
+        with self.assertRaises(CardNumberException):
+            combineCards([256], [1])
+
+        self.assertEquals(list(combineCards([256], [1], WIEGAND_34)), [(256 << 16) | 1])
+
+    def test_combineCards_LengthMismatch_Exception(self):
+        with self.assertRaises(CardNumberException):
+            combineCards([1, 2], [1])
+
+    def test_splitCards_Combined_RoundTrip(self):
+        facilities, cards = splitCards(self.cards)
+        self.assertEquals(list(combineCards(facilities, cards)), self.cards)
+
+
+    # parseCards
+
+    def test_parseCards_MixedForms_Parsed(self):
+        self.assertEquals(list(parseCards(["8405236", "128,16628", " 65537"])), [8405236, 8405236, 65537])
+
+    def test_parseCards_Malformed_Exception(self):
+        with self.assertRaises(CardNumberException):
+            parseCards(["8405236", "-1"])
+
+    def test_parseCards_Integers_Parsed(self):
+        self.assertEquals(list(parseCards([8405236, "128,16628"])), [8405236, 8405236])
+
+    def test_parseCards_Float_Exception(self):
+        with self.assertRaises(CardNumberException):
+            parseCards([3.7])
+
+        with self.assertRaises(CardNumberException):
+            parseCards([True])
+
+
+    # encodeWiegandArray / decodeWiegandArray
+
+    def test_encodeWiegandArray_Column_MatchesScalar(self):
+        for bits in (WIEGAND_26, WIEGAND_34):
+            self.assertEquals(list(encodeWiegandArray(self.cards, bits)), [encodeWiegand(card, bits) for card in self.cards])
+
+    def test_decodeWiegandArray_Column_RoundTrip(self):
+        for bits in (WIEGAND_26, WIEGAND_34):
+            self.assertEquals(list(decodeWiegandArray(encodeWiegandArray(self.cards, bits), bits)), self.cards)
+
+    def test_decodeWiegandArray_BadParity_Exception(self):
+        raws = encodeWiegandArray(self.cards)
+        raws[3] ^= 1
+
+        with self.assertRaises(CardNumberException):
+            decodeWiegandArray(raws)
+
+    def test_encodeWiegandArray_Empty_Empty(self):
+        self.assertEquals(len(encodeWiegandArray([])), 0)
+
+
+    # packCards / unpackCards
+
+    def test_packCards_Column_LittleEndianFields(self):
+        self.assertEquals(packCards([8405236, 1]), b"\xf4\x40\x80\x00\x01\x00\x00\x00")
+
+    def test_unpackCards_Packed_RoundTrip(self):
+        self.assertEquals(unpackCards(packCards(self.cards)), array.array(unpackCards(b"").typecode, self.cards))
+
+    def test_unpackCards_PartialField_Exception(self):
+        with self.assertRaises(CardNumberException):
+            unpackCards(b"\x00\x00\x00")
+
+
+    # NumPy columns
+
+    @unittest.skipIf(numpy is None, "NumPy not available")
+    def test_encodeWiegandArray_Numpy_MatchesScalar(self):
+        values = numpy.array(self.cards, dtype=numpy.uint32)
+
+        for bits in (WIEGAND_26, WIEGAND_34):
+            raws = encodeWiegandArray(values, bits)
+
+            self.assertTrue(isinstance(raws, numpy.ndarray))
+            self.assertEquals(raws.tolist(), [encodeWiegand(card, bits) for card in self.cards])
+            self.assertEquals(decodeWiegandArray(raws, bits).tolist(), self.cards)
+
+    @unittest.skipIf(numpy is None, "NumPy not available")
+    def test_packCards_Numpy_MatchesArray(self):
+        self.assertEquals(packCards(numpy.array(self.cards)), packCards(self.cards))
+
+
+
+
+if __name__ == '__main__':
+    unittest.main()
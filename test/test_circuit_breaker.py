@@ -0,0 +1,354 @@
+#!/usr/bin/env python
+
+import socket
+import time
+import unittest
+
+from uhppote_rfid import (CircuitBreaker, CircuitBreakerRegistry, CircuitOpenException, ConnectionPool,
+                          ControllerSocket, SocketConnectionException)
+from uhppote_rfid.circuit_breaker import STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN
+
+
+def _unusedPort():
+    unused = socket.socket()
+    unused.bind(('127.0.0.1', 0))
+    port = unused.getsockname()[1]
+    unused.close()
+    return port
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """
+    Tests circuit breaker state transitions.
+    """
+
+    def setUp(self):
+        """
+        .. function:: setUp()
+
+           Creates a breaker that opens after two failures in three calls.
+        """
+        self.breaker = CircuitBreaker(failureThreshold=0.5, minimumCalls=2, window=4, resetTimeout=10.0, maxResetTimeout=30.0)
+
+
+    def _open(self, now=100.0):
+        self.breaker.recordFailure(now)
+        self.breaker.recordFailure(now)
+
+
+    # CircuitBreaker.__init__
+
+    def test_constructor_BadThreshold_Exception(self):
+        with self.assertRaises(ValueError):
+            CircuitBreaker(failureThreshold=0)
+
+        with self.assertRaises(ValueError):
+            CircuitBreaker(failureThreshold=1.5)
+
+    def test_constructor_WindowTooSmall_Exception(self):
+        with self.assertRaises(ValueError):
+            CircuitBreaker(minimumCalls=5, window=3)
+
+    def test_constructor_BadTimeout_Exception(self):
+        with self.assertRaises(ValueError):
+            CircuitBreaker(resetTimeout=0)
+
+
+    # CircuitBreaker.recordFailure
+
+    def test_recordFailure_BelowMinimum_Closed(self):
+        self.breaker.recordFailure(100.0)
+        self.assertEquals(self.breaker.getState(), STATE_CLOSED)
+
+    def test_recordFailure_BelowThreshold_Closed(self):
+        self.breaker.recordSuccess()
+        self.breaker.recordSuccess()
+        self.breaker.recordSuccess()
+        self.breaker.recordFailure(100.0)
+
+        self.assertEquals(self.breaker.getState(), STATE_CLOSED)
+
+    def test_recordFailure_Threshold_Open(self):
+        self._open()
+
+        self.assertEquals(self.breaker.getState(), STATE_OPEN)
+        self.assertEquals(self.breaker.getRetryAt(), 110.0)
+
+    def test_recordFailure_WindowSlides_Closed(self):
+        self.breaker.recordFailure(100.0)
+
+        for i in range(4):
+            self.breaker.recordSuccess()
+
+        self.breaker.recordFailure(100.0)
+        self.assertEquals(self.breaker.getState(), STATE_CLOSED)
+
+
+    # CircuitBreaker.allow
+
+    def test_allow_Closed_Allowed(self):
+        self.breaker.allow(100.0)
+
+    def test_allow_Open_Exception(self):
+        self._open()
+
+        with self.assertRaises(CircuitOpenException):
+            self.breaker.allow(105.0)
+
+    def test_allow_Open_IsSocketConnectionException(self):
+        self._open()
+
+        with self.assertRaises(SocketConnectionException):
+            self.breaker.allow(105.0)
+
+    def test_allow_TimeoutPassed_SingleTrial(self):
+        self._open()
+        self.breaker.allow(110.0)
+
+        self.assertEquals(self.breaker.getState(), STATE_HALF_OPEN)
+
+        with self.assertRaises(CircuitOpenException):
+            self.breaker.allow(110.0)
+
+    def test_allow_TrialSucceeded_Closed(self):
+        self._open()
+        self.breaker.allow(110.0)
+        self.breaker.recordSuccess()
+
+        self.assertEquals(self.breaker.getState(), STATE_CLOSED)
+        self.breaker.allow(110.0)
+
+    def test_allow_TrialFailed_BackedOff(self):
+        self._open()
+        self.breaker.allow(110.0)
+        self.breaker.recordFailure(110.0)
+
+        self.assertEquals(self.breaker.getState(), STATE_OPEN)
+        self.assertEquals(self.breaker.getRetryAt(), 130.0)
+
+        self.breaker.allow(130.0)
+        self.breaker.recordFailure(130.0)
+        self.assertEquals(self.breaker.getRetryAt(), 160.0)
+
+    def test_allow_TrialUnreported_NewTrial(self):
+        self._open()
+        self.breaker.allow(110.0)
+
+        with self.assertRaises(CircuitOpenException):
+            self.breaker.allow(139.0)
+
+        self.breaker.allow(140.0)
+
+        self.assertEquals(self.breaker.getState(), STATE_HALF_OPEN)
+        self.assertEquals(self.breaker.getRetryAt(), 170.0)
+
+    def test_recordFailure_AlreadyOpen_Ignored(self):
+        self._open()
+        self.breaker.recordFailure(105.0)
+
+        self.assertEquals(self.breaker.getRetryAt(), 110.0)
+
+
+    # CircuitBreaker.check
+
+    def test_check_TimeoutPassed_NoTrialAdmitted(self):
+        self._open()
+        self.breaker.check(110.0)
+
+        self.assertEquals(self.breaker.getState(), STATE_OPEN)
+
+    def test_check_HalfOpen_Exception(self):
+        self._open()
+        self.breaker.allow(110.0)
+
+        with self.assertRaises(CircuitOpenException):
+            self.breaker.check(110.0)
+
+    def test_check_TrialUnreported_Allowed(self):
+        self._open()
+        self.breaker.allow(110.0)
+        self.breaker.check(140.0)
+
+
+
+
+class TestCircuitBreakerRegistry(unittest.TestCase):
+    """
+    Tests circuit breakers applied to connections.
+    """
+
+    def setUp(self):
+        """
+        .. function:: setUp()
+
+           Creates a registry whose breakers open on the first failure.
+        """
+        self.probes = []
+        self.probeFails = True
+        self.registry = CircuitBreakerRegistry(self._probe, minimumCalls=1, window=1, resetTimeout=60.0)
+
+
+    def _probe(self, controller):
+        self.probes.append((controller.getHost(), controller.getPort()))
+
+        if self.probeFails:
+            raise SocketConnectionException("Unreachable")
+
+
+    # CircuitBreakerRegistry.get
+
+    def test_get_SameBoard_SameBreaker(self):
+        self.assertTrue(self.registry.get('127.0.0.1', 60000) is self.registry.get('127.0.0.1', '60000'))
+        self.assertFalse(self.registry.get('127.0.0.1', 60000) is self.registry.get('127.0.0.1', 60001))
+
+    def test_constructor_BadOptions_Exception(self):
+        with self.assertRaises(ValueError):
+            CircuitBreakerRegistry(window=0)
+
+
+    # ControllerSocket.connect
+
+    def test_connect_DeadBoard_FailsFast(self):
+        port = _unusedPort()
+        breaker = self.registry.get('127.0.0.1', port)
+
+        controller = ControllerSocket('127.0.0.1', port)
+        controller.setBreaker(breaker)
+
+        with self.assertRaises(SocketConnectionException):
+            controller.connect(1)
+
+        self.assertEquals(breaker.getState(), STATE_OPEN)
+
+        start = time.time()
+        with self.assertRaises(CircuitOpenException):
+            controller.connect(1)
+
+        self.assertTrue(time.time() - start < 0.01)
+        controller.close()
+
+    def test_connect_LiveBoard_Closed(self):
+        server = socket.socket()
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+
+        breaker = self.registry.get('127.0.0.1', server.getsockname()[1])
+        controller = ControllerSocket('127.0.0.1', server.getsockname()[1])
+        controller.setBreaker(breaker)
+
+        try:
+            controller.connect(1)
+        finally:
+            controller.close()
+            server.close()
+
+        self.assertEquals(breaker.getState(), STATE_CLOSED)
+
+
+    # ConnectionPool.call
+
+    def test_call_OpenBreaker_Rejected(self):
+        port = _unusedPort()
+        pool = ConnectionPool(attempts=1, breakers=self.registry)
+
+        with self.assertRaises(SocketConnectionException):
+            pool.call('127.0.0.1', port, lambda controller: None)
+
+        with self.assertRaises(CircuitOpenException):
+            pool.call('127.0.0.1', port, lambda controller: None)
+
+        pool.close()
+
+
+    # CircuitBreakerRegistry.probeDue
+
+    def test_probeDue_NotDue_NotProbed(self):
+        self.registry.get('127.0.0.1', 60000).recordFailure(100.0)
+
+        self.assertEquals(self.registry.probeDue(120.0), 0)
+        self.assertEquals(self.probes, [])
+
+    def test_probeDue_Unreachable_Reopened(self):
+        breaker = self.registry.get('127.0.0.1', 60000)
+        breaker.recordFailure(100.0)
+
+        self.assertEquals(self.registry.probeDue(160.0), 1)
+        self.assertEquals(self.probes, [('127.0.0.1', 60000)])
+        self.assertEquals(breaker.getState(), STATE_OPEN)
+        self.assertTrue(time.time() + 119.0 < breaker.getRetryAt() <= time.time() + 120.0)
+
+    def test_probeDue_SlowProbe_RetryFromFinish(self):
+        def probe(controller):
+            time.sleep(0.2)
+            raise SocketConnectionException("Unreachable")
+
+        registry = CircuitBreakerRegistry(probe, minimumCalls=1, window=1, resetTimeout=60.0)
+        breaker = registry.get('127.0.0.1', 60000)
+        breaker.recordFailure(time.time() - 60.0)
+
+        registry.probeDue()
+        self.assertTrue(breaker.getRetryAt() > time.time() + 119.9)
+
+    def test_probeDue_Reachable_Closed(self):
+        breaker = self.registry.get('127.0.0.1', 60000)
+        breaker.recordFailure(100.0)
+        self.probeFails = False
+
+        self.registry.probeDue(160.0)
+        self.assertEquals(breaker.getState(), STATE_CLOSED)
+
+
+    def test_probeDue_TrialUnreported_Probed(self):
+        breaker = self.registry.get('127.0.0.1', 60000)
+        breaker.recordFailure(100.0)
+        breaker.allow(160.0)
+
+        self.assertEquals(self.registry.probeDue(170.0), 0)
+        self.assertEquals(self.registry.probeDue(190.0), 1)
+        self.assertEquals(breaker.getState(), STATE_OPEN)
+
+    def test_probeDue_SlowProbes_Concurrent(self):
+        timeouts = []
+
+        def probe(controller):
+            timeouts.append(controller.getEstimator().getTimeout(controller.getHost(), controller.getPort()))
+            time.sleep(0.2)
+            raise SocketConnectionException("Unreachable")
+
+        registry = CircuitBreakerRegistry(probe, probeTimeout=1.5, minimumCalls=1, window=1, resetTimeout=60.0)
+
+        for port in range(60000, 60008):
+            registry.get('127.0.0.1', port).recordFailure(100.0)
+
+        began = time.time()
+
+        self.assertEquals(registry.probeDue(160.0), 8)
+        self.assertTrue(time.time() - began < 0.8)
+        self.assertEquals(timeouts, [1.5] * 8)
+
+
+    # CircuitBreakerRegistry.start
+
+    def test_start_OpenBreaker_ProbedInBackground(self):
+        registry = CircuitBreakerRegistry(self._probe, interval=0.01, minimumCalls=1, window=1, resetTimeout=0.01)
+        self.probeFails = False
+
+        breaker = registry.get('127.0.0.1', 60000)
+        breaker.recordFailure()
+
+        registry.start()
+
+        try:
+            deadline = time.time() + 2.0
+            while breaker.getState() != STATE_CLOSED and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            registry.stop()
+
+        self.assertEquals(breaker.getState(), STATE_CLOSED)
+
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+import datetime
+import unittest
+
+from uhppote_rfid import CommandException, SerialNumberException
+from uhppote_rfid.commands import buildRequest, decodeDateTime, encodeDateTime, fromBCD, getCommand, toBCD
+
+
+class TestCommands(unittest.TestCase):
+    """
+    Tests construction of request packets.
+    """
+
+    # toBCD / fromBCD
+
+    def test_toBCD_Negative_Exception(self):
+        with self.assertRaises(ValueError):
+            toBCD(-1)
+
+    def test_toBCD_TooLong_Exception(self):
+        with self.assertRaises(ValueError):
+            toBCD(100)
+
+    def test_toBCD_Year_Valid(self):
+        self.assertEquals(toBCD(2017, 4), bytearray([0x20, 0x17]))
+
+    def test_fromBCD_Year_Valid(self):
+        self.assertEquals(fromBCD(bytearray([0x20, 0x17])), 2017)
+
+
+    # encodeDateTime / decodeDateTime
+
+    def test_encodeDateTime_Valid(self):
+        moment = datetime.datetime(2017, 10, 9, 8, 7, 6)
+        self.assertEquals(encodeDateTime(moment), bytearray([0x20, 0x17, 0x10, 0x09, 0x08, 0x07, 0x06]))
+
+    def test_decodeDateTime_RoundTrip_Valid(self):
+        moment = datetime.datetime(2017, 12, 31, 23, 59, 58)
+        self.assertEquals(decodeDateTime(encodeDateTime(moment)), moment)
+
+
+    # buildRequest
+
+    def test_buildRequest_BadFunction_Exception(self):
+        with self.assertRaises(ValueError):
+            buildRequest(0x100, 423187757)
+
+    def test_buildRequest_BadSerial_Exception(self):
+        with self.assertRaises(SerialNumberException):
+            buildRequest(0x20, -1)
+
+    def test_buildRequest_TooMuchData_Exception(self):
+        with self.assertRaises(ValueError):
+            buildRequest(0x20, 423187757, bytearray(57))
+
+    def test_buildRequest_Header_Valid(self):
+        packet = buildRequest(0x40, 423187757, bytearray([1]))
+
+        self.assertEquals(len(packet), 64)
+        self.assertEquals(packet[0:9], bytearray([0x17, 0x40, 0, 0, 0x2d, 0x55, 0x39, 0x19, 1]))
+        self.assertEquals(packet[9:], bytearray(55))
+
+
+    # getCommand
+
+    def test_getCommand_Unknown_Exception(self):
+        with self.assertRaises(CommandException):
+            getCommand("explode")
+
+    def test_getCommand_OpenDoorBadDoor_Exception(self):
+        with self.assertRaises(ValueError):
+            getCommand("open-door").buildRequest(423187757, ["5"])
+
+    def test_getCommand_OpenDoorNoDoor_Exception(self):
+        with self.assertRaises(ValueError):
+            getCommand("open-door").buildRequest(423187757)
+
+    def test_getCommand_GetStatusArguments_Exception(self):
+        with self.assertRaises(ValueError):
+            getCommand("get-status").buildRequest(423187757, ["1"])
+
+    def test_getCommand_SetTime_Valid(self):
+        packet = getCommand("set-time").buildRequest(423187757, ["2017-10-09", "08:07:06"])
+        self.assertEquals(packet[8:15], bytearray([0x20, 0x17, 0x10, 0x09, 0x08, 0x07, 0x06]))
+
+    def test_getCommand_SetDoorControl_Valid(self):
+        packet = getCommand("set-door-control").buildRequest(423187757, ["2", "normally-open", "7"])
+        self.assertEquals(packet[8:11], bytearray([2, 1, 7]))
+
+    def test_getCommand_SetDoorControlBadMode_Exception(self):
+        with self.assertRaises(ValueError):
+            getCommand("set-door-control").buildRequest(423187757, ["2", "ajar", "7"])
+
+    def test_getCommand_SetTimeProfile_Valid(self):
+        packet = getCommand("set-time-profile").buildRequest(
+            423187757, ["2", "2017-01-01", "2017-12-31", "1111100", "08:00-12:30", "linked=3"])
+
+        self.assertEquals(packet[8:17], bytearray([2, 0x20, 0x17, 0x01, 0x01, 0x20, 0x17, 0x12, 0x31]))
+        self.assertEquals(packet[17:24], bytearray([1, 1, 1, 1, 1, 0, 0]))
+        self.assertEquals(packet[24:28], bytearray([0x08, 0x00, 0x12, 0x30]))
+        self.assertEquals(packet[28:36], bytearray(8))
+        self.assertEquals(packet[36], 3)
+
+    def test_getCommand_SetTimeProfileBadWeekdays_Exception(self):
+        with self.assertRaises(ValueError):
+            getCommand("set-time-profile").buildRequest(423187757, ["2", "2017-01-01", "2017-12-31", "11111"])
+
+    def test_getCommand_GetTimeProfileReserved_Exception(self):
+        with self.assertRaises(ValueError):
+            getCommand("get-time-profile").buildRequest(423187757, ["1"])
+
+    def test_getCommand_SetInterlockUnknown_Exception(self):
+        with self.assertRaises(ValueError):
+            getCommand("set-interlock").buildRequest(423187757, ["5"])
+
+
+    # Command.checkResponse
+
+    def test_checkResponse_Short_Exception(self):
+        with self.assertRaises(CommandException):
+            getCommand("get-status").checkResponse(bytearray([0x17, 0x20]))
+
+    def test_checkResponse_WrongFunction_Exception(self):
+        with self.assertRaises(CommandException):
+            getCommand("get-status").checkResponse(buildRequest(0x32, 423187757))
+
+    def test_checkResponse_Matching_Valid(self):
+        getCommand("get-status").checkResponse(buildRequest(0x20, 423187757))
+
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+
+import socket
+import threading
+import unittest
+
+from uhppote_rfid import BoardConfig, ConfigException, ControllerSocket
+from uhppote_rfid.config import applyConfig, diffConfig, readConfig
+
+
+class TestBoardConfig(unittest.TestCase):
+    """
+    Tests the configuration model and diff without a control board.
+    """
+
+    # BoardConfig.update
+
+    def test_update_Document_Stored(self):
+        config = BoardConfig({
+            "doors": {"1": {"mode": "controlled", "delay": 5}},
+            "profiles": {"2": {"weekdays": "1111100", "segments": ["8:00-18:00"], "startDate": "2017-1-1"}},
+            "interlock": 1,
+        })
+
+        self.assertEquals(config.doors, {1: (1, "controlled", 5)})
+        self.assertEquals(config.profiles[2], (2, "2017-01-01", "2099-12-31", "1111100", "08:00-18:00", "linked=0"))
+        self.assertEquals(config.interlock, 1)
+
+    def test_update_MissingField_Exception(self):
+        with self.assertRaises(ValueError):
+            BoardConfig({"doors": {"1": {"mode": "controlled"}}})
+
+    def test_setDoor_BadMode_Exception(self):
+        with self.assertRaises(ValueError):
+            BoardConfig().setDoor(1, "ajar", 5)
+
+    def test_setProfile_TooManySegments_Exception(self):
+        with self.assertRaises(ValueError):
+            BoardConfig().setProfile(2, "1111111", ["00:00-01:00", "02:00-03:00", "04:00-05:00", "06:00-07:00"])
+
+    def test_setInterlock_Unknown_Exception(self):
+        with self.assertRaises(ValueError):
+            BoardConfig().setInterlock(5)
+
+    def test_toDocument_RoundTrip_Equal(self):
+        config = BoardConfig()
+        config.setDoor(2, "normally-open", 0)
+        config.setProfile(3, "0000011", ["09:00-12:00"], linked=4)
+        config.setInterlock(3)
+
+        copy = BoardConfig(config.toDocument())
+        self.assertEquals((copy.doors, copy.profiles, copy.interlock), (config.doors, config.profiles, config.interlock))
+
+
+    # diffConfig
+
+    def test_diffConfig_Equal_Empty(self):
+        document = {"doors": {"1": {"mode": "controlled", "delay": 5}}}
+        self.assertEquals(diffConfig(BoardConfig(document), BoardConfig(document)), [])
+
+    def test_diffConfig_OnlyChanged_Listed(self):
+        current = BoardConfig({"doors": {"1": {"mode": "controlled", "delay": 5}, "2": {"mode": "controlled", "delay": 5}}})
+        desired = BoardConfig({"doors": {"1": {"mode": "controlled", "delay": 5}, "2": {"mode": "controlled", "delay": 8}}})
+
+        self.assertEquals(diffConfig(current, desired), [("set-door-control", [2, "controlled", 8])])
+
+    def test_diffConfig_UnnamedSetting_Untouched(self):
+        current = BoardConfig({"doors": {"3": {"mode": "normally-open", "delay": 1}}})
+        self.assertEquals(diffConfig(current, BoardConfig()), [])
+
+    def test_diffConfig_UnknownInterlock_Written(self):
+        self.assertEquals(diffConfig(BoardConfig(), BoardConfig({"interlock": 0})), [("set-interlock", [0])])
+
+
+
+
+class TestApplyConfig(unittest.TestCase):
+    """
+    Tests reading and writing settings against an emulated control board.
+    """
+
+    def setUp(self):
+        """
+        .. function:: setUp()
+
+           Runs a fake control board locally on an ephemeral port, with every door controlled with a 3-second delay.
+        """
+        self.doors = dict((door, [3, 3]) for door in range(1, 5))
+        self.profiles = {}
+        self.interlock = 0
+        self.functions = []
+        self.reject = False
+
+        self.server = socket.socket()
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(8)
+
+        thread = threading.Thread(target=self._serve)
+        thread.daemon = True
+        thread.start()
+
+        self.controller = ControllerSocket('127.0.0.1', self.server.getsockname()[1])
+        self.controller.connect()
+
+
+    def tearDown(self):
+        """
+        .. function:: tearDown()
+
+           Closes the connection and the test suite's server.
+        """
+        self.controller.close()
+        self.server.close()
+
+
+    def _serve(self):
+        while True:
+            try:
+                connection = self.server.accept()[0]
+            except (socket.error, OSError):
+                return
+
+            thread = threading.Thread(target=self._board, args=(connection,))
+            thread.daemon = True
+            thread.start()
+
+    def _board(self, connection):
+        while True:
+            data = bytearray(connection.recv(64))
+            if not data:
+                connection.close()
+                return
+
+            self.functions.append(data[1])
+
+            if data[1] == 0x80:
+                self.doors[data[8]] = [data[9], data[10]]
+            elif data[1] == 0x88:
+                self.profiles[data[8]] = data[8:37]
+            elif data[1] == 0xa2:
+                self.interlock = data[8]
+
+            if data[1] in (0x80, 0x82):
+                data[9:11] = bytearray(self.doors[data[8]])
+            elif data[1] == 0x98:
+                data[8:37] = self.profiles.get(data[8], bytearray(29))
+            else:
+                data[8:] = bytearray(56)
+                data[8] = 0 if self.reject else 1
+
+            connection.sendall(data)
+
+
+    # readConfig
+
+    def test_readConfig_Doors_Read(self):
+        config = readConfig(self.controller, 423187757, doors=(1, 4))
+        self.assertEquals(config.doors, {1: (1, "controlled", 3), 4: (4, "controlled", 3)})
+
+    def test_readConfig_UndefinedProfile_Omitted(self):
+        self.assertEquals(readConfig(self.controller, 423187757, doors=(), profiles=(2,)).profiles, {})
+
+
+    # applyConfig
+
+    def test_applyConfig_OneChange_OnePacketWritten(self):
+        desired = BoardConfig()
+        for door in range(1, 5):
+            desired.setDoor(door, "controlled", 3 if door != 2 else 10)
+
+        changes = applyConfig(self.controller, 423187757, desired)
+
+        self.assertEquals(changes, [("set-door-control", [2, "controlled", 10])])
+        self.assertEquals(self.functions.count(0x80), 1)
+        self.assertEquals(self.doors[2], [3, 10])
+
+    def test_applyConfig_Profile_WrittenThenUnchanged(self):
+        desired = BoardConfig()
+        desired.setProfile(2, "1111100", ["08:00-12:00", "13:00-17:30"], "2017-01-01", "2017-12-31")
+
+        self.assertEquals(len(applyConfig(self.controller, 423187757, desired)), 1)
+        self.assertEquals(applyConfig(self.controller, 423187757, desired), [])
+        self.assertEquals(self.functions.count(0x88), 1)
+
+    def test_applyConfig_Interlock_Written(self):
+        applyConfig(self.controller, 423187757, BoardConfig({"interlock": 3}))
+        self.assertEquals(self.interlock, 3)
+
+    def test_applyConfig_Rejected_Exception(self):
+        self.reject = True
+
+        with self.assertRaises(ConfigException):
+            applyConfig(self.controller, 423187757, BoardConfig({"interlock": 3}))
+
+
+
+
+if __name__ == '__main__':
+    unittest.main()
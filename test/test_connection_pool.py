@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+
+import socket
+import threading
+import time
+import unittest
+
+from uhppote_rfid import ConnectionPool, SocketConnectionException, SocketTransmitException
+from uhppote_rfid.commands import FUNCTION_GET_STATUS, FUNCTION_OPEN_DOOR, buildRequest
+
+
+class TestConnectionPool(unittest.TestCase):
+    """
+    Tests connection reuse by emulating a control board's server that counts connections.
+    """
+
+    def setUp(self):
+        """
+        .. function:: setUp()
+
+           Runs an echo server locally on an ephemeral port.
+        """
+        self.server = socket.socket()
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(8)
+        self.port = self.server.getsockname()[1]
+        self.accepted = []
+        self.silent = False
+
+        thread = threading.Thread(target=self._serve)
+        thread.daemon = True
+        thread.start()
+
+        self.pool = ConnectionPool(attempts=1)
+
+
+    def tearDown(self):
+        """
+        .. function:: tearDown()
+
+           Closes the pool and the test suite's server.
+        """
+        self.pool.close()
+        self.server.close()
+
+
+    def _serve(self):
+        while True:
+            try:
+                connection = self.server.accept()[0]
+            except (socket.error, OSError):
+                return
+
+            self.accepted.append(connection)
+
+            thread = threading.Thread(target=self._echo, args=(connection,))
+            thread.daemon = True
+            thread.start()
+
+    def _echo(self, connection):
+        while True:
+            try:
+                data = connection.recv(64)
+            except (socket.error, OSError):
+                return
+
+            if not data:
+                connection.close()
+                return
+
+            if not self.silent:
+                connection.sendall(data)
+
+
+    # ConnectionPool.__init__
+
+    def test_constructor_BadTimeout_Exception(self):
+        with self.assertRaises(ValueError):
+            ConnectionPool(timeout=0)
+
+
+    # ConnectionPool.transmit
+
+    def test_transmit_Unreachable_Exception(self):
+        with self.assertRaises(SocketConnectionException):
+            self.pool.transmit('127.0.0.1', 1, bytearray(64))
+
+    def test_transmit_Repeated_OneConnection(self):
+        for i in range(5):
+            self.assertEquals(self.pool.transmit('127.0.0.1', self.port, bytearray([i] * 64)), bytearray([i] * 64))
+
+        self.assertEquals(len(self.accepted), 1)
+        self.assertEquals(len(self.pool), 1)
+
+    def test_transmit_NoAnswer_TimedOut(self):
+        self.silent = True
+        pool = ConnectionPool(attempts=1, timeout=0.2)
+        began = time.time()
+
+        try:
+            with self.assertRaises(SocketTransmitException):
+                pool.transmit('127.0.0.1', self.port, buildRequest(FUNCTION_GET_STATUS, 423187757))
+        finally:
+            pool.close()
+
+        self.assertTrue(time.time() - began < 2.0)
+
+    def test_transmit_ClosedByBoard_Reconnects(self):
+        request = buildRequest(FUNCTION_GET_STATUS, 423187757)
+        self.pool.transmit('127.0.0.1', self.port, request)
+
+        self.accepted[0].shutdown(socket.SHUT_RDWR)
+        self.accepted[0].close()
+
+        self.assertEquals(self.pool.transmit('127.0.0.1', self.port, request), request)
+        self.assertEquals(len(self.accepted), 2)
+
+    def test_transmit_WriteClosedByBoard_NotResent(self):
+        self.pool.transmit('127.0.0.1', self.port, buildRequest(FUNCTION_GET_STATUS, 423187757))
+
+        self.accepted[0].shutdown(socket.SHUT_RDWR)
+        self.accepted[0].close()
+
+        with self.assertRaises((SocketConnectionException, SocketTransmitException)):
+            self.pool.transmit('127.0.0.1', self.port, buildRequest(FUNCTION_OPEN_DOOR, 423187757, bytearray([1])))
+
+        self.assertEquals(len(self.accepted), 1)
+
+
+    # ConnectionPool.call
+
+    def test_call_NothingSent_Retried(self):
+        self.pool.transmit('127.0.0.1', self.port, buildRequest(FUNCTION_GET_STATUS, 423187757))
+        attempts = []
+
+        def operation(controller):
+            attempts.append(controller)
+
+            if len(attempts) == 1:
+                raise SocketTransmitException("Connection closed before sending.")
+
+            return "done"
+
+        self.assertEquals(self.pool.call('127.0.0.1', self.port, operation), "done")
+        self.assertEquals(len(attempts), 2)
+
+
+    # ConnectionPool.discard
+
+    def test_discard_Pooled_Removed(self):
+        self.pool.transmit('127.0.0.1', self.port, bytearray(64))
+        self.pool.discard('127.0.0.1', self.port)
+
+        self.assertEquals(len(self.pool), 0)
+
+
+
+
+if __name__ == '__main__':
+    unittest.main()
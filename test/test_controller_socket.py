@@ -1,13 +1,18 @@
 #!/usr/bin/env python
 
-import mock
 import os
 import socket
 import threading
 import time
 import unittest
 
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
 from uhppote_rfid import ControllerSocket, SocketConnectionException, SocketTransmitException
+from uhppote_rfid.resolver import DEFAULT_RESOLVER
 
 
 class TestControllerSocket(unittest.TestCase):
@@ -134,6 +139,71 @@ class TestControllerSocket(unittest.TestCase):
         self.assertEquals(socket.getHost(), "localhost")
 
 
+    def test_constructor_IPv6Host_Valid(self):
+        socket = ControllerSocket("::1")
+        self.assertEquals(socket.getHost(), "::1")
+
+    def test_constructor_BadIPv6Host_Exception(self):
+        with self.assertRaises(ValueError):
+            ControllerSocket("::1::2")
+
+    def test_constructor_UnknownProfile_Exception(self):
+        with self.assertRaises(ValueError):
+            ControllerSocket('127.0.0.1', profile='fastest')
+
+    def test_constructor_DefaultProfile_Valid(self):
+        self.assertEquals(self.socket.getProfile(), {})
+
+    def test_constructor_NoSocketOpened(self):
+        with mock.patch('uhppote_rfid.controller_socket.socket') as mock_socket:
+            ControllerSocket('127.0.0.1', profile='low-latency')
+
+            self.assertFalse(mock_socket.socket.called)
+
+    def test_constructor_Slots_NoInstanceDict(self):
+        with self.assertRaises(AttributeError):
+            self.socket.unknownAttribute = True
+
+
+    # Socket.setProfile
+
+    def test_setProfile_Integer_Exception(self):
+        with self.assertRaises(ValueError):
+            self.socket.setProfile(5)
+
+    def test_setProfile_UnknownOption_Exception(self):
+        with self.assertRaises(ValueError):
+            self.socket.setProfile({'fast': True})
+
+    def test_setProfile_LowLatency_NoDelay(self):
+        self.socket.setProfile('low-latency')
+        self.socket.connect()
+
+        self.assertTrue(self.socket.socket.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY))
+        self.assertTrue(self.socket.socket.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE))
+        self.assertTrue(self.socket.socket.getsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR))
+
+    def test_setProfile_Bulk_Buffers(self):
+        self.socket.setProfile('bulk')
+        self.socket.connect()
+
+        self.assertFalse(self.socket.socket.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY))
+        self.assertTrue(self.socket.socket.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF) >= 262144)
+
+    def test_setProfile_Connected_AppliedImmediately(self):
+        self.socket.connect()
+        self.socket.setProfile('low-latency')
+
+        self.assertTrue(self.socket.socket.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY))
+
+    def test_setProfile_Dict_Valid(self):
+        self.socket.setProfile({'nodelay': True, 'receiveBuffer': 8192})
+        self.socket.connect()
+
+        self.assertEquals(self.socket.getProfile(), {'nodelay': True, 'receiveBuffer': 8192})
+        self.assertTrue(self.socket.socket.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY))
+
+
     # Socket.connect
 
     def test_connect_ZeroAttempts_Exception(self):
@@ -149,19 +219,51 @@ class TestControllerSocket(unittest.TestCase):
         with self.assertRaises(SocketConnectionException):
             socket.connect()
 
+    def test_connect_Hostname_Cached(self):
+        DEFAULT_RESOLVER.invalidate()
+
+        socket = ControllerSocket('localhost')
+        socket.connect()
+        socket.close()
+
+        self.assertEquals(len(DEFAULT_RESOLVER), 1)
+
     def test_connect_ConnectLocal_Success(self):
         try:
             self.socket.connect()
-        except SocketConnectionException, e:
+        except SocketConnectionException as e:
             self.fail("Unexpected SocketConnectionException raisesd: %s" % str(e))
 
 
+    def test_connect_AfterClose_Reconnected(self):
+        self.socket.connect()
+        first = self.socket.socket
+        self.socket.close()
+
+        self.assertEquals(self.socket.socket, None)
+
+        self.socket.connect()
+        self.assertTrue(self.socket.isConnected())
+        self.assertFalse(self.socket.socket is first)
+
+    def test_connect_FailedAttempt_SocketReleased(self):
+        unused = socket.socket()
+        unused.bind(('127.0.0.1', 0))
+        controller = ControllerSocket('127.0.0.1', unused.getsockname()[1])
+        unused.close()
+
+        with self.assertRaises(SocketConnectionException):
+            controller.connect(2)
+
+        self.assertEquals(controller.socket, None)
+
+
     # Socket.close
 
     def test_close_CloseInactive_Success(self):
         try:
             self.socket.close()
-        except Exception, e:
+        except Exception as e:
             self.fail("Unexpected Exception raised: %s" % str(e))
 
     def test_close_CloseActive_Success(self):
@@ -169,7 +271,7 @@ class TestControllerSocket(unittest.TestCase):
 
         try:
             self.socket.close()
-        except Exception, e:
+        except Exception as e:
             self.fail("Unexpected Exception raisesd: %s" % str(e))
 
     def test_close_ClosedNotConnected_Success(self):
@@ -224,62 +326,77 @@ class TestControllerSocket(unittest.TestCase):
         with self.assertRaises(ValueError):
             self.socket.send('')
 
+    def test_send_Unicode_Exception(self):
+        with self.assertRaises(ValueError):
+            self.socket.send(u'hello')
+
     def test_send_EmptyByteArray_Exception(self):
         with self.assertRaises(ValueError):
             self.socket.send(bytearray())
 
     def test_send_EmptyBytes_Exception(self):
         with self.assertRaises(ValueError):
-            self.socket.send(bytes(''))
+            self.socket.send(b'')
 
     def test_send_ClosedSocket_Exception(self):
         self.socket.close()
         with self.assertRaises(SocketConnectionException):
-            self.socket.send('hello')
+            self.socket.send(b'hello')
 
     def test_send_Interrupt_Exception(self):
         with mock.patch('uhppote_rfid.controller_socket.socket') as mock_socket:
             mockSocket = ControllerSocket('127.0.0.1')
-            mockSocket.socket.send.return_value = 0
+            mock_socket.socket.return_value.send.return_value = 0
 
             mockSocket.connect()
 
             with self.assertRaises(SocketTransmitException):
-                mockSocket.send('hello')
+                mockSocket.send(b'hello')
 
     def test_send_String_Valid(self):
-        data = 'Hello World'
+        data = b'Hello World'
 
         with mock.patch('uhppote_rfid.controller_socket.socket') as mock_socket:
             mockSocket = ControllerSocket('127.0.0.1')
-            mockSocket.socket.send.return_value = len(data)
+            mock_socket.socket.return_value.send.return_value = len(data)
 
             mockSocket.connect()
             mockSocket.send(data)
-            mockSocket.socket.send.assert_called_with(data)
+            mock_socket.socket.return_value.send.assert_called_with(data)
 
 
     def test_send_ByteArray_Valid(self):
-        data = bytearray(['h', 'e', 'l', 'l', 'o'])
+        data = bytearray(b'hello')
 
         with mock.patch('uhppote_rfid.controller_socket.socket') as mock_socket:
             mockSocket = ControllerSocket('127.0.0.1')
-            mockSocket.socket.send.return_value = len(data)
+            mock_socket.socket.return_value.send.return_value = len(data)
 
             mockSocket.connect()
             mockSocket.send(data)
-            mockSocket.socket.send.assert_called_with(data)
+            mock_socket.socket.return_value.send.assert_called_with(data)
+
+    def test_send_MemoryView_Valid(self):
+        data = memoryview(b'hello')
+
+        with mock.patch('uhppote_rfid.controller_socket.socket') as mock_socket:
+            mockSocket = ControllerSocket('127.0.0.1')
+            mock_socket.socket.return_value.send.return_value = len(data)
+
+            mockSocket.connect()
+            mockSocket.send(data)
+            mock_socket.socket.return_value.send.assert_called_with(data)
 
     def test_send_Bytes_Valid(self):
         data = bytes([10, 20, 30, 40])
 
         with mock.patch('uhppote_rfid.controller_socket.socket') as mock_socket:
             mockSocket = ControllerSocket('127.0.0.1')
-            mockSocket.socket.send.return_value = len(data)
+            mock_socket.socket.return_value.send.return_value = len(data)
 
             mockSocket.connect()
             mockSocket.send(data)
-            mockSocket.socket.send.assert_called_with(data)
+            mock_socket.socket.return_value.send.assert_called_with(data)
 
 
     # Socket.receive
@@ -361,7 +478,7 @@ class TestControllerSocket(unittest.TestCase):
     def test_receive_Cutoff_Exception(self):
         with mock.patch('uhppote_rfid.controller_socket.socket') as mock_socket:
             mockSocket = ControllerSocket('127.0.0.1')
-            mockSocket.socket.recv.return_value = ''
+            mock_socket.socket.return_value.recv.return_value = b''
 
             mockSocket.connect()
 
@@ -373,7 +490,7 @@ class TestControllerSocket(unittest.TestCase):
 
         with mock.patch('uhppote_rfid.controller_socket.socket') as mock_socket:
             mockSocket = ControllerSocket('127.0.0.1')
-            mockSocket.socket.recv.return_value = bytearray(arr)
+            mock_socket.socket.return_value.recv.return_value = bytearray(arr)
 
             data = bytearray()
             for i in range(0, 8):
@@ -387,11 +504,176 @@ class TestControllerSocket(unittest.TestCase):
 
         with mock.patch('uhppote_rfid.controller_socket.socket') as mock_socket:
             mockSocket = ControllerSocket('127.0.0.1')
-            mockSocket.socket.recv.return_value = data
+            mock_socket.socket.return_value.recv.return_value = data
 
             mockSocket.connect()
             self.assertEquals(mockSocket.receive(len(data)), data)
 
+    def test_receive_Surplus_Kept(self):
+        first = bytearray([1] * 64)
+        second = bytearray([2] * 64)
+
+        with mock.patch('uhppote_rfid.controller_socket.socket') as mock_socket:
+            mockSocket = ControllerSocket('127.0.0.1')
+            mock_socket.socket.return_value.recv.side_effect = [first + second[:8], second[8:]]
+
+            mockSocket.connect()
+            self.assertEquals(mockSocket.receive(), first)
+            self.assertEquals(mockSocket.receive(), second)
+            self.assertEquals(mock_socket.socket.return_value.recv.call_count, 2)
+
+    def test_receive_BufferedFrames_NoRecv(self):
+        frames = bytearray([1] * 64) + bytearray([2] * 64)
+
+        with mock.patch('uhppote_rfid.controller_socket.socket') as mock_socket:
+            mockSocket = ControllerSocket('127.0.0.1')
+            mock_socket.socket.return_value.recv.side_effect = [frames]
+
+            mockSocket.connect()
+            mockSocket.receive()
+            self.assertEquals(mockSocket.receive(), bytearray([2] * 64))
+            self.assertEquals(mock_socket.socket.return_value.recv.call_count, 1)
+
+
+    # Socket.receiveFrame
+
+    def test_receiveFrame_ClosedSocket_Exception(self):
+        with self.assertRaises(SocketConnectionException):
+            self.socket.receiveFrame()
+
+    def test_receiveFrame_Valid(self):
+        frame = bytearray([0x17, 0x20, 0, 0]) + bytearray(60)
+
+        with mock.patch('uhppote_rfid.controller_socket.socket') as mock_socket:
+            mockSocket = ControllerSocket('127.0.0.1')
+            mock_socket.socket.return_value.recv.side_effect = [frame]
+
+            mockSocket.connect()
+            self.assertEquals(mockSocket.receiveFrame(), frame)
+
+    def test_receiveFrame_Garbage_Resynchronized(self):
+        frame = bytearray([0x17, 0x20, 0, 0]) + bytearray([5] * 60)
+        garbage = bytearray([0x01, 0x17, 0x20, 0x01, 0x02])
+
+        with mock.patch('uhppote_rfid.controller_socket.socket') as mock_socket:
+            mockSocket = ControllerSocket('127.0.0.1')
+            mock_socket.socket.return_value.recv.side_effect = [garbage, frame[:10], frame[10:]]
+
+            mockSocket.connect()
+            self.assertEquals(mockSocket.receiveFrame(), frame)
+            self.assertEquals(mockSocket.reader.discarded, len(garbage))
+
+    def test_receiveFrame_Cutoff_Exception(self):
+        with mock.patch('uhppote_rfid.controller_socket.socket') as mock_socket:
+            mockSocket = ControllerSocket('127.0.0.1')
+            mock_socket.socket.return_value.recv.side_effect = [bytearray([0x17, 0x20, 0, 0]), b'']
+
+            mockSocket.connect()
+
+            with self.assertRaises(SocketTransmitException):
+                mockSocket.receiveFrame()
+
+
+    # Socket.addHook
+
+    def test_addHook_UnknownStage_Exception(self):
+        with self.assertRaises(ValueError):
+            self.socket.addHook("pre-connect", lambda controller, value: None)
+
+    def test_addHook_None_NoHooks(self):
+        self.assertEquals(self.socket.hooks, None)
+
+    def test_addHook_Stages_Called(self):
+        calls = []
+        frame = bytearray([0x17, 0x20, 0, 0]) + bytearray(60)
+
+        for stage in ("pre-send", "post-send", "post-receive"):
+            self.socket.addHook(stage, lambda controller, value, stage=stage: calls.append((stage, bytes(value))))
+
+        with mock.patch('uhppote_rfid.controller_socket.socket') as mock_socket:
+            mockSocket = ControllerSocket('127.0.0.1')
+            mockSocket.hooks = self.socket.hooks
+            mock_socket.socket.return_value.send.return_value = 5
+            mock_socket.socket.return_value.recv.return_value = frame
+
+            mockSocket.connect()
+            mockSocket.send(b'hello')
+            mockSocket.receiveFrame()
+
+        self.assertEquals(calls, [("pre-send", b'hello'), ("post-send", b'hello'), ("post-receive", bytes(frame))])
+
+    def test_addHook_PreSend_Replaced(self):
+        with mock.patch('uhppote_rfid.controller_socket.socket') as mock_socket:
+            mockSocket = ControllerSocket('127.0.0.1')
+            mockSocket.addHook("pre-send", lambda controller, value: b'HELLO')
+            mock_socket.socket.return_value.send.return_value = 5
+
+            mockSocket.connect()
+            mockSocket.send(b'hello')
+            mock_socket.socket.return_value.send.assert_called_with(memoryview(b'HELLO'))
+
+    def test_addHook_PreSendRaises_NotSent(self):
+        def inject(controller, value):
+            raise SocketTransmitException("Injected fault.")
+
+        with mock.patch('uhppote_rfid.controller_socket.socket') as mock_socket:
+            mockSocket = ControllerSocket('127.0.0.1')
+            mockSocket.addHook("pre-send", inject)
+
+            mockSocket.connect()
+
+            with self.assertRaises(SocketTransmitException):
+                mockSocket.send(b'hello')
+
+            self.assertFalse(mock_socket.socket.return_value.send.called)
+
+    def test_addHook_Error_CalledAndRaised(self):
+        errors = []
+
+        with mock.patch('uhppote_rfid.controller_socket.socket') as mock_socket:
+            mockSocket = ControllerSocket('127.0.0.1')
+            mockSocket.addHook("error", lambda controller, error: errors.append(error))
+            mock_socket.socket.return_value.recv.side_effect = [b'']
+
+            mockSocket.connect()
+
+            with self.assertRaises(SocketTransmitException):
+                mockSocket.receive()
+
+        self.assertEquals(len(errors), 1)
+        self.assertTrue(isinstance(errors[0], SocketTransmitException))
+
+
+    # Socket.removeHook
+
+    def test_removeHook_Last_NoHooks(self):
+        callback = lambda controller, value: None
+
+        self.socket.addHook("post-send", callback)
+        self.socket.removeHook("post-send", callback)
+
+        self.assertEquals(self.socket.hooks, None)
+
+    def test_removeHook_Unknown_Exception(self):
+        with self.assertRaises(ValueError):
+            self.socket.removeHook("post-send", lambda controller, value: None)
+
+
+    # Socket.setRecorder
+
+    def test_setRecorder_Replaced_HooksSwapped(self):
+        first, second = mock.Mock(), mock.Mock()
+
+        self.socket.setRecorder(first)
+        self.socket.setRecorder(second)
+        self.socket.runHooks("post-send", b'hello')
+
+        self.assertFalse(first.recordSent.called)
+        second.recordSent.assert_called_with(b'hello')
+
+        self.socket.setRecorder(None)
+        self.assertEquals(self.socket.hooks, None)
+
 
 
 
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import socket
+import stat
+import tempfile
+import threading
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from uhppote_rfid import ControllerDaemon, DaemonClient
+from uhppote_rfid.__main__ import main
+from uhppote_rfid.client import getDefaultSocketPath, parseTarget
+
+
+class TestControllerDaemon(unittest.TestCase):
+    """
+    Tests the daemon and its client by emulating a control board that echoes requests.
+    """
+
+    def setUp(self):
+        """
+        .. function:: setUp()
+
+           Runs an echo server locally on an ephemeral port and a daemon on a temporary Unix socket.
+        """
+        self.server = socket.socket()
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(8)
+        self.port = self.server.getsockname()[1]
+
+        thread = threading.Thread(target=self._serve)
+        thread.daemon = True
+        thread.start()
+
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "daemon.sock")
+
+        self.daemon = ControllerDaemon(self.path)
+        self.daemon.start()
+
+        self.client = DaemonClient(self.path)
+
+
+    def tearDown(self):
+        """
+        .. function:: tearDown()
+
+           Shuts down the client, daemon, and test suite's server.
+        """
+        self.client.close()
+        self.daemon.shutdown()
+        self.server.close()
+        shutil.rmtree(self.directory)
+
+
+    def _serve(self):
+        while True:
+            try:
+                connection = self.server.accept()[0]
+            except (socket.error, OSError):
+                return
+
+            thread = threading.Thread(target=self._echo, args=(connection,))
+            thread.daemon = True
+            thread.start()
+
+    def _echo(self, connection):
+        while True:
+            data = connection.recv(64)
+            if not data:
+                connection.close()
+                return
+
+            connection.sendall(data)
+
+
+    # parseTarget
+
+    def test_parseTarget_Host_DefaultPort(self):
+        self.assertEquals(parseTarget("10.0.0.1"), ("10.0.0.1", 60000))
+
+    def test_parseTarget_HostPort_Valid(self):
+        self.assertEquals(parseTarget("10.0.0.1:1234"), ("10.0.0.1", 1234))
+
+    def test_parseTarget_IPv6Port_Valid(self):
+        self.assertEquals(parseTarget("[::1]:1234"), ("::1", 1234))
+
+    def test_parseTarget_IPv6_DefaultPort(self):
+        self.assertEquals(parseTarget("::1"), ("::1", 60000))
+
+
+    # getDefaultSocketPath
+
+    def test_getDefaultSocketPath_RuntimeDirectory_Used(self):
+        with mock.patch.dict(os.environ, {"XDG_RUNTIME_DIR": self.directory}):
+            os.environ.pop("UHPPOTE_SOCKET", None)
+
+            self.assertEquals(getDefaultSocketPath(), os.path.join(self.directory, "uhppote-rfid.sock"))
+
+    def test_getDefaultSocketPath_NoRuntimeDirectory_NotShared(self):
+        with mock.patch.dict(os.environ, {}):
+            os.environ.pop("UHPPOTE_SOCKET", None)
+            os.environ.pop("XDG_RUNTIME_DIR", None)
+
+            self.assertNotEquals(os.path.dirname(getDefaultSocketPath()), tempfile.gettempdir())
+
+
+    # ControllerDaemon.start
+
+    def test_start_AlreadyRunning_Exception(self):
+        with self.assertRaises(socket.error):
+            ControllerDaemon(self.path).start()
+
+    def test_start_MissingDirectory_Private(self):
+        path = os.path.join(self.directory, "run", "daemon.sock")
+        daemon = ControllerDaemon(path)
+        daemon.start()
+        daemon.shutdown()
+
+        self.assertEquals(stat.S_IMODE(os.stat(os.path.dirname(path)).st_mode) & 0o077, 0)
+
+    def test_start_SharedDirectory_Exception(self):
+        os.chmod(self.directory, 0o777)
+
+        with self.assertRaises(socket.error):
+            ControllerDaemon(os.path.join(self.directory, "other.sock")).start()
+
+
+    # DaemonClient.request
+
+    def test_request_OpenDoor_Valid(self):
+        reply = self.client.request("open-door", 423187757, "127.0.0.1", self.port, ["1"])
+
+        self.assertTrue(reply["ok"])
+        self.assertEquals(reply["response"][:18], "174000002d55391901")
+
+    def test_request_Repeated_PooledConnection(self):
+        for i in range(3):
+            self.assertTrue(self.client.request("get-status", 423187757, "127.0.0.1", self.port)["ok"])
+
+        self.assertEquals(len(self.daemon.pool), 1)
+
+    def test_request_UnknownCommand_Error(self):
+        reply = self.client.request("explode", 423187757, "127.0.0.1", self.port)
+
+        self.assertFalse(reply["ok"])
+        self.assertIn("CommandException", reply["error"])
+
+    def test_request_SharedDirectory_Exception(self):
+        os.chmod(self.directory, 0o777)
+
+        with self.assertRaises(socket.error):
+            self.client.request("get-status", 423187757, "127.0.0.1", self.port)
+
+    def test_request_BadSerial_Error(self):
+        reply = self.client.request("get-status", -1, "127.0.0.1", self.port)
+
+        self.assertFalse(reply["ok"])
+        self.assertIn("SerialNumberException", reply["error"])
+
+
+    # __main__.main
+
+    def test_main_NoDaemon_Exit2(self):
+        self.assertEquals(main(["--socket", os.path.join(self.directory, "missing.sock"), "get-status", "423187757", "127.0.0.1"]), 2)
+
+    def test_main_OpenDoor_Exit0(self):
+        self.assertEquals(main(["--socket", self.path, "open-door", "423187757", "127.0.0.1:%d" % self.port, "1"]), 0)
+
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+
+import errno
+import socket
+import threading
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from uhppote_rfid import ControllerSocket, SocketConnectionException, SocketTransmitException, TimerWheel
+from uhppote_rfid.commands import buildRequest
+from uhppote_rfid.event_loop import EventLoop, EventLoopException, selectors
+
+
+class TestTimerWheel(unittest.TestCase):
+    """
+    Tests the hashed timer wheel with an explicit clock.
+    """
+
+    def setUp(self):
+        """
+        .. function:: setUp()
+
+           Creates a wheel with 0.1-second ticks and 8 buckets, starting at time 100.
+        """
+        self.fired = []
+        self.wheel = TimerWheel(0.1, 8, now=100.0)
+
+
+    def _callback(self, name):
+        return lambda: self.fired.append(name)
+
+
+    # TimerWheel.__init__
+
+    def test_constructor_BadTick_Exception(self):
+        with self.assertRaises(ValueError):
+            TimerWheel(0)
+
+
+    # TimerWheel.schedule / advance
+
+    def test_advance_NotDue_NotFired(self):
+        self.wheel.schedule(0.5, self._callback("a"), now=100.0)
+
+        self.assertEquals(self.wheel.advance(100.4), 0)
+        self.assertEquals(self.fired, [])
+        self.assertEquals(len(self.wheel), 1)
+
+    def test_advance_Due_Fired(self):
+        self.wheel.schedule(0.5, self._callback("a"), now=100.0)
+        self.wheel.schedule(0.2, self._callback("b"), now=100.0)
+
+        self.assertEquals(self.wheel.advance(100.55), 2)
+        self.assertEquals(sorted(self.fired), ["a", "b"])
+        self.assertEquals(len(self.wheel), 0)
+
+    def test_advance_LaterTurn_WaitsForTurn(self):
+        self.wheel.schedule(1.25, self._callback("a"), now=100.0)
+
+        self.wheel.advance(100.6)
+        self.wheel.advance(101.0)
+        self.assertEquals(self.fired, [])
+
+        self.wheel.advance(101.35)
+        self.assertEquals(self.fired, ["a"])
+
+    def test_advance_LongStall_AllFired(self):
+        for delay in (0.1, 0.5, 2.0, 3.3):
+            self.wheel.schedule(delay, self._callback(delay), now=100.0)
+
+        self.wheel.advance(110.0)
+        self.assertEquals(sorted(self.fired), [0.1, 0.5, 2.0, 3.3])
+
+    def test_cancel_Due_NotFired(self):
+        timer = self.wheel.schedule(0.2, self._callback("a"), now=100.0)
+        timer.cancel()
+
+        self.assertEquals(self.wheel.advance(101.0), 0)
+        self.assertEquals(self.fired, [])
+
+
+@unittest.skipIf(selectors is None, "selectors module not available")
+class TestEventLoop(unittest.TestCase):
+    """
+    Tests the event loop against emulated control boards that echo requests.
+    """
+
+    def setUp(self):
+        """
+        .. function:: setUp()
+
+           Runs an echo server locally on an ephemeral port.
+        """
+        self.silent = False
+
+        self.server = socket.socket()
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(128)
+        self.port = self.server.getsockname()[1]
+
+        thread = threading.Thread(target=self._serve)
+        thread.daemon = True
+        thread.start()
+
+        self.loop = EventLoop()
+        self.results = []
+
+
+    def tearDown(self):
+        """
+        .. function:: tearDown()
+
+           Closes the loop and the test suite's server.
+        """
+        self.loop.close()
+        self.server.close()
+
+
+    def _serve(self):
+        while True:
+            try:
+                connection = self.server.accept()[0]
+            except (socket.error, OSError):
+                return
+
+            thread = threading.Thread(target=self._echo, args=(connection,))
+            thread.daemon = True
+            thread.start()
+
+    def _echo(self, connection):
+        while True:
+            data = connection.recv(4096)
+            if not data:
+                connection.close()
+                return
+
+            if not self.silent:
+                connection.sendall(data)
+
+    def _record(self, controller, result, error):
+        self.results.append((controller, result, error))
+
+
+    # EventLoop.connect
+
+    def test_connect_Listening_Connected(self):
+        controller = ControllerSocket('127.0.0.1', self.port)
+
+        self.loop.connect(controller, self._record)
+        self.loop.run()
+
+        self.assertEquals(self.results, [(controller, None, None)])
+        self.assertTrue(controller.isConnected())
+
+    def test_connect_Refused_Exception(self):
+        unused = socket.socket()
+        unused.bind(('127.0.0.1', 0))
+        controller = ControllerSocket('127.0.0.1', unused.getsockname()[1])
+        unused.close()
+
+        self.loop.connect(controller, self._record)
+        self.loop.run()
+
+        self.assertEquals(len(self.results), 1)
+        self.assertTrue(isinstance(self.results[0][2], SocketConnectionException))
+        self.assertFalse(controller.isConnected())
+
+    def test_connect_FailedAtOnce_Released(self):
+        controller = ControllerSocket('127.0.0.1', self.port)
+        prepareConnect = ControllerSocket._prepareConnect
+        opened = []
+
+        def prepare(target):
+            address = prepareConnect(target)
+            target.socket = mock.Mock(wraps=target.socket)
+            target.socket.connect_ex.return_value = errno.ECONNREFUSED
+            opened.append(target.socket)
+            return address
+
+        with mock.patch.object(ControllerSocket, '_prepareConnect', prepare):
+            self.loop.connect(controller, self._record)
+
+        self.assertTrue(isinstance(self.results[0][2], SocketConnectionException))
+        self.assertTrue(opened[0].close.called)
+        self.assertEquals(controller.socket, None)
+        self.assertFalse(id(controller) in self.loop.channels)
+
+    def test_connect_Twice_Exception(self):
+        controller = ControllerSocket('127.0.0.1', self.port)
+        self.loop.connect(controller, self._record)
+
+        with self.assertRaises(EventLoopException):
+            self.loop.connect(controller, self._record)
+
+
+    # EventLoop.request
+
+    def test_request_ManyControllers_AllAnswered(self):
+        controllers = [ControllerSocket('127.0.0.1', self.port) for i in range(50)]
+
+        for index, controller in enumerate(controllers):
+            self.loop.connect(controller, lambda controller, result, error: None)
+
+            for function in (0x20, 0x32):
+                self.loop.request(controller, buildRequest(function, 1000 + index), self._record)
+
+        self.loop.run()
+
+        self.assertEquals(len(self.results), 100)
+        self.assertTrue(all(error is None for controller, result, error in self.results))
+
+        for controller in controllers:
+            responses = [result for owner, result, error in self.results if owner is controller]
+            self.assertEquals([response[1] for response in responses], [0x20, 0x32])
+
+        for controller in controllers:
+            controller.close()
+
+    def test_request_Refused_CalledOnce(self):
+        unused = socket.socket()
+        unused.bind(('127.0.0.1', 0))
+        controller = ControllerSocket('127.0.0.1', unused.getsockname()[1])
+        unused.close()
+
+        self.loop.connect(controller, lambda controller, result, error: None)
+        self.loop.request(controller, buildRequest(0x20, 423187757), self._record)
+        self.loop.run()
+
+        self.assertEquals(len(self.results), 1)
+        self.assertTrue(isinstance(self.results[0][2], SocketConnectionException))
+        self.assertEquals(self.loop.getPending(), 0)
+
+    def test_request_NotConnected_CalledOnce(self):
+        controller = ControllerSocket('127.0.0.1', self.port)
+
+        self.loop.request(controller, buildRequest(0x20, 423187757), self._record)
+
+        self.assertEquals(len(self.results), 1)
+        self.assertTrue(isinstance(self.results[0][2], SocketConnectionException))
+
+    def test_request_NoResponse_TimedOut(self):
+        self.silent = True
+        controller = ControllerSocket('127.0.0.1', self.port)
+
+        self.loop.connect(controller, lambda controller, result, error: None)
+        self.loop.request(controller, buildRequest(0x20, 423187757), self._record, timeout=0.05)
+        self.loop.request(controller, buildRequest(0x20, 423187757), self._record, timeout=5.0)
+        self.loop.run()
+
+        self.assertEquals(len(self.results), 2)
+        self.assertTrue(all(isinstance(error, SocketTransmitException) for controller, result, error in self.results))
+        self.assertFalse(controller.isConnected())
+
+
+    # EventLoop.send / receive
+
+    def test_send_NotConnected_Exception(self):
+        controller = ControllerSocket('127.0.0.1', self.port)
+
+        self.loop.send(controller, buildRequest(0x20, 423187757), self._record)
+
+        self.assertTrue(isinstance(self.results[0][2], SocketConnectionException))
+
+    def test_receive_ConnectedDirectly_Received(self):
+        controller = ControllerSocket('127.0.0.1', self.port)
+        controller.connect()
+        controller.send(buildRequest(0x20, 423187757))
+
+        self.loop.receive(controller, self._record)
+        self.loop.run()
+
+        self.assertEquals(self.results[0][1], buildRequest(0x20, 423187757))
+
+        self.loop.remove(controller)
+        controller.send(buildRequest(0x32, 423187757))
+        self.assertEquals(controller.receive()[1], 0x32)
+        controller.close()
+
+
+    # EventLoop.callLater
+
+    def test_callLater_Delay_Called(self):
+        calls = []
+
+        self.loop.callLater(0.02, lambda: calls.append(1))
+        self.loop.run()
+
+        self.assertEquals(calls, [1])
+
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+
+import socket
+import threading
+import time
+import unittest
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+from uhppote_rfid import FleetManager, FleetManagerException, HashRing, SerialNumber, SerialNumberException
+from uhppote_rfid import CommandException, SocketConnectionException, StatusResponse
+from uhppote_rfid.commands import FUNCTION_GET_STATUS, buildRequest
+from uhppote_rfid.fleet_manager import _toError
+
+
+class TestHashRing(unittest.TestCase):
+    """
+    Tests the consistent hash ring used to partition control boards.
+    """
+
+    # HashRing.__init__
+
+    def test_constructor_NoNodes_Exception(self):
+        with self.assertRaises(ValueError):
+            HashRing([])
+
+    def test_constructor_ZeroReplicas_Exception(self):
+        with self.assertRaises(ValueError):
+            HashRing([0, 1], 0)
+
+
+    # HashRing.getNode
+
+    def test_getNode_InvalidSerial_Exception(self):
+        ring = HashRing([0, 1])
+        with self.assertRaises(SerialNumberException):
+            ring.getNode(-1)
+
+    def test_getNode_SameSerialFormats_SameNode(self):
+        ring = HashRing(range(8))
+        self.assertEquals(ring.getNode(123456789), ring.getNode(SerialNumber("123456789")))
+
+    def test_getNode_AllNodes_Used(self):
+        ring = HashRing(range(4))
+        nodes = set(ring.getNode(serial) for serial in range(100000000, 100002000))
+        self.assertEquals(nodes, set(range(4)))
+
+    def test_addNode_OnlyMovesToNewNode_Valid(self):
+        ring = HashRing(range(4))
+        serials = range(100000000, 100002000)
+        before = dict((serial, ring.getNode(serial)) for serial in serials)
+
+        ring.addNode(4)
+
+        for serial in serials:
+            node = ring.getNode(serial)
+            if node != before[serial]:
+                self.assertEquals(node, 4)
+
+    def test_removeNode_NodeUnused_Valid(self):
+        ring = HashRing(range(4))
+        ring.removeNode(2)
+
+        nodes = set(ring.getNode(serial) for serial in range(100000000, 100002000))
+        self.assertEquals(nodes, set([0, 1, 3]))
+
+
+
+
+class TestFleetManager(unittest.TestCase):
+    """
+    Tests routing of commands through worker processes by emulating control boards' servers.
+    """
+
+    def setUp(self):
+        """
+        .. function:: setUp()
+
+           Runs an echo server locally on an ephemeral port and starts a fleet manager with two workers.
+        """
+        self.server = socket.socket()
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(8)
+        self.port = self.server.getsockname()[1]
+
+        thread = threading.Thread(target=self._serve)
+        thread.daemon = True
+        thread.start()
+
+        self.manager = FleetManager(2)
+        self.manager.start()
+
+
+    def tearDown(self):
+        """
+        .. function:: tearDown()
+
+           Cleanly shuts down the fleet manager and the test suite's server.
+        """
+        self.manager.stop()
+        self.server.close()
+
+
+    def _serve(self):
+        while True:
+            try:
+                connection = self.server.accept()[0]
+            except (socket.error, OSError):
+                return
+
+            thread = threading.Thread(target=self._echo, args=(connection,))
+            thread.daemon = True
+            thread.start()
+
+    def _echo(self, connection):
+        while True:
+            data = connection.recv(64)
+            if not data:
+                connection.close()
+                return
+
+            connection.sendall(data)
+
+    def _listenSilently(self):
+        server = socket.socket()
+        server.bind(('127.0.0.1', 0))
+        server.listen(8)
+        connections = []
+
+        def accept():
+            while True:
+                try:
+                    connections.append(server.accept()[0])
+                except (socket.error, OSError):
+                    return
+
+        thread = threading.Thread(target=accept)
+        thread.daemon = True
+        thread.start()
+
+        return server, connections
+
+
+    # FleetManager.__init__
+
+    def test_constructor_ZeroWorkers_Exception(self):
+        with self.assertRaises(ValueError):
+            FleetManager(0)
+
+    def test_constructor_ZeroConcurrency_Exception(self):
+        with self.assertRaises(ValueError):
+            FleetManager(1, concurrency=0)
+
+
+    # FleetManager.transmit
+
+    def test_transmit_NotStarted_Exception(self):
+        manager = FleetManager(1)
+        with self.assertRaises(FleetManagerException):
+            manager.transmit(123456789, "get-status")
+
+    def test_transmit_Unregistered_Exception(self):
+        with self.assertRaises(FleetManagerException):
+            self.manager.transmit(123456789, "get-status", timeout=5)
+
+    def test_transmit_Unreachable_Exception(self):
+        self.manager.register(123456789, '127.0.0.1', 1)
+        with self.assertRaises(SocketConnectionException):
+            self.manager.transmit(123456789, "get-status", timeout=5)
+
+    def test_transmit_Echo_Decoded(self):
+        self.manager.register(123456789, '127.0.0.1', self.port)
+        response = self.manager.transmit(123456789, "get-status", timeout=5)
+
+        self.assertTrue(isinstance(response, StatusResponse))
+        self.assertEquals(response.serial.getInteger(), 123456789)
+        self.assertEquals(response.getBytes(), buildRequest(FUNCTION_GET_STATUS, 123456789))
+
+    def test_transmit_UnknownCommand_Exception(self):
+        with self.assertRaises(CommandException):
+            self.manager.transmit(123456789, "explode", timeout=5)
+
+    def test_transmit_BadArguments_ExceptionRebuilt(self):
+        self.manager.register(123456789, '127.0.0.1', self.port)
+
+        with self.assertRaises(ValueError):
+            self.manager.transmit(123456789, "open-door", [9], timeout=5)
+
+    def test_transmit_Connected_Event(self):
+        self.manager.register(123456789, '127.0.0.1', self.port)
+        self.manager.transmit(123456789, "get-status", timeout=5)
+
+        self.assertEquals(self.manager.getEvent(timeout=5)[:2], (123456789, "connected"))
+
+
+    def test_transmit_SilentBoard_OthersServed(self):
+        silent, connections = self._listenSilently()
+        manager = FleetManager(1, timeout=1.0)
+        manager.start()
+
+        try:
+            manager.register(100000001, '127.0.0.1', silent.getsockname()[1])
+            manager.register(100000002, '127.0.0.1', self.port)
+            manager.submit(100000001, "get-status")
+
+            began = time.time()
+            manager.transmit(100000002, "get-status", timeout=5)
+            self.assertTrue(time.time() - began < 0.5)
+
+            requestId, serial, response, error = manager.getResult(timeout=5)
+            self.assertEquals(serial, 100000001)
+            self.assertTrue(error is not None)
+
+        finally:
+            manager.stop()
+            silent.close()
+
+    def test_transmit_TimedOut_LateResultDropped(self):
+        silent, connections = self._listenSilently()
+        manager = FleetManager(1, timeout=0.5)
+        manager.start()
+
+        try:
+            manager.register(100000001, '127.0.0.1', silent.getsockname()[1])
+
+            with self.assertRaises(FleetManagerException):
+                manager.transmit(100000001, "get-status", timeout=0.1)
+
+            with self.assertRaises(queue.Empty):
+                manager.getResult(timeout=1.5)
+
+        finally:
+            manager.stop()
+            silent.close()
+
+
+    # _toError
+
+    def test_toError_Known_Rebuilt(self):
+        error = _toError(("SocketConnectionException", "refused"))
+
+        self.assertTrue(isinstance(error, SocketConnectionException))
+        self.assertEquals(str(error), "refused")
+
+    def test_toError_Unknown_FleetManagerException(self):
+        error = _toError(("PicklingError", "cannot pickle"))
+
+        self.assertTrue(isinstance(error, FleetManagerException))
+        self.assertEquals(str(error), "PicklingError: cannot pickle")
+
+
+    # FleetManager.submit
+
+    def test_submit_ManyBoards_AllResults(self):
+        serials = range(100000000, 100000020)
+        for serial in serials:
+            self.manager.register(serial, '127.0.0.1', self.port)
+
+        requests = {}
+        for serial in serials:
+            requests[self.manager.submit(serial, "get-status")] = serial
+
+        for i in range(len(serials)):
+            requestId, serial, response, error = self.manager.getResult(timeout=5)
+
+            self.assertIsNone(error)
+            self.assertEquals(requests.pop(requestId), serial)
+            self.assertEquals(response.serial.getInteger(), serial)
+
+        self.assertEquals(requests, {})
+
+
+
+
+if __name__ == '__main__':
+    unittest.main()
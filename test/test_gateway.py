@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+
+import json
+import socket
+import threading
+import time
+import unittest
+
+try:
+    from urllib.request import Request, urlopen
+    from urllib.error import HTTPError
+except ImportError:
+    from urllib2 import HTTPError, Request, urlopen
+
+from uhppote_rfid import ControllerGateway
+
+
+class TestControllerGateway(unittest.TestCase):
+    """
+    Tests the HTTP gateway by emulating a control board that echoes requests after a short delay.
+    """
+
+    def setUp(self):
+        """
+        .. function:: setUp()
+
+           Runs a slow echo server locally on an ephemeral port and a gateway on another.
+        """
+        self.server = socket.socket()
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(8)
+        self.port = self.server.getsockname()[1]
+        self.requests = []
+
+        thread = threading.Thread(target=self._serve)
+        thread.daemon = True
+        thread.start()
+
+        self.gateway = ControllerGateway(port=0)
+        self.gateway.start()
+        self.url = "http://127.0.0.1:%d" % self.gateway.getPort()
+
+
+    def tearDown(self):
+        """
+        .. function:: tearDown()
+
+           Shuts down the gateway and the test suite's server.
+        """
+        self.gateway.shutdown()
+        self.server.close()
+
+
+    def _serve(self):
+        while True:
+            try:
+                connection = self.server.accept()[0]
+            except (socket.error, OSError):
+                return
+
+            thread = threading.Thread(target=self._echo, args=(connection,))
+            thread.daemon = True
+            thread.start()
+
+    def _echo(self, connection):
+        while True:
+            data = connection.recv(64)
+            if not data:
+                connection.close()
+                return
+
+            self.requests.append(data)
+            time.sleep(0.05)
+            connection.sendall(data)
+
+    def _post(self, path, payload):
+        request = Request(self.url + path, json.dumps(payload).encode("utf-8"), {"Content-Type": "application/json"})
+        return json.loads(urlopen(request).read().decode("utf-8"))
+
+    def _message(self, command, *args):
+        return {"serial": 423187757, "host": "127.0.0.1", "port": self.port, "command": command, "args": list(args)}
+
+
+    # GET /health
+
+    def test_health_Valid(self):
+        self.assertEquals(json.loads(urlopen(self.url + "/health").read().decode("utf-8")), {"ok": True, "connections": 0})
+
+    def test_get_UnknownPath_NotFound(self):
+        with self.assertRaises(HTTPError) as context:
+            urlopen(self.url + "/missing")
+
+        self.assertEquals(context.exception.code, 404)
+
+
+    # POST /command
+
+    def test_command_InvalidJSON_BadRequest(self):
+        with self.assertRaises(HTTPError) as context:
+            urlopen(Request(self.url + "/command", b"{", {"Content-Type": "application/json"}))
+
+        self.assertEquals(context.exception.code, 400)
+
+    def test_command_OpenDoor_Valid(self):
+        reply = self._post("/command", self._message("open-door", 1))
+
+        self.assertTrue(reply["ok"])
+        self.assertEquals(reply["response"][:18], "174000002d55391901")
+
+    def test_command_UnknownCommand_Error(self):
+        reply = self._post("/command", self._message("explode"))
+
+        self.assertFalse(reply["ok"])
+        self.assertIn("CommandException", reply["error"])
+
+    def test_command_ConcurrentReads_Coalesced(self):
+        replies = []
+        threads = [threading.Thread(target=lambda: replies.append(self._post("/command", self._message("get-status"))))
+                   for i in range(5)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEquals(len(replies), 5)
+        self.assertTrue(all(reply["ok"] for reply in replies))
+        self.assertTrue(len(self.requests) < 5)
+
+
+    def test_command_CoalescedStuck_GatewayTimeout(self):
+        gateway = ControllerGateway(port=0, waitTimeout=0.1)
+        message = self._message("get-status")
+
+        # A leader that never finishes, as with a board that stopped answering
+        gateway.inflight[gateway._getReadKey(message)] = [threading.Event(), None]
+        gateway.start()
+
+        try:
+            request = Request("http://127.0.0.1:%d/command" % gateway.getPort(), json.dumps(message).encode("utf-8"),
+                              {"Content-Type": "application/json"})
+
+            with self.assertRaises(HTTPError) as context:
+                urlopen(request)
+
+        finally:
+            gateway.shutdown()
+
+        self.assertEquals(context.exception.code, 504)
+
+
+    # POST /batch
+
+    def test_batch_NotList_BadRequest(self):
+        with self.assertRaises(HTTPError) as context:
+            self._post("/batch", {"command": "get-status"})
+
+        self.assertEquals(context.exception.code, 400)
+
+    def test_batch_Mixed_InOrder(self):
+        replies = self._post("/batch", [self._message("open-door", 1), {"command": "get-status"}, self._message("get-time")])
+
+        self.assertEquals([reply["ok"] for reply in replies], [True, False, True])
+        self.assertEquals(replies[2]["response"][:4], "1732")
+        self.assertEquals(len(self.gateway.pool), 1)
+
+    def test_batch_ManyBoards_BoundedThreads(self):
+        gateway = ControllerGateway(port=0, workers=2)
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def handle(message):
+            with lock:
+                running.append(message)
+                peak.append(len(running))
+
+            time.sleep(0.05)
+
+            with lock:
+                running.remove(message)
+
+            return {"ok": True, "host": message["host"]}
+
+        gateway.handle = handle
+
+        try:
+            replies = gateway.handleBatch([{"host": "10.0.0.%d" % i} for i in range(1, 7)])
+        finally:
+            gateway.shutdown()
+
+        self.assertEquals([reply["host"] for reply in replies], ["10.0.0.%d" % i for i in range(1, 7)])
+        self.assertEquals(max(peak), 2)
+
+
+    def test_batch_Stuck_TimedOut(self):
+        gateway = ControllerGateway(port=0, workers=2, waitTimeout=0.1)
+
+        def handle(message):
+            if message["host"] == "10.0.0.1":
+                time.sleep(0.5)
+
+            return {"ok": True, "host": message["host"]}
+
+        gateway.handle = handle
+
+        try:
+            replies = gateway.handleBatch([{"host": "10.0.0.1"}, {"host": "10.0.0.2"}])
+        finally:
+            gateway.shutdown()
+
+        self.assertIn("GatewayTimeoutException", replies[0]["error"])
+        self.assertEquals(replies[1], {"ok": True, "host": "10.0.0.2"})
+
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+
+import socket
+import threading
+import time
+import unittest
+
+from uhppote_rfid import (ControllerSocket, HealthMonitor, RTTEstimator, SocketConnectionException,
+                          SocketTransmitException)
+from uhppote_rfid.health_monitor import statusProbe
+
+
+class TestHealthMonitor(unittest.TestCase):
+    """
+    Tests adaptive scheduling of the HealthMonitor with a scripted probe.
+    """
+
+    def setUp(self):
+        """
+        .. function:: setUp()
+
+           Creates a monitor whose probe result is controlled by the test.
+        """
+        self.reachable = True
+        self.active = False
+        self.probed = []
+        self.changes = []
+
+        self.monitor = HealthMonitor(
+            probe=self._probe,
+            activeInterval=5,
+            idleInterval=60,
+            idleAfter=30,
+            unreachableAfter=2,
+            unreachableInterval=10,
+            maxUnreachableInterval=40,
+            onStateChange=lambda serial, old, new: self.changes.append((serial, old, new))
+        )
+        self.monitor.register(123456789, '127.0.0.1', now=0)
+
+
+    def _probe(self, controller, serial):
+        self.probed.append(controller.getHost())
+
+        if not self.reachable:
+            raise SocketConnectionException("Unreachable")
+
+        return self.active
+
+
+    # HealthMonitor.__init__
+
+    def test_constructor_ZeroInterval_Exception(self):
+        with self.assertRaises(ValueError):
+            HealthMonitor(activeInterval=0)
+
+    def test_constructor_ZeroUnreachableAfter_Exception(self):
+        with self.assertRaises(ValueError):
+            HealthMonitor(unreachableAfter=0)
+
+
+    # HealthMonitor.register
+
+    def test_register_Duplicate_Exception(self):
+        with self.assertRaises(ValueError):
+            self.monitor.register(123456789, '127.0.0.1')
+
+    def test_register_NewBoard_Active(self):
+        self.assertEquals(self.monitor.getState(123456789), "active")
+        self.assertEquals(self.monitor.getNextPoll(123456789), 0)
+
+
+    # HealthMonitor.poll
+
+    def test_poll_NotDue_NoProbe(self):
+        self.monitor.poll(now=0)
+        self.assertEquals(self.monitor.poll(now=4), 0)
+
+    def test_poll_Recent_ActiveInterval(self):
+        self.assertEquals(self.monitor.poll(now=0), 1)
+        self.assertEquals(self.monitor.getNextPoll(123456789), 5)
+
+    def test_poll_Quiet_IdleInterval(self):
+        self.monitor.poll(now=31)
+
+        self.assertEquals(self.monitor.getState(123456789), "idle")
+        self.assertEquals(self.monitor.getNextPoll(123456789), 91)
+
+    def test_poll_ProbeActivity_StaysActive(self):
+        self.active = True
+        self.monitor.poll(now=31)
+
+        self.assertEquals(self.monitor.getState(123456789), "active")
+        self.assertEquals(self.monitor.getNextPoll(123456789), 36)
+
+    def test_poll_Failures_ExponentialBackoff(self):
+        self.reachable = False
+
+        self.monitor.poll(now=0)
+        self.assertEquals(self.monitor.getState(123456789), "active")
+        self.assertEquals(self.monitor.getNextPoll(123456789), 5)
+
+        self.monitor.poll(now=5)
+        self.assertEquals(self.monitor.getState(123456789), "unreachable")
+        self.assertEquals(self.monitor.getNextPoll(123456789), 15)
+
+        self.monitor.poll(now=15)
+        self.assertEquals(self.monitor.getNextPoll(123456789), 35)
+
+        self.monitor.poll(now=35)
+        self.assertEquals(self.monitor.getNextPoll(123456789), 75)
+
+        self.monitor.poll(now=75)
+        self.assertEquals(self.monitor.getNextPoll(123456789), 115)
+
+    def test_poll_Recovered_Active(self):
+        self.reachable = False
+        self.monitor.poll(now=0)
+        self.monitor.poll(now=5)
+
+        self.reachable = True
+        self.monitor.poll(now=15)
+
+        self.assertEquals(self.monitor.getState(123456789), "active")
+        self.assertEquals(self.changes, [
+            (123456789, "active", "unreachable"),
+            (123456789, "unreachable", "active"),
+        ])
+
+
+    def test_poll_SlowProbes_Concurrent(self):
+        def probe(controller, serial):
+            time.sleep(0.2)
+            return False
+
+        monitor = HealthMonitor(probe=probe, concurrency=8)
+
+        for serial in range(100000001, 100000009):
+            monitor.register(serial, '127.0.0.1', now=0)
+
+        began = time.time()
+
+        self.assertEquals(monitor.poll(now=0), 8)
+        self.assertTrue(time.time() - began < 0.8)
+
+    def test_poll_Probe_TimeoutSet(self):
+        timeouts = []
+        monitor = HealthMonitor(probe=lambda controller, serial: timeouts.append(controller.getEstimator().getTimeout(
+            controller.getHost(), controller.getPort())), probeTimeout=1.5)
+        monitor.register(123456789, '127.0.0.1', now=0)
+        monitor.poll(now=0)
+
+        self.assertEquals(timeouts, [1.5])
+
+    def test_poll_CallbackCallsMonitor_NoDeadlock(self):
+        states = []
+
+        def onStateChange(serial, old, new):
+            monitor.recordActivity(serial, now=0)
+            states.append(monitor.getState(serial))
+
+        monitor = HealthMonitor(probe=self._probe, unreachableAfter=1, onStateChange=onStateChange)
+        monitor.register(123456789, '127.0.0.1', now=0)
+        self.reachable = False
+
+        thread = threading.Thread(target=monitor.poll, kwargs={"now": 0})
+        thread.daemon = True
+        thread.start()
+        thread.join(2)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEquals(states, ["unreachable"])
+
+
+    # HealthMonitor.recordActivity
+
+    def test_recordActivity_Idle_PolledSooner(self):
+        self.monitor.poll(now=31)
+        self.monitor.recordActivity(123456789, now=40)
+
+        self.assertEquals(self.monitor.getState(123456789), "active")
+        self.assertEquals(self.monitor.getNextPoll(123456789), 45)
+
+        self.assertEquals(self.monitor.poll(now=45), 1)
+        self.assertEquals(self.monitor.poll(now=49), 0)
+
+    def test_recordActivity_Unregistered_Exception(self):
+        with self.assertRaises(KeyError):
+            self.monitor.recordActivity(987654321)
+
+
+
+
+class TestStatusProbe(unittest.TestCase):
+    """
+    Tests the default probe against an emulated control board.
+    """
+
+    def setUp(self):
+        """
+        .. function:: setUp()
+
+           Runs a server locally on an ephemeral port that echoes the first request, or stays silent if told to.
+        """
+        self.server = socket.socket()
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(1)
+        self.port = self.server.getsockname()[1]
+        self.silent = False
+
+        thread = threading.Thread(target=self._serve)
+        thread.daemon = True
+        thread.start()
+
+
+    def tearDown(self):
+        """
+        .. function:: tearDown()
+
+           Closes the test suite's server.
+        """
+        self.server.close()
+
+
+    def _serve(self):
+        try:
+            connection = self.server.accept()[0]
+        except (socket.error, OSError):
+            return
+
+        data = connection.recv(64)
+
+        if not self.silent:
+            connection.sendall(data)
+
+        connection.recv(64)
+        connection.close()
+
+
+    # statusProbe
+
+    def test_statusProbe_Answered_RTTSampled(self):
+        estimator = RTTEstimator(initial=2.0)
+        controller = ControllerSocket('127.0.0.1', self.port)
+        controller.setEstimator(estimator)
+
+        self.assertFalse(statusProbe(controller, 123456789))
+        self.assertFalse(controller.isConnected())
+        self.assertIsNotNone(estimator.getEstimate('127.0.0.1', self.port))
+
+    def test_statusProbe_Silent_Exception(self):
+        self.silent = True
+        controller = ControllerSocket('127.0.0.1', self.port)
+        controller.setEstimator(RTTEstimator(initial=0.2, minimum=0.1, maximum=0.2))
+
+        with self.assertRaises(SocketTransmitException):
+            statusProbe(controller, 123456789)
+
+        self.assertFalse(controller.isConnected())
+
+
+
+
+if __name__ == '__main__':
+    unittest.main()
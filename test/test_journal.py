@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+from uhppote_rfid import CommandException, CommandJournal, ControllerSocket
+
+
+class TestCommandJournal(unittest.TestCase):
+    """
+    Tests journaling and replay of writes against an emulated control board.
+    """
+
+    def setUp(self):
+        """
+        .. function:: setUp()
+
+           Runs a fake control board locally on an ephemeral port, and opens a journal in a temporary directory.
+        """
+        self.doors = dict((door, [3, 3]) for door in range(1, 5))
+        self.functions = []
+        self.reject = False
+
+        self.server = socket.socket()
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(8)
+
+        thread = threading.Thread(target=self._serve)
+        thread.daemon = True
+        thread.start()
+
+        self.controller = ControllerSocket('127.0.0.1', self.server.getsockname()[1])
+
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "journal.db")
+        self.journal = CommandJournal(self.path)
+
+
+    def tearDown(self):
+        """
+        .. function:: tearDown()
+
+           Closes the connection, the journal, and the test suite's server.
+        """
+        self.controller.close()
+        self.journal.close()
+        self.server.close()
+        shutil.rmtree(self.directory)
+
+
+    def _serve(self):
+        while True:
+            try:
+                connection = self.server.accept()[0]
+            except (socket.error, OSError):
+                return
+
+            thread = threading.Thread(target=self._board, args=(connection,))
+            thread.daemon = True
+            thread.start()
+
+    def _board(self, connection):
+        buffered = bytearray()
+
+        while True:
+            while len(buffered) < 64:
+                chunk = connection.recv(4096)
+                if not chunk:
+                    connection.close()
+                    return
+
+                buffered += chunk
+
+            data, buffered = buffered[:64], buffered[64:]
+            self.functions.append((data[1], data[8]))
+
+            if data[1] == 0x80:
+                self.doors[data[8]] = [data[9], data[10]]
+            elif data[1] == 0x82:
+                data[9:11] = bytearray(self.doors[data[8]])
+            elif data[1] == 0xa2:
+                data[8] = 0 if self.reject else 1
+
+            connection.sendall(data)
+
+    def _unreachable(self):
+        unused = socket.socket()
+        unused.bind(('127.0.0.1', 0))
+        controller = ControllerSocket('127.0.0.1', unused.getsockname()[1])
+        unused.close()
+
+        return controller
+
+
+    # CommandJournal.enqueue
+
+    def test_enqueue_ReadOnly_Exception(self):
+        with self.assertRaises(CommandException):
+            self.journal.enqueue(423187757, "get-status")
+
+    def test_enqueue_OpenDoor_Exception(self):
+        with self.assertRaises(CommandException):
+            self.journal.enqueue(423187757, "open-door", [1])
+
+    def test_enqueue_BadArguments_Exception(self):
+        with self.assertRaises(ValueError):
+            self.journal.enqueue(423187757, "set-door-control", [9, "controlled", 3])
+
+    def test_enqueue_SameSetting_Replaced(self):
+        self.journal.enqueue(423187757, "set-door-control", [1, "controlled", 3])
+        self.journal.enqueue(423187757, "set-interlock", [1])
+        self.journal.enqueue(423187757, "set-door-control", [1, "normally-open", 3])
+
+        self.assertEquals([(name, args) for name, args, key in self.journal.getPending(423187757)],
+                          [("set-interlock", [1]), ("set-door-control", [1, "normally-open", 3])])
+
+    def test_enqueue_Identical_Ignored(self):
+        self.assertTrue(self.journal.enqueue(423187757, "set-interlock", [1], key="lock-1"))
+        self.assertFalse(self.journal.enqueue(423187757, "set-interlock", [1], key="lock-1"))
+        self.assertEquals(len(self.journal.getPending(423187757)), 1)
+
+    def test_enqueue_Reopened_Kept(self):
+        self.journal.enqueue("423187757", "set-interlock", [3])
+        self.journal.close()
+
+        self.journal = CommandJournal(self.path)
+
+        self.assertEquals(self.journal.getSerials(), [423187757])
+        self.assertEquals(self.journal.getPending(423187757), [("set-interlock", [3], "set-interlock:interlock")])
+
+
+    # CommandJournal.submit
+
+    def test_submit_Reachable_Sent(self):
+        response = self.journal.submit(self.controller, 423187757, "set-door-control", [2, "normally-open", 5])
+
+        self.assertEquals(response[1], 0x80)
+        self.assertEquals(self.doors[2], [1, 5])
+        self.assertEquals(self.journal.getPending(423187757), [])
+
+    def test_submit_Unreachable_JournaledAndBackedOff(self):
+        controller = self._unreachable()
+
+        self.assertEquals(self.journal.submit(controller, 423187757, "set-interlock", [1]), None)
+        self.assertFalse(self.journal.isDue(423187757))
+
+        # Waiting out the backoff; queued without trying the board
+        self.assertEquals(self.journal.submit(self.controller, 423187757, "set-interlock", [3]), None)
+        self.assertEquals(self.functions, [])
+        self.assertEquals(self.journal.getPending(423187757), [("set-interlock", [3], "set-interlock:interlock")])
+
+    def test_submit_PendingDue_QueuedAndReplayed(self):
+        self.journal.enqueue(423187757, "set-door-control", [1, "normally-closed", 2])
+        self.journal.submit(self.controller, 423187757, "set-door-control", [2, "normally-open", 4])
+
+        self.assertEquals([function for function in self.functions if function[0] == 0x80], [(0x80, 1), (0x80, 2)])
+        self.assertEquals(self.journal.getPending(423187757), [])
+
+
+    # CommandJournal.replay
+
+    def test_replay_Pending_InOrderAndCleared(self):
+        for door in (3, 1, 4):
+            self.journal.enqueue(423187757, "set-door-control", [door, "normally-open", door])
+
+        self.journal.enqueue(423187757, "set-interlock", [2])
+        outcomes = self.journal.replay(self.controller, 423187757)
+
+        self.assertTrue(all(outcome["ok"] for outcome in outcomes))
+        self.assertEquals(self.functions, [(0x80, 3), (0x82, 3), (0x80, 1), (0x82, 1), (0x80, 4), (0x82, 4), (0xa2, 2)])
+        self.assertEquals(self.journal.getSerials(), [])
+
+    def test_replay_SmallBatches_AllSent(self):
+        journal = CommandJournal(":memory:", batch=2)
+
+        for door in range(1, 5):
+            journal.enqueue(423187757, "set-door-control", [door, "normally-open", door])
+
+        self.assertEquals(len(journal.replay(self.controller, 423187757)), 4)
+        self.assertEquals(journal.getPending(423187757), [])
+
+    def test_replay_NotDue_Skipped(self):
+        self.journal.submit(self._unreachable(), 423187757, "set-interlock", [1])
+
+        self.assertEquals(self.journal.replay(self.controller, 423187757), [])
+        self.assertEquals(self.functions, [])
+
+        self.assertEquals(len(self.journal.replay(self.controller, 423187757, now=1e12)), 1)
+        self.assertTrue(self.journal.isDue(423187757))
+
+    def test_replay_Rejected_DroppedAfterAttempts(self):
+        self.reject = True
+        journal = CommandJournal(":memory:", maxAttempts=2)
+        journal.enqueue(423187757, "set-interlock", [1])
+
+        self.assertFalse(journal.replay(self.controller, 423187757)[0]["ok"])
+        self.assertEquals(len(journal.getPending(423187757)), 1)
+
+        journal.replay(self.controller, 423187757)
+        self.assertEquals(journal.getPending(423187757), [])
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import time
+import unittest
+
+from uhppote_rfid import CommandException, LoadGenerator, ReplayServer
+from uhppote_rfid.load_test import _percentile, formatReport, main
+
+
+class TestLoadGenerator(unittest.TestCase):
+    """
+    Tests load generation and reporting against a local echoing fake board.
+    """
+
+    def setUp(self):
+        """
+        .. function:: setUp()
+
+           Starts a replay server with no recorded responses, so every request is echoed back.
+        """
+        self.server = ReplayServer([])
+        self.server.start()
+        self.targets = [(423187757, '127.0.0.1', self.server.getPort())]
+
+
+    def tearDown(self):
+        """
+        .. function:: tearDown()
+
+           Stops the fake board.
+        """
+        self.server.shutdown()
+
+
+    # LoadGenerator.__init__
+
+    def test_constructor_NoTargets_Exception(self):
+        with self.assertRaises(ValueError):
+            LoadGenerator([])
+
+    def test_constructor_ZeroClients_Exception(self):
+        with self.assertRaises(ValueError):
+            LoadGenerator(self.targets, clients=0)
+
+    def test_constructor_UnknownOperation_Exception(self):
+        with self.assertRaises(CommandException):
+            LoadGenerator(self.targets, mix={"get-everything": 1})
+
+    def test_constructor_BadArguments_Exception(self):
+        with self.assertRaises(ValueError):
+            LoadGenerator(self.targets, mix={"get-door-control 9": 1})
+
+    def test_constructor_ZeroTimeout_Exception(self):
+        with self.assertRaises(ValueError):
+            LoadGenerator(self.targets, timeout=0)
+
+
+    # LoadGenerator.run
+
+    def test_run_Loopback_Measured(self):
+        report = LoadGenerator(self.targets, clients=3, mix={"get-status": 3, "get-door-control 2": 1},
+                               duration=0.4, interval=0.1).run()
+
+        self.assertEquals(report["errors"], 0)
+        self.assertTrue(report["requests"] > 0 and report["throughput"] > 0)
+        self.assertEquals(len(report["intervals"]), 4)
+        self.assertEquals(sum(interval["requests"] for interval in report["intervals"]), report["requests"])
+        self.assertEquals(sorted(report["operations"]), ["get-door-control 2", "get-status"])
+
+        latency = report["latency"]
+        self.assertTrue(0 < latency["p50"] <= latency["p95"] <= latency["p99"] <= latency["max"])
+
+    def test_run_Unreachable_Errors(self):
+        unused = socket.socket()
+        unused.bind(('127.0.0.1', 0))
+        port = unused.getsockname()[1]
+        unused.close()
+
+        report = LoadGenerator([(423187757, '127.0.0.1', port)], clients=1, duration=0.1).run()
+
+        self.assertEquals(report["errorRate"], 1.0)
+        self.assertEquals(list(report["errorTypes"]), ["SocketConnectionException"])
+        self.assertEquals(report["latency"]["p99"], None)
+
+        # Retries back off rather than hammering the target
+        self.assertTrue(report["requests"] <= 5)
+
+
+    def test_run_SilentTarget_TimedOut(self):
+        silent = socket.socket()
+        silent.bind(('127.0.0.1', 0))
+        silent.listen(8)
+        began = time.time()
+
+        try:
+            report = LoadGenerator([(423187757, '127.0.0.1', silent.getsockname()[1])], clients=2, duration=0.5).run()
+        finally:
+            silent.close()
+
+        self.assertTrue(time.time() - began < 2.0)
+        self.assertEquals(list(report["errorTypes"]), ["SocketTransmitException"])
+
+
+    # formatReport
+
+    def test_formatReport_Report_Table(self):
+        text = formatReport(LoadGenerator(self.targets, clients=1, duration=0.1).run())
+
+        self.assertTrue("p99 ms" in text)
+        self.assertTrue("\ntotal " in text)
+        self.assertTrue("\nget-status " in text)
+
+
+    # _percentile
+
+    def test_percentile_NearestRank_Value(self):
+        ordered = list(range(1, 101))
+
+        self.assertEquals(_percentile(ordered, 0.50), 50)
+        self.assertEquals(_percentile(ordered, 0.99), 99)
+        self.assertEquals(_percentile([7], 0.95), 7)
+        self.assertEquals(_percentile([], 0.5), None)
+
+
+    # main
+
+    def test_main_Json_Written(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "report.json")
+        stdout = sys.stdout
+
+        try:
+            sys.stdout = open(os.devnull, "w")
+            status = main(["--duration", "0.2", "--clients", "2", "--mix", "get-time=1", "--json", path,
+                           "423187757@127.0.0.1:%d" % self.server.getPort()])
+
+            with open(path) as handle:
+                report = json.load(handle)
+
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+            shutil.rmtree(directory)
+
+        self.assertEquals(status, 0)
+        self.assertEquals((report["clients"], report["mix"]), (2, {"get-time": 1.0}))
+
+    def test_main_BadWeight_Usage(self):
+        stderr = sys.stderr
+
+        try:
+            sys.stderr = open(os.devnull, "w")
+
+            with self.assertRaises(SystemExit):
+                main(["--mix", "get-status=abc", "--loopback"])
+
+        finally:
+            sys.stderr.close()
+            sys.stderr = stderr
+
+
+
+if __name__ == '__main__':
+    unittest.main()
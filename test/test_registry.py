@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from uhppote_rfid import ControllerRegistry, ControllerSocket, SerialNumber, SerialNumberException
+from uhppote_rfid.registry import FLAG_ALARM, FLAG_ONLINE
+
+
+class TestControllerRegistry(unittest.TestCase):
+    """
+    Tests storage, lookup, and bulk loading of control boards.
+    """
+
+    def setUp(self):
+        """
+        .. function:: setUp()
+
+           Creates a registry holding three boards.
+        """
+        self.registry = ControllerRegistry()
+        self.registry.add(123456789, '10.0.0.1')
+        self.registry.add('000000042', 'door.example.com', port=60001, doors=2)
+        self.registry.add(SerialNumber(7), '::1', doors=1, flags=FLAG_ALARM)
+
+
+    def _write(self, name, content):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        path = os.path.join(directory, name)
+        with io.open(path, 'w') as stream:
+            stream.write(content)
+
+        return path
+
+
+    # ControllerRegistry.add
+
+    def test_add_Stored_Retrieved(self):
+        self.assertEquals(self.registry.get(42), {
+            "serial": 42, "host": 'door.example.com', "port": 60001, "doors": 2, "flags": 0, "lastSeen": 0.0
+        })
+        self.assertEquals(self.registry.get('123456789')["host"], '10.0.0.1')
+        self.assertEquals(self.registry.get(7)["host"], '::1')
+        self.assertEquals(len(self.registry), 3)
+
+    def test_add_Duplicate_Exception(self):
+        with self.assertRaises(ValueError):
+            self.registry.add(123456789, '10.0.0.2')
+
+    def test_add_DuplicateAddress_Exception(self):
+        with self.assertRaises(ValueError):
+            self.registry.add(100, '10.0.0.1')
+
+        self.assertFalse(100 in self.registry)
+        self.assertEquals(self.registry.findByAddress('10.0.0.1'), 123456789)
+
+    def test_add_BadSerial_Exception(self):
+        with self.assertRaises(SerialNumberException):
+            self.registry.add(1000000000, '10.0.0.2')
+
+        with self.assertRaises(SerialNumberException):
+            self.registry.add(-1, '10.0.0.2')
+
+        with self.assertRaises(SerialNumberException):
+            self.registry.add(1 << 40, '10.0.0.2')
+
+    def test_add_BadPort_Exception(self):
+        with self.assertRaises(ValueError):
+            self.registry.add(1, '10.0.0.2', port=0)
+
+        with self.assertRaises(ValueError):
+            self.registry.add(1, '10.0.0.2', port=70000)
+
+    def test_add_BadDoors_Exception(self):
+        with self.assertRaises(ValueError):
+            self.registry.add(1, '10.0.0.2', doors=5)
+
+    def test_add_BadHost_Exception(self):
+        with self.assertRaises(ValueError):
+            self.registry.add(1, 'bad host!')
+
+
+    # ControllerRegistry.findByAddress
+
+    def test_findByAddress_Known_Serial(self):
+        self.assertEquals(self.registry.findByAddress('10.0.0.1'), 123456789)
+        self.assertEquals(self.registry.findByAddress('door.example.com', 60001), 42)
+        self.assertEquals(self.registry.findByAddress('::1'), 7)
+
+    def test_findByAddress_Unknown_None(self):
+        self.assertEquals(self.registry.findByAddress('10.0.0.9'), None)
+        self.assertEquals(self.registry.findByAddress('door.example.com'), None)
+
+    def test_findByAddress_SharedAddress_ByPort(self):
+        self.registry.add(100, '10.0.0.5', port=60000)
+        self.registry.add(101, '10.0.0.5', port=60001)
+        self.registry.remove(101)
+
+        self.assertEquals(self.registry.findByAddress('10.0.0.5'), 100)
+        self.assertEquals(self.registry.findByAddress('10.0.0.5', 60001), None)
+
+        self.registry.remove(100)
+        self.assertEquals(self.registry.findByAddress('10.0.0.5'), None)
+
+
+    # ControllerRegistry.remove
+
+    def test_remove_First_LastMoved(self):
+        self.registry.remove(123456789)
+
+        self.assertEquals(len(self.registry), 2)
+        self.assertFalse(123456789 in self.registry)
+        self.assertEquals(self.registry.findByAddress('10.0.0.1'), None)
+        self.assertEquals(self.registry.get(7)["host"], '::1')
+        self.assertEquals(self.registry.findByAddress('::1'), 7)
+        self.assertEquals(sorted(self.registry), [7, 42])
+
+    def test_remove_Unknown_Exception(self):
+        with self.assertRaises(KeyError):
+            self.registry.remove(5)
+
+
+    # ControllerRegistry.markSeen / setFlags
+
+    def test_markSeen_Stored_Online(self):
+        self.registry.markSeen(42, 1500.0)
+
+        self.assertEquals(self.registry.get(42)["lastSeen"], 1500.0)
+        self.assertEquals(self.registry.get(42)["flags"], FLAG_ONLINE)
+
+    def test_setFlags_Stored_Replaced(self):
+        self.registry.setFlags(7, FLAG_ONLINE)
+        self.assertEquals(self.registry.get(7)["flags"], FLAG_ONLINE)
+
+
+    # ControllerRegistry.getController
+
+    def test_getController_Known_Unconnected(self):
+        controller = self.registry.getController(42)
+
+        self.assertTrue(isinstance(controller, ControllerSocket))
+        self.assertEquals(controller.getHost(), 'door.example.com')
+        self.assertEquals(controller.getPort(), 60001)
+        self.assertFalse(controller.isConnected())
+
+
+    # ControllerRegistry.load
+
+    def test_load_BadRecord_Unchanged(self):
+        records = [{"serial": 100, "host": '10.0.1.1'}, {"serial": 101, "host": '10.0.1.2', "port": 0}]
+
+        with self.assertRaises(ValueError):
+            self.registry.load(records)
+
+        self.assertEquals(len(self.registry), 3)
+        self.assertFalse(100 in self.registry)
+
+    def test_load_DuplicateInBatch_Exception(self):
+        with self.assertRaises(ValueError):
+            self.registry.load([{"serial": 100, "host": '10.0.1.1'}, {"serial": 100, "host": '10.0.1.2'}])
+
+    def test_load_DuplicateAddressInBatch_Exception(self):
+        with self.assertRaises(ValueError):
+            self.registry.load([{"serial": 100, "host": 'panel.example.com'}, {"serial": 101, "host": 'panel.example.com'}])
+
+        self.assertEquals(len(self.registry), 3)
+
+    def test_load_MissingHost_Exception(self):
+        with self.assertRaises(ValueError):
+            self.registry.load([{"serial": 100}])
+
+    def test_load_ManyBoards_Compact(self):
+        registry = ControllerRegistry()
+        records = [{"serial": serial, "host": '10.%d.%d.1' % (serial // 256, serial % 256)} for serial in range(10000)]
+
+        self.assertEquals(registry.load(records), 10000)
+        self.assertEquals(registry.findByAddress('10.39.15.1'), 9999)
+        self.assertTrue(registry.getMemoryUsage() <= 200000)
+
+
+    # ControllerRegistry.loadCSV / loadJSON
+
+    def test_loadCSV_File_Loaded(self):
+        path = self._write('boards.csv', u"serial,host,port,doors\n000000100,10.0.1.1,,\n000000101,10.0.1.2,60005,2\n")
+
+        self.assertEquals(self.registry.loadCSV(path), 2)
+        self.assertEquals(self.registry.get(101)["port"], 60005)
+        self.assertEquals(self.registry.get(100)["doors"], 4)
+
+    def test_loadCSV_BadSerial_Exception(self):
+        stream = io.StringIO(u"serial,host\n000000100,10.0.1.1\nabc,10.0.1.2\n")
+
+        with self.assertRaises(SerialNumberException):
+            self.registry.loadCSV(stream)
+
+    def test_loadJSON_File_Loaded(self):
+        path = self._write('boards.json', u"%s" % json.dumps([{"serial": "000000100", "host": '10.0.1.1', "flags": 1}]))
+
+        self.assertEquals(self.registry.loadJSON(path), 1)
+        self.assertEquals(self.registry.get(100)["flags"], FLAG_ONLINE)
+
+    def test_loadJSON_NotList_Exception(self):
+        with self.assertRaises(ValueError):
+            self.registry.loadJSON(io.StringIO(u'{"serial": 100}'))
+
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+import socket
+import unittest
+
+from uhppote_rfid.resolver import ResolverCache
+
+
+class TestResolverCache(unittest.TestCase):
+    """
+    Tests the TTL-bounded hostname resolution cache.
+    """
+
+    def setUp(self):
+        """
+        .. function:: setUp()
+
+           Creates an empty cache with a 10-second TTL.
+        """
+        self.cache = ResolverCache(ttl=10, maxEntries=2)
+
+
+    # ResolverCache.__init__
+
+    def test_constructor_NegativeTTL_Exception(self):
+        with self.assertRaises(ValueError):
+            ResolverCache(ttl=-1)
+
+    def test_constructor_ZeroEntries_Exception(self):
+        with self.assertRaises(ValueError):
+            ResolverCache(maxEntries=0)
+
+
+    # ResolverCache.resolve
+
+    def test_resolve_BadHost_Exception(self):
+        with self.assertRaises(socket.gaierror):
+            self.cache.resolve('badhost.invalid', 60000)
+
+    def test_resolve_Localhost_Valid(self):
+        family, address = self.cache.resolve('localhost', 60000, now=0)
+
+        self.assertIn(family, (socket.AF_INET, socket.AF_INET6))
+        self.assertEquals(address[1], 60000)
+
+    def test_resolve_WithinTTL_Cached(self):
+        self.cache.entries[('example', 60000)] = (10, socket.AF_INET, ('10.0.0.1', 60000))
+        self.assertEquals(self.cache.resolve('EXAMPLE', 60000, now=5), (socket.AF_INET, ('10.0.0.1', 60000)))
+
+    def test_resolve_Expired_Resolved(self):
+        self.cache.entries[('localhost', 60000)] = (10, socket.AF_INET, ('10.0.0.1', 60000))
+        self.assertNotEquals(self.cache.resolve('localhost', 60000, now=11)[1][0], '10.0.0.1')
+
+    def test_resolve_MaxEntries_OldestDropped(self):
+        self.cache.resolve('localhost', 1, now=0)
+        self.cache.resolve('localhost', 2, now=0)
+        self.cache.resolve('localhost', 3, now=0)
+
+        self.assertEquals(list(self.cache.entries.keys()), [('localhost', 2), ('localhost', 3)])
+
+
+    # ResolverCache.invalidate
+
+    def test_invalidate_Host_Removed(self):
+        self.cache.resolve('localhost', 1, now=0)
+        self.cache.invalidate('LOCALHOST')
+        self.assertEquals(len(self.cache), 0)
+
+
+
+
+if __name__ == '__main__':
+    unittest.main()
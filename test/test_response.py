@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+
+import datetime
+import pickle
+import unittest
+
+from uhppote_rfid import (ConfirmationResponse, DoorControlResponse, OpenDoorResponse, Response, ResponseException,
+                          StatusResponse, TimeProfileResponse, TimeResponse)
+from uhppote_rfid.commands import buildRequest
+from uhppote_rfid.response import parseResponse
+
+
+class TestResponse(unittest.TestCase):
+    """
+    Tests lazy decoding of response packets.
+    """
+
+    def setUp(self):
+        """
+        .. function:: setUp()
+
+           Builds a status response packet with known field values.
+        """
+        self.packet = buildRequest(0x20, 423187757)
+        self.packet[8:12] = bytearray([0x39, 0x30, 0x00, 0x00])
+        self.packet[13] = 1
+        self.packet[14] = 3
+        self.packet[16:20] = bytearray([0x15, 0xcd, 0x5b, 0x07])
+        self.packet[20:27] = bytearray([0x20, 0x17, 0x10, 0x09, 0x08, 0x07, 0x06])
+        self.packet[28:32] = bytearray([0, 1, 0, 0])
+        self.packet[37:40] = bytearray([0x12, 0x34, 0x56])
+        self.packet[51:54] = bytearray([0x17, 0x11, 0x30])
+
+
+    # Response.__init__
+
+    def test_constructor_Short_Exception(self):
+        with self.assertRaises(ResponseException):
+            Response(bytearray([0x17, 0x20]))
+
+    def test_constructor_BadStart_Exception(self):
+        with self.assertRaises(ResponseException):
+            Response(bytearray(64))
+
+    def test_constructor_Bytes_Valid(self):
+        self.assertEquals(Response(bytes(self.packet)).function, 0x20)
+
+    def test_constructor_NoCopy_Valid(self):
+        response = Response(self.packet)
+        self.packet[1] = 0x32
+        self.assertEquals(response.function, 0x32)
+
+
+    # Response fields
+
+    def test_serial_Valid(self):
+        self.assertEquals(Response(self.packet).serial.getInteger(), 423187757)
+
+    def test_field_Cached_Valid(self):
+        response = StatusResponse(self.packet)
+        self.assertEquals(response.lastEventIndex, 12345)
+
+        self.packet[8] = 0
+        self.assertEquals(response.lastEventIndex, 12345)
+        self.assertIn("lastEventIndex", response.__dict__)
+        self.assertNotIn("eventCardNumber", response.__dict__)
+
+
+    # Response.__getstate__
+
+    def test_pickle_Status_Decoded(self):
+        response = pickle.loads(pickle.dumps(StatusResponse(self.packet), 2))
+
+        self.assertIn("eventCardNumber", response.__dict__)
+        self.assertEquals(response.eventCardNumber, 123456789)
+        self.assertEquals(response.getBytes(), self.packet)
+
+
+    # StatusResponse
+
+    def test_status_Event_Valid(self):
+        response = StatusResponse(self.packet)
+
+        self.assertTrue(response.eventGranted)
+        self.assertEquals(response.eventDoor, 3)
+        self.assertEquals(response.eventCardNumber, 123456789)
+        self.assertEquals(response.eventTimestamp, datetime.datetime(2017, 10, 9, 8, 7, 6))
+
+    def test_status_NoEventTimestamp_None(self):
+        self.packet[20:27] = bytearray(7)
+        self.assertIsNone(StatusResponse(self.packet).eventTimestamp)
+
+    def test_status_Doors_Valid(self):
+        response = StatusResponse(self.packet)
+
+        self.assertEquals(response.doorOpen, (False, True, False, False))
+        self.assertTrue(response.isDoorOpen(2))
+        self.assertFalse(response.isDoorOpen(1))
+
+    def test_status_BadDoor_Exception(self):
+        with self.assertRaises(ValueError):
+            StatusResponse(self.packet).isDoorOpen(5)
+
+    def test_status_SystemDateTime_Valid(self):
+        self.assertEquals(StatusResponse(self.packet).systemDateTime, datetime.datetime(2017, 11, 30, 12, 34, 56))
+
+
+    # parseResponse
+
+    def test_parseResponse_Status_Type(self):
+        self.assertIsInstance(parseResponse(self.packet), StatusResponse)
+
+    def test_parseResponse_Time_Valid(self):
+        response = parseResponse(buildRequest(0x32, 423187757, bytearray([0x20, 0x17, 0x12, 0x31, 0x23, 0x59, 0x58])))
+
+        self.assertIsInstance(response, TimeResponse)
+        self.assertEquals(response.dateTime, datetime.datetime(2017, 12, 31, 23, 59, 58))
+
+    def test_parseResponse_OpenDoor_Valid(self):
+        response = parseResponse(buildRequest(0x40, 423187757, bytearray([1])))
+
+        self.assertIsInstance(response, OpenDoorResponse)
+        self.assertTrue(response.succeeded)
+
+    def test_parseResponse_DoorControl_Valid(self):
+        response = parseResponse(buildRequest(0x82, 423187757, bytearray([2, 3, 5])))
+
+        self.assertIsInstance(response, DoorControlResponse)
+        self.assertEquals((response.door, response.mode, response.delay), (2, 3, 5))
+
+    def test_parseResponse_TimeProfile_Valid(self):
+        data = bytearray([4, 0x20, 0x17, 0x01, 0x01, 0x20, 0x17, 0x12, 0x31, 1, 1, 1, 1, 1, 0, 0,
+                          0x08, 0x00, 0x12, 0x30, 0x13, 0x00, 0x17, 0x00]) + bytearray(4) + bytearray([5])
+        response = parseResponse(buildRequest(0x98, 423187757, data))
+
+        self.assertIsInstance(response, TimeProfileResponse)
+        self.assertEquals(response.profile, 4)
+        self.assertEquals(response.startDate, datetime.date(2017, 1, 1))
+        self.assertEquals(response.endDate, datetime.date(2017, 12, 31))
+        self.assertEquals(response.weekdays, (True, True, True, True, True, False, False))
+        self.assertEquals(response.segments, (("08:00", "12:30"), ("13:00", "17:00")))
+        self.assertEquals(response.linked, 5)
+
+    def test_parseResponse_UndefinedProfile_NoDates(self):
+        response = parseResponse(buildRequest(0x98, 423187757))
+        self.assertEquals((response.profile, response.startDate, response.segments), (0, None, ()))
+
+    def test_parseResponse_Interlock_Confirmation(self):
+        response = parseResponse(buildRequest(0xa2, 423187757, bytearray([1])))
+
+        self.assertIsInstance(response, ConfirmationResponse)
+        self.assertTrue(response.succeeded)
+
+    def test_parseResponse_Unknown_Generic(self):
+        self.assertEquals(type(parseResponse(buildRequest(0x99, 423187757))), Response)
+
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+from uhppote_rfid import ConnectionPool, ControllerSocket, RTTEstimator, SocketTransmitException
+
+
+class TestRTTEstimator(unittest.TestCase):
+    """
+    Tests round-trip time estimation and timeouts without a control board.
+    """
+
+    def setUp(self):
+        """
+        .. function:: setUp()
+
+           Creates a temporary directory for saved estimates.
+        """
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "rtt.json")
+
+
+    def tearDown(self):
+        """
+        .. function:: tearDown()
+
+           Removes the temporary directory.
+        """
+        shutil.rmtree(self.directory)
+
+
+    # RTTEstimator.__init__
+
+    def test_constructor_BadTimeouts_Exception(self):
+        with self.assertRaises(ValueError):
+            RTTEstimator(initial=0.1, minimum=0.2)
+
+
+    # RTTEstimator.getTimeout
+
+    def test_getTimeout_Unmeasured_Initial(self):
+        estimator = RTTEstimator(initial=1.5)
+
+        self.assertEquals(estimator.getTimeout("10.0.0.1", 60000), 1.5)
+        self.assertEquals(estimator.getEstimate("10.0.0.1", 60000), None)
+
+
+    # RTTEstimator.sample
+
+    def test_sample_First_HalfVariation(self):
+        estimator = RTTEstimator(minimum=0.01)
+        estimator.sample("10.0.0.1", 60000, 0.1)
+
+        self.assertEquals(estimator.getEstimate("10.0.0.1", 60000), (0.1, 0.05, 0.1 + 4 * 0.05))
+
+    def test_sample_Second_Smoothed(self):
+        estimator = RTTEstimator(minimum=0.01)
+        estimator.sample("10.0.0.1", 60000, 0.1)
+        estimator.sample("10.0.0.1", 60000, 0.2)
+
+        srtt, rttvar, rto = estimator.getEstimate("10.0.0.1", 60000)
+
+        self.assertAlmostEqual(rttvar, 0.75 * 0.05 + 0.25 * 0.1)
+        self.assertAlmostEqual(srtt, 0.875 * 0.1 + 0.125 * 0.2)
+        self.assertAlmostEqual(rto, srtt + 4 * rttvar)
+
+    def test_sample_FastBoard_Minimum(self):
+        estimator = RTTEstimator(minimum=0.2)
+
+        for _ in range(20):
+            estimator.sample("10.0.0.1", 60000, 0.001)
+
+        self.assertEquals(estimator.getTimeout("10.0.0.1", 60000), 0.2)
+
+    def test_sample_SlowLink_Maximum(self):
+        estimator = RTTEstimator(maximum=5.0)
+        estimator.sample("10.0.0.1", 60000, 4.0)
+
+        self.assertEquals(estimator.getTimeout("10.0.0.1", 60000), 5.0)
+
+
+    # RTTEstimator.backoff
+
+    def test_backoff_Repeated_DoubledToMaximum(self):
+        estimator = RTTEstimator(initial=1.0, maximum=3.0)
+
+        self.assertEquals(estimator.backoff("10.0.0.1", 60000), 2.0)
+        self.assertEquals(estimator.backoff("10.0.0.1", 60000), 3.0)
+
+    def test_backoff_ThenSample_Recovered(self):
+        estimator = RTTEstimator(minimum=0.01)
+        estimator.sample("10.0.0.1", 60000, 0.1)
+        estimator.backoff("10.0.0.1", 60000)
+        estimator.sample("10.0.0.1", 60000, 0.1)
+
+        self.assertTrue(estimator.getTimeout("10.0.0.1", 60000) < 0.3)
+
+
+    # RTTEstimator.save
+
+    def test_save_Reloaded_Estimates(self):
+        estimator = RTTEstimator(self.path, minimum=0.01)
+        estimator.sample("10.0.0.1", 60000, 0.1)
+        estimator.sample("fe80::1", 60001, 0.3)
+        estimator.backoff("10.0.0.2", 60000)
+        estimator.save()
+
+        loaded = RTTEstimator(self.path, minimum=0.01)
+
+        self.assertEquals(loaded.getEstimate("10.0.0.1", 60000), estimator.getEstimate("10.0.0.1", 60000))
+        self.assertEquals(loaded.getEstimate("fe80::1", 60001), estimator.getEstimate("fe80::1", 60001))
+        self.assertEquals(loaded.getEstimate("10.0.0.2", 60000), None)
+
+    def test_save_Interval_Automatic(self):
+        estimator = RTTEstimator(self.path, saveInterval=0)
+        estimator.sample("10.0.0.1", 60000, 0.1)
+
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_save_Interval_OnceAcrossThreads(self):
+        estimator = RTTEstimator(self.path, saveInterval=0)
+        errors = []
+
+        def measure():
+            try:
+                for _ in range(50):
+                    estimator.sample("10.0.0.1", 60000, 0.1)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=measure) for _ in range(8)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEquals(errors, [])
+        self.assertEquals(sorted(os.listdir(self.directory)), ["rtt.json"])
+
+    def test_save_Unwritable_SampleKept(self):
+        estimator = RTTEstimator(os.path.join(self.directory, "missing", "rtt.json"), minimum=0.01, saveInterval=0)
+        estimator.sample("10.0.0.1", 60000, 0.1)
+
+        self.assertEquals(estimator.getEstimate("10.0.0.1", 60000)[0], 0.1)
+
+    def test_save_PoolClosed_Saved(self):
+        estimator = RTTEstimator(self.path)
+        estimator.sample("10.0.0.1", 60000, 0.1)
+
+        self.assertFalse(os.path.exists(self.path))
+
+        ConnectionPool(estimator=estimator).close()
+
+        self.assertEquals(RTTEstimator(self.path).getEstimate("10.0.0.1", 60000), estimator.getEstimate("10.0.0.1", 60000))
+
+    def test_load_Corrupt_Ignored(self):
+        with open(self.path, "w") as handle:
+            handle.write("{not json")
+
+        self.assertEquals(RTTEstimator(self.path, initial=2.0).getTimeout("10.0.0.1", 60000), 2.0)
+
+
+
+
+class TestRTTSocket(unittest.TestCase):
+    """
+    Tests timeouts derived from measured round trips against an emulated control board.
+    """
+
+    def setUp(self):
+        """
+        .. function:: setUp()
+
+           Runs a fake control board locally on an ephemeral port, answering each request after a set delay or not at
+           all.
+        """
+        self.delay = 0.0
+        self.silent = False
+
+        self.server = socket.socket()
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(8)
+
+        thread = threading.Thread(target=self._serve)
+        thread.daemon = True
+        thread.start()
+
+        self.estimator = RTTEstimator(initial=0.5, minimum=0.05)
+        self.port = self.server.getsockname()[1]
+        self.controller = ControllerSocket('127.0.0.1', self.port)
+        self.controller.setEstimator(self.estimator)
+
+
+    def tearDown(self):
+        """
+        .. function:: tearDown()
+
+           Closes the connection and the test suite's server.
+        """
+        self.controller.close()
+        self.server.close()
+
+
+    def _serve(self):
+        while True:
+            try:
+                connection = self.server.accept()[0]
+            except (socket.error, OSError):
+                return
+
+            thread = threading.Thread(target=self._board, args=(connection,))
+            thread.daemon = True
+            thread.start()
+
+    def _board(self, connection):
+        while True:
+            data = connection.recv(64)
+            if not data:
+                connection.close()
+                return
+
+            if not self.silent:
+                time.sleep(self.delay)
+                connection.sendall(data)
+
+
+    # ControllerSocket.setEstimator
+
+    def test_setEstimator_Answered_Measured(self):
+        self.controller.connect()
+
+        for _ in range(3):
+            self.controller.send(bytearray([0x17, 0x20, 0, 0]) + bytearray(60))
+            self.controller.receiveFrame()
+
+        srtt, rttvar, rto = self.estimator.getEstimate('127.0.0.1', self.port)
+
+        self.assertTrue(0 < srtt < 0.05)
+        self.assertEquals(rto, 0.05)
+
+    def test_setEstimator_Pipelined_OnlyFirstMeasured(self):
+        self.controller.connect()
+        self.controller.send(bytearray([0x17, 0x20, 0, 0]) + bytearray(60))
+        self.controller.send(bytearray([0x17, 0x20, 0, 0]) + bytearray(60))
+        self.controller.receiveFrame()
+        self.controller.receiveFrame()
+
+        self.assertEquals(self.estimator.getEstimate('127.0.0.1', self.port), None)
+
+    def test_setEstimator_NoAnswer_TimedOutAndBackedOff(self):
+        self.silent = True
+        self.estimator.sample('127.0.0.1', self.port, 0.01)
+
+        self.controller.connect()
+        self.controller.send(bytearray([0x17, 0x20, 0, 0]) + bytearray(60))
+
+        began = time.time()
+
+        with self.assertRaises(SocketTransmitException):
+            self.controller.receiveFrame()
+
+        self.assertTrue(time.time() - began < 0.4)
+        self.assertFalse(self.controller.isConnected())
+        self.assertEquals(self.estimator.getTimeout('127.0.0.1', self.port), 0.1)
+
+    def test_setEstimator_SlowBoard_NotTimedOut(self):
+        self.delay = 0.15
+
+        self.controller.connect()
+
+        for _ in range(2):
+            self.controller.send(bytearray([0x17, 0x20, 0, 0]) + bytearray(60))
+            self.controller.receiveFrame()
+
+        self.assertTrue(self.estimator.getTimeout('127.0.0.1', self.port) > 0.15)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 
+import pickle
 import unittest
 
 from uhppote_rfid import SerialNumber, SerialNumberException
@@ -88,6 +89,10 @@ class TestSerialNumber(unittest.TestCase):
         with self.assertRaises(SerialNumberException):
             SerialNumber(bytes(1))
 
+    @unittest.skipIf(bytes is str, "bytes is a string on Python 2")
+    def test_constructor_FourBytes_Valid(self):
+        self.assertEqual(SerialNumber(bytes(bytearray([0x6, 0xb0, 0x8b, 0xe5]))).getInteger(), 112233445)
+
     def test_constructor_List_Exception(self):
         with self.assertRaises(SerialNumberException):
             SerialNumber([1, 2, 3, 4])
@@ -492,6 +497,12 @@ class TestSerialNumber(unittest.TestCase):
         self.assertEqual(str(SerialNumber(bytearray([0x0, 0x0, 0x0, 0x10]))), "00000010")
 
 
+    # SerialNumber.__reduce__
+
+    def test_Pickle_NormalValue_IsEqual(self):
+        self.assertEqual(pickle.loads(pickle.dumps(SerialNumber(423187757), 2)).getInteger(), 423187757)
+
+
 
 
 if __name__ == '__main__':
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+
+from uhppote_rfid import StatusBoard, StatusBoardException
+from uhppote_rfid.commands import buildRequest
+from uhppote_rfid.response import parseResponse
+
+
+class TestStatusBoard(unittest.TestCase):
+    """
+    Tests the shared-memory status table with a writer and separate readers.
+    """
+
+    def setUp(self):
+        """
+        .. function:: setUp()
+
+           Creates a small status table in a temporary directory, and a status response with known field values.
+        """
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "status")
+        self.writer = StatusBoard(self.path, slots=8, writable=True)
+        self.reader = StatusBoard(self.path)
+
+        packet = buildRequest(0x20, 423187757)
+        packet[8:12] = bytearray([0x39, 0x30, 0x00, 0x00])
+        packet[12] = 1
+        packet[13] = 1
+        packet[14] = 3
+        packet[16:20] = bytearray([0x15, 0xcd, 0x5b, 0x07])
+        packet[28:32] = bytearray([0, 1, 0, 1])
+        packet[49] = 0x05
+        self.status = parseResponse(packet)
+
+
+    def tearDown(self):
+        """
+        .. function:: tearDown()
+
+           Unmaps the tables and removes the temporary directory.
+        """
+        self.reader.close()
+        self.writer.close()
+        shutil.rmtree(self.directory)
+
+
+    # StatusBoard.__init__
+
+    def test_constructor_Missing_Exception(self):
+        with self.assertRaises((IOError, OSError)):
+            StatusBoard(os.path.join(self.directory, "missing"))
+
+    def test_constructor_NotATable_Exception(self):
+        path = os.path.join(self.directory, "other")
+
+        with open(path, "wb") as handle:
+            handle.write(b"not a status table")
+
+        with self.assertRaises(StatusBoardException):
+            StatusBoard(path)
+
+    def test_constructor_Reopened_SlotsKept(self):
+        self.writer.update(423187757, self.status, now=100.0)
+        self.writer.close()
+
+        self.writer = StatusBoard(self.path, writable=True)
+        self.writer.update(423187757, online=False, now=200.0)
+
+        self.assertEquals(self.writer.slots, 8)
+        self.assertEquals(len(self.reader.getAll()), 1)
+        self.assertEquals(self.reader.get(423187757)["lastEventIndex"], 12345)
+
+
+    # StatusBoard.update
+
+    def test_update_Status_Read(self):
+        self.writer.update("423187757", self.status, now=100.0)
+        status = self.reader.get(423187757)
+
+        self.assertEquals(status["serial"], 423187757)
+        self.assertEquals(status["updated"], 100.0)
+        self.assertTrue(status["online"])
+        self.assertTrue(status["eventGranted"])
+        self.assertEquals((status["eventType"], status["eventDoor"], status["relayState"]), (1, 3, 5))
+        self.assertEquals(status["eventCardNumber"], 123456789)
+        self.assertEquals(status["doorOpen"], 0x0a)
+
+    def test_update_OnlineOnly_StatusKept(self):
+        self.writer.update(423187757, self.status, now=100.0)
+        self.writer.update(423187757, online=False, now=200.0)
+        status = self.reader.get(423187757)
+
+        self.assertFalse(status["online"])
+        self.assertEquals((status["updated"], status["eventCardNumber"]), (200.0, 123456789))
+
+    def test_update_WriterDiedMidUpdate_Readable(self):
+        self.writer.update(423187757, self.status, now=100.0)
+        offset = 16 + self.writer.indexes[423187757] * 40
+
+        # Left odd, as by a writer that died between marking the slot and finishing it
+        with open(self.path, "r+b") as handle:
+            handle.seek(offset)
+            handle.write(struct.pack("<I", 5))
+
+        self.writer.close()
+        self.writer = StatusBoard(self.path, writable=True)
+
+        for now in (200.0, 300.0):
+            self.writer.update(423187757, online=False, now=now)
+            self.assertEquals(self.reader.get(423187757)["updated"], now)
+
+    def test_update_ReadOnly_Exception(self):
+        with self.assertRaises(StatusBoardException):
+            self.reader.update(423187757, self.status)
+
+    def test_update_Full_Exception(self):
+        for serial in range(100000001, 100000009):
+            self.writer.update(serial)
+
+        with self.assertRaises(StatusBoardException):
+            self.writer.update(100000009)
+
+    def test_update_Colliding_AllFound(self):
+        # Serial numbers hashing to the same slot are probed past each other
+        for serial in (100000000, 100000008, 100000016):
+            self.writer.update(serial, online=serial != 100000008)
+
+        self.assertEquals([self.reader.get(serial)["online"] for serial in (100000000, 100000008, 100000016)],
+                          [True, False, True])
+        self.assertEquals(self.reader.get(100000024), None)
+
+
+    # StatusBoard.get
+
+    def test_get_ConcurrentWriter_Consistent(self):
+        done = []
+
+        def write():
+            for index in range(20000):
+                self.writer.update(423187757, online=index % 2 == 0, now=float(index % 2))
+
+            done.append(True)
+
+        self.writer.update(423187757, now=0.0)
+        thread = threading.Thread(target=write)
+        thread.start()
+
+        while not done:
+            status = self.reader.get(423187757)
+            self.assertEquals(status["online"], status["updated"] == 0.0)
+
+        thread.join()
+
+    def test_get_OtherProcess_Read(self):
+        self.writer.update(423187757, self.status)
+        script = "from uhppote_rfid import StatusBoard; print(StatusBoard(%r).isDoorOpen(423187757, 2))" % self.path
+
+        output = subprocess.check_output([sys.executable, "-c", script], cwd=os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__))))
+
+        self.assertEquals(output.strip(), b"True")
+
+
+    # StatusBoard.isDoorOpen
+
+    def test_isDoorOpen_Doors_Flags(self):
+        self.writer.update(423187757, self.status)
+
+        self.assertEquals([self.reader.isDoorOpen(423187757, door) for door in range(1, 5)], [False, True, False, True])
+        self.assertEquals(self.reader.isDoorOpen(100000001, 1), None)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+
+import datetime
+import socket
+import threading
+import time
+import unittest
+
+from uhppote_rfid import ConnectionPool, TimeSynchronizer
+from uhppote_rfid.commands import decodeDateTime, encodeDateTime
+from uhppote_rfid.time_sync import summarizeReports
+
+
+class TestTimeSynchronizer(unittest.TestCase):
+    """
+    Tests time synchronization by emulating a control board whose clock runs ahead of the local clock.
+    """
+
+    def setUp(self):
+        """
+        .. function:: setUp()
+
+           Runs a fake control board locally on an ephemeral port.
+        """
+        self.offset = 30.0
+
+        self.server = socket.socket()
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(8)
+        self.port = self.server.getsockname()[1]
+
+        thread = threading.Thread(target=self._serve)
+        thread.daemon = True
+        thread.start()
+
+        self.pool = ConnectionPool()
+        self.synchronizer = TimeSynchronizer(self.pool, samples=4, interval=0.05)
+
+
+    def tearDown(self):
+        """
+        .. function:: tearDown()
+
+           Cleanly shuts down the test suite's server.
+        """
+        self.pool.close()
+        self.server.close()
+
+
+    def _serve(self):
+        while True:
+            try:
+                connection = self.server.accept()[0]
+            except (socket.error, OSError):
+                return
+
+            thread = threading.Thread(target=self._board, args=(connection,))
+            thread.daemon = True
+            thread.start()
+
+    def _board(self, connection):
+        while True:
+            data = bytearray(connection.recv(64))
+            if not data:
+                connection.close()
+                return
+
+            now = time.time()
+
+            if data[1] == 0x30:
+                self.offset = time.mktime(decodeDateTime(data[8:15]).timetuple()) - now
+            else:
+                data[8:15] = encodeDateTime(datetime.datetime.fromtimestamp(int(now + self.offset)))
+
+            connection.sendall(data)
+
+
+    # TimeSynchronizer.__init__
+
+    def test_constructor_NoSamples_Exception(self):
+        with self.assertRaises(ValueError):
+            TimeSynchronizer(self.pool, samples=0)
+
+    def test_constructor_NegativeTolerance_Exception(self):
+        with self.assertRaises(ValueError):
+            TimeSynchronizer(self.pool, tolerance=-1)
+
+
+    # TimeSynchronizer.measure
+
+    def test_measure_Ahead_Offset(self):
+        measurement = self.synchronizer.measure(423187757, '127.0.0.1', self.port)
+
+        self.assertTrue(abs(measurement["offset"] - 30.0) <= measurement["uncertainty"] + 0.05)
+        self.assertTrue(measurement["uncertainty"] <= 0.5)
+        self.assertTrue(0 <= measurement["rtt"] <= measurement["rttMax"])
+
+
+    # TimeSynchronizer.synchronize
+
+    def test_synchronize_Ahead_Corrected(self):
+        reports = self.synchronizer.synchronize([(423187757, '127.0.0.1', self.port)])
+
+        self.assertEquals(len(reports), 1)
+        self.assertTrue(reports[0]["ok"])
+        self.assertTrue(reports[0]["corrected"])
+        self.assertEquals(reports[0]["serial"], 423187757)
+        self.assertTrue(abs(self.offset) < 0.1)
+
+    def test_synchronize_NoCorrect_Unchanged(self):
+        reports = self.synchronizer.synchronize([(423187757, '127.0.0.1', self.port)], correct=False)
+
+        self.assertFalse(reports[0]["corrected"])
+        self.assertEquals(self.offset, 30.0)
+
+    def test_synchronize_Silent_ReportedFailed(self):
+        silent = socket.socket()
+        silent.bind(('127.0.0.1', 0))
+        silent.listen(8)
+
+        synchronizer = TimeSynchronizer(samples=1, timeout=0.2)
+        began = time.time()
+
+        try:
+            reports = synchronizer.synchronize([(423187757, '127.0.0.1', silent.getsockname()[1]),
+                                                (423187757, '127.0.0.1', self.port)])
+        finally:
+            synchronizer.pool.close()
+            silent.close()
+
+        self.assertTrue(time.time() - began < 3.0)
+        self.assertEquals([report["ok"] for report in reports], [False, True])
+        self.assertIn("SocketTransmitException", reports[0]["error"])
+
+    def test_synchronize_Unreachable_Reported(self):
+        unused = socket.socket()
+        unused.bind(('127.0.0.1', 0))
+        port = unused.getsockname()[1]
+        unused.close()
+
+        reports = self.synchronizer.synchronize([
+            (423187757, '127.0.0.1', port),
+            (423187758, '127.0.0.1', self.port),
+        ], correct=False)
+
+        self.assertFalse(reports[0]["ok"])
+        self.assertTrue("SocketConnectionException" in reports[0]["error"])
+        self.assertTrue(reports[1]["ok"])
+
+
+    # summarizeReports
+
+    def test_summarizeReports_Mixed_Summary(self):
+        summary = summarizeReports([
+            {"ok": True, "corrected": True, "offset": 2.0, "uncertainty": 0.1, "rtt": 0.01},
+            {"ok": True, "corrected": False, "offset": -4.0, "uncertainty": 0.3, "rtt": 0.03},
+            {"ok": False, "corrected": False, "error": "SocketConnectionException: down"},
+        ])
+
+        self.assertEquals(summary["measured"], 2)
+        self.assertEquals(summary["failed"], 1)
+        self.assertEquals(summary["corrected"], 1)
+        self.assertEquals(summary["meanOffset"], -1.0)
+        self.assertEquals(summary["maxOffset"], 4.0)
+        self.assertEquals(summary["maxUncertainty"], 0.3)
+
+    def test_summarizeReports_Empty_None(self):
+        self.assertEquals(summarizeReports([])["meanOffset"], None)
+
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+
+import socket
+import threading
+import time
+import unittest
+
+from uhppote_rfid import CommandException, ControllerSocket, Transaction
+
+
+class TestTransaction(unittest.TestCase):
+    """
+    Tests pipelined, verified writes against an emulated control board.
+    """
+
+    def setUp(self):
+        """
+        .. function:: setUp()
+
+           Runs a fake control board locally on an ephemeral port.  It answers each request after a short delay and
+           can be told to silently ignore writes to particular doors.
+        """
+        self.doors = dict((door, [3, 3]) for door in range(1, 5))
+        self.ignore = {}
+        self.functions = []
+        self.delay = 0.0
+        self.reject = False
+
+        self.server = socket.socket()
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(8)
+
+        thread = threading.Thread(target=self._serve)
+        thread.daemon = True
+        thread.start()
+
+        self.controller = ControllerSocket('127.0.0.1', self.server.getsockname()[1])
+
+
+    def tearDown(self):
+        """
+        .. function:: tearDown()
+
+           Closes the connection and the test suite's server.
+        """
+        self.controller.close()
+        self.server.close()
+
+
+    def _serve(self):
+        while True:
+            try:
+                connection = self.server.accept()[0]
+            except (socket.error, OSError):
+                return
+
+            thread = threading.Thread(target=self._board, args=(connection,))
+            thread.daemon = True
+            thread.start()
+
+    def _board(self, connection):
+        buffered = bytearray()
+
+        while True:
+            while len(buffered) < 64:
+                chunk = connection.recv(4096)
+                if not chunk:
+                    connection.close()
+                    return
+
+                buffered += chunk
+
+            data, buffered = buffered[:64], buffered[64:]
+            self.functions.append(data[1])
+            time.sleep(self.delay)
+
+            if data[1] == 0x80:
+                if self.ignore.get(data[8], 0) > 0:
+                    self.ignore[data[8]] -= 1
+                else:
+                    self.doors[data[8]] = [data[9], data[10]]
+
+            if data[1] == 0x82:
+                data[9:11] = bytearray(self.doors[data[8]])
+            elif data[1] == 0xa2:
+                data[8] = 0 if self.reject else 1
+
+            connection.sendall(data)
+
+
+    # Transaction.__init__
+
+    def test_constructor_BadWindow_Exception(self):
+        with self.assertRaises(ValueError):
+            Transaction(self.controller, 423187757, window=0)
+
+
+    # Transaction.write
+
+    def test_write_ReadOnly_Exception(self):
+        with self.assertRaises(CommandException):
+            Transaction(self.controller, 423187757).write("get-status")
+
+    def test_write_BadArguments_Exception(self):
+        with self.assertRaises(ValueError):
+            Transaction(self.controller, 423187757).write("set-door-control", [5, "controlled", 3])
+
+
+    # Transaction.commit
+
+    def test_commit_AllStored_Verified(self):
+        transaction = Transaction(self.controller, 423187757)
+
+        for door in range(1, 5):
+            transaction.write("set-door-control", [door, "normally-open", door])
+
+        outcomes = transaction.commit()
+
+        self.assertTrue(all(outcome["ok"] and outcome["attempts"] == 1 for outcome in outcomes))
+        self.assertEquals(self.functions, [0x80, 0x82] * 4)
+        self.assertEquals(self.doors[3], [1, 3])
+
+    def test_commit_IgnoredWrite_OnlyFailedRetried(self):
+        self.ignore[2] = 1
+        transaction = Transaction(self.controller, 423187757)
+
+        for door in range(1, 5):
+            transaction.write("set-door-control", [str(door), "controlled", "9"])
+
+        outcomes = transaction.commit()
+
+        self.assertTrue(all(outcome["ok"] for outcome in outcomes))
+        self.assertEquals([outcome["attempts"] for outcome in outcomes], [1, 2, 1, 1])
+        self.assertEquals(self.functions[8:], [0x80, 0x82])
+
+    def test_commit_AlwaysIgnored_Failed(self):
+        self.ignore[1] = 10
+        transaction = Transaction(self.controller, 423187757, attempts=2)
+        transaction.write("set-door-control", [1, "controlled", 9])
+
+        outcome = transaction.commit()[0]
+
+        self.assertFalse(outcome["ok"])
+        self.assertEquals(outcome["attempts"], 2)
+        self.assertTrue("Read-back" in outcome["error"])
+
+    def test_commit_Rejected_Failed(self):
+        self.reject = True
+        transaction = Transaction(self.controller, 423187757, attempts=1)
+        transaction.write("set-interlock", [1])
+
+        outcome = transaction.commit()[0]
+
+        self.assertFalse(outcome["ok"])
+        self.assertEquals(self.functions, [0xa2])
+
+    def test_commit_Unreachable_Failed(self):
+        unused = socket.socket()
+        unused.bind(('127.0.0.1', 0))
+        controller = ControllerSocket('127.0.0.1', unused.getsockname()[1])
+        unused.close()
+
+        transaction = Transaction(controller, 423187757)
+        transaction.write("set-interlock", [1])
+
+        outcome = transaction.commit()[0]
+
+        self.assertFalse(outcome["ok"])
+        self.assertTrue("SocketConnectionException" in outcome["error"])
+
+    def test_commit_SmallWindow_AllVerified(self):
+        transaction = Transaction(self.controller, 423187757, window=1)
+
+        for index in range(10):
+            transaction.write("set-door-control", [index % 4 + 1, "controlled", index])
+
+        self.assertTrue(all(outcome["ok"] for outcome in transaction.commit()))
+        self.assertEquals(len(self.functions), 20)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,16 +2,95 @@
 """
 Module for interfacing with UHPPOTE RFID control boards.
 
+On Python 3.7 and later, classes are imported from their modules on first use, so lightweight entry points (such as
+the command line client) do not pay for loading the whole package.
+
 .. moduleauthor:: Andrew Vaughan <hello@andrewvaughan.io>
 """
 
-from .serial_number import SerialNumber, SerialNumberException
-from .controller_socket import ControllerSocket, SocketConnectionException, SocketTransmitException
+import importlib
+import sys
+
+_EXPORTS = {
+    'SerialNumber': 'serial_number',
+    'SerialNumberException': 'serial_number',
+    'ControllerSocket': 'controller_socket',
+    'SocketConnectionException': 'controller_socket',
+    'SocketTransmitException': 'controller_socket',
+    'FleetManager': 'fleet_manager',
+    'FleetManagerException': 'fleet_manager',
+    'HashRing': 'fleet_manager',
+    'HealthMonitor': 'health_monitor',
+    'ResolverCache': 'resolver',
+    'Command': 'commands',
+    'CommandException': 'commands',
+    'ConnectionPool': 'connection_pool',
+    'ControllerDaemon': 'daemon',
+    'DaemonClient': 'client',
+    'BatchRunner': 'batch',
+    'ControllerGateway': 'gateway',
+    'GatewayTimeoutException': 'gateway',
+    'Response': 'response',
+    'StatusResponse': 'response',
+    'TimeResponse': 'response',
+    'OpenDoorResponse': 'response',
+    'DoorControlResponse': 'response',
+    'TimeProfileResponse': 'response',
+    'ConfirmationResponse': 'response',
+    'ResponseException': 'response',
+    'TimeSynchronizer': 'time_sync',
+    'CaptureWriter': 'capture',
+    'CaptureException': 'capture',
+    'ReplayServer': 'capture',
+    'CircuitBreaker': 'circuit_breaker',
+    'CircuitBreakerRegistry': 'circuit_breaker',
+    'CircuitOpenException': 'circuit_breaker',
+    'EventLoop': 'event_loop',
+    'EventLoopException': 'event_loop',
+    'TimerWheel': 'event_loop',
+    'ControllerRegistry': 'registry',
+    'CardNumber': 'card_number',
+    'CardNumberException': 'card_number',
+    'AccessPolicy': 'access_rules',
+    'AccessRuleException': 'access_rules',
+    'TimeProfile': 'access_rules',
+    'BoardConfig': 'config',
+    'ConfigException': 'config',
+    'Transaction': 'transaction',
+    'CommandJournal': 'journal',
+    'StatusBoard': 'status_board',
+    'StatusBoardException': 'status_board',
+    'LoadGenerator': 'load_test',
+    'RTTEstimator': 'rtt',
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    """
+    Import an exported class from its module on first use.
+
+       :param name: the name of the class
+       :type name: str
+
+       :returns: the exported class
+       :rtype: type
+
+       :raises AttributeError: if the name is not exported
+
+    .. versionadded:: 0.2.0
+    .. function:: __getattr__(name)
+    """
+    if name not in _EXPORTS:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+    value = getattr(importlib.import_module("." + _EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
 
-__all__ = [
-    'SerialNumber',
-    'SerialNumberException',
-    'ControllerSocket',
-    'SocketConnectionException',
-    'SocketTransmitException',
-]
+# Module-level __getattr__ is only honored from Python 3.7
+if sys.version_info < (3, 7):
+    for _name in _EXPORTS:
+        __getattr__(_name)
@@ -2,5 +2,126 @@
 """
 Module for interfacing with UHPPOTE RFID control boards.
 
+Usage::
+
+   python -m uhppote_rfid daemon
+   python -m uhppote_rfid batch [FILE]
+   python -m uhppote_rfid gateway [HOST:PORT]
+   python -m uhppote_rfid load [OPTIONS] [--loopback | SERIAL@HOST[:PORT] ...]
+   python -m uhppote_rfid COMMAND SERIAL HOST[:PORT] [ARGUMENT ...]
+
+The `daemon` command runs a long-lived process that owns pooled connections to control boards.  The `batch` command
+reads `SERIAL HOST[:PORT] COMMAND [ARGUMENT ...]` lines from a file (or standard input) and runs them concurrently,
+writing JSON results in completion order.  The `gateway` command serves the same commands over HTTP/JSON (default:
+127.0.0.1:8080).  The `load` command runs a load test and reports throughput and latency percentiles; run it with
+`--help` for its options.  Any other command is handed to the running daemon over its Unix socket, so
+scripts only pay for a local round trip.
+
 .. moduleauthor:: Andrew Vaughan <hello@andrewvaughan.io>
 """
+
+import argparse
+import json
+import socket
+import sys
+
+from .client import DEFAULT_SOCKET_PATH, DaemonClient, parseTarget
+
+
+def main(argv=None):
+    """
+    Run the command line interface.
+
+       :param argv: the command line arguments, excluding the program name (default: `sys.argv[1:]`)
+       :type argv: list
+
+       :returns: the exit status
+       :rtype: int
+
+    .. versionadded:: 0.2.0
+    .. function:: main([argv = None])
+    """
+    parser = argparse.ArgumentParser(prog="python -m uhppote_rfid", description="Control UHPPOTE RFID boards.")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET_PATH, help="the daemon's Unix socket (default: %(default)s)")
+    parser.add_argument("--concurrency", type=int, default=32, help="worker threads for batch mode (default: %(default)s)")
+    parser.add_argument("command", help="\"daemon\", \"batch\", \"gateway\", \"load\", or a command such as \"open-door\"")
+    parser.add_argument("arguments", nargs=argparse.REMAINDER,
+                        help="for batch mode, an optional file; for the gateway, an optional HOST:PORT to listen on; "
+                             "otherwise SERIAL HOST[:PORT] [ARGUMENT ...]")
+
+    argv = sys.argv[1:] if argv is None else argv
+
+    # The load test has its own options
+    if argv and argv[0] == "load":
+        from .load_test import main as runLoadTest
+
+        return runLoadTest(argv[1:])
+
+    options = parser.parse_args(argv)
+
+    if options.command == "daemon":
+        import logging
+        from .daemon import ControllerDaemon
+
+        logging.basicConfig(level=logging.INFO)
+        daemon = ControllerDaemon(options.socket)
+
+        try:
+            daemon.serveForever()
+        except KeyboardInterrupt:
+            pass
+
+        return 0
+
+    if options.command == "gateway":
+        import logging
+        from .gateway import ControllerGateway
+
+        logging.basicConfig(level=logging.INFO)
+        host, port = parseTarget(options.arguments[0] if options.arguments else "127.0.0.1", 8080)
+        gateway = ControllerGateway(host, port)
+
+        try:
+            gateway.serveForever()
+        except KeyboardInterrupt:
+            pass
+
+        return 0
+
+    if options.command == "batch":
+        from .batch import BatchRunner
+
+        if len(options.arguments) > 1:
+            parser.error("batch mode takes at most one file")
+
+        lines = open(options.arguments[0]) if options.arguments and options.arguments[0] != "-" else sys.stdin
+
+        try:
+            succeeded, failed = BatchRunner(sys.stdout, options.concurrency).run(lines)
+        finally:
+            if lines is not sys.stdin:
+                lines.close()
+
+        return 0 if failed == 0 else 1
+
+    if len(options.arguments) < 2:
+        parser.error("a serial number and target are required for \"%s\"" % options.command)
+
+    serial, target = options.arguments[0:2]
+    host, port = parseTarget(target)
+    client = DaemonClient(options.socket)
+
+    try:
+        reply = client.request(options.command, serial, host, port, options.arguments[2:])
+    except socket.error as e:
+        sys.stderr.write("Unable to reach the daemon on %s: %s\n" % (options.socket, str(e)))
+        return 2
+    finally:
+        client.close()
+
+    sys.stdout.write(json.dumps(reply) + "\n")
+    return 0 if reply.get("ok") else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
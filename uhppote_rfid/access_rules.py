@@ -0,0 +1,578 @@
+# -*- coding: utf-8 -*-
+"""
+Provides local evaluation of access rules for UHPPOTE RFID control boards.
+
+Time profiles are compiled to bitmaps over the 672 fifteen-minute slots of a week (7 days of 96 slots, Monday first).
+An `AccessPolicy` combines profiles, holidays, and door groups into one pair of bitmaps (ordinary days and holidays)
+per card and door, held as integers with slot 0 in the least-significant bit, so whether a card would open a door at a
+given time is a dictionary lookup and a bit test.  Equal bitmaps are shared, so a policy for 100,000 cards holds only
+as many bitmaps as it has distinct schedules.
+
+The same bitmaps determine the time zones each board needs: `AccessPolicy.getTimeZones()` numbers the distinct
+schedules used on a board and splits each into a chain of board time profiles, one per distinct set of daily segments.
+
+   :copyright: (c) 2017 by Andrew Vaughan.
+   :license: Apache 2.0, see LICENSE for more details.
+
+.. module:: AccessRules
+"""
+
+import datetime
+import logging
+
+from .card_number import CardNumber
+from .compat import INTEGER_TYPES, STRING_TYPES
+from .serial_number import SerialNumber
+
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+SLOTS_PER_WEEK = 7 * SLOTS_PER_DAY
+
+# Board-side time zones: 0 denies, 1 always allows, and 2 to 254 hold time profiles of up to 3 segments for their days
+ZONE_NEVER = 0
+ZONE_ALWAYS = 1
+ZONE_FIRST = 2
+ZONE_LAST = 254
+SEGMENTS_PER_DAY = 3
+
+_EMPTY = 0
+_FULL = (1 << SLOTS_PER_WEEK) - 1
+
+
+class TimeProfile(object):
+    """
+    A weekly schedule of allowed times, at 15-minute resolution.
+
+    .. class:: TimeProfile
+    .. versionadded:: 0.2.0
+    """
+
+    def __init__(self, windows=None, holidays=False):
+        """
+        Initialize a new TimeProfile.
+
+           :param windows: `(days, start, end)` windows to allow, as for `addWindow()` (default: none)
+           :type windows: iterable
+           :param holidays: whether the profile also allows access on holidays (default: False)
+           :type holidays: bool
+
+           :raises ValueError: if a window is invalid
+
+        .. versionadded:: 0.2.0
+        .. function:: __init__([windows = None, holidays = False])
+        """
+        self.bitmap = bytearray(SLOTS_PER_WEEK // 8)
+        self.holidays = bool(holidays)
+
+        for days, start, end in windows or ():
+            self.addWindow(days, start, end)
+
+
+    def addWindow(self, days, start, end):
+        """
+        Allow access between two times on the given days.  The start is rounded down and the end rounded up to a
+        whole slot; an end at or before the start runs past midnight into the next day.
+
+           :param days: the days of the week, 0 (Monday) to 6 (Sunday)
+           :type days: iterable or int
+           :param start: the start time, as "HH:MM" or a `datetime.time`
+           :type start: str or datetime.time
+           :param end: the end time, exclusive, as "HH:MM" (up to "24:00") or a `datetime.time`
+           :type end: str or datetime.time
+
+           :raises ValueError: if a day or time is invalid
+
+        .. versionadded:: 0.2.0
+        .. function:: addWindow(days, start, end)
+        """
+        if isinstance(days, INTEGER_TYPES):
+            days = (days,)
+
+        first = _toMinutes(start) // SLOT_MINUTES
+        last = -(-_toMinutes(end) // SLOT_MINUTES)
+
+        if last <= first:
+            last += SLOTS_PER_DAY
+
+        for day in days:
+            if not 0 <= int(day) <= 6:
+                raise ValueError("Invalid day of the week. Expected 0 (Monday) to 6 (Sunday); received \"%s\"." % day)
+
+            offset = int(day) * SLOTS_PER_DAY
+
+            for slot in range(offset + first, offset + last):
+                slot %= SLOTS_PER_WEEK
+                self.bitmap[slot >> 3] |= 1 << (slot & 7)
+
+
+    def allows(self, when):
+        """
+        Return whether the profile allows access at a time, ignoring holidays.
+
+           :param when: the time
+           :type when: datetime.datetime
+
+           :returns: whether access is allowed
+           :rtype: bool
+
+        .. versionadded:: 0.2.0
+        .. function:: allows(when)
+        """
+        slot = getSlot(when)
+        return bool(self.bitmap[slot >> 3] >> (slot & 7) & 1)
+
+
+    def getBitmap(self):
+        """
+        Return the profile's weekly bitmap: bit `n` of the 84 bytes is set if slot `n` is allowed.
+
+           :returns: the bitmap
+           :rtype: bytes
+
+        .. versionadded:: 0.2.0
+        .. function:: getBitmap()
+        """
+        return bytes(self.bitmap)
+
+
+
+
+class AccessPolicy(object):
+    """
+    Compiles grants of doors to cards into bitmaps, for local permission checks and board time-zone planning.
+
+    .. class:: AccessPolicy
+    .. versionadded:: 0.2.0
+    """
+
+    def __init__(self):
+        """
+        Initialize a new, empty AccessPolicy.
+
+        .. versionadded:: 0.2.0
+        .. function:: __init__()
+        """
+        self.logger = logging.getLogger("UHPPOTE.AccessPolicy")
+
+        self.profiles = {}
+        self.groups = {}
+        self.holidays = set()
+        self.grants = []
+
+        # Compiled state: distinct (ordinary, holiday) bitmap pairs, and an index into them by card, board, and door
+        self.schedules = []
+        self.entries = {}
+        self.compiled = False
+
+
+    def addProfile(self, name, profile):
+        """
+        Add a named time profile.
+
+           :param name: the name of the profile
+           :type name: str
+           :param profile: the profile
+           :type profile: TimeProfile
+
+        .. versionadded:: 0.2.0
+        .. function:: addProfile(name, profile)
+        """
+        self.profiles[name] = profile
+        self.compiled = False
+
+
+    def addDoorGroup(self, name, doors):
+        """
+        Add a named group of doors.
+
+           :param name: the name of the group
+           :type name: str
+           :param doors: `(serial, door)` pairs, with doors numbered from 1
+           :type doors: iterable
+
+           :raises ValueError: if a door number is invalid
+           :raises SerialNumberException: if a serial number is invalid
+
+        .. versionadded:: 0.2.0
+        .. function:: addDoorGroup(name, doors)
+        """
+        self.groups[name] = [_toDoor(serial, door) for serial, door in doors]
+        self.compiled = False
+
+
+    def addHoliday(self, date):
+        """
+        Add a holiday, on which only profiles created with `holidays=True` allow access.
+
+           :param date: the date of the holiday
+           :type date: datetime.date
+
+        .. versionadded:: 0.2.0
+        .. function:: addHoliday(date)
+        """
+        self.holidays.add(date.date() if isinstance(date, datetime.datetime) else date)
+
+
+    def grant(self, cards, doors, profile=None):
+        """
+        Grant cards access to doors.  Grants are additive: a card may open a door whenever any of its grants allows.
+
+           :param cards: the card numbers
+           :type cards: iterable
+           :param doors: a door group name, or `(serial, door)` pairs
+           :type doors: str or iterable
+           :param profile: the name of the time profile, or None to always allow (default: None)
+           :type profile: str
+
+           :raises KeyError: if the door group or profile is unknown
+           :raises CardNumberException: if a card number is invalid
+
+        .. versionadded:: 0.2.0
+        .. function:: grant(cards, doors[, profile = None])
+        """
+        if isinstance(doors, STRING_TYPES):
+            doors = self.groups[doors]
+        else:
+            doors = [_toDoor(serial, door) for serial, door in doors]
+
+        if profile is not None and profile not in self.profiles:
+            raise KeyError(profile)
+
+        self.grants.append(([_toCard(card) for card in cards], doors, profile))
+        self.compiled = False
+
+
+    def compile(self):
+        """
+        Compile the grants into per-card, per-door bitmaps.  Called automatically by `allows()` after a change.
+
+           :returns: the number of distinct schedules
+           :rtype: int
+
+        .. versionadded:: 0.2.0
+        .. function:: compile()
+        """
+        # Profiles are combined by name first, so each distinct set of profiles is merged once
+        combined = {}
+
+        for cards, doors, profile in self.grants:
+            single = frozenset((profile,))
+
+            for door in doors:
+                keys = dict.fromkeys([(card << 33) | door for card in cards], single)
+
+                # Only keys granted before need merging; the rest are added in one step
+                for key in set(keys).intersection(combined):
+                    keys[key] = combined[key] | single
+
+                combined.update(keys)
+
+        schedules = []
+        indexes = {}
+        merged = {}
+
+        for names in set(combined.values()):
+            pair = self._merge(names)
+            index = indexes.get(pair)
+
+            if index is None:
+                index = indexes[pair] = len(schedules)
+                schedules.append(pair)
+
+            merged[names] = index
+
+        self.schedules = schedules
+        self.entries = entries = dict((key, merged[names]) for key, names in combined.items())
+        self.compiled = True
+
+        self.logger.debug("Compiled %d card-door entries into %d schedules." % (len(entries), len(schedules)))
+        return len(schedules)
+
+
+    def allows(self, card, serial, door, when):
+        """
+        Return whether a card would open a door at a time.
+
+           :param card: the card number
+           :type card: CardNumber or int or str
+           :param serial: the serial number of the control board
+           :type serial: SerialNumber or str or int or bytearray
+           :param door: the door number, from 1
+           :type door: int
+           :param when: the time
+           :type when: datetime.datetime
+
+           :returns: whether access would be granted
+           :rtype: bool
+
+        .. versionadded:: 0.2.0
+        .. function:: allows(card, serial, door, when)
+        """
+        if not self.compiled:
+            self.compile()
+
+        index = self.entries.get((_toCard(card) << 33) | _toDoor(serial, door))
+
+        if index is None:
+            return False
+
+        return bool(self.schedules[index][1 if when.date() in self.holidays else 0] >> getSlot(when) & 1)
+
+
+    def getTimeZones(self, serial):
+        """
+        Plan the time zones for a control board: number each distinct schedule used on the board, split it into board
+        time profiles, and give each card the zone for each door.
+
+        A board time profile allows the same segments on every day it applies to, so a schedule whose days differ takes
+        one profile per distinct set of segments, chained with `linked`; its zone is the first profile of the chain.
+        Each profile is given as keyword arguments for `BoardConfig.setProfile()`, with the profile number.  A schedule
+        that is empty is zone 0 and a full week is zone 1; neither needs writing.  Holiday access is not representable
+        in board time zones, so only the ordinary-day bitmap is planned.
+
+           :param serial: the serial number of the control board
+           :type serial: SerialNumber or str or int or bytearray
+
+           :returns: a dict with `profiles` (profile number to `setProfile()` arguments), `zones` (zone to the profile
+              numbers of its chain), and `cards` (card to a list of 4 zones)
+           :rtype: dict
+
+           :raises AccessRuleException: if the board would need more profiles, or a day more segments, than it holds
+
+        .. versionadded:: 0.2.0
+        .. function:: getTimeZones(serial)
+        """
+        if not self.compiled:
+            self.compile()
+
+        board = _toSerial(serial)
+        profiles = {}
+        zones = {}
+        numbers = {_EMPTY: ZONE_NEVER, _FULL: ZONE_ALWAYS}
+        cards = {}
+
+        for key, index in self.entries.items():
+            if (key >> 3) & 0x3fffffff != board:
+                continue
+
+            bitmap = self.schedules[index][0]
+            zone = numbers.get(bitmap)
+
+            if zone is None:
+                chain = _getProfiles(bitmap)
+                zone = ZONE_FIRST + len(profiles)
+
+                if zone + len(chain) - 1 > ZONE_LAST:
+                    raise AccessRuleException("Control board %d needs more than %d time profiles." % (board, ZONE_LAST - ZONE_FIRST + 1))
+
+                for offset, (weekdays, segments) in enumerate(chain):
+                    linked = zone + offset + 1 if offset + 1 < len(chain) else 0
+                    profiles[zone + offset] = {"weekdays": weekdays, "segments": segments, "linked": linked}
+
+                zones[zone] = list(range(zone, zone + len(chain)))
+                numbers[bitmap] = zone
+
+            card = key >> 33
+            doors = cards.get(card)
+
+            if doors is None:
+                doors = cards[card] = [ZONE_NEVER] * 4
+
+            doors[(key & 7) - 1] = zone
+
+        return {"profiles": profiles, "zones": zones, "cards": cards}
+
+
+    def _merge(self, names):
+        """
+        Return the combined ordinary-day and holiday bitmaps of a set of profile names, where None always allows.
+
+        .. versionadded:: 0.2.0
+        """
+        if None in names:
+            return (_FULL, _FULL)
+
+        ordinary = 0
+        holiday = 0
+
+        for name in names:
+            profile = self.profiles[name]
+            value = _toInteger(profile.bitmap)
+
+            ordinary |= value
+
+            if profile.holidays:
+                holiday |= value
+
+        return (ordinary, holiday)
+
+
+
+
+def getSlot(when):
+    """
+    Return the slot of the week a time falls in, from 0 (Monday 00:00) to 671 (Sunday 23:45).
+
+       :param when: the time
+       :type when: datetime.datetime
+
+       :returns: the slot
+       :rtype: int
+
+    .. versionadded:: 0.2.0
+    .. function:: getSlot(when)
+    """
+    return when.weekday() * SLOTS_PER_DAY + (when.hour * 60 + when.minute) // SLOT_MINUTES
+
+
+def _toMinutes(value):
+    """
+    Return a time of day, as "HH:MM" or a `datetime.time`, in minutes after midnight.
+
+    .. versionadded:: 0.2.0
+    """
+    if isinstance(value, datetime.time):
+        return value.hour * 60 + value.minute
+
+    try:
+        hours, minutes = (int(part) for part in value.split(":"))
+    except (AttributeError, ValueError):
+        raise ValueError("Invalid time. Expected \"HH:MM\"; received \"%s\"." % value)
+
+    if not 0 <= minutes < 60 or not 0 <= hours * 60 + minutes <= 24 * 60:
+        raise ValueError("Invalid time. Expected \"00:00\" to \"24:00\"; received \"%s\"." % value)
+
+    return hours * 60 + minutes
+
+
+def _toCard(card):
+    """
+    Return a card number as an integer, without building a `CardNumber` for plain integers.
+
+    .. versionadded:: 0.2.0
+    """
+    if isinstance(card, INTEGER_TYPES) and 0 <= card <= 0xffffffff:
+        return int(card)
+
+    if not isinstance(card, CardNumber):
+        card = CardNumber(card)
+
+    return card.getInteger()
+
+
+def _toSerial(serial):
+    """
+    Return a serial number as an integer, without building a `SerialNumber` for plain integers.
+
+    .. versionadded:: 0.2.0
+    """
+    if isinstance(serial, INTEGER_TYPES) and 0 <= serial <= 999999999:
+        return int(serial)
+
+    if not isinstance(serial, SerialNumber):
+        serial = SerialNumber(serial)
+
+    return serial.getInteger()
+
+
+def _toDoor(serial, door):
+    """
+    Return a board and door as one integer key: the serial number above three bits of door number.
+
+    .. versionadded:: 0.2.0
+    """
+    if not 1 <= int(door) <= 4:
+        raise ValueError("Invalid door number. Expected 1 to 4; received \"%s\"." % door)
+
+    return (_toSerial(serial) << 3) | int(door)
+
+
+def _toInteger(bitmap):
+    """
+    Return a bitmap as an integer, slot 0 in the least-significant bit.
+
+    .. versionadded:: 0.2.0
+    """
+    value = 0
+
+    for byte in reversed(bytearray(bitmap)):
+        value = (value << 8) | byte
+
+    return value
+
+
+def _getSegments(bitmap):
+    """
+    Split a weekly bitmap into runs of allowed slots for each day, as `(start, end)` minutes of the day.
+
+    .. versionadded:: 0.2.0
+    """
+    days = []
+
+    for day in range(7):
+        segments = []
+        start = None
+
+        for slot in range(SLOTS_PER_DAY + 1):
+            allowed = slot < SLOTS_PER_DAY and bitmap >> (day * SLOTS_PER_DAY + slot) & 1
+
+            if allowed and start is None:
+                start = slot
+            elif not allowed and start is not None:
+                segments.append((start * SLOT_MINUTES, slot * SLOT_MINUTES))
+                start = None
+
+        if len(segments) > SEGMENTS_PER_DAY:
+            raise AccessRuleException("Time zone needs %d segments on day %d; boards hold %d." % (len(segments), day, SEGMENTS_PER_DAY))
+
+        days.append(segments)
+
+    return days
+
+
+def _getProfiles(bitmap):
+    """
+    Split a weekly bitmap into board time profiles, one for each distinct set of segments on the days that allow any,
+    as `(weekdays, segments)` with seven 0/1 flags from Monday and "HH:MM-HH:MM" segments.
+
+    .. versionadded:: 0.2.0
+    """
+    profiles = []
+    days = {}
+
+    for day, segments in enumerate(_getSegments(bitmap)):
+        if not segments:
+            continue
+
+        # Boards cannot hold 24:00, so a segment running to midnight ends on the last minute of the day
+        segments = tuple("%s-%s" % (_toTime(start), _toTime(min(end, 24 * 60 - 1))) for start, end in segments)
+
+        if segments not in days:
+            days[segments] = len(profiles)
+            profiles.append([["0"] * 7, list(segments)])
+
+        profiles[days[segments]][0][day] = "1"
+
+    return [("".join(weekdays), segments) for weekdays, segments in profiles]
+
+
+def _toTime(minutes):
+    """
+    Return minutes after midnight as "HH:MM".
+
+    .. versionadded:: 0.2.0
+    """
+    return "%02d:%02d" % divmod(minutes, 60)
+
+
+
+
+class AccessRuleException(Exception):
+    """
+    Custom exception raised when access rules cannot be represented on a control board.
+
+    .. versionadded:: 0.2.0
+    """
+
+    pass
@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+"""
+Provides batch execution of commands across many UHPPOTE RFID control boards.
+
+Each input line names a control board and a command::
+
+   SERIAL HOST[:PORT] COMMAND [ARGUMENT ...]
+
+Blank lines and lines starting with `#` are ignored.  Results are written as JSON lines in completion order.
+
+   :copyright: (c) 2017 by Andrew Vaughan.
+   :license: Apache 2.0, see LICENSE for more details.
+
+.. module:: BatchRunner
+"""
+
+import binascii
+import collections
+import json
+import logging
+import threading
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+from .client import parseTarget
+from .commands import PACKET_SIZE, CommandException, getCommand
+from .connection_pool import ConnectionPool
+from .serial_number import SerialNumber
+
+
+class BatchRunner(object):
+    """
+    Runs batches of commands concurrently across control boards, in order for each board.
+
+    Commands are queued per board.  Worker threads take boards with queued commands in turn and pipeline a window of
+    each board's commands over its pooled connection, so every command for a board runs in input order while different
+    boards are served in parallel, and a slow board holds up only its own commands.
+
+    .. class:: BatchRunner
+    .. versionadded:: 0.2.0
+    """
+
+    def __init__(self, output, concurrency=32, pool=None, window=16, timeout=5.0):
+        """
+        Initialize a new BatchRunner.
+
+           :param output: a writable text stream receiving one JSON result per line
+           :type output: file
+           :param concurrency: the number of worker threads (default: 32)
+           :type concurrency: int
+           :param pool: the connection pool to use (default: a new `ConnectionPool` timed out by `timeout`)
+           :type pool: ConnectionPool
+           :param window: the most requests in flight at once to one board (default: 16)
+           :type window: int
+           :param timeout: the longest time, in seconds, to wait to connect to or hear from a board, if no pool is
+              given (default: 5.0)
+           :type timeout: float
+
+           :raises ValueError: if concurrency or the window is below 1, or the timeout is not positive
+
+        .. versionadded:: 0.2.0
+        .. function:: __init__(output[, concurrency = 32, pool = None, window = 16, timeout = 5.0])
+        """
+        self.logger = logging.getLogger("UHPPOTE.BatchRunner")
+
+        if int(concurrency) <= 0:
+            raise ValueError("Invalid concurrency for batch runner: %d" % int(concurrency))
+
+        if int(window) <= 0:
+            raise ValueError("Invalid window for batch runner: %d" % int(window))
+
+        self.output = output
+        self.concurrency = int(concurrency)
+        self.window = int(window)
+        self.pool = pool if pool is not None else ConnectionPool(timeout=timeout)
+        self.outputLock = threading.Lock()
+        self.succeeded = 0
+        self.failed = 0
+
+        # Queued commands by board, and the boards a worker is serving or has been asked to serve
+        self.backlog = {}
+        self.ready = queue.Queue()
+        self.lock = threading.Lock()
+        self.idle = threading.Condition(self.lock)
+
+
+    def run(self, lines):
+        """
+        Run every command in a batch and wait for all of them to finish.
+
+        Input is consumed as it is read, so commands start before the whole batch has been received.
+
+           :param lines: the batch, one command per line
+           :type lines: iterable
+
+           :returns: a tuple of the number of commands that succeeded and the number that failed
+           :rtype: tuple
+
+        .. versionadded:: 0.2.0
+        .. function:: run(lines)
+        """
+        self.succeeded = 0
+        self.failed = 0
+
+        workers = []
+
+        for index in range(self.concurrency):
+            worker = threading.Thread(target=self._work, name="UHPPOTE-BatchWorker")
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+
+        for number, line in enumerate(lines, 1):
+            line = line.strip()
+
+            if not line or line.startswith("#"):
+                continue
+
+            try:
+                item = parseLine(line)
+            except ValueError as e:
+                self._emit({"line": number, "ok": False, "error": "ValueError: %s" % str(e)})
+                continue
+
+            item["line"] = number
+            key = (item["host"], item["port"])
+
+            with self.lock:
+                if key not in self.backlog:
+                    self.backlog[key] = collections.deque()
+                    self.ready.put(key)
+
+                self.backlog[key].append(item)
+
+        with self.lock:
+            while self.backlog:
+                self.idle.wait()
+
+        for worker in workers:
+            self.ready.put(None)
+
+        for worker in workers:
+            worker.join()
+
+        self.pool.close()
+        return self.succeeded, self.failed
+
+
+    def _work(self):
+        """
+        Serve boards with queued commands until given None.
+
+        .. versionadded:: 0.2.0
+        .. function:: _work()
+        """
+        while True:
+            key = self.ready.get()
+            if key is None:
+                return
+
+            with self.lock:
+                commands = self.backlog[key]
+                items = [commands.popleft() for i in range(min(self.window, len(commands)))]
+
+            try:
+                self._runItems(key, items)
+            except Exception as e:
+                self.logger.error("Batch worker failed serving %s:%d: %s" % (key[0], key[1], str(e)))
+
+            # One window per turn, so a board with a long queue does not starve the others
+            with self.lock:
+                if self.backlog[key]:
+                    self.ready.put(key)
+                else:
+                    del self.backlog[key]
+                    self.idle.notify_all()
+
+
+    def _runItems(self, key, items):
+        """
+        Pipeline a board's commands over its pooled connection and emit their results in order.  Commands left
+        unanswered when the connection fails or times out are reported with the error.
+
+           :param key: the host and port of the control board
+           :type key: tuple
+           :param items: the parsed commands, in input order
+           :type items: list
+
+        .. versionadded:: 0.2.0
+        .. function:: _runItems(key, items)
+        """
+        outcomes = [None] * len(items)
+        requests = []
+
+        for index, item in enumerate(items):
+            try:
+                command = getCommand(item["command"])
+                requests.append((index, command, command.buildRequest(item["serial"], item["args"])))
+            except (CommandException, ValueError) as e:
+                outcomes[index] = e
+
+        if requests:
+            try:
+                self.pool.call(
+                    key[0],
+                    key[1],
+                    lambda controller: self._pipeline(controller, requests, outcomes),
+                    all(command.readOnly for index, command, request in requests)
+                )
+
+            except Exception as e:
+                for index, command, request in requests:
+                    if outcomes[index] is None:
+                        outcomes[index] = e
+
+        for item, outcome in zip(items, outcomes):
+            result = {
+                "line": item["line"],
+                "serial": item["serial"].getInteger(),
+                "host": item["host"],
+                "port": item["port"],
+                "command": item["command"],
+            }
+
+            if isinstance(outcome, Exception):
+                result["ok"] = False
+                result["error"] = "%s: %s" % (type(outcome).__name__, str(outcome))
+            else:
+                result["ok"] = True
+                result["response"] = binascii.hexlify(bytes(outcome)).decode("ascii")
+
+            self._emit(result)
+
+
+    def _pipeline(self, controller, requests, outcomes):
+        """
+        Send requests that have no outcome yet, keeping up to a window in flight, and record each response.  The
+        socket's timeout bounds the wait for every response.
+
+           :param controller: the connected socket for the control board
+           :type controller: ControllerSocket
+           :param requests: the position, command, and encoded request of each command, in order
+           :type requests: list
+           :param outcomes: the response or error of each command, filled in as responses arrive
+           :type outcomes: list
+
+           :raises CommandException: if a response does not answer its request
+           :raises SocketConnectionException: if the socket does not have a working connection
+           :raises SocketTransmitException: if the connection is broken or times out
+
+        .. versionadded:: 0.2.0
+        .. function:: _pipeline(controller, requests, outcomes)
+        """
+        # Only what is still unanswered, as this is run again on a fresh connection if the pooled one had closed
+        pending = collections.deque(entry for entry in requests if outcomes[entry[0]] is None)
+        inflight = collections.deque()
+
+        while pending or inflight:
+            while pending and len(inflight) < self.window:
+                entry = pending.popleft()
+                controller.send(entry[2])
+                inflight.append(entry)
+
+            index, command, request = inflight[0]
+            response = controller.receiveFrame(PACKET_SIZE)
+
+            try:
+                command.checkResponse(response)
+            except CommandException:
+                # The stream can no longer be trusted to pair responses with requests
+                controller.close()
+                raise
+
+            inflight.popleft()
+            outcomes[index] = response
+
+
+    def _emit(self, result):
+        """
+        Write a result to the output and count it.
+
+           :param result: the result
+           :type result: dict
+
+        .. versionadded:: 0.2.0
+        .. function:: _emit(result)
+        """
+        with self.outputLock:
+            if result["ok"]:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+
+            self.output.write(json.dumps(result, sort_keys=True) + "\n")
+            self.output.flush()
+
+
+
+
+def parseLine(line):
+    """
+    Parse a batch line of the form `SERIAL HOST[:PORT] COMMAND [ARGUMENT ...]`.
+
+       :param line: the line to parse
+       :type line: str
+
+       :returns: the parsed command, with `serial`, `host`, `port`, `command`, and `args`
+       :rtype: dict
+
+       :raises ValueError: if the line is malformed or the serial number or port is invalid
+
+    .. versionadded:: 0.2.0
+    .. function:: parseLine(line)
+    """
+    fields = line.split()
+
+    if len(fields) < 3:
+        raise ValueError("Expected SERIAL HOST[:PORT] COMMAND [ARGUMENT ...]; received \"%s\"." % line)
+
+    try:
+        serial = SerialNumber(fields[0])
+    except Exception as e:
+        raise ValueError(str(e))
+
+    host, port = parseTarget(fields[1])
+
+    return {
+        "serial": serial,
+        "host": host,
+        "port": port,
+        "command": fields[2],
+        "args": fields[3:],
+    }
@@ -0,0 +1,492 @@
+# -*- coding: utf-8 -*-
+"""
+Provides capture of control board traffic to a compact binary file, and replay of captures for offline testing.
+
+A capture file starts with the 5-byte header `UHPC\\x01`, followed by one record per packet::
+
+   <timestamp: float64> <serial: uint32> <direction: uint8> <length: uint16> <packet: length bytes>
+
+All fields are little-endian; the timestamp is in seconds since the epoch and the serial number is read from the
+packet itself.  A 64-byte packet takes 79 bytes on disk.
+
+   :copyright: (c) 2017 by Andrew Vaughan.
+   :license: Apache 2.0, see LICENSE for more details.
+
+.. module:: capture
+"""
+
+import collections
+import logging
+import struct
+import threading
+import time
+
+try:
+    import SocketServer as socketserver
+except ImportError:
+    import socketserver
+
+from .commands import PACKET_SIZE
+from .controller_socket import ControllerSocket
+
+
+CAPTURE_HEADER = b"UHPC\x01"
+CAPTURE_RECORD = struct.Struct("<dIBH")
+
+DIRECTION_SENT = 0
+DIRECTION_RECEIVED = 1
+
+
+class CaptureWriter(object):
+    """
+    Records packets sent to and received from control boards to a capture file.
+
+    Pass a writer to `ControllerSocket.setRecorder()` (or to a `ConnectionPool`) to record traffic.  Writes are
+    serialized, so one writer can be shared by every socket in a process.
+
+    .. class:: CaptureWriter
+    .. versionadded:: 0.2.0
+    """
+
+    def __init__(self, path):
+        """
+        Create a capture file, replacing any existing file at the path.
+
+           :param path: the path of the capture file
+           :type path: str
+
+           :raises IOError: if the file cannot be created
+
+        .. versionadded:: 0.2.0
+        .. function:: __init__(path)
+        """
+        self.logger = logging.getLogger("UHPPOTE.CaptureWriter")
+
+        self.path = path
+        self.file = open(path, "wb")
+        self.file.write(CAPTURE_HEADER)
+        self.lock = threading.Lock()
+        self.count = 0
+
+
+    def recordSent(self, data):
+        """
+        Record a packet sent to a control board.
+
+           :param data: the packet
+           :type data: bytes or bytearray or memoryview
+
+        .. versionadded:: 0.2.0
+        .. function:: recordSent(data)
+        """
+        self.record(DIRECTION_SENT, data)
+
+
+    def recordReceived(self, data):
+        """
+        Record a packet received from a control board.
+
+           :param data: the packet
+           :type data: bytes or bytearray or memoryview
+
+        .. versionadded:: 0.2.0
+        .. function:: recordReceived(data)
+        """
+        self.record(DIRECTION_RECEIVED, data)
+
+
+    def record(self, direction, data, timestamp=None):
+        """
+        Append a packet to the capture file.
+
+           :param direction: `DIRECTION_SENT` or `DIRECTION_RECEIVED`
+           :type direction: int
+           :param data: the packet
+           :type data: bytes or bytearray or memoryview
+           :param timestamp: the time the packet was sent or received (default: now)
+           :type timestamp: float
+
+           :raises ValueError: if the packet is longer than 65535 bytes
+
+        .. versionadded:: 0.2.0
+        .. function:: record(direction, data[, timestamp = None])
+        """
+        data = bytes(bytearray(data))
+
+        if len(data) > 0xffff:
+            raise ValueError("Packet too long to capture: %d bytes." % len(data))
+
+        header = CAPTURE_RECORD.pack(
+            time.time() if timestamp is None else timestamp,
+            getPacketSerial(data),
+            direction,
+            len(data)
+        )
+
+        with self.lock:
+            if self.file is None:
+                return
+
+            self.file.write(header + data)
+            self.count += 1
+
+
+    def close(self):
+        """
+        Flush and close the capture file.  Packets recorded afterwards are dropped.
+
+        .. versionadded:: 0.2.0
+        .. function:: close()
+        """
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+
+
+def getPacketSerial(data):
+    """
+    Return the serial number addressed by a packet, or 0 if the packet is too short to hold one.
+
+       :param data: the packet
+       :type data: bytes or bytearray or memoryview
+
+       :returns: the serial number
+       :rtype: int
+
+    .. versionadded:: 0.2.0
+    .. function:: getPacketSerial(data)
+    """
+    if len(data) < 8:
+        return 0
+
+    return struct.unpack_from("<I", data, 4)[0]
+
+
+def readCapture(path):
+    """
+    Read the records of a capture file in order.
+
+       :param path: the path of the capture file
+       :type path: str
+
+       :returns: a generator of `(timestamp, serial, direction, packet)` tuples
+       :rtype: generator
+
+       :raises CaptureException: if the file is not a capture file or is truncated
+       :raises IOError: if the file cannot be read
+
+    .. versionadded:: 0.2.0
+    .. function:: readCapture(path)
+    """
+    with open(path, "rb") as capture:
+        if capture.read(len(CAPTURE_HEADER)) != CAPTURE_HEADER:
+            raise CaptureException("Not a capture file: %s" % path)
+
+        while True:
+            header = capture.read(CAPTURE_RECORD.size)
+            if not header:
+                return
+
+            if len(header) < CAPTURE_RECORD.size:
+                raise CaptureException("Truncated record header in %s." % path)
+
+            timestamp, serial, direction, length = CAPTURE_RECORD.unpack(header)
+            data = capture.read(length)
+
+            if len(data) < length:
+                raise CaptureException("Truncated record in %s." % path)
+
+            yield timestamp, serial, direction, bytearray(data)
+
+
+def replayTraffic(records, host, port=60000, speed=1.0, profile="low-latency"):
+    """
+    Send the recorded requests of a capture to a control board (or `ReplayServer`) at their recorded pace.
+
+    Each board's requests are sent in order from its own thread over its own connection, so the load pattern across
+    boards is reproduced.
+
+       :param records: the capture records, as returned by `readCapture()`
+       :type records: iterable
+       :param host: the hostname or IP address to send to
+       :type host: str
+       :param port: the port to send to (default: 60000)
+       :type port: int
+       :param speed: how many times faster than recorded to send (default: 1.0)
+       :type speed: float
+       :param profile: the socket profile for each board's connection (default: "low-latency")
+       :type profile: str or dict
+
+       :returns: the number of requests `sent` and `failed`, the `duration` in seconds, and every round trip
+          `latencies` in seconds
+       :rtype: dict
+
+       :raises ValueError: if speed is not positive
+
+    .. versionadded:: 0.2.0
+    .. function:: replayTraffic(records, host[, port = 60000, speed = 1.0, profile = "low-latency"])
+    """
+    if float(speed) <= 0:
+        raise ValueError("Invalid replay speed: %s" % speed)
+
+    boards = collections.OrderedDict()
+    first = None
+
+    for timestamp, serial, direction, data in records:
+        if direction != DIRECTION_SENT:
+            continue
+
+        if first is None:
+            first = timestamp
+
+        boards.setdefault(serial, []).append(((timestamp - first) / float(speed), data))
+
+    report = {"sent": 0, "failed": 0, "latencies": []}
+    lock = threading.Lock()
+    start = time.time()
+
+    def run(requests):
+        # A connection per board; boards sharing one would be served one at a time
+        controller = ControllerSocket(host, port, profile)
+
+        try:
+            for delay, data in requests:
+                time.sleep(max(0.0, start + delay - time.time()))
+                sent = time.time()
+
+                try:
+                    if not controller.isConnected():
+                        controller.connect(attempts=1)
+
+                    _sendAndReceiveFrame(controller, data)
+
+                except Exception as e:
+                    logging.getLogger("UHPPOTE.capture").debug("Replayed request failed: %s" % str(e))
+                    controller.close()
+
+                    with lock:
+                        report["failed"] += 1
+
+                    continue
+
+                with lock:
+                    report["sent"] += 1
+                    report["latencies"].append(time.time() - sent)
+
+        finally:
+            controller.close()
+
+    threads = []
+    for requests in boards.values():
+        thread = threading.Thread(target=run, args=(requests,), name="UHPPOTE-Replay")
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+
+    for thread in threads:
+        thread.join()
+
+    report["duration"] = time.time() - start
+    return report
+
+
+def _sendAndReceiveFrame(controller, data):
+    """
+    Send a packet and return the next well-formed response.
+
+    .. versionadded:: 0.2.0
+    """
+    controller.send(data)
+    return controller.receiveFrame(len(data))
+
+
+
+
+class ReplayServer(object):
+    """
+    A local fake control board answering requests with the responses recorded in a capture.
+
+    Responses are matched to requests by serial number and function code and served in recorded order, wrapping
+    around when exhausted, after the recorded response time divided by `speed`.  Requests with no recorded response
+    are echoed back.
+
+    .. class:: ReplayServer
+    .. versionadded:: 0.2.0
+    """
+
+    def __init__(self, records, host="127.0.0.1", port=0, speed=1.0):
+        """
+        Initialize a new ReplayServer.  The server is not opened until `start()` is called.
+
+           :param records: the capture records, as returned by `readCapture()`
+           :type records: iterable
+           :param host: the address to listen on (default: 127.0.0.1)
+           :type host: str
+           :param port: the port to listen on; 0 picks a free port (default: 0)
+           :type port: int
+           :param speed: how many times faster than recorded to respond (default: 1.0)
+           :type speed: float
+
+           :raises ValueError: if speed is not positive
+
+        .. versionadded:: 0.2.0
+        .. function:: __init__(records[, host = "127.0.0.1", port = 0, speed = 1.0])
+        """
+        self.logger = logging.getLogger("UHPPOTE.ReplayServer")
+
+        if float(speed) <= 0:
+            raise ValueError("Invalid replay speed: %s" % speed)
+
+        self.host = host
+        self.port = int(port)
+        self.speed = float(speed)
+        self.responses = {}
+        self.positions = {}
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+
+        pending = {}
+
+        for timestamp, serial, direction, data in records:
+            if direction == DIRECTION_SENT:
+                pending.setdefault(serial, collections.deque()).append(timestamp)
+
+            elif len(data) > 1:
+                sent = pending[serial].popleft() if pending.get(serial) else timestamp
+                self.responses.setdefault((serial, data[1]), []).append((bytes(data), max(0.0, timestamp - sent)))
+
+
+    def respond(self, request):
+        """
+        Return the response to a request, and the seconds to wait before sending it.
+
+           :param request: the request packet
+           :type request: bytearray
+
+           :returns: a tuple of the response and the delay
+           :rtype: tuple
+
+        .. versionadded:: 0.2.0
+        .. function:: respond(request)
+        """
+        key = (getPacketSerial(request), request[1])
+        responses = self.responses.get(key)
+
+        if not responses:
+            return bytes(request), 0.0
+
+        with self.lock:
+            position = self.positions.get(key, 0)
+            self.positions[key] = (position + 1) % len(responses)
+
+        response, delay = responses[position]
+        return response, delay / self.speed
+
+
+    def start(self):
+        """
+        Open the server and answer requests in a background thread.
+
+        .. versionadded:: 0.2.0
+        .. function:: start()
+        """
+        self.server = _ReplayTCPServer((self.host, self.port), _ReplayHandler)
+        self.server.replay = self
+        self.port = self.server.server_address[1]
+
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.1,), name="UHPPOTE-ReplayServer")
+        self.thread.daemon = True
+        self.thread.start()
+
+
+    def shutdown(self):
+        """
+        Stop answering requests and close the server.
+
+        .. versionadded:: 0.2.0
+        .. function:: shutdown()
+        """
+        if self.server is None:
+            return
+
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+
+        self.server = None
+        self.thread = None
+
+
+    def getPort(self):
+        """
+        Return the port the server listens on, which is only known after starting if 0 was requested.
+
+           :returns: the port
+           :rtype: int
+
+        .. versionadded:: 0.2.0
+        .. function:: getPort()
+        """
+        return self.port
+
+
+
+
+class _ReplayTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """
+    TCP server handling each client connection in its own thread.
+
+    .. versionadded:: 0.2.0
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _ReplayHandler(socketserver.BaseRequestHandler):
+    """
+    Answers 64-byte requests from a client connection with recorded responses.
+
+    .. versionadded:: 0.2.0
+    """
+
+    def handle(self):
+        """
+        Serve requests until the client disconnects.
+
+        .. versionadded:: 0.2.0
+        .. function:: handle()
+        """
+        buffered = bytearray()
+
+        while True:
+            chunk = self.request.recv(4096)
+            if not chunk:
+                return
+
+            buffered.extend(chunk)
+
+            while len(buffered) >= PACKET_SIZE:
+                response, delay = self.server.replay.respond(buffered[:PACKET_SIZE])
+                del buffered[:PACKET_SIZE]
+
+                if delay:
+                    time.sleep(delay)
+
+                self.request.sendall(response)
+
+
+
+
+class CaptureException(Exception):
+    """
+    Custom exception raised if a capture file is invalid.
+
+    .. versionadded:: 0.2.0
+    """
+
+    pass
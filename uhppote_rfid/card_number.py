@@ -0,0 +1,634 @@
+# -*- coding: utf-8 -*-
+"""
+Provides card number support for UHPPOTE RFID control boards.
+
+Control boards store a card as a 32-bit number: the facility code in the upper 16 bits and the card number in the
+lower 16 bits, sent little-endian.  Badges are printed in that decimal form or as "facility,card", and readers report
+the raw 26-bit or 34-bit Wiegand frame, which wraps the same number in two parity bits.
+
+Besides the `CardNumber` class, the module provides column-wise conversions for bulk imports.  They accept any
+sequence of integers and return typed arrays; given NumPy arrays, they return NumPy arrays and run without a Python
+loop.
+
+   :copyright: (c) 2017 by Andrew Vaughan.
+   :license: Apache 2.0, see LICENSE for more details.
+
+.. module:: CardNumber
+"""
+
+import array
+import logging
+import numbers
+import struct
+import sys
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .compat import INTEGER_TYPES, STRING_TYPES
+
+
+CARD_MAXIMUM = 0xFFFFFFFF
+
+WIEGAND_26 = 26
+WIEGAND_34 = 34
+
+# The largest facility code each format can carry
+FACILITY_MAXIMUM = {
+    WIEGAND_26: 0xFF,
+    WIEGAND_34: 0xFFFF,
+}
+
+# Smallest array types holding 32 and 64 bits
+_UINT32 = 'I' if array.array('I').itemsize >= 4 else 'L'
+_UINT64 = 'Q' if sys.version_info >= (3, 3) else 'L'
+
+# Parity of every 16-bit value, built on first use
+_parity = None
+
+
+class CardNumber(object):
+    """
+    Manages access card numbers for UHPPOTE RFID systems.
+
+    .. class:: CardNumber
+    .. versionadded:: 0.2.0
+    """
+
+    def __init__(self, card, facility=None):
+        """
+        Initialize a new CardNumber.  Card numbers can be provided in one of several formats.
+
+        Card Number Formats
+        -------------------
+
+        Decimal `int` or `str`
+        ++++++++++++++++++++++
+        The full card number, as printed on most badges (e.g., 8405236 or "0008405236").
+
+        Facility and Card
+        +++++++++++++++++
+        A facility code and card number, either as a "facility,card" or "facility:card" string (e.g., "128,16628"), or
+        as a card number with the `facility` parameter.
+
+           :param card: the card number
+           :type card: str or int
+           :param facility: the facility code, if `card` holds only the card number (default: None)
+           :type facility: int
+
+           :raises CardNumberException: if the provided card number is in the incorrect format or out of bounds
+
+        .. versionadded:: 0.2.0
+        .. function:: __init__(card[, facility = None])
+        """
+        self.logger = logging.getLogger("UHPPOTE.CardNumber")
+
+        if isinstance(card, STRING_TYPES):
+            card = original = card.strip()
+
+            for separator in (",", ":"):
+                if separator in card:
+                    if facility is not None:
+                        raise CardNumberException("CardNumber given a facility code twice.  Received \"%s\"." % original)
+
+                    facility, card = card.split(separator, 1)
+                    break
+
+            try:
+                card = int(card)
+                facility = None if facility is None else int(facility)
+            except ValueError:
+                raise CardNumberException("CardNumber as string must be decimal or \"facility,card\".  Received \"%s\"." % original)
+
+        elif not isinstance(card, INTEGER_TYPES) or isinstance(card, bool):
+            raise CardNumberException("CardNumber provided as unknown type.  Expected integer or string.")
+
+        if facility is None:
+            if card < 0 or card > CARD_MAXIMUM:
+                raise CardNumberException("CardNumber is out of bounds.  Must be between 0 and %d.  Received \"%d\"." % (CARD_MAXIMUM, card))
+
+            self.cardInteger = int(card)
+
+        else:
+            self.cardInteger = _combine(int(facility), int(card), WIEGAND_34)
+
+        self.logger.debug("Card number stored as %d (%d,%d)." % (self.cardInteger, self.getFacility(), self.getCard()))
+
+
+    def __str__(self):
+        """
+        Return a string representation of the CardNumber.
+
+           :returns: the card number as a decimal string
+           :rtype: str
+
+        .. versionadded:: 0.2.0
+        .. function:: __str__()
+        """
+        return str(self.getInteger())
+
+
+    def getInteger(self):
+        """
+        Return the full card number, as the control board stores it.
+
+           :returns: the card number
+           :rtype: int
+
+        .. versionadded:: 0.2.0
+        .. function:: getInteger()
+        """
+        return self.cardInteger
+
+
+    def getFacility(self):
+        """
+        Return the facility code.
+
+           :returns: the facility code
+           :rtype: int
+
+        .. versionadded:: 0.2.0
+        .. function:: getFacility()
+        """
+        return self.cardInteger >> 16
+
+
+    def getCard(self):
+        """
+        Return the card number within the facility.
+
+           :returns: the card number
+           :rtype: int
+
+        .. versionadded:: 0.2.0
+        .. function:: getCard()
+        """
+        return self.cardInteger & 0xFFFF
+
+
+    def getFacilityString(self):
+        """
+        Return the card number as a "facility,card" string, as printed on some badges.
+
+           :returns: the card number as a string
+           :rtype: str
+
+        .. versionadded:: 0.2.0
+        .. function:: getFacilityString()
+        """
+        return "%d,%05d" % (self.getFacility(), self.getCard())
+
+
+    def getWiegand(self, bits=WIEGAND_26):
+        """
+        Return the card number as a raw Wiegand frame, including parity bits.
+
+           :param bits: the frame length, `WIEGAND_26` or `WIEGAND_34` (default: `WIEGAND_26`)
+           :type bits: int
+
+           :returns: the raw frame
+           :rtype: int
+
+           :raises CardNumberException: if the format is unknown or the facility code is too large for it
+
+        .. versionadded:: 0.2.0
+        .. function:: getWiegand([bits = WIEGAND_26])
+        """
+        return encodeWiegand(self.cardInteger, bits)
+
+
+    def getByteArray(self):
+        """
+        Return the card number as the 4-byte, little-endian field the control board expects.
+
+           :returns: the card number as a 4-length array of bytes
+           :rtype: bytearray
+
+        .. versionadded:: 0.2.0
+        .. function:: getByteArray()
+        """
+        return bytearray(struct.pack("<I", self.cardInteger))
+
+
+
+
+def encodeWiegand(card, bits=WIEGAND_26):
+    """
+    Wrap a card number in a raw Wiegand frame: an even parity bit over the upper half of the data, the data, and an odd
+    parity bit over the lower half.
+
+       :param card: the full card number
+       :type card: int
+       :param bits: the frame length, `WIEGAND_26` or `WIEGAND_34` (default: `WIEGAND_26`)
+       :type bits: int
+
+       :returns: the raw frame
+       :rtype: int
+
+       :raises CardNumberException: if the format is unknown or the card number does not fit it
+
+    .. versionadded:: 0.2.0
+    .. function:: encodeWiegand(card[, bits = WIEGAND_26])
+    """
+    half, limit = _getFormat(bits)
+
+    if card < 0 or card >= limit:
+        raise CardNumberException("Card number %d does not fit a %d-bit Wiegand frame." % (card, bits))
+
+    parity = _getParity()
+    return (parity[card >> half] << (bits - 1)) | (card << 1) | (parity[card & ((1 << half) - 1)] ^ 1)
+
+
+def decodeWiegand(raw, bits=WIEGAND_26):
+    """
+    Return the card number in a raw Wiegand frame, checking both parity bits.
+
+       :param raw: the raw frame
+       :type raw: int
+       :param bits: the frame length, `WIEGAND_26` or `WIEGAND_34` (default: `WIEGAND_26`)
+       :type bits: int
+
+       :returns: the full card number
+       :rtype: int
+
+       :raises CardNumberException: if the format is unknown, or the frame is too long or fails its parity check
+
+    .. versionadded:: 0.2.0
+    .. function:: decodeWiegand(raw[, bits = WIEGAND_26])
+    """
+    half, limit = _getFormat(bits)
+
+    if raw < 0 or raw >> bits:
+        raise CardNumberException("Raw value %d is not a %d-bit Wiegand frame." % (raw, bits))
+
+    card = (raw >> 1) & (limit - 1)
+    parity = _getParity()
+
+    if parity[card >> half] != raw >> (bits - 1) or parity[card & ((1 << half) - 1)] == raw & 1:
+        raise CardNumberException("Wiegand frame %d fails its parity check." % raw)
+
+    return card
+
+
+def combineCards(facilities, cards, bits=WIEGAND_26):
+    """
+    Combine columns of facility codes and card numbers into full card numbers.
+
+       :param facilities: the facility codes
+       :type facilities: sequence or numpy.ndarray
+       :param cards: the card numbers within each facility
+       :type cards: sequence or numpy.ndarray
+       :param bits: the Wiegand format that bounds the facility codes (default: `WIEGAND_26`)
+       :type bits: int
+
+       :returns: the full card numbers
+       :rtype: array.array or numpy.ndarray
+
+       :raises CardNumberException: if the columns differ in length or a value is out of bounds
+
+    .. versionadded:: 0.2.0
+    .. function:: combineCards(facilities, cards[, bits = WIEGAND_26])
+    """
+    _getFormat(bits)
+
+    if len(facilities) != len(cards):
+        raise CardNumberException("Expected as many card numbers as facility codes; received %d and %d." % (len(cards), len(facilities)))
+
+    if not len(cards):
+        return _empty(cards, _UINT32)
+
+    _checkBounds(facilities, FACILITY_MAXIMUM[bits], "Facility code")
+    _checkBounds(cards, 0xFFFF, "Card number")
+
+    if _isNumpy(facilities) or _isNumpy(cards):
+        return (numpy.asarray(facilities, dtype=numpy.uint32) << numpy.uint32(16)) | numpy.asarray(cards, dtype=numpy.uint32)
+
+    return array.array(_UINT32, [(facility << 16) | card for facility, card in zip(facilities, cards)])
+
+
+def splitCards(values):
+    """
+    Split a column of full card numbers into facility codes and card numbers.
+
+       :param values: the full card numbers
+       :type values: sequence or numpy.ndarray
+
+       :returns: the facility codes and the card numbers within each facility
+       :rtype: tuple
+
+    .. versionadded:: 0.2.0
+    .. function:: splitCards(values)
+    """
+    if _isNumpy(values):
+        values = numpy.asarray(values, dtype=numpy.uint32)
+        return values >> numpy.uint32(16), values & numpy.uint32(0xFFFF)
+
+    return array.array(_UINT32, [value >> 16 for value in values]), array.array(_UINT32, [value & 0xFFFF for value in values])
+
+
+def parseCards(values):
+    """
+    Parse a column of card numbers as printed on badges, in either decimal or "facility,card" form.  Integers are
+    taken as full card numbers; other types, such as floats, are rejected rather than truncated.
+
+       :param values: the printed card numbers, as strings or integers
+       :type values: iterable
+
+       :returns: the full card numbers
+       :rtype: array.array
+
+       :raises CardNumberException: if a card number is malformed or out of bounds
+
+    .. versionadded:: 0.2.0
+    .. function:: parseCards(values)
+    """
+    cards = array.array(_UINT32)
+
+    for value in values:
+        # Plain decimals are by far the most common; anything else takes the CardNumber path, which rejects floats
+        if isinstance(value, STRING_TYPES) or isinstance(value, numbers.Integral) and not isinstance(value, bool):
+            try:
+                cards.append(int(value))
+                continue
+            except (ValueError, OverflowError):
+                pass
+
+        cards.append(CardNumber(value).getInteger())
+
+    return cards
+
+
+def encodeWiegandArray(values, bits=WIEGAND_26):
+    """
+    Wrap a column of full card numbers in raw Wiegand frames.
+
+       :param values: the full card numbers
+       :type values: sequence or numpy.ndarray
+       :param bits: the frame length, `WIEGAND_26` or `WIEGAND_34` (default: `WIEGAND_26`)
+       :type bits: int
+
+       :returns: the raw frames
+       :rtype: array.array or numpy.ndarray
+
+       :raises CardNumberException: if the format is unknown or a card number does not fit it
+
+    .. versionadded:: 0.2.0
+    .. function:: encodeWiegandArray(values[, bits = WIEGAND_26])
+    """
+    half, limit = _getFormat(bits)
+
+    if not len(values):
+        return _empty(values, _UINT64)
+
+    _checkBounds(values, limit - 1, "Card number")
+
+    mask = (1 << half) - 1
+    parity = _getParity()
+
+    if _isNumpy(values):
+        values = numpy.asarray(values, dtype=numpy.uint64)
+        table = numpy.frombuffer(bytes(parity), dtype=numpy.uint8).astype(numpy.uint64)
+
+        half, top, one = numpy.uint64(half), numpy.uint64(bits - 1), numpy.uint64(1)
+        return (table[values >> half] << top) | (values << one) | (table[values & numpy.uint64(mask)] ^ one)
+
+    top = bits - 1
+    return array.array(_UINT64, [(parity[value >> half] << top) | (value << 1) | (parity[value & mask] ^ 1)
+                                 for value in values])
+
+
+def decodeWiegandArray(raws, bits=WIEGAND_26):
+    """
+    Return the card numbers in a column of raw Wiegand frames, checking every parity bit.
+
+       :param raws: the raw frames
+       :type raws: sequence or numpy.ndarray
+       :param bits: the frame length, `WIEGAND_26` or `WIEGAND_34` (default: `WIEGAND_26`)
+       :type bits: int
+
+       :returns: the full card numbers
+       :rtype: array.array or numpy.ndarray
+
+       :raises CardNumberException: if the format is unknown, or a frame is too long or fails its parity check
+
+    .. versionadded:: 0.2.0
+    .. function:: decodeWiegandArray(raws[, bits = WIEGAND_26])
+    """
+    half, limit = _getFormat(bits)
+
+    if not len(raws):
+        return _empty(raws, _UINT32)
+
+    _checkBounds(raws, (1 << bits) - 1, "Raw Wiegand frame")
+
+    mask = (1 << half) - 1
+    parity = _getParity()
+
+    if _isNumpy(raws):
+        raws = numpy.asarray(raws, dtype=numpy.uint64)
+        table = numpy.frombuffer(bytes(parity), dtype=numpy.uint8).astype(numpy.uint64)
+
+        half, top, one = numpy.uint64(half), numpy.uint64(bits - 1), numpy.uint64(1)
+        cards = (raws >> one) & numpy.uint64(limit - 1)
+        bad = (table[cards >> half] != raws >> top) | (table[cards & numpy.uint64(mask)] == raws & one)
+
+        if bad.any():
+            raise CardNumberException("Wiegand frame %d fails its parity check." % int(raws[bad.argmax()]))
+
+        return cards.astype(numpy.uint32)
+
+    cards = array.array(_UINT32, [(raw >> 1) & (limit - 1) for raw in raws])
+    top = bits - 1
+
+    for raw, card in zip(raws, cards):
+        if parity[card >> half] != raw >> top or parity[card & mask] == raw & 1:
+            raise CardNumberException("Wiegand frame %d fails its parity check." % raw)
+
+    return cards
+
+
+def packCards(values):
+    """
+    Pack a column of full card numbers into consecutive 4-byte, little-endian fields.
+
+       :param values: the full card numbers
+       :type values: sequence or numpy.ndarray
+
+       :returns: the packed fields
+       :rtype: bytes
+
+       :raises CardNumberException: if a card number is out of bounds
+
+    .. versionadded:: 0.2.0
+    .. function:: packCards(values)
+    """
+    if not len(values):
+        return b""
+
+    _checkBounds(values, CARD_MAXIMUM, "Card number")
+
+    if _isNumpy(values):
+        return numpy.asarray(values, dtype="<u4").tobytes()
+
+    if array.array(_UINT32).itemsize != 4:
+        return struct.pack("<%dI" % len(values), *values)
+
+    values = array.array(_UINT32, values)
+
+    if sys.byteorder != "little":
+        values.byteswap()
+
+    return _toBytes(values)
+
+
+def unpackCards(data):
+    """
+    Unpack consecutive 4-byte, little-endian card number fields.
+
+       :param data: the packed fields
+       :type data: bytes or bytearray
+
+       :returns: the full card numbers
+       :rtype: array.array
+
+       :raises CardNumberException: if the data is not a whole number of fields
+
+    .. versionadded:: 0.2.0
+    .. function:: unpackCards(data)
+    """
+    if len(data) % 4:
+        raise CardNumberException("Packed card numbers must be a multiple of 4 bytes; received %d." % len(data))
+
+    values = array.array(_UINT32)
+
+    if values.itemsize != 4:
+        values.extend(struct.unpack("<%dI" % (len(data) // 4), bytes(data)))
+        return values
+
+    _fromBytes(values, bytes(data))
+
+    if sys.byteorder != "little":
+        values.byteswap()
+
+    return values
+
+
+def _combine(facility, card, bits):
+    """
+    Return the full card number for a facility code and card number, checking both against the format.
+
+    .. versionadded:: 0.2.0
+    """
+    if facility < 0 or facility > FACILITY_MAXIMUM[bits]:
+        raise CardNumberException("Facility code is out of bounds.  Must be between 0 and %d.  Received \"%d\"." % (FACILITY_MAXIMUM[bits], facility))
+
+    if card < 0 or card > 0xFFFF:
+        raise CardNumberException("Card number is out of bounds.  Must be between 0 and 65535.  Received \"%d\"." % card)
+
+    return (facility << 16) | card
+
+
+def _getFormat(bits):
+    """
+    Return the number of data bits covered by each parity bit, and the exclusive upper bound of the card number, for a
+    Wiegand format.
+
+    .. versionadded:: 0.2.0
+    """
+    if bits not in FACILITY_MAXIMUM:
+        raise CardNumberException("Unknown Wiegand format.  Expected 26 or 34 bits; received %s." % bits)
+
+    return (bits - 2) // 2, 1 << (bits - 2)
+
+
+def _getParity():
+    """
+    Return a table of the parity of every 16-bit value, building it on first use.
+
+    .. versionadded:: 0.2.0
+    """
+    global _parity
+
+    if _parity is None:
+        table = bytearray(1 << 16)
+
+        for value in range(1, 1 << 16):
+            table[value] = table[value >> 1] ^ (value & 1)
+
+        _parity = table
+
+    return _parity
+
+
+def _checkBounds(values, maximum, name):
+    """
+    Check that every value in a column is between 0 and a maximum, reporting the first that is not.
+
+    .. versionadded:: 0.2.0
+    """
+    if _isNumpy(values):
+        if values.min() >= 0 and values.max() <= maximum:
+            return
+
+    elif min(values) >= 0 and max(values) <= maximum:
+        return
+
+    value = next(value for value in values if not 0 <= value <= maximum)
+    raise CardNumberException("%s is out of bounds.  Must be between 0 and %d.  Received \"%d\"." % (name, maximum, value))
+
+
+def _isNumpy(values):
+    """
+    Return whether a column is a NumPy array.
+
+    .. versionadded:: 0.2.0
+    """
+    return numpy is not None and isinstance(values, numpy.ndarray)
+
+
+def _empty(values, typecode):
+    """
+    Return an empty column of the same kind as the input.
+
+    .. versionadded:: 0.2.0
+    """
+    if _isNumpy(values):
+        return numpy.zeros(0, dtype=numpy.uint32 if typecode == _UINT32 else numpy.uint64)
+
+    return array.array(typecode)
+
+
+def _toBytes(values):
+    """
+    Return the contents of a typed array as bytes.
+
+    .. versionadded:: 0.2.0
+    """
+    return values.tobytes() if hasattr(values, "tobytes") else values.tostring()
+
+
+def _fromBytes(values, data):
+    """
+    Append bytes to a typed array.
+
+    .. versionadded:: 0.2.0
+    """
+    if hasattr(values, "frombytes"):
+        values.frombytes(data)
+    else:
+        values.fromstring(data)
+
+
+
+
+class CardNumberException(Exception):
+    """
+    Custom exception for use with CardNumber objects.
+
+    .. versionadded:: 0.2.0
+    """
+
+    pass
@@ -0,0 +1,497 @@
+# -*- coding: utf-8 -*-
+"""
+Provides per-controller circuit breakers, so calls to a board known to be offline fail immediately.
+
+A breaker starts `closed` and tracks the outcome of recent connection attempts.  When the failure rate crosses the
+threshold it `opens`, and every call is rejected with `CircuitOpenException` without touching the network.  Once the
+reset timeout passes, the breaker is `half-open`: a single trial (from a caller, or from the registry's background
+prober) decides whether it closes again or reopens with a doubled timeout.  A trial that reports no outcome within the
+trial timeout is abandoned, and the next call is admitted as a new trial.
+
+   :copyright: (c) 2017 by Andrew Vaughan.
+   :license: Apache 2.0, see LICENSE for more details.
+
+.. module:: CircuitBreaker
+"""
+
+import collections
+import logging
+import threading
+import time
+
+from .controller_socket import ControllerSocket, SocketConnectionException
+from .health_monitor import connectProbe
+from .rtt import RTTEstimator
+
+
+STATE_CLOSED = 0
+STATE_OPEN = 1
+STATE_HALF_OPEN = 2
+
+STATE_NAMES = {
+    STATE_CLOSED: "closed",
+    STATE_OPEN: "open",
+    STATE_HALF_OPEN: "half-open",
+}
+
+
+class CircuitBreaker(object):
+    """
+    Tracks the health of one control board and rejects calls while it is known to be unreachable.
+
+    .. class:: CircuitBreaker
+    .. versionadded:: 0.2.0
+    """
+
+    def __init__(self, failureThreshold=0.5, minimumCalls=3, window=10, resetTimeout=5.0, maxResetTimeout=300.0,
+                 trialTimeout=30.0):
+        """
+        Initialize a new, closed CircuitBreaker.
+
+           :param failureThreshold: the fraction of failed calls in the window that opens the breaker (default: 0.5)
+           :type failureThreshold: float
+           :param minimumCalls: the number of calls in the window before the failure rate is judged (default: 3)
+           :type minimumCalls: int
+           :param window: the number of most recent calls considered (default: 10)
+           :type window: int
+           :param resetTimeout: seconds the breaker stays open before a trial call is allowed (default: 5.0)
+           :type resetTimeout: float
+           :param maxResetTimeout: the longest reset timeout after repeated failed trials (default: 300.0)
+           :type maxResetTimeout: float
+           :param trialTimeout: seconds a trial call may take to report its outcome before another is admitted
+              (default: 30.0)
+           :type trialTimeout: float
+
+           :raises ValueError: if the threshold is not between 0 and 1, a count is below 1, or a timeout is not positive
+
+        .. versionadded:: 0.2.0
+        .. function:: __init__([failureThreshold = 0.5, minimumCalls = 3, window = 10, resetTimeout = 5.0, ...])
+        """
+        if not 0 < float(failureThreshold) <= 1:
+            raise ValueError("Invalid failureThreshold for circuit breaker. Expected 0 to 1; received \"%s\"." % failureThreshold)
+
+        if int(minimumCalls) <= 0 or int(window) < int(minimumCalls):
+            raise ValueError("Invalid window for circuit breaker. Expected at least minimumCalls (%d); received %d." % (int(minimumCalls), int(window)))
+
+        if float(resetTimeout) <= 0 or float(maxResetTimeout) < float(resetTimeout):
+            raise ValueError("Invalid reset timeout for circuit breaker: %s" % resetTimeout)
+
+        if float(trialTimeout) <= 0:
+            raise ValueError("Invalid trial timeout for circuit breaker: %s" % trialTimeout)
+
+        self.failureThreshold = float(failureThreshold)
+        self.minimumCalls = int(minimumCalls)
+        self.resetTimeout = float(resetTimeout)
+        self.maxResetTimeout = float(maxResetTimeout)
+        self.trialTimeout = float(trialTimeout)
+
+        self.state = STATE_CLOSED
+        self.outcomes = collections.deque(maxlen=int(window))
+        self.failures = 0
+        self.timeout = self.resetTimeout
+        self.retryAt = 0.0
+        self.trialDeadline = 0.0
+        self.lock = threading.Lock()
+
+
+    def allow(self, now=None):
+        """
+        Check that a call may proceed, admitting a single trial call once an open breaker's timeout has passed, or once
+        the previous trial has gone unreported for the trial timeout.
+
+           :param now: the current time (default: `time.time()`)
+           :type now: float
+
+           :raises CircuitOpenException: if the breaker is open, or half-open with a trial already in progress
+
+        .. versionadded:: 0.2.0
+        .. function:: allow([now = None])
+        """
+        # Fast path: no lock while closed
+        if self.state == STATE_CLOSED:
+            return
+
+        now = time.time() if now is None else now
+
+        with self.lock:
+            if self.state == STATE_HALF_OPEN and now >= self.trialDeadline:
+                # The trial's caller never reported back; open again, already due for another trial
+                self.state = STATE_OPEN
+                self.retryAt = self.trialDeadline
+
+            if self.state == STATE_OPEN and now >= self.retryAt:
+                self.state = STATE_HALF_OPEN
+                self.trialDeadline = now + self.trialTimeout
+                return
+
+            if self.state != STATE_CLOSED:
+                raise CircuitOpenException("Circuit open; retrying in %.1f seconds." % max(self.getRetryAt() - now, 0.0))
+
+
+    def check(self, now=None):
+        """
+        Check that a call would be allowed, without admitting a trial call.
+
+        This lets callers reject work before queueing for a connection, leaving `allow()` to the call itself.
+
+           :param now: the current time (default: `time.time()`)
+           :type now: float
+
+           :raises CircuitOpenException: if the breaker is open and its timeout has not passed, or a trial is in progress
+
+        .. versionadded:: 0.2.0
+        .. function:: check([now = None])
+        """
+        if self.state == STATE_CLOSED:
+            return
+
+        now = time.time() if now is None else now
+
+        if not self.isDue(now):
+            raise CircuitOpenException("Circuit open; retrying in %.1f seconds." % max(self.getRetryAt() - now, 0.0))
+
+
+    def recordSuccess(self):
+        """
+        Record a successful call.  A half-open or open breaker closes.
+
+        .. versionadded:: 0.2.0
+        .. function:: recordSuccess()
+        """
+        with self.lock:
+            if self.state != STATE_CLOSED:
+                self.state = STATE_CLOSED
+                self.outcomes.clear()
+                self.failures = 0
+                self.timeout = self.resetTimeout
+                return
+
+            self._append(False)
+
+
+    def recordFailure(self, now=None):
+        """
+        Record a failed call.  A half-open breaker reopens with a doubled timeout; a closed breaker opens if the
+        failure rate crosses the threshold.  Failures reported while already open are ignored.
+
+           :param now: the current time (default: `time.time()`)
+           :type now: float
+
+        .. versionadded:: 0.2.0
+        .. function:: recordFailure([now = None])
+        """
+        now = time.time() if now is None else now
+
+        with self.lock:
+            if self.state == STATE_CLOSED:
+                self._append(True)
+
+                if len(self.outcomes) < self.minimumCalls or self.failures < self.failureThreshold * len(self.outcomes):
+                    return
+
+            elif self.state == STATE_HALF_OPEN:
+                self.timeout = min(self.timeout * 2, self.maxResetTimeout)
+
+            else:
+                return
+
+            self.state = STATE_OPEN
+            self.retryAt = now + self.timeout
+
+
+    def getState(self):
+        """
+        Return the state of the breaker.
+
+           :returns: `STATE_CLOSED`, `STATE_OPEN`, or `STATE_HALF_OPEN`
+           :rtype: int
+
+        .. versionadded:: 0.2.0
+        .. function:: getState()
+        """
+        return self.state
+
+
+    def getRetryAt(self):
+        """
+        Return when an open breaker next admits a trial call; for a half-open breaker, when its trial is abandoned.
+
+           :returns: the time, in seconds since the epoch
+           :rtype: float
+
+        .. versionadded:: 0.2.0
+        .. function:: getRetryAt()
+        """
+        return self.trialDeadline if self.state == STATE_HALF_OPEN else self.retryAt
+
+
+    def isDue(self, now=None):
+        """
+        Return whether an open or half-open breaker would admit a trial call now.
+
+           :param now: the current time (default: `time.time()`)
+           :type now: float
+
+           :returns: whether a trial call would be admitted; False for a closed breaker
+           :rtype: bool
+
+        .. versionadded:: 0.2.0
+        .. function:: isDue([now = None])
+        """
+        now = time.time() if now is None else now
+
+        if self.state == STATE_OPEN:
+            return now >= self.retryAt
+
+        return self.state == STATE_HALF_OPEN and now >= self.trialDeadline
+
+
+    def _append(self, failed):
+        """
+        Add an outcome to the window, keeping the failure count in step.  Must be called with the lock held.
+
+           :param failed: whether the call failed
+           :type failed: bool
+
+        .. versionadded:: 0.2.0
+        .. function:: _append(failed)
+        """
+        if len(self.outcomes) == self.outcomes.maxlen and self.outcomes[0]:
+            self.failures -= 1
+
+        self.outcomes.append(failed)
+
+        if failed:
+            self.failures += 1
+
+
+
+
+class CircuitBreakerRegistry(object):
+    """
+    Holds one `CircuitBreaker` per control board and probes open breakers in the background.
+
+    .. class:: CircuitBreakerRegistry
+    .. versionadded:: 0.2.0
+    """
+
+    def __init__(self, probe=connectProbe, interval=1.0, probeTimeout=2.0, concurrency=16, **options):
+        """
+        Initialize a new, empty CircuitBreakerRegistry.
+
+           :param probe: a callable given a `ControllerSocket`, raising an exception if the board is unreachable
+              (default: `connectProbe`)
+           :type probe: callable
+           :param interval: the longest time, in seconds, the background prober sleeps between checks (default: 1.0)
+           :type interval: float
+           :param probeTimeout: seconds each probe's connection may take to connect or answer (default: 2.0)
+           :type probeTimeout: float
+           :param concurrency: the most boards probed at once (default: 16)
+           :type concurrency: int
+           :param options: keyword arguments for each new `CircuitBreaker`
+
+           :raises ValueError: if the interval or probe timeout is not positive, the concurrency is below 1, or the
+              breaker options are invalid
+
+        .. versionadded:: 0.2.0
+        .. function:: __init__([probe = connectProbe, interval = 1.0, probeTimeout = 2.0, concurrency = 16, **options])
+        """
+        self.logger = logging.getLogger("UHPPOTE.CircuitBreakerRegistry")
+
+        if float(interval) <= 0:
+            raise ValueError("Invalid interval for circuit breaker registry: %s" % interval)
+
+        if float(probeTimeout) <= 0 or int(concurrency) <= 0:
+            raise ValueError("Invalid probe timeout or concurrency for circuit breaker registry: %s, %s" % (probeTimeout, concurrency))
+
+        # Fail on invalid options now rather than on first use
+        CircuitBreaker(**options)
+
+        self.probe = probe
+        self.interval = float(interval)
+        self.concurrency = int(concurrency)
+        self.options = options
+
+        # Probe connections time out after probeTimeout at most
+        self.estimator = RTTEstimator(initial=probeTimeout, minimum=min(0.2, float(probeTimeout)), maximum=probeTimeout)
+        self.breakers = {}
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stopping = threading.Event()
+
+
+    def get(self, host, port=60000):
+        """
+        Return the breaker for a control board, creating it on first use.
+
+           :param host: the hostname or IP address of the control board
+           :type host: str
+           :param port: the port of the control board (default: 60000)
+           :type port: int
+
+           :returns: the breaker
+           :rtype: CircuitBreaker
+
+        .. versionadded:: 0.2.0
+        .. function:: get(host[, port = 60000])
+        """
+        key = (host, int(port))
+        breaker = self.breakers.get(key)
+
+        if breaker is None:
+            with self.lock:
+                breaker = self.breakers.get(key)
+
+                if breaker is None:
+                    breaker = CircuitBreaker(**self.options)
+                    self.breakers[key] = breaker
+
+        return breaker
+
+
+    def probeDue(self, now=None):
+        """
+        Run a trial probe against every open breaker whose reset timeout has passed, and every half-open breaker whose
+        trial was abandoned.  Boards are probed concurrently, up to the registry's concurrency.
+
+           :param now: the current time (default: `time.time()`)
+           :type now: float
+
+           :returns: the number of boards probed
+           :rtype: int
+
+        .. versionadded:: 0.2.0
+        .. function:: probeDue([now = None])
+        """
+        now = time.time() if now is None else now
+
+        with self.lock:
+            due = [(key, breaker) for key, breaker in self.breakers.items() if breaker.isDue(now)]
+
+        trials = []
+
+        for key, breaker in due:
+            try:
+                breaker.allow(now)
+            except CircuitOpenException:
+                continue
+
+            trials.append((key, breaker))
+
+        # Threads take trials in turn, so one unreachable board does not delay the others
+        remaining = iter(trials)
+        remainingLock = threading.Lock()
+
+        def work():
+            while True:
+                with remainingLock:
+                    trial = next(remaining, None)
+
+                if trial is None:
+                    return
+
+                self._probe(trial[0], trial[1])
+
+        if len(trials) <= 1:
+            work()
+        else:
+            threads = [threading.Thread(target=work, name="UHPPOTE-BreakerProbe")
+                       for _ in range(min(self.concurrency, len(trials)))]
+
+            for thread in threads:
+                thread.daemon = True
+                thread.start()
+
+            for thread in threads:
+                thread.join()
+
+        return len(trials)
+
+
+    def start(self):
+        """
+        Start probing open breakers in a background thread.
+
+        .. versionadded:: 0.2.0
+        .. function:: start()
+        """
+        if self.thread is not None:
+            return
+
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self._run, name="UHPPOTE-CircuitBreakerRegistry")
+        self.thread.daemon = True
+        self.thread.start()
+
+
+    def stop(self):
+        """
+        Stop the background probing thread.
+
+        .. versionadded:: 0.2.0
+        .. function:: stop()
+        """
+        if self.thread is None:
+            return
+
+        self.stopping.set()
+        self.thread.join()
+        self.thread = None
+
+
+    def _probe(self, key, breaker):
+        """
+        Run a trial probe of a control board and record the outcome on its breaker.  A failure is recorded at the time
+        the probe finished, so a slow probe does not bring the next trial forward.
+
+           :param key: the host and port of the control board
+           :type key: tuple
+           :param breaker: the board's breaker, already admitting the trial
+           :type breaker: CircuitBreaker
+
+        .. versionadded:: 0.2.0
+        .. function:: _probe(key, breaker)
+        """
+        host, port = key
+
+        try:
+            controller = ControllerSocket(host, port)
+            controller.setEstimator(self.estimator)
+            self.probe(controller)
+
+        except Exception as e:
+            self.logger.debug("Probe of %s:%d failed: %s" % (host, port, str(e)))
+            breaker.recordFailure()
+
+        else:
+            self.logger.info("%s:%d is reachable again; closing circuit." % (host, port))
+            breaker.recordSuccess()
+
+
+    def _run(self):
+        """
+        Probe due breakers until stopped, sleeping until the next breaker is due.
+
+        .. versionadded:: 0.2.0
+        .. function:: _run()
+        """
+        while not self.stopping.is_set():
+            self.probeDue()
+
+            with self.lock:
+                retries = [breaker.getRetryAt() for breaker in self.breakers.values() if breaker.state != STATE_CLOSED]
+
+            wait = min(retries) - time.time() if retries else self.interval
+            self.stopping.wait(min(max(wait, 0.01), self.interval))
+
+
+
+
+class CircuitOpenException(SocketConnectionException):
+    """
+    Custom exception raised instead of connecting to a control board whose circuit breaker is open.
+
+    .. versionadded:: 0.2.0
+    """
+
+    pass
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+Provides a lightweight client for the UHPPOTE RFID daemon.
+
+This module deliberately imports nothing beyond the standard library, so short-lived scripts can hand commands to a
+running daemon without loading the rest of the package.
+
+   :copyright: (c) 2017 by Andrew Vaughan.
+   :license: Apache 2.0, see LICENSE for more details.
+
+.. module:: client
+"""
+
+import errno
+import json
+import os
+import socket
+import stat
+import tempfile
+
+
+def getDefaultSocketPath():
+    """
+    Return the daemon's socket path: `$UHPPOTE_SOCKET` if set, otherwise in the user's `$XDG_RUNTIME_DIR`, otherwise in
+    a directory of the user's own under the system's temporary directory.  A fixed path in a shared directory could be
+    claimed first by any local user.
+
+       :returns: the path of the daemon's Unix socket
+       :rtype: str
+
+    .. versionadded:: 0.2.0
+    .. function:: getDefaultSocketPath()
+    """
+    if os.environ.get("UHPPOTE_SOCKET"):
+        return os.environ["UHPPOTE_SOCKET"]
+
+    if os.environ.get("XDG_RUNTIME_DIR"):
+        return os.path.join(os.environ["XDG_RUNTIME_DIR"], "uhppote-rfid.sock")
+
+    user = os.getuid() if hasattr(os, "getuid") else os.environ.get("USERNAME", "user")
+    return os.path.join(tempfile.gettempdir(), "uhppote-rfid-%s" % user, "uhppote-rfid.sock")
+
+
+def checkSocketPath(path):
+    """
+    Check that a daemon's socket can be trusted: the socket, if it exists, must belong to the current user, and its
+    directory to the current user or root, and be writable by no one else unless it is sticky, as `/tmp` is.
+
+       :param path: the path of the daemon's Unix socket
+       :type path: str
+
+       :raises socket.error: if the socket or its directory could have been created or replaced by another user
+
+    .. versionadded:: 0.2.0
+    .. function:: checkSocketPath(path)
+    """
+    if not hasattr(os, "getuid"):
+        return
+
+    user = os.getuid()
+    directory = os.path.dirname(os.path.abspath(path))
+
+    try:
+        info = os.stat(directory)
+    except OSError:
+        return
+
+    if info.st_uid not in (user, 0):
+        raise socket.error(errno.EPERM, "Refusing to use %s: its directory belongs to another user." % path)
+
+    if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH) and not info.st_mode & stat.S_ISVTX:
+        raise socket.error(errno.EPERM, "Refusing to use %s: its directory is writable by other users." % path)
+
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return
+
+    if info.st_uid != user:
+        raise socket.error(errno.EPERM, "Refusing to use %s: it belongs to another user." % path)
+
+
+DEFAULT_SOCKET_PATH = getDefaultSocketPath()
+
+
+def parseTarget(target, port=60000):
+    """
+    Split a `host`, `host:port`, or `[ipv6]:port` target into a host and port.
+
+       :param target: the target to split
+       :type target: str
+       :param port: the port to use if the target does not include one (default: 60000)
+       :type port: int
+
+       :returns: a tuple of the host and port
+       :rtype: tuple
+
+       :raises ValueError: if the port is not an integer
+
+    .. versionadded:: 0.2.0
+    .. function:: parseTarget(target[, port = 60000])
+    """
+    if target.startswith("["):
+        host, _, rest = target[1:].partition("]")
+        return host, int(rest[1:]) if rest.startswith(":") else port
+
+    if target.count(":") == 1:
+        host, _, rest = target.partition(":")
+        return host, int(rest)
+
+    return target, port
+
+
+class DaemonClient(object):
+    """
+    Sends requests to a running daemon over its Unix socket, one JSON object per line.
+
+    .. class:: DaemonClient
+    .. versionadded:: 0.2.0
+    """
+
+    def __init__(self, path=DEFAULT_SOCKET_PATH, timeout=30.0):
+        """
+        Initialize a new DaemonClient.  The connection is opened on the first request.
+
+           :param path: the path of the daemon's Unix socket (default: see `getDefaultSocketPath()`)
+           :type path: str
+           :param timeout: the number of seconds to wait for the daemon (default: 30.0)
+           :type timeout: float
+
+        .. versionadded:: 0.2.0
+        .. function:: __init__([path = DEFAULT_SOCKET_PATH, timeout = 30.0])
+        """
+        self.path = path
+        self.timeout = timeout
+        self.socket = None
+        self.reader = None
+
+
+    def request(self, command, serial, host, port=60000, args=None):
+        """
+        Ask the daemon to run a command on a control board and return its reply.
+
+           :param command: the name of the command
+           :type command: str
+           :param serial: the serial number of the control board
+           :type serial: str or int
+           :param host: the hostname or IP address of the control board
+           :type host: str
+           :param port: the port of the control board (default: 60000)
+           :type port: int
+           :param args: the command arguments (default: none)
+           :type args: list
+
+           :returns: the reply, with `ok` set and either `response` or `error`
+           :rtype: dict
+
+           :raises socket.error: if the daemon cannot be reached, or its socket belongs to another user
+           :raises ValueError: if the daemon's reply is not valid JSON
+
+        .. versionadded:: 0.2.0
+        .. function:: request(command, serial, host[, port = 60000, args = None])
+        """
+        if self.socket is None:
+            checkSocketPath(self.path)
+
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            connection.settimeout(self.timeout)
+
+            try:
+                connection.connect(self.path)
+            except socket.error:
+                connection.close()
+                raise
+
+            self.socket = connection
+            self.reader = connection.makefile("rb")
+
+        message = {
+            "command": command,
+            "serial": serial,
+            "host": host,
+            "port": port,
+            "args": list(args or []),
+        }
+
+        self.socket.sendall(json.dumps(message).encode("utf-8") + b"\n")
+
+        line = self.reader.readline()
+        if not line:
+            self.close()
+            raise socket.error("Daemon closed the connection.")
+
+        return json.loads(line.decode("utf-8"))
+
+
+    def close(self):
+        """
+        Close the connection to the daemon.
+
+        .. versionadded:: 0.2.0
+        .. function:: close()
+        """
+        if self.socket is not None:
+            self.reader.close()
+            self.socket.close()
+
+        self.socket = None
+        self.reader = None
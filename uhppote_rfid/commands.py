@@ -0,0 +1,550 @@
+# -*- coding: utf-8 -*-
+"""
+Provides request packet construction for UHPPOTE RFID control boards.
+
+Every request and response is a fixed 64-byte packet:
+
+====== ====== ===================================================================
+Offset Length Contents
+====== ====== ===================================================================
+0      1      start of message (`0x17`)
+1      1      function code
+2      2      reserved (`0x0000`)
+4      4      serial number of the control board, least-significant byte first
+8      56     function-specific data
+====== ====== ===================================================================
+
+   :copyright: (c) 2017 by Andrew Vaughan.
+   :license: Apache 2.0, see LICENSE for more details.
+
+.. module:: commands
+"""
+
+import datetime
+
+from .compat import STRING_TYPES
+from .serial_number import SerialNumber
+
+
+PACKET_SIZE = 64
+START_OF_MESSAGE = 0x17
+
+FUNCTION_GET_STATUS = 0x20
+FUNCTION_SET_TIME = 0x30
+FUNCTION_GET_TIME = 0x32
+FUNCTION_OPEN_DOOR = 0x40
+FUNCTION_SET_DOOR_CONTROL = 0x80
+FUNCTION_GET_DOOR_CONTROL = 0x82
+FUNCTION_SET_TIME_PROFILE = 0x88
+FUNCTION_GET_TIME_PROFILE = 0x98
+FUNCTION_SET_INTERLOCK = 0xa2
+
+DOOR_MODES = {
+    "normally-open": 1,
+    "normally-closed": 2,
+    "controlled": 3,
+}
+
+MODE_NAMES = dict((mode, name) for name, mode in DOOR_MODES.items())
+
+# Doors locked against each other, by the interlock code the board uses
+INTERLOCKS = {
+    0: (),
+    1: ((1, 2),),
+    2: ((3, 4),),
+    3: ((1, 2), (3, 4)),
+    4: ((1, 2, 3),),
+    8: ((1, 2, 3, 4),),
+}
+
+PROFILE_FIRST = 2
+PROFILE_LAST = 254
+PROFILE_SEGMENTS = 3
+
+
+def toBCD(value, digits=2):
+    """
+    Encode a non-negative integer as packed binary-coded decimal, most-significant byte first.
+
+       :param value: the value to encode
+       :type value: int
+       :param digits: the number of decimal digits to encode; must be even (default: 2)
+       :type digits: int
+
+       :returns: the encoded value
+       :rtype: bytearray
+
+       :raises ValueError: if the value is negative or does not fit in the given number of digits
+
+    .. versionadded:: 0.2.0
+    .. function:: toBCD(value[, digits = 2])
+    """
+    text = str(int(value))
+
+    if int(value) < 0 or len(text) > digits:
+        raise ValueError("Cannot encode %s as %d-digit BCD." % (value, digits))
+
+    text = text.zfill(digits)
+    return bytearray((int(text[i]) << 4) | int(text[i + 1]) for i in range(0, digits, 2))
+
+
+def fromBCD(data):
+    """
+    Decode packed binary-coded decimal bytes, most-significant byte first, to an integer.
+
+       :param data: the bytes to decode
+       :type data: bytearray or bytes or memoryview
+
+       :returns: the decoded value
+       :rtype: int
+
+    .. versionadded:: 0.2.0
+    .. function:: fromBCD(data)
+    """
+    value = 0
+    for byte in bytearray(data):
+        value = value * 100 + (byte >> 4) * 10 + (byte & 0x0f)
+
+    return value
+
+
+def buildRequest(function, serial, data=None):
+    """
+    Build a 64-byte request packet.
+
+       :param function: the function code of the request
+       :type function: int
+       :param serial: the serial number of the control board
+       :type serial: SerialNumber or str or int or bytearray
+       :param data: the function-specific data, up to 56 bytes (default: none)
+       :type data: bytearray or bytes
+
+       :returns: the request packet
+       :rtype: bytearray
+
+       :raises ValueError: if the function code or data is invalid
+       :raises SerialNumberException: if the serial number is invalid
+
+    .. versionadded:: 0.2.0
+    .. function:: buildRequest(function, serial[, data = None])
+    """
+    if not 0 <= int(function) <= 0xff:
+        raise ValueError("Invalid function code. Expected a single byte; received \"%s\"." % function)
+
+    if not isinstance(serial, SerialNumber):
+        serial = SerialNumber(serial)
+
+    packet = bytearray(PACKET_SIZE)
+    packet[0] = START_OF_MESSAGE
+    packet[1] = int(function)
+    packet[4:8] = serial.getByteArray(True)
+
+    if data is not None:
+        if len(data) > PACKET_SIZE - 8:
+            raise ValueError("Invalid request data. Expected at most %d bytes; received %d." % (PACKET_SIZE - 8, len(data)))
+
+        packet[8:8 + len(data)] = data
+
+    return packet
+
+
+def _encodeNone(args):
+    """
+    Encode a request that takes no arguments.
+
+       :param args: the command arguments
+       :type args: list
+
+       :returns: no data
+       :rtype: None
+
+       :raises ValueError: if any arguments are provided
+
+    .. versionadded:: 0.2.0
+    .. function:: _encodeNone(args)
+    """
+    if args:
+        raise ValueError("Command takes no arguments; received %d." % len(args))
+
+    return None
+
+
+def _encodeDoor(args):
+    """
+    Encode a request for a single door, numbered 1 to 4.
+
+       :param args: the command arguments; exactly one door number
+       :type args: list
+
+       :returns: the encoded door number
+       :rtype: bytearray
+
+       :raises ValueError: if the door number is missing or invalid
+
+    .. versionadded:: 0.2.0
+    .. function:: _encodeDoor(args)
+    """
+    if len(args) != 1:
+        raise ValueError("Command requires exactly one door number; received %d arguments." % len(args))
+
+    door = int(args[0])
+    if door < 1 or door > 4:
+        raise ValueError("Invalid door. Expected 1 to 4; received \"%s\"." % args[0])
+
+    return bytearray([door])
+
+
+def _encodeDoorControl(args):
+    """
+    Encode a request to set a door's control mode and unlock delay.
+
+       :param args: the command arguments; a door number, a mode name from `DOOR_MODES`, and a delay in seconds
+       :type args: list
+
+       :returns: the encoded door, mode, and delay
+       :rtype: bytearray
+
+       :raises ValueError: if an argument is missing or invalid
+
+    .. versionadded:: 0.2.0
+    .. function:: _encodeDoorControl(args)
+    """
+    if len(args) != 3:
+        raise ValueError("Command requires a door, mode, and delay; received %d arguments." % len(args))
+
+    door = _encodeDoor(args[:1])
+
+    if args[1] not in DOOR_MODES:
+        raise ValueError("Invalid door mode. Expected one of %s; received \"%s\"." % (", ".join(sorted(DOOR_MODES)), args[1]))
+
+    delay = int(args[2])
+    if not 0 <= delay <= 0xff:
+        raise ValueError("Invalid delay. Expected 0 to 255 seconds; received \"%s\"." % args[2])
+
+    return door + bytearray([DOOR_MODES[args[1]], delay])
+
+
+def _encodeProfile(args):
+    """
+    Encode a request for a single time profile, numbered 2 to 254.
+
+       :param args: the command arguments; exactly one profile number
+       :type args: list
+
+       :returns: the encoded profile number
+       :rtype: bytearray
+
+       :raises ValueError: if the profile number is missing or invalid
+
+    .. versionadded:: 0.2.0
+    .. function:: _encodeProfile(args)
+    """
+    if len(args) != 1:
+        raise ValueError("Command requires exactly one profile number; received %d arguments." % len(args))
+
+    profile = int(args[0])
+    if profile < PROFILE_FIRST or profile > PROFILE_LAST:
+        raise ValueError("Invalid profile. Expected %d to %d; received \"%s\"." % (PROFILE_FIRST, PROFILE_LAST, args[0]))
+
+    return bytearray([profile])
+
+
+def _encodeTimeProfile(args):
+    """
+    Encode a request to define a time profile.
+
+    Arguments are the profile number, the first and last dates it applies (`YYYY-MM-DD`), the days it applies as seven
+    `0`/`1` flags from Monday (e.g., `1111100`), up to three `HH:MM-HH:MM` segments, and optionally `linked=N` naming
+    the profile that continues it.
+
+       :param args: the command arguments
+       :type args: list
+
+       :returns: the encoded profile
+       :rtype: bytearray
+
+       :raises ValueError: if an argument is missing or invalid
+
+    .. versionadded:: 0.2.0
+    .. function:: _encodeTimeProfile(args)
+    """
+    args = list(args)
+    linked = 0
+
+    if args and str(args[-1]).startswith("linked="):
+        linked = int(str(args.pop())[len("linked="):])
+
+        if linked and not PROFILE_FIRST <= linked <= PROFILE_LAST:
+            raise ValueError("Invalid linked profile. Expected 0 or %d to %d; received %d." % (PROFILE_FIRST, PROFILE_LAST, linked))
+
+    if not 4 <= len(args) <= 4 + PROFILE_SEGMENTS:
+        raise ValueError("Command requires a profile, dates, weekdays, and 0 to %d segments; received %d arguments." % (PROFILE_SEGMENTS, len(args)))
+
+    data = _encodeProfile(args[:1])
+
+    for text in args[1:3]:
+        date = datetime.datetime.strptime(str(text), "%Y-%m-%d")
+        data += toBCD(date.year, 4) + toBCD(date.month) + toBCD(date.day)
+
+    weekdays = str(args[3])
+    if len(weekdays) != 7 or weekdays.strip("01"):
+        raise ValueError("Invalid weekdays. Expected seven 0/1 flags from Monday; received \"%s\"." % weekdays)
+
+    data += bytearray(int(flag) for flag in weekdays)
+
+    segments = bytearray(4 * PROFILE_SEGMENTS)
+    for index, text in enumerate(args[4:]):
+        try:
+            start, end = [datetime.datetime.strptime(part, "%H:%M") for part in str(text).split("-")]
+        except ValueError:
+            raise ValueError("Invalid segment. Expected \"HH:MM-HH:MM\"; received \"%s\"." % text)
+
+        segments[index * 4:index * 4 + 4] = toBCD(start.hour) + toBCD(start.minute) + toBCD(end.hour) + toBCD(end.minute)
+
+    return data + segments + bytearray([linked])
+
+
+def _encodeInterlock(args):
+    """
+    Encode a request to set the door interlock, as a code from `INTERLOCKS`.
+
+       :param args: the command arguments; exactly one interlock code
+       :type args: list
+
+       :returns: the encoded interlock
+       :rtype: bytearray
+
+       :raises ValueError: if the interlock code is missing or invalid
+
+    .. versionadded:: 0.2.0
+    .. function:: _encodeInterlock(args)
+    """
+    if len(args) != 1:
+        raise ValueError("Command requires exactly one interlock code; received %d arguments." % len(args))
+
+    interlock = int(args[0])
+    if interlock not in INTERLOCKS:
+        raise ValueError("Invalid interlock. Expected one of %s; received \"%s\"." % (", ".join(str(code) for code in sorted(INTERLOCKS)), args[0]))
+
+    return bytearray([interlock])
+
+
+def encodeDateTime(moment):
+    """
+    Encode a date and time in the 7-byte BCD layout used by the control board (`YYYYMMDDHHmmss`).
+
+       :param moment: the date and time to encode
+       :type moment: datetime.datetime
+
+       :returns: the encoded date and time
+       :rtype: bytearray
+
+    .. versionadded:: 0.2.0
+    .. function:: encodeDateTime(moment)
+    """
+    return toBCD(moment.year, 4) + toBCD(moment.month) + toBCD(moment.day) + \
+        toBCD(moment.hour) + toBCD(moment.minute) + toBCD(moment.second)
+
+
+def decodeDateTime(data):
+    """
+    Decode a 7-byte BCD date and time (`YYYYMMDDHHmmss`) from the control board.
+
+       :param data: the encoded date and time
+       :type data: bytearray or bytes or memoryview
+
+       :returns: the decoded date and time
+       :rtype: datetime.datetime
+
+       :raises ValueError: if the data is not a valid date and time
+
+    .. versionadded:: 0.2.0
+    .. function:: decodeDateTime(data)
+    """
+    data = bytearray(data)
+
+    return datetime.datetime(
+        fromBCD(data[0:2]),
+        fromBCD(data[2:3]),
+        fromBCD(data[3:4]),
+        fromBCD(data[4:5]),
+        fromBCD(data[5:6]),
+        fromBCD(data[6:7])
+    )
+
+
+def _encodeDateTime(args):
+    """
+    Encode a request to set the time, given `"now"` or a `YYYY-MM-DD HH:MM:SS` string.
+
+       :param args: the command arguments; a date and a time, a single combined string, or `"now"`
+       :type args: list
+
+       :returns: the encoded date and time
+       :rtype: bytearray
+
+       :raises ValueError: if the date and time are missing or invalid
+
+    .. versionadded:: 0.2.0
+    .. function:: _encodeDateTime(args)
+    """
+    if len(args) == 1 and isinstance(args[0], datetime.datetime):
+        return encodeDateTime(args[0])
+
+    text = " ".join(str(arg) for arg in args)
+
+    if text == "now":
+        return encodeDateTime(datetime.datetime.now())
+
+    return encodeDateTime(datetime.datetime.strptime(text, "%Y-%m-%d %H:%M:%S"))
+
+
+class Command(object):
+    """
+    Describes a named operation on a control board and how to encode its arguments.
+
+    .. class:: Command
+    .. versionadded:: 0.2.0
+    """
+
+    def __init__(self, name, function, encoder=_encodeNone, readOnly=False):
+        """
+        Initialize a new Command.
+
+           :param name: the name of the command, as used on the command line
+           :type name: str
+           :param function: the function code of the request
+           :type function: int
+           :param encoder: a callable converting a list of arguments to request data (default: no arguments)
+           :type encoder: callable
+           :param readOnly: whether the command only reads state from the control board (default: False)
+           :type readOnly: bool
+
+        .. versionadded:: 0.2.0
+        .. function:: __init__(name, function[, encoder = _encodeNone, readOnly = False])
+        """
+        self.name = name
+        self.function = function
+        self.encoder = encoder
+        self.readOnly = readOnly
+
+
+    def buildRequest(self, serial, args=None):
+        """
+        Build the request packet for this command.
+
+           :param serial: the serial number of the control board
+           :type serial: SerialNumber or str or int or bytearray
+           :param args: the command arguments (default: none)
+           :type args: list
+
+           :returns: the request packet
+           :rtype: bytearray
+
+           :raises ValueError: if the arguments are invalid
+           :raises SerialNumberException: if the serial number is invalid
+
+        .. versionadded:: 0.2.0
+        .. function:: buildRequest(serial[, args = None])
+        """
+        return buildRequest(self.function, serial, self.encoder(list(args or [])))
+
+
+    def checkResponse(self, response):
+        """
+        Verify that a response packet answers this command.
+
+           :param response: the response packet
+           :type response: bytearray
+
+           :raises CommandException: if the response is malformed or answers a different function
+
+        .. versionadded:: 0.2.0
+        .. function:: checkResponse(response)
+        """
+        if len(response) != PACKET_SIZE or response[0] != START_OF_MESSAGE:
+            raise CommandException("Malformed response to %s. Expected a %d-byte packet." % (self.name, PACKET_SIZE))
+
+        if response[1] != self.function:
+            raise CommandException("Unexpected response to %s. Expected function 0x%02x; received 0x%02x." % (self.name, self.function, response[1]))
+
+
+
+
+COMMANDS = dict((command.name, command) for command in [
+    Command("get-status", FUNCTION_GET_STATUS, readOnly=True),
+    Command("get-time", FUNCTION_GET_TIME, readOnly=True),
+    Command("set-time", FUNCTION_SET_TIME, _encodeDateTime),
+    Command("open-door", FUNCTION_OPEN_DOOR, _encodeDoor),
+    Command("get-door-control", FUNCTION_GET_DOOR_CONTROL, _encodeDoor, readOnly=True),
+    Command("set-door-control", FUNCTION_SET_DOOR_CONTROL, _encodeDoorControl),
+    Command("get-time-profile", FUNCTION_GET_TIME_PROFILE, _encodeProfile, readOnly=True),
+    Command("set-time-profile", FUNCTION_SET_TIME_PROFILE, _encodeTimeProfile),
+    Command("set-interlock", FUNCTION_SET_INTERLOCK, _encodeInterlock),
+])
+
+
+def getCommand(name):
+    """
+    Return the command with a given name.
+
+       :param name: the name of the command
+       :type name: str
+
+       :returns: the command
+       :rtype: Command
+
+       :raises CommandException: if no command has the given name
+
+    .. versionadded:: 0.2.0
+    .. function:: getCommand(name)
+    """
+    if not isinstance(name, STRING_TYPES) or name not in COMMANDS:
+        raise CommandException("Unknown command \"%s\". Expected one of %s." % (name, ", ".join(sorted(COMMANDS))))
+
+    return COMMANDS[name]
+
+
+def execute(controller, serial, name, args=None):
+    """
+    Send a named command to a connected control board and return the verified response packet.
+
+       :param controller: the connected socket for the control board
+       :type controller: ControllerSocket
+       :param serial: the serial number of the control board
+       :type serial: SerialNumber or str or int or bytearray
+       :param name: the name of the command
+       :type name: str
+       :param args: the command arguments (default: none)
+       :type args: list
+
+       :returns: the response packet
+       :rtype: bytearray
+
+       :raises CommandException: if the command is unknown or the response does not answer it
+       :raises ValueError: if the arguments are invalid
+       :raises SocketConnectionException: if the socket does not have a working connection
+       :raises SocketTransmitException: if the connection is broken during transmission
+
+    .. versionadded:: 0.2.0
+    .. function:: execute(controller, serial, name[, args = None])
+    """
+    command = getCommand(name)
+
+    controller.send(command.buildRequest(serial, args))
+    response = controller.receiveFrame(PACKET_SIZE)
+
+    command.checkResponse(response)
+    return response
+
+
+
+
+class CommandException(Exception):
+    """
+    Custom exception raised if a command is unknown or its response is invalid.
+
+    .. versionadded:: 0.2.0
+    """
+
+    pass
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+"""
+Provides type compatibility between Python 2 and Python 3.
+
+   :copyright: (c) 2017 by Andrew Vaughan.
+   :license: Apache 2.0, see LICENSE for more details.
+
+.. module:: compat
+"""
+
+try:
+    INTEGER_TYPES = (int, long)
+    STRING_TYPES = (str, unicode)
+
+except NameError:
+    INTEGER_TYPES = (int,)
+    STRING_TYPES = (str,)
+
+# On Python 2, `str` is a byte string and can be sent as-is
+BINARY_TYPES = (bytes, bytearray, memoryview)
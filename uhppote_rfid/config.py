@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+"""
+Provides a desired-state model of control board settings, and writes only the settings that differ from the board.
+
+A `BoardConfig` holds door control modes and unlock delays, time profiles, and the door interlock, each stored as the
+arguments of the command that sets it.  `applyConfig()` reads back only the settings the desired configuration
+names, compares them, and sends a request for each setting that differs, so a deploy that changes one door's delay
+sends one packet rather than the whole configuration.
+
+Desired state can be given as a document, as loaded from JSON::
+
+   {
+       "doors": {"1": {"mode": "controlled", "delay": 5}},
+       "profiles": {"2": {"weekdays": "1111100", "segments": ["08:00-18:00"]}},
+       "interlock": 1
+   }
+
+   :copyright: (c) 2017 by Andrew Vaughan.
+   :license: Apache 2.0, see LICENSE for more details.
+
+.. module:: BoardConfig
+"""
+
+import datetime
+import logging
+
+from .commands import execute, getCommand
+from .response import parseResponse
+from .transaction import Transaction
+
+
+DEFAULT_START_DATE = "2000-01-01"
+DEFAULT_END_DATE = "2099-12-31"
+
+
+class BoardConfig(object):
+    """
+    Settings for one control board.  Only the settings that have been set are compared and written.
+
+    .. class:: BoardConfig
+    .. versionadded:: 0.2.0
+    """
+
+    def __init__(self, document=None):
+        """
+        Initialize a new BoardConfig.
+
+           :param document: settings to apply, as for `update()` (default: none)
+           :type document: dict
+
+           :raises ValueError: if a setting is invalid
+
+        .. versionadded:: 0.2.0
+        .. function:: __init__([document = None])
+        """
+        self.doors = {}
+        self.profiles = {}
+        self.interlock = None
+
+        if document:
+            self.update(document)
+
+
+    def setDoor(self, door, mode, delay):
+        """
+        Set a door's control mode and unlock delay.
+
+           :param door: the door number, from 1 to 4
+           :type door: int
+           :param mode: the mode, one of "controlled", "normally-open", or "normally-closed"
+           :type mode: str
+           :param delay: the unlock delay, in seconds
+           :type delay: int
+
+           :raises ValueError: if a setting is invalid
+
+        .. versionadded:: 0.2.0
+        .. function:: setDoor(door, mode, delay)
+        """
+        args = (int(door), mode, int(delay))
+        getCommand("set-door-control").encoder(list(args))
+
+        self.doors[int(door)] = args
+
+
+    def setProfile(self, profile, weekdays, segments=(), startDate=DEFAULT_START_DATE, endDate=DEFAULT_END_DATE,
+                   linked=0):
+        """
+        Define a time profile.
+
+           :param profile: the profile number, from 2 to 254
+           :type profile: int
+           :param weekdays: the days the profile applies, as seven 0/1 flags from Monday (e.g., "1111100")
+           :type weekdays: str
+           :param segments: up to three allowed times of day, as "HH:MM-HH:MM" (default: none)
+           :type segments: iterable
+           :param startDate: the first date the profile applies, as "YYYY-MM-DD" (default: "2000-01-01")
+           :type startDate: str
+           :param endDate: the last date the profile applies, as "YYYY-MM-DD" (default: "2099-12-31")
+           :type endDate: str
+           :param linked: the profile that continues this one, or 0 (default: 0)
+           :type linked: int
+
+           :raises ValueError: if a setting is invalid
+
+        .. versionadded:: 0.2.0
+        .. function:: setProfile(profile, weekdays[, segments = (), startDate = "2000-01-01", ...])
+        """
+        args = (int(profile), startDate, endDate, weekdays) + tuple(segments) + ("linked=%d" % int(linked),)
+        getCommand("set-time-profile").encoder(list(args))
+
+        # Store the form the board reports back, so equal settings compare equal
+        args = (int(profile), _formatDate(startDate), _formatDate(endDate), weekdays) + \
+            tuple(_formatSegment(segment) for segment in segments) + ("linked=%d" % int(linked),)
+
+        self.profiles[int(profile)] = args
+
+
+    def setInterlock(self, interlock):
+        """
+        Set the door interlock.
+
+           :param interlock: the interlock code, from `commands.INTERLOCKS`
+           :type interlock: int
+
+           :raises ValueError: if the interlock code is invalid
+
+        .. versionadded:: 0.2.0
+        .. function:: setInterlock(interlock)
+        """
+        getCommand("set-interlock").encoder([interlock])
+        self.interlock = int(interlock)
+
+
+    def update(self, document):
+        """
+        Apply the settings in a document, with optional `doors`, `profiles`, and `interlock` keys.
+
+           :param document: the settings
+           :type document: dict
+
+           :raises ValueError: if a setting is invalid or missing
+
+        .. versionadded:: 0.2.0
+        .. function:: update(document)
+        """
+        try:
+            for door, settings in document.get("doors", {}).items():
+                self.setDoor(door, settings["mode"], settings["delay"])
+
+            for profile, settings in document.get("profiles", {}).items():
+                self.setProfile(profile, settings["weekdays"], settings.get("segments", ()),
+                                settings.get("startDate", DEFAULT_START_DATE), settings.get("endDate", DEFAULT_END_DATE),
+                                settings.get("linked", 0))
+
+        except (KeyError, TypeError, AttributeError) as e:
+            raise ValueError("Invalid configuration document: missing or malformed %s." % str(e))
+
+        if document.get("interlock") is not None:
+            self.setInterlock(document["interlock"])
+
+
+    def toDocument(self):
+        """
+        Return the settings as a document, as accepted by `update()`.
+
+           :returns: the settings
+           :rtype: dict
+
+        .. versionadded:: 0.2.0
+        .. function:: toDocument()
+        """
+        document = {
+            "doors": dict((str(door), {"mode": args[1], "delay": args[2]}) for door, args in self.doors.items()),
+            "profiles": dict((str(profile), {
+                "startDate": args[1],
+                "endDate": args[2],
+                "weekdays": args[3],
+                "segments": list(args[4:-1]),
+                "linked": int(args[-1][len("linked="):]),
+            }) for profile, args in self.profiles.items()),
+        }
+
+        if self.interlock is not None:
+            document["interlock"] = self.interlock
+
+        return document
+
+
+
+
+def _formatDate(text):
+    """
+    Return a date as a zero-padded "YYYY-MM-DD" string.
+
+    .. versionadded:: 0.2.0
+    """
+    return datetime.datetime.strptime(str(text), "%Y-%m-%d").strftime("%Y-%m-%d")
+
+
+def _formatSegment(text):
+    """
+    Return a segment as a zero-padded "HH:MM-HH:MM" string.
+
+    .. versionadded:: 0.2.0
+    """
+    return "-".join(datetime.datetime.strptime(part, "%H:%M").strftime("%H:%M") for part in str(text).split("-"))
+
+
+def readConfig(controller, serial, doors=(1, 2, 3, 4), profiles=()):
+    """
+    Read settings from a control board.  Boards cannot report their interlock, so it is left unset.
+
+       :param controller: the connected socket for the control board
+       :type controller: ControllerSocket
+       :param serial: the serial number of the control board
+       :type serial: SerialNumber or str or int or bytearray
+       :param doors: the doors to read (default: all four)
+       :type doors: iterable
+       :param profiles: the time profiles to read (default: none)
+       :type profiles: iterable
+
+       :returns: the board's settings; undefined profiles are omitted
+       :rtype: BoardConfig
+
+       :raises CommandException: if a response does not answer its request
+       :raises SocketConnectionException: if the socket does not have a working connection
+       :raises SocketTransmitException: if the connection is broken during transmission
+
+    .. versionadded:: 0.2.0
+    .. function:: readConfig(controller, serial[, doors = (1, 2, 3, 4), profiles = ()])
+    """
+    config = BoardConfig()
+
+    for door in doors:
+        response = parseResponse(execute(controller, serial, "get-door-control", [door]))
+        config.doors[int(door)] = response.getArguments()
+
+    for profile in profiles:
+        args = parseResponse(execute(controller, serial, "get-time-profile", [profile])).getArguments()
+
+        if args is not None and args[0] == int(profile):
+            config.profiles[int(profile)] = args
+
+    return config
+
+
+def diffConfig(current, desired):
+    """
+    List the requests that bring a board's settings to the desired settings.  Settings the desired configuration does
+    not name are left alone, and an interlock is always written when the current one is unknown.
+
+       :param current: the board's settings
+       :type current: BoardConfig
+       :param desired: the desired settings
+       :type desired: BoardConfig
+
+       :returns: `(command, args)` pairs, time profiles first
+       :rtype: list
+
+    .. versionadded:: 0.2.0
+    .. function:: diffConfig(current, desired)
+    """
+    changes = []
+
+    for profile in sorted(desired.profiles):
+        if current.profiles.get(profile) != desired.profiles[profile]:
+            changes.append(("set-time-profile", list(desired.profiles[profile])))
+
+    for door in sorted(desired.doors):
+        if current.doors.get(door) != desired.doors[door]:
+            changes.append(("set-door-control", list(desired.doors[door])))
+
+    if desired.interlock is not None and current.interlock != desired.interlock:
+        changes.append(("set-interlock", [desired.interlock]))
+
+    return changes
+
+
+def applyConfig(controller, serial, desired, current=None, window=16, attempts=3):
+    """
+    Write the settings that differ between a control board and the desired configuration, verifying each by reading it
+    back in the same pipelined `Transaction`.
+
+       :param controller: the connected socket for the control board
+       :type controller: ControllerSocket
+       :param serial: the serial number of the control board
+       :type serial: SerialNumber or str or int or bytearray
+       :param desired: the desired settings
+       :type desired: BoardConfig
+       :param current: the board's settings, if already known (default: read from the board)
+       :type current: BoardConfig
+       :param window: the most requests in flight at once (default: 16)
+       :type window: int
+       :param attempts: the number of times a failed setting is tried (default: 3)
+       :type attempts: int
+
+       :returns: the `(command, args)` pairs written
+       :rtype: list
+
+       :raises ConfigException: if a setting could not be applied and verified
+       :raises CommandException: if a response does not answer its request
+       :raises SocketConnectionException: if the socket does not have a working connection
+       :raises SocketTransmitException: if the connection is broken during transmission
+
+    .. versionadded:: 0.2.0
+    .. function:: applyConfig(controller, serial, desired[, current = None, window = 16, attempts = 3])
+    """
+    logger = logging.getLogger("UHPPOTE.BoardConfig")
+
+    if current is None:
+        current = readConfig(controller, serial, sorted(desired.doors), sorted(desired.profiles))
+
+    changes = diffConfig(current, desired)
+    transaction = Transaction(controller, serial, window, attempts)
+
+    for name, args in changes:
+        transaction.write(name, args)
+
+    failed = [outcome for outcome in transaction.commit() if not outcome["ok"]]
+
+    if failed:
+        raise ConfigException("Control board did not apply %d setting(s); first: %s %s (%s)" % (
+            len(failed), failed[0]["command"], " ".join(str(arg) for arg in failed[0]["args"]), failed[0]["error"]))
+
+    logger.info("Applied %d setting(s) to %s." % (len(changes), serial))
+    return changes
+
+
+
+
+class ConfigException(Exception):
+    """
+    Custom exception raised if a control board does not apply a setting.
+
+    .. versionadded:: 0.2.0
+    """
+
+    pass
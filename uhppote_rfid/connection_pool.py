@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+Provides pooled, reusable connections to UHPPOTE RFID control boards.
+
+   :copyright: (c) 2017 by Andrew Vaughan.
+   :license: Apache 2.0, see LICENSE for more details.
+
+.. module:: ConnectionPool
+"""
+
+import logging
+import socket
+import threading
+
+from .commands import COMMANDS
+from .controller_socket import HOOK_PRE_SEND, ControllerSocket, SocketConnectionException, SocketTransmitException
+from .rtt import RTTEstimator
+
+
+# Function codes of commands that only read state, so resending them is harmless
+READ_ONLY_FUNCTIONS = frozenset(command.function for command in COMMANDS.values() if command.readOnly)
+
+
+class ConnectionPool(object):
+    """
+    Keeps one open `ControllerSocket` per control board and serializes the requests sent through it.
+
+    .. class:: ConnectionPool
+    .. versionadded:: 0.2.0
+    """
+
+    def __init__(self, profile="low-latency", attempts=3, recorder=None, breakers=None, estimator=None, timeout=5.0):
+        """
+        Initialize a new, empty ConnectionPool.
+
+           :param profile: the socket profile for new connections (default: "low-latency")
+           :type profile: str or dict
+           :param attempts: the number of connection attempts for new connections (default: 3)
+           :type attempts: int
+           :param recorder: a recorder given every packet on every connection, such as a `CaptureWriter` (default: none)
+           :type recorder: CaptureWriter
+           :param breakers: circuit breakers guarding each board, so calls to boards known to be down fail at once
+              (default: none)
+           :type breakers: CircuitBreakerRegistry
+           :param estimator: a round-trip time estimator timing out each connection from its board's measured round
+              trips (default: one of the pool's own, bounded by `timeout`)
+           :type estimator: RTTEstimator
+           :param timeout: the longest time, in seconds, to wait to connect to or hear from a board when no estimator
+              is given; shorter once the board's round trips are measured (default: 5.0)
+           :type timeout: float
+
+           :raises ValueError: if the timeout is not positive
+
+        .. versionadded:: 0.2.0
+        .. function:: __init__([profile = "low-latency", attempts = 3, recorder = None, breakers = None, ...])
+        """
+        self.logger = logging.getLogger("UHPPOTE.ConnectionPool")
+
+        if float(timeout) <= 0:
+            raise ValueError("Invalid timeout for connection pool: %s" % timeout)
+
+        # A board that accepts the connection but never answers must not hold its caller forever
+        if estimator is None:
+            estimator = RTTEstimator(initial=float(timeout), minimum=min(0.2, float(timeout)), maximum=float(timeout))
+
+        self.profile = profile
+        self.attempts = attempts
+        self.recorder = recorder
+        self.breakers = breakers
+        self.estimator = estimator
+        self.connections = {}
+        self.lock = threading.Lock()
+
+
+    def transmit(self, host, port, msg, size=64):
+        """
+        Send a message to a control board over its pooled connection and return the response.
+
+        The connection is opened on first use.  If a reused connection turns out to have been closed by the board,
+        it is reopened and the message is sent once more, if it had not been sent yet or only reads from the board.
+
+           :param host: the hostname or IP address of the control board
+           :type host: str
+           :param port: the port of the control board
+           :type port: int
+           :param msg: the message to send
+           :type msg: bytes or bytearray or memoryview
+           :param size: the size, in bytes, expected for the response (default: 64)
+           :type size: int
+
+           :returns: the received message
+           :rtype: bytearray
+
+           :raises ValueError: if provided an invalid host, port, message, or size
+           :raises SocketConnectionException: if unable to connect to the control board
+           :raises SocketTransmitException: if the connection is broken during transmission
+
+        .. versionadded:: 0.2.0
+        .. function:: transmit(host, port, msg[, size = 64])
+        """
+        idempotent = len(msg) > 1 and bytearray(msg[1:2])[0] in READ_ONLY_FUNCTIONS
+
+        return self.call(host, port, lambda controller: _sendAndReceive(controller, msg, size), idempotent)
+
+
+    def call(self, host, port, operation, idempotent=False):
+        """
+        Run an operation with exclusive use of the pooled connection to a control board.
+
+        If a reused connection turns out to have been closed by the board, it is reopened and the operation is run
+        once more, but only if the operation had sent nothing or is idempotent.  A command that changes the board,
+        such as opening a door, may have been carried out even though its response was lost, so it is not repeated.
+
+           :param host: the hostname or IP address of the control board
+           :type host: str
+           :param port: the port of the control board
+           :type port: int
+           :param operation: a callable given the connected `ControllerSocket`
+           :type operation: callable
+           :param idempotent: whether running the operation twice is harmless, as for commands that only read
+              (default: False)
+           :type idempotent: bool
+
+           :returns: the result of the operation
+           :rtype: object
+
+           :raises ValueError: if provided an invalid host or port
+           :raises SocketConnectionException: if unable to connect to the control board
+           :raises SocketTransmitException: if the connection is broken during the operation
+           :raises CircuitOpenException: if the board's circuit breaker is open
+
+        .. versionadded:: 0.2.0
+        .. function:: call(host, port, operation[, idempotent = False])
+        """
+        key = (host, int(port))
+        breaker = self.breakers.get(host, port) if self.breakers is not None else None
+
+        # Reject calls to a board known to be down before waiting for its connection
+        if breaker is not None:
+            breaker.check()
+
+        with self.lock:
+            entry = self.connections.get(key)
+
+            if entry is None:
+                entry = [threading.Lock(), None]
+                self.connections[key] = entry
+
+        with entry[0]:
+            reused = entry[1] is not None and entry[1].isConnected()
+
+            while True:
+                if entry[1] is None or not entry[1].isConnected():
+                    controller = ControllerSocket(host, port, self.profile)
+                    controller.setRecorder(self.recorder)
+                    controller.setBreaker(breaker)
+                    controller.setEstimator(self.estimator)
+
+                    try:
+                        controller.connect(self.attempts)
+                    except SocketConnectionException:
+                        controller.close()
+                        raise
+
+                    entry[1] = controller
+
+                controller = entry[1]
+                sent = []
+
+                def markSent(target, msg):
+                    sent.append(True)
+
+                controller.addHook(HOOK_PRE_SEND, markSent)
+
+                try:
+                    return operation(controller)
+
+                except (SocketConnectionException, SocketTransmitException, socket.error) as e:
+                    self.logger.debug("Connection to %s:%d failed: %s" % (key[0], key[1], str(e)))
+
+                    controller.close()
+                    entry[1] = None
+
+                    if not reused or (sent and not idempotent):
+                        raise
+
+                    reused = False
+
+                finally:
+                    controller.removeHook(HOOK_PRE_SEND, markSent)
+
+
+    def discard(self, host, port):
+        """
+        Close and remove the pooled connection to a control board.
+
+           :param host: the hostname or IP address of the control board
+           :type host: str
+           :param port: the port of the control board
+           :type port: int
+
+        .. versionadded:: 0.2.0
+        .. function:: discard(host, port)
+        """
+        with self.lock:
+            entry = self.connections.pop((host, int(port)), None)
+
+        if entry is not None:
+            with entry[0]:
+                if entry[1] is not None:
+                    entry[1].close()
+                    entry[1] = None
+
+
+    def close(self):
+        """
+        Close every pooled connection, and save the estimator's round-trip times so the next run starts from them.
+
+        .. versionadded:: 0.2.0
+        .. function:: close()
+        """
+        with self.lock:
+            keys = list(self.connections)
+
+        for host, port in keys:
+            self.discard(host, port)
+
+        if self.estimator is not None:
+            try:
+                self.estimator.save()
+            except (IOError, OSError) as e:
+                self.logger.warning("Unable to save round-trip times: %s" % str(e))
+
+
+    def __len__(self):
+        """
+        Return the number of control boards with pooled connections.
+
+           :returns: the number of pooled connections
+           :rtype: int
+
+        .. versionadded:: 0.2.0
+        .. function:: __len__()
+        """
+        return len(self.connections)
+
+
+
+
+def _sendAndReceive(controller, msg, size):
+    """
+    Send a message and return the response.
+
+       :param controller: the connected socket
+       :type controller: ControllerSocket
+       :param msg: the message to send
+       :type msg: bytes or bytearray or memoryview
+       :param size: the size, in bytes, expected for the response
+       :type size: int
+
+       :returns: the received message
+       :rtype: bytearray
+
+    .. versionadded:: 0.2.0
+    .. function:: _sendAndReceive(controller, msg, size)
+    """
+    controller.send(msg)
+    return controller.receive(size)
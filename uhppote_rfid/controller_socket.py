@@ -11,17 +11,72 @@ Provides socket and communication support for UHPPOTE RFID control boards.
 import logging
 import re
 import socket
+import time
+
+from .commands import START_OF_MESSAGE
+from .compat import BINARY_TYPES, INTEGER_TYPES, STRING_TYPES
+from .resolver import DEFAULT_RESOLVER
+
+
+FRAME_START = bytearray([START_OF_MESSAGE])
+
+HOSTNAME_LABEL = re.compile(r"(?!-)[A-Z\d-]{1,63}(?<!-)$", re.IGNORECASE)
+
+# Points in a socket's traffic where hooks are called, each with `(controller, value)`
+HOOK_PRE_SEND = "pre-send"
+HOOK_POST_SEND = "post-send"
+HOOK_POST_RECEIVE = "post-receive"
+HOOK_ERROR = "error"
+
+HOOK_STAGES = (HOOK_PRE_SEND, HOOK_POST_SEND, HOOK_POST_RECEIVE, HOOK_ERROR)
+
+
+SOCKET_PROFILES = {
+    "default": {},
+    "low-latency": {
+        "nodelay": True,
+        "keepalive": True,
+        "keepaliveIdle": 10,
+        "keepaliveInterval": 3,
+        "keepaliveCount": 3,
+        "reuseAddress": True,
+    },
+    "bulk": {
+        "nodelay": False,
+        "keepalive": True,
+        "keepaliveIdle": 60,
+        "keepaliveInterval": 10,
+        "keepaliveCount": 5,
+        "sendBuffer": 262144,
+        "receiveBuffer": 262144,
+        "reuseAddress": True,
+    },
+}
 
 
 class ControllerSocket(object):
     """
     Manages socket communication and transport for UHPPOTE RFID boards.
 
+    The operating system socket is only opened by `connect()`, so controllers can be created in bulk without using
+    file descriptors, and instances use `__slots__` to keep large registries small.
+
+    Hooks can be added to observe or alter traffic, for tracing, metrics, packet capture, or fault injection.  A socket
+    without hooks checks a single attribute per packet.
+
+    Sockets block without a timeout unless given an `RTTEstimator`, which times connects and receives from the
+    board's measured round-trip time.
+
     .. class:: ControllerSocket
     .. versionadded:: 0.1.0
+    .. versionchanged:: 0.2.0
+       The socket is opened on `connect()` rather than on creation.
     """
 
-    def __init__(self, host, port=60000):
+    __slots__ = ("logger", "host", "hostFamily", "port", "profile", "connected", "socket", "socketFamily", "reader",
+                 "recorder", "breaker", "hooks", "estimator", "outstanding", "sentAt")
+
+    def __init__(self, host, port=60000, profile="default"):
         """
         Initialize a new Socket given an IP address and port for the control board.
 
@@ -29,34 +84,50 @@ class ControllerSocket(object):
            :type host: str
            :param port: the port of the control board (default: 60000)
            :type port: int
+           :param profile: the name of a profile in `SOCKET_PROFILES`, or a dict of socket options (default: "default")
+           :type profile: str or dict
 
-           :raises ValueError: if provided an invalid host or port
+           :raises ValueError: if provided an invalid host, port, or profile
 
         .. versionadded:: 0.1.0
-        .. function:: __init__(host, port)
+        .. versionchanged:: 0.2.0
+           Added the `profile` parameter.
+        .. function:: __init__(host[, port = 60000, profile = "default"])
         """
         self.logger = logging.getLogger("UHPPOTE.ControllerSocket")
 
         self.setHost(host)
         self.setPort(port)
         self.connected = False
+        self.reader = None
+        self.recorder = None
+        self.breaker = None
+        self.hooks = None
+        self.estimator = None
+        self.outstanding = 0
+        self.sentAt = None
 
-        self.logger.debug("Creating socket on %s:%d (not connected)" % (self.getHost(), self.getPort()))
-        self.socket = socket.socket(
-            socket.AF_INET,
-            socket.SOCK_STREAM
-        )
+        self.socket = None
+        self.socketFamily = None
+
+        self.setProfile(profile)
 
 
     def connect(self, attempts=3):
         """
         Attempt to connect to the target as-configured.
 
+        A new socket is opened for each attempt, so a closed controller can be connected again.  IP addresses are used
+        directly.  Hostnames are resolved through the shared `ResolverCache`, so reconnects within its TTL skip the
+        operating system's resolver.  If a circuit breaker is set and open, the connection is refused immediately.  If
+        an RTT estimator is set, each attempt is given the board's current timeout, which doubles when it expires.
+
            :param attempts: the number of times to retry connecting before throwing an exception (default: 3)
            :type attempts: int
 
            :raises ValueError: if attempts is below 1
            :raises SocketConnectionException: if unable to connect after the prescribed number of retries
+           :raises CircuitOpenException: if the circuit breaker is open
 
         .. versionadded:: 0.1.0
         .. function:: connect()
@@ -66,18 +137,43 @@ class ControllerSocket(object):
         if int(attempts) <= 0:
             raise ValueError("Invalid number of attempts for socket connection: %d" % int(attempts))
 
+        if self.breaker is not None:
+            self.breaker.allow()
+
         for attempt in range(1, attempts + 1):
             self.logger.debug("Attempt #%d..." % attempt)
 
             try:
-                self.socket.connect((self.host, self.port))
+                address = self._prepareConnect()
+
+                if self.estimator is not None:
+                    self.socket.settimeout(self.estimator.getTimeout(self.host, self.port))
+
+                self.socket.connect(address)
+                self.reader = FrameReader(self.socket)
                 self.connected = True
                 self.logger.debug("Connection successful.")
+
+                if self.breaker is not None:
+                    self.breaker.recordSuccess()
+
                 return
 
-            except Exception, e:
+            except Exception as e:
                 self.logger.warn("Connection attempt #%d to %s:%d unsuccessful.  Error message: %s" % (attempt, self.host, self.port, str(e)))
-                pass
+
+                if self.estimator is not None and isinstance(e, socket.timeout):
+                    self.estimator.backoff(self.host, self.port)
+
+                # A socket that failed to connect cannot portably be reused
+                self._closeSocket()
+
+        # The address may have changed; resolve it again next time
+        if self.hostFamily is None:
+            DEFAULT_RESOLVER.invalidate(self.host)
+
+        if self.breaker is not None:
+            self.breaker.recordFailure()
 
         raise SocketConnectionException("Unable to connect to %s:%d after %d attempts." % (self.host, self.port, int(attempts)))
 
@@ -93,8 +189,11 @@ class ControllerSocket(object):
         .. function:: close()
         """
         self.logger.debug("Closing socket...")
-        self.socket.close()
+        self._closeSocket()
+        self.reader = None
         self.connected = False
+        self.outstanding = 0
+        self.sentAt = None
 
 
 
@@ -103,46 +202,65 @@ class ControllerSocket(object):
         Send a message through a connected socket.
 
            :param msg: the message to send through the socket
-           :type msg: str or bytearray or bytes
+           :type msg: bytes or bytearray or memoryview
 
            :raises ValueError: if the message being sent is in an invalid format
            :raises SocketConnectionException: if the socket does not have a working connection
            :raises SocketTransmitException: if the socket connection is broken during transmission
 
         .. versionadded:: 0.1.0
+        .. versionchanged:: 0.2.0
+           Text strings are no longer accepted on Python 3, and `memoryview` messages are sent without copying.  Calls
+           hooks, and no longer logs each packet.
         .. function:: send(msg)
         """
-        if not isinstance(msg, (str, bytes, bytearray)):
-            raise ValueError("Invalid message sent to socket.  Expected str, bytes, or bytearray; received %s." % type(msg))
-
-        messageLength = len(msg)
+        if not isinstance(msg, BINARY_TYPES):
+            raise ValueError("Invalid message sent to socket.  Expected bytes, bytearray, or memoryview; received %s." % type(msg))
 
-        if messageLength <= 0:
+        if len(msg) <= 0:
             raise ValueError("Expected message to be sent.  Received blank message.")
 
         if not self.isConnected():
             raise SocketConnectionException("Socket not connected. Cannot send.")
 
-        self.logger.debug("Attempting to send message through socket of length %d." % messageLength)
-        self.logger.log(1, str(msg))
+        if self.hooks is not None:
+            msg = self.runHooks(HOOK_PRE_SEND, msg)
 
+        messageLength = len(msg)
+        view = memoryview(msg)
         byteCount = 0
-        while byteCount < messageLength:
-            sent = self.socket.send(msg[byteCount:])
 
-            if sent == 0:
-                raise SocketTransmitException("Connection broken.")
+        try:
+            while byteCount < messageLength:
+                sent = self.socket.send(view[byteCount:])
+
+                if sent == 0:
+                    raise SocketTransmitException("Connection broken.")
+
+                byteCount += sent
+
+        except Exception as e:
+            if self.hooks is not None:
+                self.runHooks(HOOK_ERROR, e)
+
+            raise
 
-            self.logger.log(1, "%d bytes sent in chunk..." % sent)
-            byteCount += sent
+        if self.estimator is not None:
+            # Only a request sent with nothing else outstanding can be timed without queueing delay
+            self.outstanding += 1
+            self.sentAt = time.time() if self.outstanding == 1 else None
 
-        self.logger.debug("Send complete (%d bytes)." % byteCount)
+        if self.hooks is not None:
+            self.runHooks(HOOK_POST_SEND, msg)
 
 
     def receive(self, size=64):
         """
         Receive a message through a connected socket.  Will block I/O until enough bytes to get `size` are returned.
 
+        Bytes are read in large chunks; any received beyond `size` are kept for the next call rather than returned
+        or lost.
+
            :param size: the size, in bytes, expected for the incoming message
            :type size: int
 
@@ -151,20 +269,21 @@ class ControllerSocket(object):
 
            :raises ValueError: if the size is not a positive multiple of 8
            :raises SocketConnectionException: if the socket does not have a working connection
-           :raises SocketTransmitException: if the socket connection is broken during transmission
+           :raises SocketTransmitException: if the socket connection is broken during transmission, or the response times
+              out; a timed out connection is closed
 
         .. versionadded:: 0.1.0
+        .. versionchanged:: 0.2.0
+           Surplus bytes are buffered for the next receive.  Calls hooks, and no longer logs each packet.
         .. function:: receive()
         """
-        self.logger.debug("Listening for message via socket of length %s..." % str(size))
-
-        if isinstance(size, str):
+        if isinstance(size, STRING_TYPES):
             if not size.isdigit():
                 raise ValueError("Invalid size. Non-Integer string provided: \"%s\"." % size)
 
             size = int(size)
 
-        if not isinstance(size, (int, long)):
+        if not isinstance(size, INTEGER_TYPES):
             raise ValueError("Invalid size. Expected positive integer; received \"%s\"." % type(size))
 
         if size <= 0:
@@ -176,20 +295,74 @@ class ControllerSocket(object):
         if not self.isConnected():
             raise SocketConnectionException("Socket not connected. Cannot send.")
 
-        received = bytearray()
-        received_bytes = 0
-        while received_bytes < size:
-            chunk = self.socket.recv(min(size, 2048))
+        if self.estimator is not None:
+            self.socket.settimeout(self.estimator.getTimeout(self.host, self.port))
+
+        try:
+            data = self.reader.read(size)
 
-            if chunk == '':
-                raise SocketTransmitException("Unexpected end of connection.  Received %d bytes, but expected %d." % (received_bytes, size))
+        except Exception as e:
+            if self.estimator is not None and isinstance(e, socket.timeout):
+                e = self._timedOut()
 
-            received.extend(chunk)
-            received_bytes += len(chunk)
+            if self.hooks is not None:
+                self.runHooks(HOOK_ERROR, e)
 
-            self.logger.debug(1, "%d bytes received in chunk..." % len(chunk))
+            raise e
 
-        return received
+        if self.estimator is not None:
+            self._measure()
+
+        if self.hooks is not None:
+            self.runHooks(HOOK_POST_RECEIVE, data)
+
+        return data
+
+
+    def receiveFrame(self, size=64):
+        """
+        Receive the next well-formed packet through a connected socket, skipping any malformed bytes before it.
+
+        This keeps framing intact when several requests are pipelined, or after the board sends a malformed packet.
+
+           :param size: the size, in bytes, of a packet (default: 64)
+           :type size: int
+
+           :returns: the received packet
+           :rtype: bytearray
+
+           :raises SocketConnectionException: if the socket does not have a working connection
+           :raises SocketTransmitException: if the socket connection is broken during transmission, or the response times
+              out; a timed out connection is closed
+
+        .. versionadded:: 0.2.0
+        .. function:: receiveFrame([size = 64])
+        """
+        if not self.isConnected():
+            raise SocketConnectionException("Socket not connected. Cannot receive.")
+
+        if self.estimator is not None:
+            self.socket.settimeout(self.estimator.getTimeout(self.host, self.port))
+
+        try:
+            data = self.reader.readFrame(size)
+
+        except Exception as e:
+            if self.estimator is not None and isinstance(e, socket.timeout):
+                e = self._timedOut()
+
+            if self.hooks is not None:
+                self.runHooks(HOOK_ERROR, e)
+
+            raise e
+
+        if self.estimator is not None:
+            self._measure()
+
+        if self.hooks is not None:
+            self.runHooks(HOOK_POST_RECEIVE, data)
+
+        return data
 
 
     def getHost(self):
@@ -209,6 +382,8 @@ class ControllerSocket(object):
         """
         Set the hostname for the socket.
 
+        IPv4 and IPv6 addresses are recognized without a regular expression; anything else must be a valid hostname.
+
            :param host: the hostname for the socket
            :type host: str or bytearray
 
@@ -217,7 +392,7 @@ class ControllerSocket(object):
         .. versionadded: 0.1.0
         .. function:: setHost(host)
         """
-        if not isinstance(host, (str, bytearray)):
+        if not isinstance(host, STRING_TYPES + (bytearray,)):
             raise ValueError("Invalid host provided. Expected string or bytearray; received %s." % type(host))
 
         if isinstance(host, bytearray):
@@ -229,15 +404,18 @@ class ControllerSocket(object):
         if len(host) <= 0 or len(host) > 255:
             raise ValueError("Invalid host provided. Length cannot be 0 or longer than 255 characters; received \"%s\"." % host)
 
-        # Valid hostnames can have one dot at the end; strip it if it exists
-        if host[-1] == ".":
-            host = host[:-1]
+        family = _getAddressFamily(host)
+
+        if family is None:
+            # Valid hostnames can have one dot at the end; strip it if it exists
+            if host[-1] == ".":
+                host = host[:-1]
 
-        allowed = re.compile("(?!-)[A-Z\d-]{1,63}(?<!-)$", re.IGNORECASE)
-        if not all(allowed.match(c) for c in host.split(".")):
-            raise ValueError("Invalid host provided. Received \"%s\"." % host)
+            if not all(HOSTNAME_LABEL.match(c) for c in host.split(".")):
+                raise ValueError("Invalid host provided. Received \"%s\"." % host)
 
         self.host = host
+        self.hostFamily = family
 
 
     def getPort(self):
@@ -265,11 +443,11 @@ class ControllerSocket(object):
         .. versionadded:: 0.1.0
         .. function:: setPort(port)
         """
-        if isinstance(port, str):
+        if isinstance(port, STRING_TYPES):
             if not port.isdigit():
                 raise ValueError("Invalid port. Non-Integer string provided: \"%s\"." % port)
 
-        elif not isinstance(port, (int, long)):
+        elif not isinstance(port, INTEGER_TYPES):
             raise ValueError("Invalid port. Expected positive integer; received \"%s\"." % type(port))
 
         if int(port) <= 0:
@@ -281,6 +459,383 @@ class ControllerSocket(object):
         self.port = int(port)
 
 
+    def getProfile(self):
+        """
+        Return the socket options applied to the socket.
+
+           :returns: the socket options, keyed by option name
+           :rtype: dict
+
+        .. versionadded:: 0.2.0
+        .. function:: getProfile()
+        """
+        return self.profile
+
+
+    def setProfile(self, profile):
+        """
+        Set the socket options for the socket, applying them at once if it is open and otherwise on `connect()`.
+
+        Profiles are dicts with any of the following options:
+
+        * `nodelay` (bool) - sets `TCP_NODELAY`, disabling Nagle's algorithm for small writes
+        * `keepalive` (bool) - sets `SO_KEEPALIVE`, so dead peers are noticed without sending
+        * `keepaliveIdle`, `keepaliveInterval`, `keepaliveCount` (int) - tune keepalive probes where supported
+        * `sendBuffer`, `receiveBuffer` (int) - set `SO_SNDBUF` and `SO_RCVBUF` in bytes
+        * `reuseAddress` (bool) - sets `SO_REUSEADDR`
+
+           :param profile: the name of a profile in `SOCKET_PROFILES`, or a dict of socket options
+           :type profile: str or dict
+
+           :raises ValueError: if provided an unknown profile or option
+
+        .. versionadded:: 0.2.0
+        .. function:: setProfile(profile)
+        """
+        if isinstance(profile, STRING_TYPES):
+            if profile not in SOCKET_PROFILES:
+                raise ValueError("Invalid profile. Expected one of %s; received \"%s\"." % (", ".join(sorted(SOCKET_PROFILES)), profile))
+
+            profile = SOCKET_PROFILES[profile]
+
+        if not isinstance(profile, dict):
+            raise ValueError("Invalid profile. Expected string or dict; received %s." % type(profile))
+
+        options = []
+
+        for option, value in profile.items():
+            if option == "nodelay":
+                options.append((socket.IPPROTO_TCP, socket.TCP_NODELAY, int(bool(value))))
+
+            elif option == "keepalive":
+                options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, int(bool(value))))
+
+            elif option == "reuseAddress":
+                options.append((socket.SOL_SOCKET, socket.SO_REUSEADDR, int(bool(value))))
+
+            elif option == "sendBuffer":
+                options.append((socket.SOL_SOCKET, socket.SO_SNDBUF, int(value)))
+
+            elif option == "receiveBuffer":
+                options.append((socket.SOL_SOCKET, socket.SO_RCVBUF, int(value)))
+
+            elif option in ("keepaliveIdle", "keepaliveInterval", "keepaliveCount"):
+                # Keepalive tuning is platform-specific; macOS names the idle option TCP_KEEPALIVE
+                name = {
+                    "keepaliveIdle": "TCP_KEEPIDLE" if hasattr(socket, "TCP_KEEPIDLE") else "TCP_KEEPALIVE",
+                    "keepaliveInterval": "TCP_KEEPINTVL",
+                    "keepaliveCount": "TCP_KEEPCNT",
+                }[option]
+
+                if hasattr(socket, name):
+                    options.append((socket.IPPROTO_TCP, getattr(socket, name), int(value)))
+                else:
+                    self.logger.debug("Socket option %s not supported on this platform; ignoring." % name)
+
+            else:
+                raise ValueError("Invalid profile. Unknown socket option \"%s\"." % option)
+
+        if self.socket is not None:
+            for level, name, value in options:
+                self.socket.setsockopt(level, name, value)
+
+        self.profile = dict(profile)
+
+
+    def getRecorder(self):
+        """
+        Return the recorder given every packet sent and received, if any.
+
+           :returns: the recorder, or None
+           :rtype: CaptureWriter
+
+        .. versionadded:: 0.2.0
+        .. function:: getRecorder()
+        """
+        return self.recorder
+
+
+    def setRecorder(self, recorder):
+        """
+        Set a recorder to be given every packet sent and received, such as a `CaptureWriter`.  The recorder is called
+        from post-send and post-receive hooks.
+
+           :param recorder: an object with `recordSent(data)` and `recordReceived(data)` methods, or None to stop recording
+           :type recorder: CaptureWriter
+
+        .. versionadded:: 0.2.0
+        .. function:: setRecorder(recorder)
+        """
+        if self.recorder is not None:
+            self.removeHook(HOOK_POST_SEND, self._recordSent)
+            self.removeHook(HOOK_POST_RECEIVE, self._recordReceived)
+
+        self.recorder = recorder
+
+        if recorder is not None:
+            self.addHook(HOOK_POST_SEND, self._recordSent)
+            self.addHook(HOOK_POST_RECEIVE, self._recordReceived)
+
+
+    def getEstimator(self):
+        """
+        Return the round-trip time estimator timing this socket, if any.
+
+           :returns: the estimator, or None
+           :rtype: RTTEstimator
+
+        .. versionadded:: 0.2.0
+        .. function:: getEstimator()
+        """
+        return self.estimator
+
+
+    def setEstimator(self, estimator):
+        """
+        Set a round-trip time estimator to time this socket's connects and receives, and to be given a measurement for
+        every request answered with nothing else outstanding.  Without one, the socket blocks without a timeout.
+
+           :param estimator: the estimator, usually shared by every socket, or None
+           :type estimator: RTTEstimator
+
+        .. versionadded:: 0.2.0
+        .. function:: setEstimator(estimator)
+        """
+        self.estimator = estimator
+        self.outstanding = 0
+        self.sentAt = None
+
+        if estimator is None and self.socket is not None:
+            self.socket.settimeout(None)
+
+
+    def addHook(self, stage, callback):
+        """
+        Add a callback to a point in the socket's traffic.  Callbacks run in the order added, on the thread using the
+        socket, and are given `(controller, value)`:
+
+        - `pre-send`: the message about to be sent; a callback may return a replacement message, or raise to stop it
+        - `post-send`: the message sent
+        - `post-receive`: the bytes or packet received
+        - `error`: the exception raised by a failed send or receive, which is raised again after the callbacks
+
+           :param stage: one of `HOOK_STAGES`
+           :type stage: str
+           :param callback: the callback
+           :type callback: callable
+
+           :raises ValueError: if the stage is unknown
+
+        .. versionadded:: 0.2.0
+        .. function:: addHook(stage, callback)
+        """
+        if stage not in HOOK_STAGES:
+            raise ValueError("Invalid hook stage. Expected one of %s; received \"%s\"." % (", ".join(HOOK_STAGES), stage))
+
+        # Replaced rather than changed, so a send running on another thread sees a consistent set
+        hooks = dict(self.hooks or {})
+        hooks[stage] = hooks.get(stage, ()) + (callback,)
+        self.hooks = hooks
+
+
+    def removeHook(self, stage, callback):
+        """
+        Remove a callback added with `addHook()`.
+
+           :param stage: one of `HOOK_STAGES`
+           :type stage: str
+           :param callback: the callback
+           :type callback: callable
+
+           :raises ValueError: if the callback is not a hook at that stage
+
+        .. versionadded:: 0.2.0
+        .. function:: removeHook(stage, callback)
+        """
+        callbacks = list(self.getHooks(stage))
+
+        if callback not in callbacks:
+            raise ValueError("Callback is not a %s hook." % stage)
+
+        callbacks.remove(callback)
+        hooks = dict(self.hooks)
+
+        if callbacks:
+            hooks[stage] = tuple(callbacks)
+        else:
+            del hooks[stage]
+
+        self.hooks = hooks or None
+
+
+    def getHooks(self, stage):
+        """
+        Return the callbacks at a point in the socket's traffic.
+
+           :param stage: one of `HOOK_STAGES`
+           :type stage: str
+
+           :returns: the callbacks, in the order they run
+           :rtype: tuple
+
+        .. versionadded:: 0.2.0
+        .. function:: getHooks(stage)
+        """
+        return (self.hooks or {}).get(stage, ())
+
+
+    def runHooks(self, stage, value):
+        """
+        Call the callbacks at a point in the socket's traffic.  Used by the socket itself, and by event loops that
+        drive its connection.
+
+           :param stage: one of `HOOK_STAGES`
+           :type stage: str
+           :param value: the message, received bytes, or exception
+           :type value: bytes or bytearray or memoryview or Exception
+
+           :returns: the value, as replaced by any `pre-send` callback
+           :rtype: bytes or bytearray or memoryview or Exception
+
+        .. versionadded:: 0.2.0
+        .. function:: runHooks(stage, value)
+        """
+        for callback in (self.hooks or {}).get(stage, ()):
+            result = callback(self, value)
+
+            if stage == HOOK_PRE_SEND and result is not None:
+                value = result
+
+        return value
+
+
+    def getBreaker(self):
+        """
+        Return the circuit breaker guarding connections, if any.
+
+           :returns: the circuit breaker, or None
+           :rtype: CircuitBreaker
+
+        .. versionadded:: 0.2.0
+        .. function:: getBreaker()
+        """
+        return self.breaker
+
+
+    def setBreaker(self, breaker):
+        """
+        Set a circuit breaker to guard connections, recording the outcome of every `connect()`.
+
+           :param breaker: the circuit breaker for this control board, or None
+           :type breaker: CircuitBreaker
+
+        .. versionadded:: 0.2.0
+        .. function:: setBreaker(breaker)
+        """
+        self.breaker = breaker
+
+
+    def _recordSent(self, controller, data):
+        """
+        .. versionadded:: 0.2.0
+        """
+        self.recorder.recordSent(data)
+
+
+    def _recordReceived(self, controller, data):
+        """
+        .. versionadded:: 0.2.0
+        """
+        self.recorder.recordReceived(data)
+
+
+    def _measure(self):
+        """
+        Give the estimator the round trip of the request just answered, if it was the only one outstanding.
+
+        .. versionadded:: 0.2.0
+        """
+        if self.outstanding > 0:
+            self.outstanding -= 1
+
+        if self.sentAt is not None and self.outstanding == 0:
+            self.estimator.sample(self.host, self.port, time.time() - self.sentAt)
+
+        if self.outstanding == 0:
+            self.sentAt = None
+
+
+    def _timedOut(self):
+        """
+        Back off the timeout and close the connection after a receive timed out, since a late response would
+        otherwise answer the next request.
+
+        .. versionadded:: 0.2.0
+        """
+        timeout = self.estimator.getTimeout(self.host, self.port)
+        self.estimator.backoff(self.host, self.port)
+        self.close()
+
+        return SocketTransmitException("Timed out after %.3f seconds waiting for %s:%d." % (timeout, self.host, self.port))
+
+
+    def _prepareConnect(self):
+        """
+        Resolve the address to connect to, opening a socket of the matching address family if needed.
+
+           :returns: the socket address
+           :rtype: tuple
+
+           :raises socket.gaierror: if the hostname cannot be resolved
+
+        .. versionadded:: 0.2.0
+        .. function:: _prepareConnect()
+        """
+        if self.hostFamily is not None:
+            family, address = self.hostFamily, (self.host, self.port)
+        else:
+            family, address = DEFAULT_RESOLVER.resolve(self.host, self.port)
+
+        if self.socket is None or family != self.socketFamily:
+            self._openSocket(family)
+
+        return address
+
+
+    def _openSocket(self, family):
+        """
+        Open a new, unconnected socket of an address family with the socket profile applied, closing any existing one.
+
+           :param family: the address family of the new socket
+           :type family: int
+
+        .. versionadded:: 0.2.0
+        .. function:: _openSocket(family)
+        """
+        self._closeSocket()
+
+        self.logger.debug("Creating socket for %s:%d (not connected)" % (self.host, self.port))
+        self.socketFamily = family
+        self.socket = socket.socket(
+            self.socketFamily,
+            socket.SOCK_STREAM
+        )
+
+        self.setProfile(self.profile)
+
+
+    def _closeSocket(self):
+        """
+        Close and release the operating system socket, if one is open.
+
+        .. versionadded:: 0.2.0
+        .. function:: _closeSocket()
+        """
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+
     def isConnected(self):
         """
         Return whether the socket is currently connected to a server.
@@ -296,6 +851,178 @@ class ControllerSocket(object):
 
 
 
+class FrameReader(object):
+    """
+    Buffers reads from a socket so packets can be sliced out exactly, keeping surplus bytes for the next read.
+
+    .. class:: FrameReader
+    .. versionadded:: 0.2.0
+    """
+
+    def __init__(self, sock, chunkSize=4096):
+        """
+        Initialize a new FrameReader over a connected socket.
+
+           :param sock: the connected socket
+           :type sock: socket.socket
+           :param chunkSize: the number of bytes requested from the socket per read (default: 4096)
+           :type chunkSize: int
+
+        .. versionadded:: 0.2.0
+        .. function:: __init__(sock[, chunkSize = 4096])
+        """
+        self.logger = logging.getLogger("UHPPOTE.FrameReader")
+
+        self.socket = sock
+        self.chunkSize = int(chunkSize)
+        self.buffer = bytearray()
+        self.discarded = 0
+
+
+    def read(self, size):
+        """
+        Return exactly `size` bytes, reading from the socket only if the buffer holds too few.
+
+           :param size: the number of bytes to return
+           :type size: int
+
+           :returns: the bytes read
+           :rtype: bytearray
+
+           :raises SocketTransmitException: if the connection ends before enough bytes arrive
+
+        .. versionadded:: 0.2.0
+        .. function:: read(size)
+        """
+        self._fill(size)
+
+        data = self.buffer[:size]
+        del self.buffer[:size]
+        return data
+
+
+    def readFrame(self, size=64):
+        """
+        Return the next `size`-byte packet with a valid header, discarding any bytes before it.
+
+        A valid header starts with the start-of-message byte followed by a function code and two reserved zero
+        bytes.  If the buffer does not start with one, bytes are skipped up to the next start-of-message byte.
+
+           :param size: the size, in bytes, of a packet (default: 64)
+           :type size: int
+
+           :returns: the packet
+           :rtype: bytearray
+
+           :raises SocketTransmitException: if the connection ends before a whole packet arrives
+
+        .. versionadded:: 0.2.0
+        .. function:: readFrame([size = 64])
+        """
+        while True:
+            frame = self.popFrame(size)
+
+            if frame is not None:
+                return frame
+
+            self._fill(len(self.buffer) + 1)
+
+
+    def popFrame(self, size=64):
+        """
+        Return the next `size`-byte packet with a valid header if one is fully buffered, without reading from the
+        socket.  Bytes before the packet are discarded as in `readFrame()`.
+
+           :param size: the size, in bytes, of a packet (default: 64)
+           :type size: int
+
+           :returns: the packet, or None if more bytes are needed
+           :rtype: bytearray
+
+        .. versionadded:: 0.2.0
+        .. function:: popFrame([size = 64])
+        """
+        while len(self.buffer) >= 4:
+            if self.buffer[0] == START_OF_MESSAGE and self.buffer[2] == 0 and self.buffer[3] == 0:
+                if len(self.buffer) < size:
+                    return None
+
+                frame = self.buffer[:size]
+                del self.buffer[:size]
+                return frame
+
+            skip = self.buffer.find(FRAME_START, 1)
+            if skip < 0:
+                skip = len(self.buffer)
+
+            self.logger.debug("Discarding %d bytes to resynchronize packet framing." % skip)
+            self.discarded += skip
+            del self.buffer[:skip]
+
+        return None
+
+
+    def getBuffered(self):
+        """
+        Return the number of bytes received but not yet read.
+
+           :returns: the number of buffered bytes
+           :rtype: int
+
+        .. versionadded:: 0.2.0
+        .. function:: getBuffered()
+        """
+        return len(self.buffer)
+
+
+    def _fill(self, size):
+        """
+        Read from the socket until the buffer holds at least `size` bytes.
+
+           :param size: the number of bytes needed
+           :type size: int
+
+           :raises SocketTransmitException: if the connection ends before enough bytes arrive
+
+        .. versionadded:: 0.2.0
+        .. function:: _fill(size)
+        """
+        while len(self.buffer) < size:
+            chunk = self.socket.recv(self.chunkSize)
+
+            if not chunk:
+                raise SocketTransmitException("Unexpected end of connection.  Received %d bytes, but expected %d." % (len(self.buffer), size))
+
+            self.buffer.extend(chunk)
+
+
+
+
+def _getAddressFamily(host):
+    """
+    Return the address family of an IP address literal.
+
+       :param host: the host to check
+       :type host: str
+
+       :returns: `socket.AF_INET` or `socket.AF_INET6` for IP addresses, or None for anything else
+       :rtype: int
+
+    .. versionadded:: 0.2.0
+    .. function:: _getAddressFamily(host)
+    """
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+
+    try:
+        socket.inet_pton(family, host)
+    except (socket.error, ValueError):
+        return None
+
+    return family
+
+
+
+
 class SocketConnectionException(Exception):
     """
     Custom exception raised if a socket fails to connect to its target.
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+Provides a long-running local daemon that owns pooled connections to UHPPOTE RFID control boards.
+
+Clients send one JSON object per line over a Unix socket (see `DaemonClient`) and receive one JSON reply per line.
+
+   :copyright: (c) 2017 by Andrew Vaughan.
+   :license: Apache 2.0, see LICENSE for more details.
+
+.. module:: ControllerDaemon
+"""
+
+import binascii
+import errno
+import json
+import logging
+import os
+import socket
+import threading
+
+try:
+    import SocketServer as socketserver
+except ImportError:
+    import socketserver
+
+from .client import DEFAULT_SOCKET_PATH, checkSocketPath
+from .commands import execute, getCommand
+from .connection_pool import ConnectionPool
+from .serial_number import SerialNumber
+
+
+class ControllerDaemon(object):
+    """
+    Serves commands for control boards over a Unix socket, reusing one connection per board across all clients.
+
+    .. class:: ControllerDaemon
+    .. versionadded:: 0.2.0
+    """
+
+    def __init__(self, path=DEFAULT_SOCKET_PATH, pool=None):
+        """
+        Initialize a new ControllerDaemon.  The socket is not opened until `start()` or `serveForever()` is called.
+
+           :param path: the path of the Unix socket (default: see `getDefaultSocketPath()`)
+           :type path: str
+           :param pool: the connection pool to use (default: a new `ConnectionPool`)
+           :type pool: ConnectionPool
+
+        .. versionadded:: 0.2.0
+        .. function:: __init__([path = DEFAULT_SOCKET_PATH, pool = None])
+        """
+        self.logger = logging.getLogger("UHPPOTE.ControllerDaemon")
+
+        self.path = path
+        self.pool = pool if pool is not None else ConnectionPool()
+        self.server = None
+        self.thread = None
+
+
+    def handle(self, message):
+        """
+        Run a single request and return the reply.
+
+           :param message: the request, with `command`, `serial`, `host`, and optionally `port` and `args`
+           :type message: dict
+
+           :returns: the reply, with `ok` set and either `response` (hexadecimal) or `error`
+           :rtype: dict
+
+        .. versionadded:: 0.2.0
+        .. function:: handle(message)
+        """
+        return handleRequest(self.pool, message)
+
+
+    def start(self):
+        """
+        Open the Unix socket and serve clients in a background thread.
+
+           :raises socket.error: if another daemon is already listening on the socket
+
+        .. versionadded:: 0.2.0
+        .. function:: start()
+        """
+        self._bind()
+
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.1,), name="UHPPOTE-ControllerDaemon")
+        self.thread.daemon = True
+        self.thread.start()
+
+
+    def serveForever(self):
+        """
+        Open the Unix socket and serve clients until `shutdown()` is called from another thread.
+
+           :raises socket.error: if another daemon is already listening on the socket
+
+        .. versionadded:: 0.2.0
+        .. function:: serveForever()
+        """
+        self._bind()
+        self.logger.info("Listening on %s" % self.path)
+
+        try:
+            self.server.serve_forever()
+        finally:
+            self._unbind()
+
+
+    def shutdown(self):
+        """
+        Stop serving clients, remove the Unix socket, and close all pooled connections.
+
+        .. versionadded:: 0.2.0
+        .. function:: shutdown()
+        """
+        if self.server is not None:
+            self.server.shutdown()
+
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+            self._unbind()
+
+        self.pool.close()
+
+
+    def _bind(self):
+        """
+        Open the Unix socket, replacing a stale socket file left behind by a daemon that exited uncleanly.  A missing
+        directory is created for the current user alone.
+
+           :raises socket.error: if another daemon is already listening on the socket, or the socket or its directory
+              belongs to another user
+
+        .. versionadded:: 0.2.0
+        .. function:: _bind()
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory, 0o700)
+
+        checkSocketPath(self.path)
+
+        if os.path.exists(self.path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+            try:
+                probe.connect(self.path)
+            except socket.error:
+                os.unlink(self.path)
+            else:
+                raise socket.error(errno.EADDRINUSE, "A daemon is already listening on %s." % self.path)
+            finally:
+                probe.close()
+
+        self.server = _DaemonServer(self.path, _DaemonHandler)
+        self.server.daemon = self
+
+
+    def _unbind(self):
+        """
+        Close the Unix socket and remove its file.
+
+        .. versionadded:: 0.2.0
+        .. function:: _unbind()
+        """
+        if self.server is None:
+            return
+
+        self.server.server_close()
+        self.server = None
+
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+
+
+def handleRequest(pool, message):
+    """
+    Run a single request through a connection pool and return the reply.
+
+       :param pool: the connection pool to send the request through
+       :type pool: ConnectionPool
+       :param message: the request, with `command`, `serial`, `host`, and optionally `port` and `args`
+       :type message: dict
+
+       :returns: the reply, with `ok` set and either `response` (hexadecimal) or `error`
+       :rtype: dict
+
+    .. versionadded:: 0.2.0
+    .. function:: handleRequest(pool, message)
+    """
+    try:
+        serial = SerialNumber(message["serial"])
+        command = message["command"]
+        args = message.get("args") or []
+
+        response = pool.call(
+            message["host"],
+            message.get("port", 60000),
+            lambda controller: execute(controller, serial, command, args),
+            getCommand(command).readOnly
+        )
+
+    except Exception as e:
+        logging.getLogger("UHPPOTE.ControllerDaemon").debug("Request failed: %s" % str(e))
+        return {"ok": False, "error": "%s: %s" % (type(e).__name__, str(e))}
+
+    return {"ok": True, "response": binascii.hexlify(bytes(response)).decode("ascii")}
+
+
+class _DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Unix stream server handling each client connection in its own thread.
+
+    .. versionadded:: 0.2.0
+    """
+
+    daemon_threads = True
+
+
+class _DaemonHandler(socketserver.StreamRequestHandler):
+    """
+    Reads JSON requests from a client connection, one per line, and writes one JSON reply per line.
+
+    .. versionadded:: 0.2.0
+    """
+
+    def handle(self):
+        """
+        Serve requests until the client disconnects.
+
+        .. versionadded:: 0.2.0
+        .. function:: handle()
+        """
+        for line in iter(self.rfile.readline, b""):
+            try:
+                message = json.loads(line.decode("utf-8"))
+            except ValueError as e:
+                reply = {"ok": False, "error": "ValueError: %s" % str(e)}
+            else:
+                reply = self.server.daemon.handle(message)
+
+            self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+            self.wfile.flush()
@@ -0,0 +1,813 @@
+# -*- coding: utf-8 -*-
+"""
+Provides a single-threaded, readiness-based I/O loop driving many `ControllerSocket` instances without asyncio.
+
+Operations are started with a callback, which is called from the loop as `callback(controller, result, error)` once
+the operation completes, fails, or times out.  Timeouts are kept on a hashed timer wheel, so scheduling and
+cancelling them costs the same for ten boards or ten thousand.  A timed-out or failed connection is closed and every
+operation pending on it fails, as a late response could otherwise be handed to the wrong request.
+
+Requires the `selectors` module (Python 3.4 or later).
+
+   :copyright: (c) 2017 by Andrew Vaughan.
+   :license: Apache 2.0, see LICENSE for more details.
+
+.. module:: EventLoop
+"""
+
+import collections
+import errno
+import logging
+import math
+import socket
+import time
+
+try:
+    import selectors
+except ImportError:
+    selectors = None
+
+from .controller_socket import (HOOK_ERROR, HOOK_POST_RECEIVE, HOOK_POST_SEND, HOOK_PRE_SEND, FrameReader,
+                                SocketConnectionException, SocketTransmitException)
+
+
+_IN_PROGRESS = (0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY, getattr(errno, "WSAEWOULDBLOCK", -1))
+
+
+class Timer(object):
+    """
+    A callback scheduled on a `TimerWheel`.
+
+    .. class:: Timer
+    .. versionadded:: 0.2.0
+    """
+
+    __slots__ = ("wheel", "due", "callback", "cancelled")
+
+    def __init__(self, wheel, due, callback):
+        """
+        Initialize a new Timer.
+
+           :param wheel: the wheel the timer is scheduled on
+           :type wheel: TimerWheel
+           :param due: the tick the timer fires on
+           :type due: int
+           :param callback: the callable to run, given no arguments
+           :type callback: callable
+
+        .. versionadded:: 0.2.0
+        .. function:: __init__(wheel, due, callback)
+        """
+        self.wheel = wheel
+        self.due = due
+        self.callback = callback
+        self.cancelled = False
+
+
+    def cancel(self):
+        """
+        Prevent the timer from firing.
+
+        .. versionadded:: 0.2.0
+        .. function:: cancel()
+        """
+        if not self.cancelled:
+            self.cancelled = True
+            self.wheel.count -= 1
+
+
+
+
+class TimerWheel(object):
+    """
+    A hashed timing wheel: timers are bucketed by the tick they fire on, so scheduling, cancelling, and advancing by
+    one tick take constant time regardless of the number of timers.
+
+    .. class:: TimerWheel
+    .. versionadded:: 0.2.0
+    """
+
+    def __init__(self, tick=0.01, slots=512, now=None):
+        """
+        Initialize a new, empty TimerWheel.
+
+           :param tick: the resolution of the wheel, in seconds (default: 0.01)
+           :type tick: float
+           :param slots: the number of buckets; timers further out than one turn wait extra turns (default: 512)
+           :type slots: int
+           :param now: the current time (default: `time.time()`)
+           :type now: float
+
+           :raises ValueError: if the tick is not positive or slots is below 1
+
+        .. versionadded:: 0.2.0
+        .. function:: __init__([tick = 0.01, slots = 512, now = None])
+        """
+        if float(tick) <= 0 or int(slots) <= 0:
+            raise ValueError("Invalid timer wheel. Expected positive tick and slots; received %s and %s." % (tick, slots))
+
+        self.tick = float(tick)
+        self.slots = [[] for i in range(int(slots))]
+        self.current = int((time.time() if now is None else now) / self.tick)
+        self.count = 0
+
+
+    def schedule(self, delay, callback, now=None):
+        """
+        Schedule a callback to run after a delay, rounded up to the next tick.
+
+           :param delay: the delay, in seconds
+           :type delay: float
+           :param callback: the callable to run, given no arguments
+           :type callback: callable
+           :param now: the current time (default: `time.time()`)
+           :type now: float
+
+           :returns: the timer, which can be cancelled
+           :rtype: Timer
+
+        .. versionadded:: 0.2.0
+        .. function:: schedule(delay, callback[, now = None])
+        """
+        now = time.time() if now is None else now
+        due = max(int(math.ceil((now + max(delay, 0.0)) / self.tick)), self.current + 1)
+
+        timer = Timer(self, due, callback)
+        self.slots[due % len(self.slots)].append(timer)
+        self.count += 1
+
+        return timer
+
+
+    def advance(self, now=None):
+        """
+        Run every timer due by a given time.
+
+           :param now: the current time (default: `time.time()`)
+           :type now: float
+
+           :returns: the number of timers run
+           :rtype: int
+
+        .. versionadded:: 0.2.0
+        .. function:: advance([now = None])
+        """
+        target = int((time.time() if now is None else now) / self.tick)
+        fired = 0
+
+        # After a long stall every bucket is visited once rather than once per elapsed tick
+        steps = min(target - self.current, len(self.slots))
+
+        for step in range(1, steps + 1):
+            slot = self.slots[(self.current + step) % len(self.slots)]
+            due = [timer for timer in slot if timer.due <= target]
+
+            if not due:
+                continue
+
+            slot[:] = [timer for timer in slot if timer.due > target]
+
+            for timer in due:
+                if not timer.cancelled:
+                    timer.cancelled = True
+                    self.count -= 1
+                    fired += 1
+                    timer.callback()
+
+        self.current = max(self.current, target)
+        return fired
+
+
+    def __len__(self):
+        """
+        Return the number of timers waiting to fire.
+
+           :returns: the number of timers
+           :rtype: int
+
+        .. versionadded:: 0.2.0
+        .. function:: __len__()
+        """
+        return self.count
+
+
+
+
+class _Channel(object):
+    """
+    The operations pending on one controller.
+
+    .. versionadded:: 0.2.0
+    """
+
+    __slots__ = ("controller", "socket", "events", "connecting", "sends", "receives")
+
+    def __init__(self, controller):
+        self.controller = controller
+        self.socket = None
+        self.events = 0
+        self.connecting = None
+        self.sends = collections.deque()
+        self.receives = collections.deque()
+
+
+
+
+class EventLoop(object):
+    """
+    Drives sends, receives, and connections for many control boards from one thread.
+
+    .. class:: EventLoop
+    .. versionadded:: 0.2.0
+    """
+
+    def __init__(self, tick=0.01, slots=512, chunkSize=4096):
+        """
+        Initialize a new EventLoop.
+
+           :param tick: the resolution of timeouts, in seconds (default: 0.01)
+           :type tick: float
+           :param slots: the number of buckets on the timer wheel (default: 512)
+           :type slots: int
+           :param chunkSize: the number of bytes requested from a socket per read (default: 4096)
+           :type chunkSize: int
+
+           :raises EventLoopException: if the `selectors` module is unavailable
+
+        .. versionadded:: 0.2.0
+        .. function:: __init__([tick = 0.01, slots = 512, chunkSize = 4096])
+        """
+        self.logger = logging.getLogger("UHPPOTE.EventLoop")
+
+        if selectors is None:
+            raise EventLoopException("The event loop requires the selectors module (Python 3.4 or later).")
+
+        self.selector = selectors.DefaultSelector()
+        self.timers = TimerWheel(tick, slots)
+        self.chunkSize = int(chunkSize)
+        self.channels = {}
+        self.pending = 0
+        self.stopping = False
+
+
+    def connect(self, controller, callback, timeout=5.0):
+        """
+        Start connecting a controller.  The callback's result is None.
+
+           :param controller: the controller to connect
+           :type controller: ControllerSocket
+           :param callback: called with `(controller, None, error)`; error is None on success
+           :type callback: callable
+           :param timeout: seconds to wait before failing with `SocketConnectionException` (default: 5.0)
+           :type timeout: float
+
+           :raises EventLoopException: if the controller is already connected or connecting
+
+        .. versionadded:: 0.2.0
+        .. function:: connect(controller, callback[, timeout = 5.0])
+        """
+        channel = self._getChannel(controller)
+
+        if controller.isConnected() or channel.connecting is not None:
+            raise EventLoopException("Controller %s:%d is already connected or connecting." % (controller.getHost(), controller.getPort()))
+
+        try:
+            if controller.breaker is not None:
+                controller.breaker.allow()
+
+        except SocketConnectionException as e:
+            self._complete(callback, controller, None, e)
+            return
+
+        try:
+            address = controller._prepareConnect()
+            controller.socket.setblocking(False)
+            result = controller.socket.connect_ex(address)
+
+        except (socket.error, ValueError) as e:
+            self._abortConnect(controller, callback, SocketConnectionException("Unable to connect to %s:%d: %s" % (controller.getHost(), controller.getPort(), str(e))))
+            return
+
+        if result not in _IN_PROGRESS:
+            self._abortConnect(controller, callback, SocketConnectionException("Unable to connect to %s:%d: %s" % (controller.getHost(), controller.getPort(), errno.errorcode.get(result, result))))
+            return
+
+        channel.connecting = [callback, self._schedule(channel, timeout, SocketConnectionException("Timed out connecting to %s:%d." % (controller.getHost(), controller.getPort())))]
+        self.pending += 1
+        self._update(channel)
+
+
+    def send(self, controller, msg, callback, timeout=5.0):
+        """
+        Queue a message to send through a connected controller.  The callback's result is the number of bytes sent.
+
+           :param controller: the connected controller
+           :type controller: ControllerSocket
+           :param msg: the message to send
+           :type msg: bytes or bytearray or memoryview
+           :param callback: called with `(controller, bytes sent, error)`
+           :type callback: callable
+           :param timeout: seconds to wait before failing with `SocketTransmitException` (default: 5.0)
+           :type timeout: float
+
+           :raises ValueError: if the message is empty
+
+        .. versionadded:: 0.2.0
+        .. function:: send(controller, msg, callback[, timeout = 5.0])
+        """
+        if len(msg) <= 0:
+            raise ValueError("Expected message to be sent.  Received blank message.")
+
+        channel = self._getChannel(controller)
+
+        if not controller.isConnected() and channel.connecting is None:
+            self._complete(callback, controller, None, SocketConnectionException("Socket not connected. Cannot send."))
+            return
+
+        if controller.hooks is not None:
+            msg = controller.runHooks(HOOK_PRE_SEND, msg)
+
+        channel.sends.append([memoryview(msg), 0, callback, self._schedule(channel, timeout, SocketTransmitException("Timed out sending."))])
+        self.pending += 1
+        self._update(channel)
+
+
+    def receive(self, controller, callback, size=64, timeout=5.0):
+        """
+        Queue a receive of the next well-formed packet from a connected controller.
+
+           :param controller: the connected controller
+           :type controller: ControllerSocket
+           :param callback: called with `(controller, packet, error)`
+           :type callback: callable
+           :param size: the size, in bytes, of a packet (default: 64)
+           :type size: int
+           :param timeout: seconds to wait before failing with `SocketTransmitException` (default: 5.0)
+           :type timeout: float
+
+        .. versionadded:: 0.2.0
+        .. function:: receive(controller, callback[, size = 64, timeout = 5.0])
+        """
+        channel = self._getChannel(controller)
+
+        if not controller.isConnected() and channel.connecting is None:
+            self._complete(callback, controller, None, SocketConnectionException("Socket not connected. Cannot receive."))
+            return
+
+        channel.receives.append([int(size), callback, self._schedule(channel, timeout, SocketTransmitException("Timed out receiving."))])
+        self.pending += 1
+        self._update(channel)
+        self._deliver(channel)
+
+
+    def request(self, controller, msg, callback, size=64, timeout=5.0):
+        """
+        Send a request and receive its response, pipelined behind any requests already pending on the controller.
+
+           :param controller: the connected controller
+           :type controller: ControllerSocket
+           :param msg: the request to send
+           :type msg: bytes or bytearray or memoryview
+           :param callback: called once with `(controller, response, error)` when the response arrives or either step fails
+           :type callback: callable
+           :param size: the size, in bytes, of the response (default: 64)
+           :type size: int
+           :param timeout: seconds to wait for each step (default: 5.0)
+           :type timeout: float
+
+        .. versionadded:: 0.2.0
+        .. function:: request(controller, msg, callback[, size = 64, timeout = 5.0])
+        """
+        done = [False]
+
+        def finish(controller, response, error):
+            if done[0]:
+                return
+
+            done[0] = True
+            callback(controller, response, error)
+
+        def sent(controller, result, error):
+            if error is not None:
+                self._cancelReceive(controller, finish, error)
+
+        self.send(controller, msg, sent, timeout)
+
+        # A send that failed at once has already completed the request
+        if not done[0]:
+            self.receive(controller, finish, size, timeout)
+
+
+    def callLater(self, delay, callback):
+        """
+        Run a callback from the loop after a delay.
+
+           :param delay: the delay, in seconds
+           :type delay: float
+           :param callback: the callable to run, given no arguments
+           :type callback: callable
+
+           :returns: the timer, which can be cancelled
+           :rtype: Timer
+
+        .. versionadded:: 0.2.0
+        .. function:: callLater(delay, callback)
+        """
+        return self.timers.schedule(delay, callback)
+
+
+    def remove(self, controller):
+        """
+        Stop driving a controller, failing its pending operations and restoring blocking mode so it can be used
+        directly again.
+
+           :param controller: the controller
+           :type controller: ControllerSocket
+
+        .. versionadded:: 0.2.0
+        .. function:: remove(controller)
+        """
+        channel = self.channels.pop(id(controller), None)
+
+        if channel is None:
+            return
+
+        self._failPending(channel, SocketConnectionException("Controller removed from the event loop."))
+        self._setEvents(channel, 0)
+
+        if controller.isConnected():
+            controller.socket.setblocking(True)
+
+
+    def runOnce(self, timeout=None):
+        """
+        Wait for readiness or the next timer tick, whichever is first, and handle everything that is ready.
+
+           :param timeout: the longest time to wait, in seconds (default: until something is ready)
+           :type timeout: float
+
+        .. versionadded:: 0.2.0
+        .. function:: runOnce([timeout = None])
+        """
+        if len(self.timers):
+            timeout = self.timers.tick if timeout is None else min(timeout, self.timers.tick)
+
+        if self.selector.get_map():
+            ready = self.selector.select(timeout)
+        else:
+            ready = []
+
+            if timeout:
+                time.sleep(timeout)
+
+        for key, events in ready:
+            channel = key.data
+
+            if events & selectors.EVENT_WRITE:
+                self._handleWritable(channel)
+
+            if events & selectors.EVENT_READ and channel.receives:
+                self._handleReadable(channel)
+
+        self.timers.advance()
+
+
+    def run(self):
+        """
+        Run the loop until `stop()` is called or no operations or timers remain.
+
+        .. versionadded:: 0.2.0
+        .. function:: run()
+        """
+        self.stopping = False
+
+        while not self.stopping and (self.pending or len(self.timers)):
+            self.runOnce()
+
+
+    def stop(self):
+        """
+        Make `run()` return after the current iteration.
+
+        .. versionadded:: 0.2.0
+        .. function:: stop()
+        """
+        self.stopping = True
+
+
+    def close(self):
+        """
+        Remove every controller and close the selector.
+
+        .. versionadded:: 0.2.0
+        .. function:: close()
+        """
+        for channel in list(self.channels.values()):
+            self.remove(channel.controller)
+
+        self.selector.close()
+
+
+    def getPending(self):
+        """
+        Return the number of operations in progress.
+
+           :returns: the number of pending connects, sends, and receives
+           :rtype: int
+
+        .. versionadded:: 0.2.0
+        .. function:: getPending()
+        """
+        return self.pending
+
+
+    def _getChannel(self, controller):
+        """
+        Return the channel for a controller, creating it on first use.
+
+        .. versionadded:: 0.2.0
+        """
+        channel = self.channels.get(id(controller))
+
+        if channel is None:
+            channel = _Channel(controller)
+            self.channels[id(controller)] = channel
+
+            if controller.isConnected():
+                controller.socket.setblocking(False)
+
+        return channel
+
+
+    def _schedule(self, channel, timeout, error):
+        """
+        Schedule a timeout that fails every operation on a channel.
+
+        .. versionadded:: 0.2.0
+        """
+        return self.timers.schedule(timeout, lambda: self._fail(channel, error))
+
+
+    def _update(self, channel):
+        """
+        Register the channel's socket for the events its pending operations need.
+
+        .. versionadded:: 0.2.0
+        """
+        events = 0
+
+        if channel.connecting is not None or channel.sends:
+            events |= selectors.EVENT_WRITE
+
+        if channel.receives and channel.connecting is None:
+            events |= selectors.EVENT_READ
+
+        self._setEvents(channel, events)
+
+
+    def _setEvents(self, channel, events):
+        """
+        Register, modify, or unregister a channel's socket with the selector.
+
+        .. versionadded:: 0.2.0
+        """
+        sock = channel.controller.socket
+
+        # The controller may have replaced its socket, as it does when the address family changes
+        if channel.events and channel.socket is not sock:
+            self.selector.unregister(channel.socket)
+            channel.events = 0
+
+        if events == channel.events:
+            return
+
+        if not events:
+            self.selector.unregister(sock)
+        elif not channel.events:
+            self.selector.register(sock, events, channel)
+        else:
+            self.selector.modify(sock, events, channel)
+
+        channel.socket = sock
+        channel.events = events
+
+
+    def _handleWritable(self, channel):
+        """
+        Complete a pending connection, or send as much queued data as the socket accepts.
+
+        .. versionadded:: 0.2.0
+        """
+        controller = channel.controller
+
+        if channel.connecting is not None:
+            error = controller.socket.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+
+            if error:
+                self._recordConnect(controller, False)
+                return self._fail(channel, SocketConnectionException("Unable to connect to %s:%d: %s" % (controller.getHost(), controller.getPort(), errno.errorcode.get(error, error))))
+
+            callback, timer = channel.connecting
+            channel.connecting = None
+            timer.cancel()
+            self.pending -= 1
+
+            controller.reader = FrameReader(controller.socket, self.chunkSize)
+            controller.connected = True
+            self._recordConnect(controller, True)
+
+            self._update(channel)
+            self._complete(callback, controller, None, None)
+            return
+
+        while channel.sends:
+            entry = channel.sends[0]
+
+            try:
+                sent = controller.socket.send(entry[0][entry[1]:])
+            except socket.error as e:
+                if e.args and e.args[0] in _IN_PROGRESS:
+                    return
+
+                return self._fail(channel, SocketTransmitException("Connection broken: %s" % str(e)))
+
+            entry[1] += sent
+
+            if entry[1] < len(entry[0]):
+                return
+
+            channel.sends.popleft()
+            entry[3].cancel()
+            self.pending -= 1
+
+            if controller.hooks is not None:
+                controller.runHooks(HOOK_POST_SEND, entry[0])
+
+            self._update(channel)
+            self._complete(entry[2], controller, len(entry[0]), None)
+
+
+    def _handleReadable(self, channel):
+        """
+        Read what the socket holds and deliver any complete packets.
+
+        .. versionadded:: 0.2.0
+        """
+        try:
+            chunk = channel.controller.socket.recv(self.chunkSize)
+        except socket.error as e:
+            if e.args and e.args[0] in _IN_PROGRESS:
+                return
+
+            return self._fail(channel, SocketTransmitException("Connection broken: %s" % str(e)))
+
+        if not chunk:
+            return self._fail(channel, SocketTransmitException("Unexpected end of connection."))
+
+        channel.controller.reader.buffer.extend(chunk)
+        self._deliver(channel)
+
+
+    def _deliver(self, channel):
+        """
+        Hand buffered packets to pending receives, in order.
+
+        .. versionadded:: 0.2.0
+        """
+        controller = channel.controller
+
+        while channel.receives and controller.reader is not None:
+            size, callback, timer = channel.receives[0]
+            frame = controller.reader.popFrame(size)
+
+            if frame is None:
+                return
+
+            channel.receives.popleft()
+            timer.cancel()
+            self.pending -= 1
+
+            if controller.hooks is not None:
+                controller.runHooks(HOOK_POST_RECEIVE, frame)
+
+            self._update(channel)
+            self._complete(callback, controller, frame, None)
+
+
+    def _fail(self, channel, error):
+        """
+        Fail every operation pending on a channel and close its controller.
+
+        .. versionadded:: 0.2.0
+        """
+        self.logger.debug("Closing %s:%d: %s" % (channel.controller.getHost(), channel.controller.getPort(), str(error)))
+
+        if channel.controller.hooks is not None:
+            channel.controller.runHooks(HOOK_ERROR, error)
+
+        self._setEvents(channel, 0)
+        self.channels.pop(id(channel.controller), None)
+        channel.controller.close()
+
+        self._failPending(channel, error)
+
+
+    def _failPending(self, channel, error):
+        """
+        Fail every operation pending on a channel.
+
+        .. versionadded:: 0.2.0
+        """
+        callbacks = []
+
+        if channel.connecting is not None:
+            callbacks.append(channel.connecting[0])
+            channel.connecting[1].cancel()
+            channel.connecting = None
+
+        for entry in channel.sends:
+            callbacks.append(entry[2])
+            entry[3].cancel()
+
+        for entry in channel.receives:
+            callbacks.append(entry[1])
+            entry[2].cancel()
+
+        channel.sends.clear()
+        channel.receives.clear()
+        self.pending -= len(callbacks)
+
+        for callback in callbacks:
+            self._complete(callback, channel.controller, None, error)
+
+
+    def _cancelReceive(self, controller, callback, error):
+        """
+        Withdraw a receive whose request could not be sent, failing it with the send's error.
+
+        .. versionadded:: 0.2.0
+        """
+        channel = self.channels.get(id(controller))
+
+        if channel is not None:
+            for entry in channel.receives:
+                if entry[1] is callback:
+                    channel.receives.remove(entry)
+                    entry[2].cancel()
+                    self.pending -= 1
+                    self._update(channel)
+                    break
+
+        self._complete(callback, controller, None, error)
+
+
+    def _abortConnect(self, controller, callback, error):
+        """
+        Fail a connection attempt that failed before it could be waited on, releasing its socket and channel.
+
+        .. versionadded:: 0.2.0
+        """
+        controller._closeSocket()
+        self.channels.pop(id(controller), None)
+
+        self._recordConnect(controller, False)
+        self._complete(callback, controller, None, error)
+
+
+    def _recordConnect(self, controller, succeeded):
+        """
+        Report a connection outcome to the controller's circuit breaker, if it has one.
+
+        .. versionadded:: 0.2.0
+        """
+        if controller.breaker is None:
+            return
+
+        if succeeded:
+            controller.breaker.recordSuccess()
+        else:
+            controller.breaker.recordFailure()
+
+
+    def _complete(self, callback, controller, result, error):
+        """
+        Run a completion callback, logging rather than propagating its exceptions so the loop keeps running.
+
+        .. versionadded:: 0.2.0
+        """
+        try:
+            callback(controller, result, error)
+        except Exception:
+            self.logger.exception("Event loop callback failed.")
+
+
+
+
+class EventLoopException(Exception):
+    """
+    Custom exception raised if the event loop cannot be used as requested.
+
+    .. versionadded:: 0.2.0
+    """
+
+    pass
@@ -0,0 +1,792 @@
+# -*- coding: utf-8 -*-
+"""
+Provides multi-process fleet management for large installations of UHPPOTE RFID control boards.
+
+   :copyright: (c) 2017 by Andrew Vaughan.
+   :license: Apache 2.0, see LICENSE for more details.
+
+.. module:: FleetManager
+"""
+
+import bisect
+import collections
+import hashlib
+import itertools
+import logging
+import multiprocessing
+import threading
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+from .commands import CommandException, execute, getCommand
+from .controller_socket import ControllerSocket, SocketConnectionException, SocketTransmitException
+from .response import ResponseException, parseResponse
+from .rtt import RTTEstimator
+from .serial_number import SerialNumber, SerialNumberException
+
+
+class HashRing(object):
+    """
+    Consistent hash ring used to assign control boards to nodes by serial number.
+
+    Each node is placed on the ring several times (`replicas`) so boards spread evenly, and adding or removing a node
+    only moves the boards that node owns.
+
+    .. class:: HashRing
+    .. versionadded:: 0.2.0
+    """
+
+    def __init__(self, nodes, replicas=64):
+        """
+        Initialize a new HashRing over the provided nodes.
+
+           :param nodes: the nodes to distribute serial numbers across
+           :type nodes: list
+           :param replicas: the number of points each node occupies on the ring (default: 64)
+           :type replicas: int
+
+           :raises ValueError: if no nodes are provided or replicas is below 1
+
+        .. versionadded:: 0.2.0
+        .. function:: __init__(nodes[, replicas = 64])
+        """
+        if int(replicas) <= 0:
+            raise ValueError("Invalid number of replicas for hash ring: %d" % int(replicas))
+
+        self.replicas = int(replicas)
+        self.keys = []
+        self.ring = {}
+
+        for node in nodes:
+            self.addNode(node)
+
+        if len(self.keys) == 0:
+            raise ValueError("HashRing requires at least one node.")
+
+
+    def addNode(self, node):
+        """
+        Add a node to the ring.
+
+           :param node: the node to add
+           :type node: object
+
+        .. versionadded:: 0.2.0
+        .. function:: addNode(node)
+        """
+        for replica in range(self.replicas):
+            key = self._hash("%s-%d" % (node, replica))
+            self.ring[key] = node
+            bisect.insort(self.keys, key)
+
+
+    def removeNode(self, node):
+        """
+        Remove a node from the ring.
+
+           :param node: the node to remove
+           :type node: object
+
+        .. versionadded:: 0.2.0
+        .. function:: removeNode(node)
+        """
+        for replica in range(self.replicas):
+            key = self._hash("%s-%d" % (node, replica))
+            if self.ring.pop(key, None) is not None:
+                self.keys.remove(key)
+
+
+    def getNode(self, serial):
+        """
+        Return the node that owns the given serial number.
+
+           :param serial: the serial number of the control board
+           :type serial: SerialNumber or str or int or bytearray
+
+           :returns: the node owning the serial number
+           :rtype: object
+
+           :raises SerialNumberException: if the serial number is invalid
+
+        .. versionadded:: 0.2.0
+        .. function:: getNode(serial)
+        """
+        if not isinstance(serial, SerialNumber):
+            serial = SerialNumber(serial)
+
+        index = bisect.bisect(self.keys, self._hash(serial.getHexadecimalString()))
+        if index == len(self.keys):
+            index = 0
+
+        return self.ring[self.keys[index]]
+
+
+    @staticmethod
+    def _hash(key):
+        """
+        Return a stable 32-bit position on the ring for a key.
+
+        Python's built-in `hash()` is randomized per-process, so a digest is used to keep parent and workers in
+        agreement.
+
+           :param key: the key to hash
+           :type key: str
+
+           :returns: the position on the ring
+           :rtype: int
+
+        .. versionadded:: 0.2.0
+        .. function:: _hash(key)
+        """
+        return int(hashlib.md5(key.encode("ascii")).hexdigest()[:8], 16)
+
+
+
+
+class FleetManager(object):
+    """
+    Partitions control boards across a pool of worker processes and routes commands to the owning worker.
+
+    Each worker process owns the `ControllerSocket` connections for its share of the fleet.  Commands are sent to the
+    worker by name, and the worker encodes the request, decodes the response, and returns the decoded `Response`, so
+    packet encoding, decoding, and socket I/O run on separate cores.  Within a worker, a pool of threads serves different boards at
+    once, while each board's commands still run in order, so a board that does not answer holds up only its own
+    commands.  Results and connection events from every worker are merged back into the parent.
+
+    .. class:: FleetManager
+    .. versionadded:: 0.2.0
+    """
+
+    def __init__(self, workers=None, replicas=64, concurrency=16, timeout=5.0):
+        """
+        Initialize a new FleetManager.  Worker processes are not started until `start()` is called.
+
+           :param workers: the number of worker processes (default: the number of CPUs)
+           :type workers: int
+           :param replicas: the number of hash ring points per worker (default: 64)
+           :type replicas: int
+           :param concurrency: the number of boards each worker serves at once (default: 16)
+           :type concurrency: int
+           :param timeout: the longest time, in seconds, to wait to connect to or hear from a board; shorter once the
+              board's round trips have been measured (default: 5.0)
+           :type timeout: float
+
+           :raises ValueError: if the number of workers or the concurrency is below 1, or the timeout is not positive
+
+        .. versionadded:: 0.2.0
+        .. function:: __init__([workers = None, replicas = 64, concurrency = 16, timeout = 5.0])
+        """
+        self.logger = logging.getLogger("UHPPOTE.FleetManager")
+
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+
+        if int(workers) <= 0:
+            raise ValueError("Invalid number of workers for fleet manager: %d" % int(workers))
+
+        if int(concurrency) <= 0:
+            raise ValueError("Invalid concurrency for fleet manager: %d" % int(concurrency))
+
+        if float(timeout) <= 0:
+            raise ValueError("Invalid timeout for fleet manager: %s" % timeout)
+
+        self.workerCount = int(workers)
+        self.concurrency = int(concurrency)
+        self.timeout = float(timeout)
+        self.ring = HashRing(range(self.workerCount), replicas)
+
+        self.processes = []
+        self.pipes = []
+        self.pipeLocks = []
+        self.readers = []
+
+        self.results = queue.Queue()
+        self.events = queue.Queue()
+
+        self.pending = {}
+
+        # Request IDs whose `transmit()` gave up waiting; their late results are dropped
+        self.abandoned = set()
+        self.pendingLock = threading.Lock()
+        self.requestIds = itertools.count(1)
+        self.running = False
+
+
+    def start(self):
+        """
+        Start the worker processes and the threads merging their output.
+
+        .. versionadded:: 0.2.0
+        .. function:: start()
+        """
+        if self.running:
+            return
+
+        self.logger.debug("Starting %d fleet workers..." % self.workerCount)
+
+        for worker in range(self.workerCount):
+            parentPipe, childPipe = multiprocessing.Pipe()
+
+            process = multiprocessing.Process(
+                target=_runWorker,
+                args=(childPipe, worker, self.concurrency, self.timeout),
+                name="UHPPOTE-FleetWorker-%d" % worker
+            )
+            process.daemon = True
+            process.start()
+            childPipe.close()
+
+            reader = threading.Thread(
+                target=self._readWorker,
+                args=(parentPipe, worker),
+                name="UHPPOTE-FleetReader-%d" % worker
+            )
+            reader.daemon = True
+            reader.start()
+
+            self.processes.append(process)
+            self.pipes.append(parentPipe)
+            self.pipeLocks.append(threading.Lock())
+            self.readers.append(reader)
+
+        self.running = True
+
+
+    def stop(self, timeout=5.0):
+        """
+        Stop all worker processes, closing their controller connections.
+
+           :param timeout: the number of seconds to wait for each worker to exit (default: 5.0)
+           :type timeout: float
+
+        .. versionadded:: 0.2.0
+        .. function:: stop([timeout = 5.0])
+        """
+        if not self.running:
+            return
+
+        self.logger.debug("Stopping fleet workers...")
+
+        for worker in range(self.workerCount):
+            try:
+                self._dispatch(worker, ("stop",))
+            except (EOFError, IOError, OSError):
+                pass
+
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+
+        for reader in self.readers:
+            reader.join(timeout)
+
+        for pipe in self.pipes:
+            pipe.close()
+
+        self.processes = []
+        self.pipes = []
+        self.pipeLocks = []
+        self.readers = []
+        self.running = False
+
+        with self.pendingLock:
+            for waiter in self.pending.values():
+                waiter[1] = (None, FleetManagerException("FleetManager stopped before a result was received."))
+                waiter[0].set()
+
+            self.pending = {}
+            self.abandoned = set()
+
+
+    def getWorker(self, serial):
+        """
+        Return the index of the worker process that owns a control board.
+
+           :param serial: the serial number of the control board
+           :type serial: SerialNumber or str or int or bytearray
+
+           :returns: the worker index
+           :rtype: int
+
+           :raises SerialNumberException: if the serial number is invalid
+
+        .. versionadded:: 0.2.0
+        .. function:: getWorker(serial)
+        """
+        return self.ring.getNode(serial)
+
+
+    def register(self, serial, host, port=60000):
+        """
+        Assign a control board to its owning worker.  The worker connects on the first command it receives.
+
+           :param serial: the serial number of the control board
+           :type serial: SerialNumber or str or int or bytearray
+           :param host: the hostname or IP address of the control board
+           :type host: str
+           :param port: the port of the control board (default: 60000)
+           :type port: int
+
+           :returns: the index of the owning worker
+           :rtype: int
+
+           :raises SerialNumberException: if the serial number is invalid
+           :raises FleetManagerException: if the manager has not been started
+
+        .. versionadded:: 0.2.0
+        .. function:: register(serial, host[, port = 60000])
+        """
+        serial = _toSerial(serial)
+        worker = self.getWorker(serial)
+
+        self._dispatch(worker, ("register", serial.getInteger(), host, port))
+        return worker
+
+
+    def unregister(self, serial):
+        """
+        Remove a control board from its owning worker, closing its connection.
+
+           :param serial: the serial number of the control board
+           :type serial: SerialNumber or str or int or bytearray
+
+           :raises SerialNumberException: if the serial number is invalid
+           :raises FleetManagerException: if the manager has not been started
+
+        .. versionadded:: 0.2.0
+        .. function:: unregister(serial)
+        """
+        serial = _toSerial(serial)
+        self._dispatch(self.getWorker(serial), ("unregister", serial.getInteger()))
+
+
+    def submit(self, serial, command, args=None):
+        """
+        Queue a command for a control board without waiting.  The decoded response is delivered through
+        `getResult()`.
+
+           :param serial: the serial number of the control board
+           :type serial: SerialNumber or str or int or bytearray
+           :param command: the name of the command, such as "get-status"
+           :type command: str
+           :param args: the command arguments (default: none)
+           :type args: list
+
+           :returns: the request ID, as reported by `getResult()`
+           :rtype: int
+
+           :raises SerialNumberException: if the serial number is invalid
+           :raises CommandException: if the command is unknown
+           :raises FleetManagerException: if the manager has not been started
+
+        .. versionadded:: 0.2.0
+        .. function:: submit(serial, command[, args = None])
+        """
+        serial = _toSerial(serial)
+        getCommand(command)
+        requestId = next(self.requestIds)
+
+        self._dispatch(self.getWorker(serial), ("transmit", requestId, serial.getInteger(), command, list(args or [])))
+        return requestId
+
+
+    def transmit(self, serial, command, args=None, timeout=None):
+        """
+        Run a command on a control board through its owning worker and wait for the decoded response.
+
+           :param serial: the serial number of the control board
+           :type serial: SerialNumber or str or int or bytearray
+           :param command: the name of the command, such as "get-status"
+           :type command: str
+           :param args: the command arguments (default: none)
+           :type args: list
+           :param timeout: the number of seconds to wait for a response (default: wait forever)
+           :type timeout: float
+
+           :returns: the decoded response
+           :rtype: Response
+
+           :raises SerialNumberException: if the serial number is invalid
+           :raises CommandException: if the command is unknown or the response does not answer it
+           :raises ValueError: if the arguments are invalid
+           :raises FleetManagerException: if the manager is not started or no response arrives in time
+           :raises SocketConnectionException: if the worker could not connect to the control board
+           :raises SocketTransmitException: if the connection broke during transmission
+
+        .. versionadded:: 0.2.0
+        .. function:: transmit(serial, command[, args = None, timeout = None])
+        """
+        serial = _toSerial(serial)
+        getCommand(command)
+        requestId = next(self.requestIds)
+        waiter = [threading.Event(), None]
+
+        with self.pendingLock:
+            self.pending[requestId] = waiter
+
+        try:
+            self._dispatch(self.getWorker(serial), ("transmit", requestId, serial.getInteger(), command, list(args or [])))
+
+            if not waiter[0].wait(timeout):
+                raise FleetManagerException("No response from %s within %s seconds." % (serial, timeout))
+
+        finally:
+            with self.pendingLock:
+                self.pending.pop(requestId, None)
+
+                if waiter[1] is None:
+                    self.abandoned.add(requestId)
+
+        response, error = waiter[1]
+        if error is not None:
+            raise error
+
+        return response
+
+
+    def getResult(self, block=True, timeout=None):
+        """
+        Return the next result of a message queued with `submit()`, in completion order.
+
+           :param block: whether to wait for a result (default: True)
+           :type block: bool
+           :param timeout: the number of seconds to wait for a result (default: wait forever)
+           :type timeout: float
+
+           :returns: a tuple of the request ID, the serial number, the decoded response (or None), and the error (or
+              None)
+           :rtype: tuple
+
+           :raises Queue.Empty: if no result is available
+
+        .. versionadded:: 0.2.0
+        .. function:: getResult([block = True, timeout = None])
+        """
+        return self.results.get(block, timeout)
+
+
+    def getEvent(self, block=True, timeout=None):
+        """
+        Return the next connection event reported by a worker, such as `"connected"` or `"disconnected"`.
+
+           :param block: whether to wait for an event (default: True)
+           :type block: bool
+           :param timeout: the number of seconds to wait for an event (default: wait forever)
+           :type timeout: float
+
+           :returns: a tuple of the serial number, the event name, and a detail message
+           :rtype: tuple
+
+           :raises Queue.Empty: if no event is available
+
+        .. versionadded:: 0.2.0
+        .. function:: getEvent([block = True, timeout = None])
+        """
+        return self.events.get(block, timeout)
+
+
+    def isRunning(self):
+        """
+        Return whether the worker processes are running.
+
+           :returns: whether the worker processes are running
+           :rtype: bool
+
+        .. versionadded:: 0.2.0
+        .. function:: isRunning()
+        """
+        return self.running
+
+
+    def _dispatch(self, worker, message):
+        """
+        Send a message to a worker process.
+
+           :param worker: the index of the worker
+           :type worker: int
+           :param message: the message to send
+           :type message: tuple
+
+           :raises FleetManagerException: if the manager has not been started
+
+        .. versionadded:: 0.2.0
+        .. function:: _dispatch(worker, message)
+        """
+        if not self.running and message[0] != "stop":
+            raise FleetManagerException("FleetManager not started. Cannot dispatch.")
+
+        with self.pipeLocks[worker]:
+            self.pipes[worker].send(message)
+
+
+    def _readWorker(self, pipe, worker):
+        """
+        Merge results and events from a worker process into the parent.
+
+           :param pipe: the parent end of the worker's pipe
+           :type pipe: multiprocessing.Connection
+           :param worker: the index of the worker
+           :type worker: int
+
+        .. versionadded:: 0.2.0
+        .. function:: _readWorker(pipe, worker)
+        """
+        while True:
+            try:
+                message = pipe.recv()
+            except (EOFError, IOError, OSError):
+                self.logger.debug("Fleet worker #%d pipe closed." % worker)
+                return
+
+            if message[0] == "event":
+                self.events.put(message[1:])
+                continue
+
+            if message[0] == "stopped":
+                return
+
+            requestId, serial, response, error = message[1:]
+            error = _toError(error)
+
+            with self.pendingLock:
+                waiter = self.pending.get(requestId)
+
+                if waiter is None and requestId in self.abandoned:
+                    self.abandoned.discard(requestId)
+                    continue
+
+            if waiter is None:
+                self.results.put((requestId, serial, response, error))
+            else:
+                waiter[1] = (response, error)
+                waiter[0].set()
+
+
+
+
+def _toSerial(serial):
+    """
+    Return the given serial number as a SerialNumber.
+
+       :param serial: the serial number
+       :type serial: SerialNumber or str or int or bytearray
+
+       :returns: the serial number
+       :rtype: SerialNumber
+
+    .. versionadded:: 0.2.0
+    .. function:: _toSerial(serial)
+    """
+    if isinstance(serial, SerialNumber):
+        return serial
+
+    return SerialNumber(serial)
+
+
+def _toError(error):
+    """
+    Rebuild an error reported by a worker process as an exception.  Workers report errors by type name and message,
+    since not every exception can be sent between processes.
+
+       :param error: the type name and message of the error, or None
+       :type error: tuple
+
+       :returns: the exception, or None; errors of unexpected types are given as `FleetManagerException`
+       :rtype: Exception
+
+    .. versionadded:: 0.2.0
+    .. function:: _toError(error)
+    """
+    if error is None:
+        return None
+
+    name, message = error
+    errorType = _ERROR_TYPES.get(name)
+
+    if errorType is None:
+        return FleetManagerException("%s: %s" % (name, message))
+
+    return errorType(message)
+
+
+def _runWorker(pipe, worker, concurrency=16, timeout=5.0):
+    """
+    Serve commands for the control boards owned by a worker process until told to stop.
+
+    Each command is encoded, sent, and its response decoded here, so the parent only routes commands and results.
+    Commands are queued per board.  A pool of threads takes boards with queued commands in turn, so boards are served
+    concurrently but each board's commands run one at a time and in order.
+
+       :param pipe: the child end of the worker's pipe
+       :type pipe: multiprocessing.Connection
+       :param worker: the index of the worker
+       :type worker: int
+       :param concurrency: the number of threads serving boards (default: 16)
+       :type concurrency: int
+       :param timeout: the longest connect and receive timeout, in seconds (default: 5.0)
+       :type timeout: float
+
+    .. versionadded:: 0.2.0
+    .. function:: _runWorker(pipe, worker[, concurrency = 16, timeout = 5.0])
+    """
+    logger = logging.getLogger("UHPPOTE.FleetManager.Worker")
+    estimator = RTTEstimator(initial=timeout, minimum=min(0.2, timeout), maximum=timeout)
+    addresses = {}
+    sockets = {}
+
+    # Queued commands by board, and the boards a thread is serving or has been asked to serve
+    backlog = {}
+    scheduled = set()
+    ready = queue.Queue()
+    lock = threading.Lock()
+    pipeLock = threading.Lock()
+
+    def report(message):
+        with pipeLock:
+            pipe.send(message)
+
+    def perform(serial, message):
+        if message[0] == "unregister":
+            controller = sockets.pop(serial, None)
+            if controller is not None:
+                controller.close()
+
+            return
+
+        requestId, name, args = message[1:]
+        response = None
+        error = None
+
+        try:
+            controller = sockets.get(serial)
+
+            if controller is None:
+                with lock:
+                    address = addresses.get(serial)
+
+                if address is None:
+                    raise FleetManagerException("Control board %d is not registered with worker #%d." % (serial, worker))
+
+                controller = ControllerSocket(*address)
+                controller.setEstimator(estimator)
+                controller.connect()
+                sockets[serial] = controller
+                report(("event", serial, "connected", "%s:%d" % address))
+
+            response = parseResponse(execute(controller, serial, name, args))
+
+        except Exception as e:
+            logger.warn("Command %d to control board %d failed: %s" % (requestId, serial, str(e)))
+            error = (type(e).__name__, str(e))
+
+            controller = sockets.pop(serial, None)
+            if controller is not None:
+                controller.close()
+                report(("event", serial, "disconnected", str(e)))
+
+        try:
+            report(("result", requestId, serial, response, error))
+        except Exception as e:
+            # The parent may be waiting on this result, so it must arrive even if the response cannot be sent
+            logger.error("Unable to report command %d to control board %d: %s" % (requestId, serial, str(e)))
+            report(("result", requestId, serial, None, (type(e).__name__, str(e))))
+
+    def serve():
+        while True:
+            serial = ready.get()
+
+            if serial is None:
+                return
+
+            with lock:
+                message = backlog[serial].popleft()
+
+            try:
+                perform(serial, message)
+            except Exception as e:
+                logger.error("Fleet worker #%d failed serving control board %d: %s" % (worker, serial, str(e)))
+
+            # One command per turn, so a board with a long queue does not starve the others
+            with lock:
+                if backlog[serial]:
+                    ready.put(serial)
+                else:
+                    del backlog[serial]
+                    scheduled.discard(serial)
+
+    threads = [threading.Thread(target=serve, name="UHPPOTE-FleetWorker-%d-%d" % (worker, index))
+               for index in range(concurrency)]
+
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    while True:
+        try:
+            message = pipe.recv()
+        except (EOFError, IOError, OSError):
+            break
+
+        command = message[0]
+
+        if command == "stop":
+            break
+
+        with lock:
+            if command == "register":
+                serial, host, port = message[1:]
+                addresses[serial] = (host, port)
+                continue
+
+            if command == "unregister":
+                serial = message[1]
+                addresses.pop(serial, None)
+            else:
+                serial = message[2]
+                message = ("transmit", message[1]) + message[3:]
+
+            # Queued behind the board's earlier commands, so a socket is never closed while in use
+            backlog.setdefault(serial, collections.deque()).append(message)
+
+            if serial not in scheduled:
+                scheduled.add(serial)
+                ready.put(serial)
+
+    for thread in threads:
+        ready.put(None)
+
+    for thread in threads:
+        thread.join(timeout)
+
+    for controller in list(sockets.values()):
+        controller.close()
+
+    try:
+        report(("stopped",))
+    except (EOFError, IOError, OSError):
+        pass
+
+    pipe.close()
+
+
+
+
+class FleetManagerException(Exception):
+    """
+    Custom exception raised if the fleet manager cannot route or complete a command.
+
+    .. versionadded:: 0.2.0
+    """
+
+    pass
+
+
+# Exceptions a worker may report, rebuilt in the parent by name
+_ERROR_TYPES = dict((errorType.__name__, errorType) for errorType in (
+    CommandException, FleetManagerException, ResponseException, SerialNumberException, SocketConnectionException,
+    SocketTransmitException, ValueError
+))
@@ -0,0 +1,477 @@
+# -*- coding: utf-8 -*-
+"""
+Provides an optional HTTP/JSON gateway to UHPPOTE RFID control boards.
+
+Endpoints:
+
+* `POST /command` - run one request (`serial`, `host`, optional `port`, `command`, optional `args`)
+* `POST /batch` - run a list of requests, concurrently across boards, returning replies in request order; every
+  batch shares one bounded set of worker threads
+* `GET /health` - report that the gateway is running and how many boards it holds connections to
+
+A request that shares the result of an identical read already in flight, or a batch, is answered with 504 Gateway
+Timeout (or, in a batch, an error reply) if the result does not arrive in time.
+
+Every service shares the gateway's single pooled connection per board, so connection churn on the boards does not
+grow with the number of clients.
+
+   :copyright: (c) 2017 by Andrew Vaughan.
+   :license: Apache 2.0, see LICENSE for more details.
+
+.. module:: ControllerGateway
+"""
+
+import json
+import logging
+import threading
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+try:
+    import BaseHTTPServer as httpserver
+    import SocketServer as socketserver
+except ImportError:
+    import http.server as httpserver
+    import socketserver
+
+from .commands import COMMANDS
+from .connection_pool import ConnectionPool
+from .daemon import handleRequest
+
+
+class ControllerGateway(object):
+    """
+    Serves controller commands over HTTP/JSON, coalescing identical reads that are in flight at the same time.
+
+    .. class:: ControllerGateway
+    .. versionadded:: 0.2.0
+    """
+
+    def __init__(self, host="127.0.0.1", port=8080, pool=None, maxBatch=1000, workers=32, timeout=5.0,
+                 waitTimeout=30.0):
+        """
+        Initialize a new ControllerGateway.  The server is not opened until `start()` or `serveForever()` is called.
+
+           :param host: the address to listen on (default: 127.0.0.1)
+           :type host: str
+           :param port: the port to listen on; 0 picks a free port (default: 8080)
+           :type port: int
+           :param pool: the connection pool to use (default: a new `ConnectionPool` timed out by `timeout`)
+           :type pool: ConnectionPool
+           :param maxBatch: the maximum number of requests accepted in one batch (default: 1000)
+           :type maxBatch: int
+           :param workers: the number of threads running batch requests, shared by every batch (default: 32)
+           :type workers: int
+           :param timeout: the longest time, in seconds, to wait to connect to or hear from a board, if no pool is
+              given (default: 5.0)
+           :type timeout: float
+           :param waitTimeout: the longest time, in seconds, to wait for the result of an identical request already in
+              flight, or for a batch to finish (default: 30.0)
+           :type waitTimeout: float
+
+           :raises ValueError: if the number of workers is below 1, or a timeout is not positive
+
+        .. versionadded:: 0.2.0
+        .. function:: __init__([host = "127.0.0.1", port = 8080, pool = None, maxBatch = 1000, workers = 32, ...])
+        """
+        self.logger = logging.getLogger("UHPPOTE.ControllerGateway")
+
+        if int(workers) <= 0:
+            raise ValueError("Invalid number of workers for gateway: %d" % int(workers))
+
+        if float(waitTimeout) <= 0:
+            raise ValueError("Invalid wait timeout for gateway: %s" % waitTimeout)
+
+        self.host = host
+        self.port = int(port)
+        self.pool = pool if pool is not None else ConnectionPool(timeout=timeout)
+        self.maxBatch = int(maxBatch)
+        self.waitTimeout = float(waitTimeout)
+
+        self.inflight = {}
+        self.inflightLock = threading.Lock()
+
+        # Worker threads for batches, started on the first batch
+        self.workers = int(workers)
+        self.tasks = queue.Queue()
+        self.threads = []
+        self.threadsLock = threading.Lock()
+
+        self.server = None
+        self.thread = None
+
+
+    def handle(self, message):
+        """
+        Run a single request, sharing the reply with identical read-only requests already in flight.
+
+           :param message: the request, with `command`, `serial`, `host`, and optionally `port` and `args`
+           :type message: dict
+
+           :returns: the reply, with `ok` set and either `response` (hexadecimal) or `error`
+           :rtype: dict
+
+           :raises GatewayTimeoutException: if the shared reply does not arrive within `waitTimeout` seconds
+
+        .. versionadded:: 0.2.0
+        .. function:: handle(message)
+        """
+        key = self._getReadKey(message)
+        if key is None:
+            return handleRequest(self.pool, message)
+
+        with self.inflightLock:
+            waiter = self.inflight.get(key)
+            leader = waiter is None
+
+            if leader:
+                waiter = [threading.Event(), None]
+                self.inflight[key] = waiter
+
+        if not leader:
+            if not waiter[0].wait(self.waitTimeout):
+                raise GatewayTimeoutException("No reply within %.1f seconds from the identical request in flight." % self.waitTimeout)
+
+            return dict(waiter[1])
+
+        try:
+            waiter[1] = handleRequest(self.pool, message)
+        finally:
+            with self.inflightLock:
+                del self.inflight[key]
+
+            waiter[0].set()
+
+        return waiter[1]
+
+
+    def handleBatch(self, messages):
+        """
+        Run a list of requests, concurrently across boards and in order for each board.  Each board's requests are
+        queued for the gateway's worker threads, so concurrent batches share a fixed number of threads.  Requests
+        without a reply after `waitTimeout` seconds are given an error reply.
+
+           :param messages: the requests
+           :type messages: list
+
+           :returns: the replies, in the same order as the requests
+           :rtype: list
+
+           :raises ValueError: if the batch is not a list or exceeds `maxBatch` requests
+
+        .. versionadded:: 0.2.0
+        .. function:: handleBatch(messages)
+        """
+        if not isinstance(messages, list):
+            raise ValueError("Batch must be a list of requests.")
+
+        if len(messages) > self.maxBatch:
+            raise ValueError("Batch of %d requests exceeds the maximum of %d." % (len(messages), self.maxBatch))
+
+        replies = [None] * len(messages)
+        groups = {}
+
+        for index, message in enumerate(messages):
+            try:
+                target = (message["host"], message.get("port", 60000))
+            except (AttributeError, KeyError, TypeError):
+                target = None
+
+            groups.setdefault(target, []).append(index)
+
+        remaining = [len(groups)]
+        remainingLock = threading.Lock()
+        done = threading.Event()
+
+        def runGroup(indexes):
+            try:
+                for index in indexes:
+                    try:
+                        replies[index] = self.handle(messages[index])
+                    except GatewayTimeoutException as e:
+                        replies[index] = {"ok": False, "error": "%s: %s" % (type(e).__name__, str(e))}
+
+            finally:
+                with remainingLock:
+                    remaining[0] -= 1
+
+                    if remaining[0] == 0:
+                        done.set()
+
+        for indexes in groups.values():
+            self._submit(runGroup, indexes)
+
+        if groups and not done.wait(self.waitTimeout):
+            error = "GatewayTimeoutException: No reply within %.1f seconds." % self.waitTimeout
+            return [reply if reply is not None else {"ok": False, "error": error} for reply in replies]
+
+        return replies
+
+
+    def start(self):
+        """
+        Open the HTTP server and serve clients in a background thread.
+
+        .. versionadded:: 0.2.0
+        .. function:: start()
+        """
+        self._bind()
+
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.1,), name="UHPPOTE-ControllerGateway")
+        self.thread.daemon = True
+        self.thread.start()
+
+
+    def serveForever(self):
+        """
+        Open the HTTP server and serve clients until `shutdown()` is called from another thread.
+
+        .. versionadded:: 0.2.0
+        .. function:: serveForever()
+        """
+        self._bind()
+        self.logger.info("Listening on http://%s:%d" % (self.host, self.port))
+
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            self.server = None
+
+
+    def shutdown(self):
+        """
+        Stop serving clients and close all pooled connections.
+
+        .. versionadded:: 0.2.0
+        .. function:: shutdown()
+        """
+        if self.server is not None:
+            self.server.shutdown()
+
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+            self.server.server_close()
+            self.server = None
+
+        with self.threadsLock:
+            threads = self.threads
+            self.threads = []
+
+        for thread in threads:
+            self.tasks.put(None)
+
+        for thread in threads:
+            thread.join()
+
+        self.pool.close()
+
+
+    def getPort(self):
+        """
+        Return the port the gateway listens on, which is only known after binding if 0 was requested.
+
+           :returns: the port
+           :rtype: int
+
+        .. versionadded:: 0.2.0
+        .. function:: getPort()
+        """
+        return self.port
+
+
+    def _bind(self):
+        """
+        Open the HTTP server.
+
+        .. versionadded:: 0.2.0
+        .. function:: _bind()
+        """
+        self.server = _GatewayServer((self.host, self.port), _GatewayHandler)
+        self.server.gateway = self
+        self.port = self.server.server_address[1]
+
+
+    def _submit(self, function, *args):
+        """
+        Queue a call for the worker threads, starting them if needed.
+
+           :param function: the callable to run
+           :type function: callable
+           :param args: its arguments
+
+        .. versionadded:: 0.2.0
+        .. function:: _submit(function, *args)
+        """
+        with self.threadsLock:
+            while len(self.threads) < self.workers:
+                thread = threading.Thread(target=self._work, name="UHPPOTE-GatewayWorker-%d" % len(self.threads))
+                thread.daemon = True
+                thread.start()
+                self.threads.append(thread)
+
+        self.tasks.put((function, args))
+
+
+    def _work(self):
+        """
+        Run queued calls until given None.
+
+        .. versionadded:: 0.2.0
+        .. function:: _work()
+        """
+        while True:
+            task = self.tasks.get()
+
+            if task is None:
+                return
+
+            try:
+                task[0](*task[1])
+            except Exception as e:
+                self.logger.error("Batch request failed: %s" % str(e))
+
+
+    @staticmethod
+    def _getReadKey(message):
+        """
+        Return the key identifying a read-only request for coalescing, or None if it must not be coalesced.
+
+           :param message: the request
+           :type message: dict
+
+           :returns: the key identifying the request
+           :rtype: tuple
+
+        .. versionadded:: 0.2.0
+        .. function:: _getReadKey(message)
+        """
+        try:
+            command = COMMANDS.get(message["command"])
+
+            if command is None or not command.readOnly:
+                return None
+
+            return (
+                message["host"],
+                int(message.get("port", 60000)),
+                str(message["serial"]),
+                command.name,
+                tuple(str(arg) for arg in message.get("args") or []),
+            )
+
+        except (AttributeError, KeyError, TypeError, ValueError):
+            return None
+
+
+
+
+class _GatewayServer(socketserver.ThreadingMixIn, httpserver.HTTPServer):
+    """
+    HTTP server handling each client connection in its own thread.
+
+    .. versionadded:: 0.2.0
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _GatewayHandler(httpserver.BaseHTTPRequestHandler):
+    """
+    Translates HTTP requests into gateway calls.
+
+    .. versionadded:: 0.2.0
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        """
+        Serve `GET /health`.
+
+        .. versionadded:: 0.2.0
+        .. function:: do_GET()
+        """
+        if self.path != "/health":
+            return self._reply(404, {"ok": False, "error": "Not found: %s" % self.path})
+
+        self._reply(200, {"ok": True, "connections": len(self.server.gateway.pool)})
+
+
+    def do_POST(self):
+        """
+        Serve `POST /command` and `POST /batch`.
+
+        .. versionadded:: 0.2.0
+        .. function:: do_POST()
+        """
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+
+        if self.path not in ("/command", "/batch"):
+            return self._reply(404, {"ok": False, "error": "Not found: %s" % self.path})
+
+        try:
+            message = json.loads(body.decode("utf-8"))
+
+            if self.path == "/batch":
+                return self._reply(200, self.server.gateway.handleBatch(message))
+
+        except ValueError as e:
+            return self._reply(400, {"ok": False, "error": "ValueError: %s" % str(e)})
+
+        try:
+            reply = self.server.gateway.handle(message)
+        except GatewayTimeoutException as e:
+            return self._reply(504, {"ok": False, "error": "GatewayTimeoutException: %s" % str(e)})
+
+        self._reply(200, reply)
+
+
+    def log_message(self, format, *args):
+        """
+        Send access logs to the gateway's logger rather than standard error.
+
+        .. versionadded:: 0.2.0
+        .. function:: log_message(format, *args)
+        """
+        self.server.gateway.logger.debug("%s - %s" % (self.address_string(), format % args))
+
+
+    def _reply(self, status, payload):
+        """
+        Write a JSON response.
+
+           :param status: the HTTP status code
+           :type status: int
+           :param payload: the JSON-serializable payload
+           :type payload: dict or list
+
+        .. versionadded:: 0.2.0
+        .. function:: _reply(status, payload)
+        """
+        body = json.dumps(payload).encode("utf-8")
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+
+
+class GatewayTimeoutException(Exception):
+    """
+    Custom exception raised if a reply shared with another request does not arrive in time.
+
+    .. versionadded:: 0.2.0
+    """
+
+    pass
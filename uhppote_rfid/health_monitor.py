@@ -0,0 +1,561 @@
+# -*- coding: utf-8 -*-
+"""
+Provides adaptive health monitoring for fleets of UHPPOTE RFID control boards.
+
+   :copyright: (c) 2017 by Andrew Vaughan.
+   :license: Apache 2.0, see LICENSE for more details.
+
+.. module:: HealthMonitor
+"""
+
+import array
+import heapq
+import logging
+import threading
+import time
+
+from .commands import execute
+from .controller_socket import ControllerSocket
+from .rtt import RTTEstimator
+from .serial_number import SerialNumber
+
+
+STATE_ACTIVE = 0
+STATE_IDLE = 1
+STATE_UNREACHABLE = 2
+
+STATE_NAMES = {
+    STATE_ACTIVE: "active",
+    STATE_IDLE: "idle",
+    STATE_UNREACHABLE: "unreachable",
+}
+
+
+def connectProbe(controller, serial=None):
+    """
+    Probe a control board by opening and closing a connection to it.
+
+       :param controller: the socket for the control board
+       :type controller: ControllerSocket
+       :param serial: the serial number of the control board, which a bare connection does not need (default: None)
+       :type serial: SerialNumber or str or int or bytearray
+
+       :returns: False, as a bare connection reports no activity on the board
+       :rtype: bool
+
+       :raises SocketConnectionException: if the control board cannot be reached
+
+    .. versionadded:: 0.2.0
+    .. function:: connectProbe(controller[, serial = None])
+    """
+    controller.connect(1)
+    controller.close()
+    return False
+
+
+def statusProbe(controller, serial):
+    """
+    Probe a control board by asking for its status.  Unlike a bare connection, the board must answer, and the round
+    trip is given to the socket's RTT estimator.
+
+       :param controller: the socket for the control board
+       :type controller: ControllerSocket
+       :param serial: the serial number of the control board
+       :type serial: SerialNumber or str or int or bytearray
+
+       :returns: False, as a single status reports no new activity on the board
+       :rtype: bool
+
+       :raises SocketConnectionException: if the control board cannot be reached
+       :raises SocketTransmitException: if the control board does not answer in time
+       :raises CommandException: if the answer is not a status
+
+    .. versionadded:: 0.2.0
+    .. function:: statusProbe(controller, serial)
+    """
+    controller.connect(1)
+
+    try:
+        execute(controller, serial, "get-status")
+    finally:
+        controller.close()
+
+    return False
+
+
+class HealthMonitor(object):
+    """
+    Polls control boards on an adaptive schedule.
+
+    Boards with recent activity or errors are polled every `activeInterval` seconds, healthy boards that have been
+    quiet for `idleAfter` seconds are polled every `idleInterval` seconds, and boards that fail `unreachableAfter`
+    probes in a row are probed with exponential backoff up to `maxUnreachableInterval` seconds.
+
+    Due boards are probed concurrently, up to `concurrency` at once, and every probe's connection is given
+    `probeTimeout` seconds, so an unreachable board does not delay the others' probes.
+
+    Per-board state is kept in parallel typed arrays rather than one object per board, so large fleets stay compact.
+
+    .. class:: HealthMonitor
+    .. versionadded:: 0.2.0
+    """
+
+    def __init__(self, probe=statusProbe, activeInterval=5.0, idleInterval=60.0, idleAfter=300.0,
+                 unreachableAfter=3, unreachableInterval=10.0, maxUnreachableInterval=600.0, onStateChange=None,
+                 probeTimeout=2.0, concurrency=16):
+        """
+        Initialize a new HealthMonitor.
+
+           :param probe: a callable given a `ControllerSocket` and the board's serial number, returning True if the board
+                         reported new activity and raising an exception if the board is unreachable (default:
+                         `statusProbe`)
+           :type probe: callable
+           :param activeInterval: seconds between polls of recently-active boards (default: 5.0)
+           :type activeInterval: float
+           :param idleInterval: seconds between polls of idle, healthy boards (default: 60.0)
+           :type idleInterval: float
+           :param idleAfter: seconds without activity or errors before a board is considered idle (default: 300.0)
+           :type idleAfter: float
+           :param unreachableAfter: consecutive failed probes before a board is considered unreachable (default: 3)
+           :type unreachableAfter: int
+           :param unreachableInterval: initial seconds between probes of unreachable boards (default: 10.0)
+           :type unreachableInterval: float
+           :param maxUnreachableInterval: maximum seconds between probes of unreachable boards (default: 600.0)
+           :type maxUnreachableInterval: float
+           :param onStateChange: a callable given the serial number, old state, and new state on every change; it is
+                                 called without the monitor's lock held, so it may call back into the monitor
+           :type onStateChange: callable
+           :param probeTimeout: seconds each probe's connection may take to connect or answer (default: 2.0)
+           :type probeTimeout: float
+           :param concurrency: the most boards probed at once (default: 16)
+           :type concurrency: int
+
+           :raises ValueError: if any interval or the probe timeout is not positive, or unreachableAfter or concurrency
+                               is below 1
+
+        .. versionadded:: 0.2.0
+        .. function:: __init__([probe = statusProbe, activeInterval = 5.0, idleInterval = 60.0, ...])
+        """
+        self.logger = logging.getLogger("UHPPOTE.HealthMonitor")
+
+        for name, value in (("activeInterval", activeInterval), ("idleInterval", idleInterval),
+                            ("idleAfter", idleAfter), ("unreachableInterval", unreachableInterval),
+                            ("maxUnreachableInterval", maxUnreachableInterval), ("probeTimeout", probeTimeout)):
+            if float(value) <= 0:
+                raise ValueError("Invalid %s for health monitor. Expected positive number; received \"%s\"." % (name, value))
+
+        if int(unreachableAfter) <= 0:
+            raise ValueError("Invalid unreachableAfter for health monitor: %d" % int(unreachableAfter))
+
+        if int(concurrency) <= 0:
+            raise ValueError("Invalid concurrency for health monitor: %d" % int(concurrency))
+
+        self.probe = probe
+        self.activeInterval = float(activeInterval)
+        self.idleInterval = float(idleInterval)
+        self.idleAfter = float(idleAfter)
+        self.unreachableAfter = int(unreachableAfter)
+        self.unreachableInterval = float(unreachableInterval)
+        self.maxUnreachableInterval = float(maxUnreachableInterval)
+        self.onStateChange = onStateChange
+        self.concurrency = int(concurrency)
+
+        # Probe connections time out after probeTimeout at most, sooner once a board's round trips are measured
+        self.estimator = RTTEstimator(initial=probeTimeout, minimum=min(0.2, float(probeTimeout)), maximum=probeTimeout)
+
+        self.indexes = {}
+        self.hosts = []
+        self.serials = array.array('L')
+        self.ports = array.array('H')
+        self.states = array.array('B')
+        self.failures = array.array('H')
+        self.lastActivity = array.array('d')
+        self.nextPoll = array.array('d')
+
+        self.schedule = []
+
+        # State changes made under the lock, reported to onStateChange once it is released
+        self.changes = []
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stopping = threading.Event()
+
+
+    def register(self, serial, host, port=60000, now=None):
+        """
+        Add a control board to the monitor.  New boards are considered active and are polled immediately.
+
+           :param serial: the serial number of the control board
+           :type serial: SerialNumber or str or int or bytearray
+           :param host: the hostname or IP address of the control board
+           :type host: str
+           :param port: the port of the control board (default: 60000)
+           :type port: int
+           :param now: the current time, in seconds since the epoch (default: `time.time()`)
+           :type now: float
+
+           :raises SerialNumberException: if the serial number is invalid
+           :raises ValueError: if the board is already registered
+
+        .. versionadded:: 0.2.0
+        .. function:: register(serial, host[, port = 60000, now = None])
+        """
+        serial = self._toInteger(serial)
+        now = time.time() if now is None else now
+
+        with self.lock:
+            if serial in self.indexes:
+                raise ValueError("Control board %d is already registered with the health monitor." % serial)
+
+            index = len(self.hosts)
+            self.indexes[serial] = index
+
+            self.hosts.append(host)
+            self.serials.append(serial)
+            self.ports.append(int(port))
+            self.states.append(STATE_ACTIVE)
+            self.failures.append(0)
+            self.lastActivity.append(now)
+            self.nextPoll.append(now)
+
+            heapq.heappush(self.schedule, (now, index))
+
+
+    def recordActivity(self, serial, now=None):
+        """
+        Record activity reported for a control board outside the monitor, such as a card swipe event.
+
+        The board is moved to the active schedule and polled no later than `activeInterval` seconds from now.
+
+           :param serial: the serial number of the control board
+           :type serial: SerialNumber or str or int or bytearray
+           :param now: the current time, in seconds since the epoch (default: `time.time()`)
+           :type now: float
+
+           :raises SerialNumberException: if the serial number is invalid
+           :raises KeyError: if the board is not registered
+
+        .. versionadded:: 0.2.0
+        .. function:: recordActivity(serial[, now = None])
+        """
+        now = time.time() if now is None else now
+
+        with self.lock:
+            index = self.indexes[self._toInteger(serial)]
+            self.lastActivity[index] = now
+
+            if self.states[index] != STATE_UNREACHABLE:
+                self._setState(index, STATE_ACTIVE)
+
+            if self.nextPoll[index] > now + self.activeInterval:
+                self._reschedule(index, now + self.activeInterval)
+
+        self._notify()
+
+
+    def poll(self, now=None):
+        """
+        Probe every control board that is due, and reschedule each according to the result.
+
+           :param now: the current time, in seconds since the epoch (default: `time.time()`)
+           :type now: float
+
+           :returns: the number of control boards probed
+           :rtype: int
+
+        .. versionadded:: 0.2.0
+        .. function:: poll([now = None])
+        """
+        now = time.time() if now is None else now
+        due = []
+
+        with self.lock:
+            while self.schedule and self.schedule[0][0] <= now:
+                when, index = heapq.heappop(self.schedule)
+
+                # Entries are invalidated lazily when a board is rescheduled
+                if when == self.nextPoll[index]:
+                    due.append(index)
+
+        if len(due) <= 1 or self.concurrency == 1:
+            for index in due:
+                self._probe(index, now)
+
+            return len(due)
+
+        # Threads take due boards in turn until none are left
+        remaining = iter(due)
+        remainingLock = threading.Lock()
+
+        def work():
+            while True:
+                with remainingLock:
+                    index = next(remaining, None)
+
+                if index is None:
+                    return
+
+                self._probe(index, now)
+
+        threads = [threading.Thread(target=work, name="UHPPOTE-HealthProbe")
+                   for _ in range(min(self.concurrency, len(due)))]
+
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        return len(due)
+
+
+    def getState(self, serial):
+        """
+        Return the current state of a control board: `"active"`, `"idle"`, or `"unreachable"`.
+
+           :param serial: the serial number of the control board
+           :type serial: SerialNumber or str or int or bytearray
+
+           :returns: the state of the control board
+           :rtype: str
+
+           :raises SerialNumberException: if the serial number is invalid
+           :raises KeyError: if the board is not registered
+
+        .. versionadded:: 0.2.0
+        .. function:: getState(serial)
+        """
+        return STATE_NAMES[self.states[self.indexes[self._toInteger(serial)]]]
+
+
+    def getNextPoll(self, serial):
+        """
+        Return the time a control board will next be probed.
+
+           :param serial: the serial number of the control board
+           :type serial: SerialNumber or str or int or bytearray
+
+           :returns: the time of the next probe, in seconds since the epoch
+           :rtype: float
+
+           :raises SerialNumberException: if the serial number is invalid
+           :raises KeyError: if the board is not registered
+
+        .. versionadded:: 0.2.0
+        .. function:: getNextPoll(serial)
+        """
+        return self.nextPoll[self.indexes[self._toInteger(serial)]]
+
+
+    def start(self):
+        """
+        Start polling in a background thread.
+
+        .. versionadded:: 0.2.0
+        .. function:: start()
+        """
+        if self.thread is not None:
+            return
+
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self._run, name="UHPPOTE-HealthMonitor")
+        self.thread.daemon = True
+        self.thread.start()
+
+
+    def stop(self):
+        """
+        Stop the background polling thread.
+
+        .. versionadded:: 0.2.0
+        .. function:: stop()
+        """
+        if self.thread is None:
+            return
+
+        self.stopping.set()
+        self.thread.join()
+        self.thread = None
+
+
+    def _run(self):
+        """
+        Poll due control boards until stopped, sleeping until the next board is due.
+
+        .. versionadded:: 0.2.0
+        .. function:: _run()
+        """
+        while not self.stopping.is_set():
+            self.poll()
+
+            with self.lock:
+                wait = self.schedule[0][0] - time.time() if self.schedule else self.activeInterval
+
+            self.stopping.wait(min(max(wait, 0.01), self.activeInterval))
+
+
+    def _probe(self, index, now):
+        """
+        Probe a control board and reschedule it according to the result.
+
+           :param index: the index of the board in the table
+           :type index: int
+           :param now: the time of the poll
+           :type now: float
+
+        .. versionadded:: 0.2.0
+        .. function:: _probe(index, now)
+        """
+        try:
+            controller = ControllerSocket(self.hosts[index], self.ports[index])
+            controller.setEstimator(self.estimator)
+            active = self.probe(controller, self.serials[index])
+
+        except Exception as e:
+            self.logger.debug("Probe of control board %d failed: %s" % (self.serials[index], str(e)))
+            self._recordFailure(index, now)
+
+        else:
+            self._recordSuccess(index, active, now)
+
+
+    def _recordSuccess(self, index, active, now):
+        """
+        Reschedule a control board after a successful probe.
+
+           :param index: the index of the board in the table
+           :type index: int
+           :param active: whether the probe reported new activity
+           :type active: bool
+           :param now: the time of the probe
+           :type now: float
+
+        .. versionadded:: 0.2.0
+        .. function:: _recordSuccess(index, active, now)
+        """
+        with self.lock:
+            self.failures[index] = 0
+
+            if active:
+                self.lastActivity[index] = now
+
+            if now - self.lastActivity[index] < self.idleAfter:
+                self._setState(index, STATE_ACTIVE)
+                self._reschedule(index, now + self.activeInterval)
+            else:
+                self._setState(index, STATE_IDLE)
+                self._reschedule(index, now + self.idleInterval)
+
+        self._notify()
+
+
+    def _recordFailure(self, index, now):
+        """
+        Reschedule a control board after a failed probe.
+
+        Errors count as activity, so a failing board is re-probed quickly until it is considered unreachable.
+
+           :param index: the index of the board in the table
+           :type index: int
+           :param now: the time of the probe
+           :type now: float
+
+        .. versionadded:: 0.2.0
+        .. function:: _recordFailure(index, now)
+        """
+        with self.lock:
+            failures = min(self.failures[index] + 1, 65535)
+            self.failures[index] = failures
+            self.lastActivity[index] = now
+
+            if failures < self.unreachableAfter:
+                self._reschedule(index, now + self.activeInterval)
+            else:
+                self._setState(index, STATE_UNREACHABLE)
+
+                backoff = min(failures - self.unreachableAfter, 32)
+                self._reschedule(index, now + min(self.unreachableInterval * (2 ** backoff), self.maxUnreachableInterval))
+
+        self._notify()
+
+
+    def _setState(self, index, state):
+        """
+        Change the state of a control board, queueing a notification for `onStateChange` if it differs.  The lock must
+        be held.
+
+           :param index: the index of the board in the table
+           :type index: int
+           :param state: the new state
+           :type state: int
+
+        .. versionadded:: 0.2.0
+        .. function:: _setState(index, state)
+        """
+        old = self.states[index]
+        if old == state:
+            return
+
+        self.states[index] = state
+        self.logger.debug("Control board %d is now %s." % (self.serials[index], STATE_NAMES[state]))
+
+        if self.onStateChange is not None:
+            self.changes.append((self.serials[index], STATE_NAMES[old], STATE_NAMES[state]))
+
+
+    def _notify(self):
+        """
+        Report queued state changes to `onStateChange`.  The lock must not be held, so the callback may call back into
+        the monitor.
+
+        .. versionadded:: 0.2.0
+        .. function:: _notify()
+        """
+        with self.lock:
+            if not self.changes:
+                return
+
+            changes = self.changes
+            self.changes = []
+
+        for serial, old, new in changes:
+            self.onStateChange(serial, old, new)
+
+
+    def _reschedule(self, index, when):
+        """
+        Set the next probe time of a control board.  The lock must be held.
+
+           :param index: the index of the board in the table
+           :type index: int
+           :param when: the time of the next probe
+           :type when: float
+
+        .. versionadded:: 0.2.0
+        .. function:: _reschedule(index, when)
+        """
+        self.nextPoll[index] = when
+        heapq.heappush(self.schedule, (when, index))
+
+
+    @staticmethod
+    def _toInteger(serial):
+        """
+        Return the given serial number as an integer.
+
+           :param serial: the serial number
+           :type serial: SerialNumber or str or int or bytearray
+
+           :returns: the serial number as an integer
+           :rtype: int
+
+           :raises SerialNumberException: if the serial number is invalid
+
+        .. versionadded:: 0.2.0
+        .. function:: _toInteger(serial)
+        """
+        if not isinstance(serial, SerialNumber):
+            serial = SerialNumber(serial)
+
+        return serial.getInteger()
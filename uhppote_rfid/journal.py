@@ -0,0 +1,430 @@
+# -*- coding: utf-8 -*-
+"""
+Provides a durable journal of writes for control boards that cannot be reached, replayed when they return.
+
+Writes given to `CommandJournal.submit()` are sent at once when the board is reachable.  When it is not, they are
+stored in a SQLite database, keyed by serial number, and later replayed in order through a pipelined `Transaction`.
+Each entry has an idempotency key; settings default to a key naming what they set (such as the door), so a newer
+write replaces a pending one rather than queueing behind it, and repeating an identical write is ignored.
+
+A board that fails is not tried again until its backoff expires, and only one replay runs for a board at a time, so a
+flapping link costs one attempt per backoff period however many callers are writing to it.
+
+   :copyright: (c) 2017 by Andrew Vaughan.
+   :license: Apache 2.0, see LICENSE for more details.
+
+.. module:: CommandJournal
+"""
+
+import json
+import logging
+import random
+import socket
+import sqlite3
+import threading
+import time
+
+from .commands import CommandException, execute, getCommand
+from .controller_socket import SocketConnectionException, SocketTransmitException
+from .serial_number import SerialNumber
+from .transaction import Transaction
+
+
+# Writes whose effect depends on when they run, so replaying them late would be wrong
+UNDEFERRABLE = ("open-door", "set-time")
+
+# Default idempotency keys for settings, by the command and what it sets
+SETTING_KEYS = {
+    "set-door-control": lambda args: "door=%d" % int(args[0]),
+    "set-time-profile": lambda args: "profile=%d" % int(args[0]),
+    "set-interlock": lambda args: "interlock",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    serial INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    command TEXT NOT NULL,
+    args TEXT NOT NULL,
+    created REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    UNIQUE (serial, key)
+);
+CREATE TABLE IF NOT EXISTS boards (
+    serial INTEGER PRIMARY KEY,
+    failures INTEGER NOT NULL,
+    retryAt REAL NOT NULL
+);
+"""
+
+
+class CommandJournal(object):
+    """
+    A durable, per-board queue of writes awaiting an unreachable control board.
+
+    One journal can be shared by every thread in a process.
+
+    .. class:: CommandJournal
+    .. versionadded:: 0.2.0
+    """
+
+    def __init__(self, path, batch=16, maxAttempts=5, backoff=1.0, maxBackoff=300.0):
+        """
+        Open a journal, creating its database if needed.
+
+           :param path: the path of the SQLite database, or ":memory:" for a journal that is not kept
+           :type path: str
+           :param batch: the most writes replayed in one pipelined transaction (default: 16)
+           :type batch: int
+           :param maxAttempts: the number of replays a write the board refuses is tried before it is dropped (default: 5)
+           :type maxAttempts: int
+           :param backoff: seconds before retrying a board after its first failure, doubled with each further failure
+                           (default: 1.0)
+           :type backoff: float
+           :param maxBackoff: the longest wait between retries of a board (default: 300.0)
+           :type maxBackoff: float
+
+           :raises ValueError: if a count is below 1 or a backoff is not positive
+           :raises sqlite3.Error: if the database cannot be opened
+
+        .. versionadded:: 0.2.0
+        .. function:: __init__(path[, batch = 16, maxAttempts = 5, backoff = 1.0, maxBackoff = 300.0])
+        """
+        self.logger = logging.getLogger("UHPPOTE.CommandJournal")
+
+        if int(batch) <= 0 or int(maxAttempts) <= 0:
+            raise ValueError("Invalid batch or attempts for journal: %d, %d" % (int(batch), int(maxAttempts)))
+
+        if float(backoff) <= 0 or float(maxBackoff) < float(backoff):
+            raise ValueError("Invalid backoff for journal: %s" % backoff)
+
+        self.batch = int(batch)
+        self.maxAttempts = int(maxAttempts)
+        self.backoff = float(backoff)
+        self.maxBackoff = float(maxBackoff)
+
+        self.lock = threading.Lock()
+        self.replaying = set()
+
+        self.database = sqlite3.connect(path, check_same_thread=False)
+        self.database.executescript(SCHEMA)
+
+
+    def enqueue(self, serial, name, args=None, key=None):
+        """
+        Store a write for a control board.  A pending write with the same key is replaced, and moves to the end of the
+        queue, unless its arguments are identical.
+
+           :param serial: the serial number of the control board
+           :type serial: SerialNumber or str or int or bytearray
+           :param name: the name of the command
+           :type name: str
+           :param args: the command arguments (default: none)
+           :type args: list
+           :param key: the idempotency key (default: the setting written, or the command and its arguments)
+           :type key: str
+
+           :returns: whether the journal changed
+           :rtype: bool
+
+           :raises CommandException: if the command is unknown, only reads, or cannot be deferred
+           :raises ValueError: if the arguments are invalid
+           :raises SerialNumberException: if the serial number is invalid
+
+        .. versionadded:: 0.2.0
+        .. function:: enqueue(serial, name[, args = None, key = None])
+        """
+        command = getCommand(name)
+
+        if command.readOnly or name in UNDEFERRABLE:
+            raise CommandException("Command %s cannot be journaled for later." % name)
+
+        args = list(args or [])
+        serial = _getSerial(serial)
+        command.buildRequest(serial, args)
+
+        if key is None:
+            key = "%s:%s" % (name, SETTING_KEYS[name](args) if name in SETTING_KEYS else json.dumps(args))
+
+        encoded = json.dumps(args)
+
+        with self.lock:
+            with self.database:
+                row = self.database.execute("SELECT command, args FROM entries WHERE serial = ? AND key = ?",
+                                            (serial, key)).fetchone()
+
+                if row is not None and (row[0], row[1]) == (name, encoded):
+                    return False
+
+                self.database.execute("DELETE FROM entries WHERE serial = ? AND key = ?", (serial, key))
+                self.database.execute("INSERT INTO entries (serial, key, command, args, created) VALUES (?, ?, ?, ?, ?)",
+                                      (serial, key, name, encoded, time.time()))
+
+        self.logger.debug("Journaled %s for %d (key %s)." % (name, serial, key))
+        return True
+
+
+    def submit(self, controller, serial, name, args=None, key=None):
+        """
+        Send a write to a control board now, or journal it if the board cannot take it.
+
+        If the board already has writes pending, the write is queued behind them, keeping them in order, and the
+        queue is replayed.  A board waiting out its backoff is not contacted at all.  Otherwise the write is sent, and
+        journaled if the board cannot be reached.
+
+           :param controller: the socket for the control board; connected if needed
+           :type controller: ControllerSocket
+           :param serial: the serial number of the control board
+           :type serial: SerialNumber or str or int or bytearray
+           :param name: the name of the command
+           :type name: str
+           :param args: the command arguments (default: none)
+           :type args: list
+           :param key: the idempotency key, as for `enqueue()`
+           :type key: str
+
+           :returns: the response packet, or None if the write was journaled
+           :rtype: bytearray
+
+           :raises CommandException: if the command cannot be journaled, or the response does not answer it
+           :raises ValueError: if the arguments are invalid
+
+        .. versionadded:: 0.2.0
+        .. function:: submit(controller, serial, name[, args = None, key = None])
+        """
+        serial = _getSerial(serial)
+        command = getCommand(name)
+
+        # Validate before sending, so a write that could not be journaled is never sent
+        if command.readOnly or name in UNDEFERRABLE:
+            raise CommandException("Command %s cannot be journaled for later." % name)
+
+        command.buildRequest(serial, args)
+
+        if self.getPending(serial) or not self.isDue(serial):
+            self.enqueue(serial, name, args, key)
+            self.replay(controller, serial)
+            return None
+
+        try:
+            if not controller.isConnected():
+                controller.connect()
+
+            response = execute(controller, serial, name, args)
+
+        except (SocketConnectionException, SocketTransmitException, socket.error) as e:
+            self.logger.info("Control board %d unreachable (%s); journaling %s." % (serial, str(e), name))
+            controller.close()
+
+            self.enqueue(serial, name, args, key)
+            self._recordFailure(serial)
+            return None
+
+        self._recordSuccess(serial)
+        return response
+
+
+    def replay(self, controller, serial, now=None):
+        """
+        Send a control board's pending writes, in order and in pipelined batches, if its backoff has expired and no
+        other replay for it is running.  Writes the board applies are removed; writes it refuses are kept for a later
+        replay until they run out of attempts.
+
+           :param controller: the socket for the control board; connected if needed
+           :type controller: ControllerSocket
+           :param serial: the serial number of the control board
+           :type serial: SerialNumber or str or int or bytearray
+           :param now: the current time, in seconds since the epoch (default: now)
+           :type now: float
+
+           :returns: one outcome per write tried, as from `Transaction.commit()`
+           :rtype: list
+
+        .. versionadded:: 0.2.0
+        .. function:: replay(controller, serial[, now = None])
+        """
+        serial = _getSerial(serial)
+
+        with self.lock:
+            if serial in self.replaying:
+                return []
+
+            self.replaying.add(serial)
+
+        try:
+            if not self.isDue(serial, now):
+                return []
+
+            outcomes = []
+            lastId = 0
+
+            while True:
+                rows = self._fetch(serial, lastId)
+                if not rows:
+                    break
+
+                lastId = rows[-1][0]
+                transaction = Transaction(controller, serial, window=self.batch, attempts=1)
+
+                for row in rows:
+                    transaction.write(row[1], json.loads(row[2]))
+
+                results = transaction.commit()
+                outcomes.extend(results)
+
+                if not controller.isConnected():
+                    # The board went away; keep the rest in order for the next replay
+                    self._recordFailure(serial)
+                    break
+
+                self._settle(serial, rows, results)
+
+            if outcomes and controller.isConnected():
+                self._recordSuccess(serial)
+
+            return outcomes
+
+        finally:
+            with self.lock:
+                self.replaying.discard(serial)
+
+
+    def getPending(self, serial):
+        """
+        Return the writes pending for a control board, in replay order.
+
+           :param serial: the serial number of the control board
+           :type serial: SerialNumber or str or int or bytearray
+
+           :returns: `(command, args, key)` tuples
+           :rtype: list
+
+        .. versionadded:: 0.2.0
+        .. function:: getPending(serial)
+        """
+        with self.lock:
+            rows = self.database.execute("SELECT command, args, key FROM entries WHERE serial = ? ORDER BY id",
+                                         (_getSerial(serial),)).fetchall()
+
+        return [(row[0], json.loads(row[1]), row[2]) for row in rows]
+
+
+    def getSerials(self):
+        """
+        Return the serial numbers of control boards with writes pending.
+
+           :returns: the serial numbers, as integers
+           :rtype: list
+
+        .. versionadded:: 0.2.0
+        .. function:: getSerials()
+        """
+        with self.lock:
+            return [row[0] for row in self.database.execute("SELECT DISTINCT serial FROM entries ORDER BY serial")]
+
+
+    def isDue(self, serial, now=None):
+        """
+        Return whether a control board may be tried, i.e., it is not waiting out a backoff.
+
+           :param serial: the serial number of the control board
+           :type serial: SerialNumber or str or int or bytearray
+           :param now: the current time, in seconds since the epoch (default: now)
+           :type now: float
+
+           :returns: whether the board may be tried
+           :rtype: bool
+
+        .. versionadded:: 0.2.0
+        .. function:: isDue(serial[, now = None])
+        """
+        with self.lock:
+            row = self.database.execute("SELECT retryAt FROM boards WHERE serial = ?", (_getSerial(serial),)).fetchone()
+
+        return row is None or row[0] <= (time.time() if now is None else now)
+
+
+    def close(self):
+        """
+        Close the journal's database.
+
+        .. versionadded:: 0.2.0
+        .. function:: close()
+        """
+        with self.lock:
+            self.database.close()
+
+
+    def _fetch(self, serial, lastId):
+        """
+        .. versionadded:: 0.2.0
+        """
+        with self.lock:
+            return self.database.execute(
+                "SELECT id, command, args FROM entries WHERE serial = ? AND id > ? ORDER BY id LIMIT ?",
+                (serial, lastId, self.batch)).fetchall()
+
+
+    def _settle(self, serial, rows, results):
+        """
+        .. versionadded:: 0.2.0
+        """
+        with self.lock:
+            with self.database:
+                for row, result in zip(rows, results):
+                    if result["ok"]:
+                        self.database.execute("DELETE FROM entries WHERE id = ?", (row[0],))
+                        continue
+
+                    self.database.execute("UPDATE entries SET attempts = attempts + 1, error = ? WHERE id = ?",
+                                          (result["error"], row[0]))
+
+                    dropped = self.database.execute("DELETE FROM entries WHERE id = ? AND attempts >= ?",
+                                                    (row[0], self.maxAttempts)).rowcount
+
+                    if dropped:
+                        self.logger.warning("Dropped %s for %d after %d attempts: %s" % (row[1], serial, self.maxAttempts,
+                                                                                         result["error"]))
+
+
+    def _recordFailure(self, serial):
+        """
+        .. versionadded:: 0.2.0
+        """
+        with self.lock:
+            with self.database:
+                row = self.database.execute("SELECT failures FROM boards WHERE serial = ?", (serial,)).fetchone()
+                failures = 1 if row is None else row[0] + 1
+
+                # Jitter spreads out retries from processes sharing a journal
+                delay = min(self.maxBackoff, self.backoff * 2 ** min(failures - 1, 32)) * random.uniform(0.5, 1.0)
+
+                self.database.execute("INSERT OR REPLACE INTO boards (serial, failures, retryAt) VALUES (?, ?, ?)",
+                                      (serial, failures, time.time() + delay))
+
+        self.logger.debug("Control board %d backing off %.1f seconds after %d failure(s)." % (serial, delay, failures))
+
+
+    def _recordSuccess(self, serial):
+        """
+        .. versionadded:: 0.2.0
+        """
+        with self.lock:
+            with self.database:
+                self.database.execute("DELETE FROM boards WHERE serial = ?", (serial,))
+
+
+
+
+def _getSerial(serial):
+    """
+    Return a serial number as an integer.
+
+    .. versionadded:: 0.2.0
+    """
+    if not isinstance(serial, SerialNumber):
+        serial = SerialNumber(serial)
+
+    return serial.getInteger()
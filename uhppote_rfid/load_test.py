@@ -0,0 +1,443 @@
+# -*- coding: utf-8 -*-
+"""
+Provides a load generator for sizing hardware and catching throughput regressions in the client library.
+
+A `LoadGenerator` runs a number of virtual clients, each a thread with its own `ControllerSocket` per target, issuing
+a weighted mix of commands back to back for a fixed duration.  The report gives throughput, latency percentiles, and
+error rates, overall and for each interval of the run, and can be printed as text or written as JSON.
+
+Usage::
+
+   python -m uhppote_rfid load [--clients N] [--duration SECONDS] [--interval SECONDS] [--timeout SECONDS]
+                               [--mix "COMMAND [ARG ...]=WEIGHT"] [--json FILE] [--loopback | SERIAL@HOST[:PORT] ...]
+
+With `--loopback`, a local fake board echoing each request is started and used as the only target, which measures
+the client library and the host rather than any board.
+
+   :copyright: (c) 2017 by Andrew Vaughan.
+   :license: Apache 2.0, see LICENSE for more details.
+
+.. module:: LoadGenerator
+"""
+
+import argparse
+import bisect
+import json
+import logging
+import math
+import random
+import sys
+import threading
+import time
+
+from .client import parseTarget
+from .commands import CommandException, execute, getCommand
+from .controller_socket import ControllerSocket
+from .rtt import RTTEstimator
+
+
+DEFAULT_MIX = {"get-status": 1}
+
+# Serial number used for the loopback target; the fake board answers any serial number
+LOOPBACK_SERIAL = 423187757
+
+# Seconds a client waits before retrying a target after a failure, doubling on each further failure
+RETRY_DELAY = 0.05
+MAX_RETRY_DELAY = 1.0
+
+# Seconds past the deadline that requests already in flight are given to finish
+DEADLINE_GRACE = 0.5
+
+
+class LoadGenerator(object):
+    """
+    Drives concurrent virtual clients against control boards and measures the results.
+
+    .. class:: LoadGenerator
+    .. versionadded:: 0.2.0
+    """
+
+    def __init__(self, targets, clients=8, mix=None, duration=10.0, interval=1.0, profile="low-latency", timeout=5.0):
+        """
+        Initialize a new LoadGenerator.
+
+           :param targets: the boards to load, as `(serial, host, port)` tuples; each client spreads its requests over
+                           all of them
+           :type targets: list
+           :param clients: the number of concurrent virtual clients (default: 8)
+           :type clients: int
+           :param mix: relative weights of operations, each a command name followed by any arguments, such as
+                       `{"get-status": 8, "get-door-control 1": 2}` (default: only `get-status`)
+           :type mix: dict
+           :param duration: seconds to run for (default: 10.0)
+           :type duration: float
+           :param interval: seconds covered by each interval of the report (default: 1.0)
+           :type interval: float
+           :param profile: the socket profile for the clients' connections (default: "low-latency")
+           :type profile: str or dict
+           :param timeout: seconds to wait to connect to or hear from a target before counting an error; cut short
+                           near the end of the run (default: 5.0)
+           :type timeout: float
+
+           :raises ValueError: if there are no targets, a count or time is not positive, or an operation is invalid
+           :raises CommandException: if an operation names an unknown command
+
+        .. versionadded:: 0.2.0
+        .. function:: __init__(targets[, clients = 8, mix = None, duration = 10.0, interval = 1.0, ...])
+        """
+        self.logger = logging.getLogger("UHPPOTE.LoadGenerator")
+
+        self.targets = [(serial, host, int(port)) for serial, host, port in targets]
+
+        if not self.targets:
+            raise ValueError("Invalid load test: no targets.")
+
+        if int(clients) <= 0:
+            raise ValueError("Invalid number of clients for load test: %d" % int(clients))
+
+        if float(duration) <= 0 or float(interval) <= 0:
+            raise ValueError("Invalid duration or interval for load test: %s, %s" % (duration, interval))
+
+        if float(timeout) <= 0:
+            raise ValueError("Invalid timeout for load test: %s" % timeout)
+
+        self.clients = int(clients)
+        self.duration = float(duration)
+        self.interval = float(interval)
+        self.profile = profile
+        self.timeout = float(timeout)
+
+        # Operations with the cumulative weights used to pick among them
+        self.mix = {}
+        self.operations = []
+        self.weights = []
+        total = 0.0
+
+        for operation, weight in sorted((mix or DEFAULT_MIX).items()):
+            if float(weight) <= 0:
+                raise ValueError("Invalid weight for operation \"%s\": %s" % (operation, weight))
+
+            words = operation.split()
+            getCommand(words[0]).buildRequest(self.targets[0][0], words[1:])
+
+            self.mix[operation] = float(weight)
+            total += float(weight)
+            self.operations.append((operation, words[0], words[1:]))
+            self.weights.append(total)
+
+
+    def run(self):
+        """
+        Run the load test and return its report.
+
+           :returns: the report: totals, `latency` percentiles in milliseconds, `errorTypes`, and `intervals`
+           :rtype: dict
+
+        .. versionadded:: 0.2.0
+        .. function:: run()
+        """
+        self.logger.info("Running %d client(s) against %d target(s) for %.1f seconds." % (self.clients, len(self.targets),
+                                                                                      self.duration))
+
+        samples = [[] for _ in range(self.clients)]
+        start = time.time()
+        deadline = start + self.duration
+
+        threads = [threading.Thread(target=self._client, args=(index, deadline, samples[index]))
+                   for index in range(self.clients)]
+
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        # Every request is timed out by the deadline, so waiting longer would only hide a stuck client
+        for thread in threads:
+            thread.join(max(0.0, deadline + DEADLINE_GRACE - time.time()) + 0.1)
+
+        return self._report(start, time.time() - start, [sample for client in samples for sample in list(client)])
+
+
+    def _client(self, index, deadline, samples):
+        """
+        Issue operations back to back until the deadline, appending `(finished, latency, operation, error)` samples.
+        After a failure the client pauses, with backoff, so a target that is down is not flooded with connections.
+
+        .. versionadded:: 0.2.0
+        """
+        generator = random.Random(index)
+        estimator = _DeadlineEstimator(self.timeout, deadline + DEADLINE_GRACE)
+        controllers = [ControllerSocket(host, port, self.profile) for serial, host, port in self.targets]
+
+        for controller in controllers:
+            controller.setEstimator(estimator)
+        target = index % len(self.targets)
+        delays = [0.0] * len(self.targets)
+
+        try:
+            while True:
+                began = time.time()
+
+                if began >= deadline:
+                    return
+
+                operation, name, args = self.operations[bisect.bisect_right(self.weights, generator.random() * self.weights[-1])]
+                controller = controllers[target]
+                error = None
+
+                try:
+                    if not controller.isConnected():
+                        controller.connect(attempts=1)
+
+                    execute(controller, self.targets[target][0], name, args)
+
+                except Exception as e:
+                    error = type(e).__name__
+                    controller.close()
+
+                finished = time.time()
+                samples.append((finished, finished - began, operation, error))
+
+                if error is None:
+                    delays[target] = 0.0
+                else:
+                    delays[target] = min(MAX_RETRY_DELAY, max(RETRY_DELAY, delays[target] * 2))
+                    time.sleep(max(0.0, min(delays[target], deadline - time.time())))
+
+                target = (target + 1) % len(self.targets)
+
+        finally:
+            for controller in controllers:
+                controller.close()
+
+
+    def _report(self, start, elapsed, samples):
+        """
+        Summarize samples, overall and per interval.
+
+        .. versionadded:: 0.2.0
+        """
+        report = _summarize(samples, elapsed)
+        report.update({
+            "clients": self.clients,
+            "targets": len(self.targets),
+            "duration": elapsed,
+            "mix": dict(self.mix),
+            "operations": {},
+            "intervals": [],
+        })
+
+        for operation in report["mix"]:
+            report["operations"][operation] = _summarize([sample for sample in samples if sample[2] == operation], elapsed)
+
+        # Requests still in flight at the deadline finish a little late; count them in the last interval
+        count = max(1, int(math.ceil(self.duration / self.interval - 1e-9)))
+        buckets = [[] for _ in range(count)]
+
+        for sample in samples:
+            buckets[min(count - 1, int((sample[0] - start) / self.interval))].append(sample)
+
+        for bucket in range(count):
+            covered = elapsed - bucket * self.interval if bucket == count - 1 else self.interval
+            summary = _summarize(buckets[bucket], covered)
+            summary["start"] = bucket * self.interval
+            report["intervals"].append(summary)
+
+        return report
+
+
+
+
+class _DeadlineEstimator(RTTEstimator):
+    """
+    Gives every connect and receive the same timeout, cut short so that no request outlasts the run.
+
+    .. versionadded:: 0.2.0
+    """
+
+    def __init__(self, timeout, deadline):
+        """
+        .. versionadded:: 0.2.0
+        """
+        RTTEstimator.__init__(self, initial=timeout, minimum=timeout, maximum=timeout)
+        self.deadline = deadline
+
+
+    def getTimeout(self, host, port):
+        """
+        .. versionadded:: 0.2.0
+        """
+        return max(0.001, min(self.initial, self.deadline - time.time()))
+
+
+
+
+def _summarize(samples, elapsed):
+    """
+    Return throughput, error rate, and latency percentiles for samples.
+
+    .. versionadded:: 0.2.0
+    """
+    latencies = sorted(sample[1] * 1000.0 for sample in samples if sample[3] is None)
+    errors = len(samples) - len(latencies)
+    errorTypes = {}
+
+    for sample in samples:
+        if sample[3] is not None:
+            errorTypes[sample[3]] = errorTypes.get(sample[3], 0) + 1
+
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "errorRate": float(errors) / len(samples) if samples else 0.0,
+        "errorTypes": errorTypes,
+        "throughput": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "latency": {
+            "p50": _percentile(latencies, 0.50),
+            "p95": _percentile(latencies, 0.95),
+            "p99": _percentile(latencies, 0.99),
+            "max": latencies[-1] if latencies else None,
+            "mean": sum(latencies) / len(latencies) if latencies else None,
+        },
+    }
+
+
+def _percentile(ordered, fraction):
+    """
+    Return the nearest-rank percentile of sorted values, or None if there are none.
+
+    .. versionadded:: 0.2.0
+    """
+    if not ordered:
+        return None
+
+    return ordered[max(0, min(len(ordered) - 1, int(len(ordered) * fraction + 0.999999) - 1))]
+
+
+def formatReport(report):
+    """
+    Format a load test report as a text table.
+
+       :param report: the report, as returned by `LoadGenerator.run()`
+       :type report: dict
+
+       :returns: the table, ending with a newline
+       :rtype: str
+
+    .. versionadded:: 0.2.0
+    .. function:: formatReport(report)
+    """
+    def row(label, summary):
+        latency = summary["latency"]
+        values = [latency[key] for key in ("p50", "p95", "p99", "max")]
+
+        return "%-24s %8d %7.2f%% %10.1f " % (label, summary["requests"], summary["errorRate"] * 100.0, summary["throughput"]) + \
+            " ".join("%9s" % ("-" if value is None else "%.3f" % value) for value in values)
+
+    header = "%-24s %8s %8s %10s %9s %9s %9s %9s" % ("", "requests", "errors", "req/s", "p50 ms", "p95 ms", "p99 ms",
+                                                    "max ms")
+
+    lines = ["%d client(s), %d target(s), %.1f seconds" % (report["clients"], report["targets"], report["duration"]), "",
+             header, row("total", report)]
+
+    for operation in sorted(report["operations"]):
+        lines.append(row(operation, report["operations"][operation]))
+
+    lines.extend(["", header])
+
+    for interval in report["intervals"]:
+        lines.append(row("%g s" % interval["start"], interval))
+
+    if report["errorTypes"]:
+        lines.extend(["", "errors: " + ", ".join("%s %d" % item for item in sorted(report["errorTypes"].items()))])
+
+    return "\n".join(lines) + "\n"
+
+
+def main(argv=None):
+    """
+    Run a load test from the command line, printing the text report.
+
+       :param argv: the command line arguments, excluding the program name and `load` (default: `sys.argv[1:]`)
+       :type argv: list
+
+       :returns: the exit status: 0 if no request failed, otherwise 1
+       :rtype: int
+
+    .. versionadded:: 0.2.0
+    .. function:: main([argv = None])
+    """
+    parser = argparse.ArgumentParser(prog="python -m uhppote_rfid load", description="Load test UHPPOTE RFID boards.")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent virtual clients (default: %(default)s)")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run for (default: %(default)s)")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds per report interval (default: %(default)s)")
+    parser.add_argument("--timeout", type=float, default=5.0,
+                        help="seconds to wait for a target before counting an error (default: %(default)s)")
+    parser.add_argument("--mix", action="append", default=[],
+                        help="an operation and its weight, as \"COMMAND [ARG ...]=WEIGHT\"; may be repeated "
+                             "(default: get-status only)")
+    parser.add_argument("--json", help="also write the report as JSON to this file (\"-\" for standard output)")
+    parser.add_argument("--loopback", action="store_true", help="start a local fake board and load it")
+    parser.add_argument("targets", nargs="*", help="boards to load, as SERIAL@HOST[:PORT]")
+
+    options = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    # Failed connections are counted in the report rather than logged one by one
+    logging.basicConfig(level=logging.ERROR)
+
+    if options.loopback == bool(options.targets):
+        parser.error("give either --loopback or at least one target")
+
+    mix = {}
+
+    for entry in options.mix:
+        operation, _, weight = entry.rpartition("=")
+
+        try:
+            if not operation:
+                raise ValueError(entry)
+
+            mix[operation.strip()] = float(weight)
+
+        except ValueError:
+            parser.error("invalid --mix \"%s\"; expected COMMAND [ARG ...]=WEIGHT" % entry)
+
+    server = None
+
+    if options.loopback:
+        from .capture import ReplayServer
+
+        server = ReplayServer([])
+        server.start()
+        targets = [(LOOPBACK_SERIAL, "127.0.0.1", server.getPort())]
+    else:
+        targets = []
+
+        for target in options.targets:
+            serial, _, address = target.partition("@")
+
+            if not address:
+                parser.error("invalid target \"%s\"; expected SERIAL@HOST[:PORT]" % target)
+
+            targets.append((serial,) + parseTarget(address))
+
+    try:
+        generator = LoadGenerator(targets, options.clients, mix or None, options.duration, options.interval,
+                                  timeout=options.timeout)
+        report = generator.run()
+
+    except (ValueError, CommandException) as e:
+        parser.error(str(e))
+
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    sys.stdout.write(formatReport(report))
+
+    if options.json == "-":
+        sys.stdout.write(json.dumps(report, sort_keys=True) + "\n")
+    elif options.json:
+        with open(options.json, "w") as handle:
+            json.dump(report, handle, sort_keys=True)
+
+    return 0 if report["errors"] == 0 else 1
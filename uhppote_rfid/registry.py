@@ -0,0 +1,576 @@
+# -*- coding: utf-8 -*-
+"""
+Provides a compact, array-backed inventory of UHPPOTE RFID control boards.
+
+Each attribute is kept in its own typed array, indexed by position, rather than one Python object per board.  IPv4
+addresses are stored as 32-bit integers; only hostnames and IPv6 addresses are kept as strings.  Ten thousand boards
+take well under a megabyte of array storage plus the two lookup indexes.
+
+   :copyright: (c) 2017 by Andrew Vaughan.
+   :license: Apache 2.0, see LICENSE for more details.
+
+.. module:: ControllerRegistry
+"""
+
+import array
+import csv
+import io
+import json
+import socket
+import struct
+import threading
+import time
+
+from .compat import INTEGER_TYPES, STRING_TYPES
+from .controller_socket import ControllerSocket
+from .serial_number import SERIAL_MAXIMUM, SERIAL_MINIMUM, SerialNumber, SerialNumberException
+
+
+FLAG_ONLINE = 0x01
+FLAG_ALARM = 0x02
+FLAG_DISABLED = 0x04
+
+# The smallest array type holding 32 bits
+_UINT32 = 'I' if array.array('I').itemsize >= 4 else 'L'
+
+
+class ControllerRegistry(object):
+    """
+    Holds the host, port, serial number, door count, status flags, and last-seen time of every board in a fleet, with
+    constant-time lookup by serial number and by address and port.
+
+    .. class:: ControllerRegistry
+    .. versionadded:: 0.2.0
+    """
+
+    def __init__(self):
+        """
+        Initialize a new, empty ControllerRegistry.
+
+        .. versionadded:: 0.2.0
+        .. function:: __init__()
+        """
+        self.serials = array.array(_UINT32)
+        self.addresses = array.array(_UINT32)
+        self.ports = array.array('H')
+        self.doors = array.array('B')
+        self.flags = array.array('B')
+        self.lastSeen = array.array('d')
+
+        # Hostnames and IPv6 addresses, by index; IPv4 boards have no entry
+        self.hostnames = {}
+
+        self.bySerial = {}
+
+        # By (address, port), since boards behind one address are told apart by port
+        self.byAddress = {}
+        self.lock = threading.Lock()
+
+
+    def add(self, serial, host, port=60000, doors=4, flags=0, lastSeen=0.0):
+        """
+        Add a control board.
+
+           :param serial: the serial number of the control board
+           :type serial: SerialNumber or str or int or bytearray
+           :param host: the hostname or IP address of the control board
+           :type host: str
+           :param port: the port of the control board (default: 60000)
+           :type port: int
+           :param doors: the number of doors the board controls, from 1 to 4 (default: 4)
+           :type doors: int
+           :param flags: status flags, such as `FLAG_ONLINE` (default: 0)
+           :type flags: int
+           :param lastSeen: when the board was last heard from, in seconds since the epoch; 0 if never (default: 0.0)
+           :type lastSeen: float
+
+           :raises SerialNumberException: if the serial number is invalid
+           :raises ValueError: if the board or its address and port are already registered, or the host, port, door
+              count, or flags are invalid
+
+        .. versionadded:: 0.2.0
+        .. function:: add(serial, host[, port = 60000, doors = 4, flags = 0, lastSeen = 0.0])
+        """
+        self.load([{"serial": serial, "host": host, "port": port, "doors": doors, "flags": flags, "lastSeen": lastSeen}])
+
+
+    def load(self, records):
+        """
+        Add many control boards at once.  Every record is validated before any is added, so a bad record leaves the
+        registry unchanged.
+
+           :param records: dicts with `serial` and `host`, and optionally `port`, `doors`, `flags`, and `lastSeen`
+           :type records: iterable
+
+           :returns: the number of boards added
+           :rtype: int
+
+           :raises SerialNumberException: if a serial number is invalid
+           :raises ValueError: if a record is malformed, a board or an address and port appears twice, or either is
+              already registered
+
+        .. versionadded:: 0.2.0
+        .. function:: load(records)
+        """
+        serials = array.array(_UINT32)
+        addresses = array.array(_UINT32)
+        ports = array.array('H')
+        doors = array.array('B')
+        flags = array.array('B')
+        lastSeen = array.array('d')
+        hostnames = {}
+        keys = []
+
+        for row, record in enumerate(records, 1):
+            try:
+                serial = _parseSerial(record["serial"])
+                host = record["host"]
+
+                if not SERIAL_MINIMUM <= serial < 1 << 32:
+                    # Would not fit the column; anything that does is bounds-checked below
+                    raise SerialNumberException("Invalid controller record #%d: serial number out of bounds (%d to %d); received %d." % (row, SERIAL_MINIMUM, SERIAL_MAXIMUM, serial))
+
+                port = int(_getField(record, "port", 60000))
+
+                serials.append(serial)
+                ports.append(port)
+                doors.append(int(_getField(record, "doors", 4)))
+                flags.append(int(_getField(record, "flags", 0)))
+                lastSeen.append(float(_getField(record, "lastSeen", 0.0)))
+
+                address = _packAddress(host)
+
+                if address is None:
+                    # Validates the hostname without opening a socket
+                    ControllerSocket(host)
+                    hostnames[len(keys)] = host
+
+                keys.append((host if address is None else address, port))
+                addresses.append(address or 0)
+
+            except KeyError as e:
+                raise ValueError("Invalid controller record #%d: missing %s." % (row, str(e)))
+
+            except (TypeError, ValueError, AttributeError) as e:
+                raise ValueError("Invalid controller record #%d: %s" % (row, str(e)))
+
+            except OverflowError:
+                raise ValueError("Invalid controller record #%d: value out of range." % row)
+
+        if not serials:
+            return 0
+
+        # Bounds are checked across each column at once; rows are only searched to report an error
+        _checkColumn(serials, SERIAL_MINIMUM, SERIAL_MAXIMUM, "serial number", SerialNumberException)
+        _checkColumn(ports, 1, 65535, "port", ValueError)
+        _checkColumn(doors, 1, 4, "door count", ValueError)
+
+        with self.lock:
+            incoming = set(serials)
+
+            if len(incoming) != len(serials) or not incoming.isdisjoint(self.bySerial):
+                duplicate = next(serial for row, serial in enumerate(serials)
+                                 if serial in self.bySerial or serial in serials[:row])
+                raise ValueError("Control board %d is already registered." % duplicate)
+
+            incomingKeys = set(keys)
+
+            if len(incomingKeys) != len(keys) or not incomingKeys.isdisjoint(self.byAddress):
+                row = next(row for row, key in enumerate(keys) if key in self.byAddress or key in keys[:row])
+                host = hostnames.get(row) or socket.inet_ntoa(struct.pack("!I", keys[row][0]))
+                raise ValueError("A control board at %s:%d is already registered." % (host, keys[row][1]))
+
+            offset = len(self.serials)
+
+            self.serials.extend(serials)
+            self.addresses.extend(addresses)
+            self.ports.extend(ports)
+            self.doors.extend(doors)
+            self.flags.extend(flags)
+            self.lastSeen.extend(lastSeen)
+
+            for index, host in hostnames.items():
+                self.hostnames[offset + index] = host
+
+            for index, serial in enumerate(serials):
+                self.bySerial[serial] = offset + index
+                self.byAddress[keys[index]] = offset + index
+
+        return len(serials)
+
+
+    def loadCSV(self, source):
+        """
+        Add control boards from CSV with a header row naming the columns, as for `load()`.
+
+           :param source: the path of a CSV file, or an open text stream
+           :type source: str or file
+
+           :returns: the number of boards added
+           :rtype: int
+
+           :raises SerialNumberException: if a serial number is invalid
+           :raises ValueError: if a record is malformed or a board is already registered
+
+        .. versionadded:: 0.2.0
+        .. function:: loadCSV(source)
+        """
+        if isinstance(source, STRING_TYPES):
+            with io.open(source, newline="") as stream:
+                return self.load(csv.DictReader(stream))
+
+        return self.load(csv.DictReader(source))
+
+
+    def loadJSON(self, source):
+        """
+        Add control boards from a JSON list of records, as for `load()`.
+
+           :param source: the path of a JSON file, or an open text stream
+           :type source: str or file
+
+           :returns: the number of boards added
+           :rtype: int
+
+           :raises SerialNumberException: if a serial number is invalid
+           :raises ValueError: if the JSON or a record is malformed, or a board is already registered
+
+        .. versionadded:: 0.2.0
+        .. function:: loadJSON(source)
+        """
+        if isinstance(source, STRING_TYPES):
+            with io.open(source) as stream:
+                records = json.load(stream)
+        else:
+            records = json.load(source)
+
+        if not isinstance(records, list):
+            raise ValueError("Expected a JSON list of controller records.")
+
+        return self.load(records)
+
+
+    def remove(self, serial):
+        """
+        Remove a control board.  The last board takes its place, so removal is constant-time.
+
+           :param serial: the serial number of the control board
+           :type serial: SerialNumber or str or int or bytearray
+
+           :raises KeyError: if the board is not registered
+
+        .. versionadded:: 0.2.0
+        .. function:: remove(serial)
+        """
+        serial = _parseSerial(serial)
+
+        with self.lock:
+            index = self.bySerial.pop(serial)
+            del self.byAddress[self._getAddressKey(index)]
+            self.hostnames.pop(index, None)
+
+            last = len(self.serials) - 1
+
+            if index != last:
+                for column in (self.serials, self.addresses, self.ports, self.doors, self.flags, self.lastSeen):
+                    column[index] = column[last]
+
+                if last in self.hostnames:
+                    self.hostnames[index] = self.hostnames.pop(last)
+
+                self.bySerial[self.serials[index]] = index
+                self.byAddress[self._getAddressKey(index)] = index
+
+            for column in (self.serials, self.addresses, self.ports, self.doors, self.flags, self.lastSeen):
+                column.pop()
+
+
+    def get(self, serial):
+        """
+        Return a control board's record.
+
+           :param serial: the serial number of the control board
+           :type serial: SerialNumber or str or int or bytearray
+
+           :returns: the record, with `serial`, `host`, `port`, `doors`, `flags`, and `lastSeen`
+           :rtype: dict
+
+           :raises KeyError: if the board is not registered
+
+        .. versionadded:: 0.2.0
+        .. function:: get(serial)
+        """
+        index = self.bySerial[_parseSerial(serial)]
+
+        return {
+            "serial": self.serials[index],
+            "host": self.getHost(index),
+            "port": self.ports[index],
+            "doors": self.doors[index],
+            "flags": self.flags[index],
+            "lastSeen": self.lastSeen[index],
+        }
+
+
+    def findByAddress(self, host, port=60000):
+        """
+        Return the serial number of the control board at an address and port.
+
+           :param host: the hostname or IP address of the control board
+           :type host: str
+           :param port: the port of the control board (default: 60000)
+           :type port: int
+
+           :returns: the serial number, or None if no board has that address and port
+           :rtype: int
+
+        .. versionadded:: 0.2.0
+        .. function:: findByAddress(host[, port = 60000])
+        """
+        address = _packAddress(host)
+        index = self.byAddress.get((host if address is None else address, int(port)))
+
+        return None if index is None else self.serials[index]
+
+
+    def getHost(self, index):
+        """
+        Return the host of the control board at a position in the registry.
+
+           :param index: the position of the board
+           :type index: int
+
+           :returns: the hostname or IP address
+           :rtype: str
+
+        .. versionadded:: 0.2.0
+        .. function:: getHost(index)
+        """
+        host = self.hostnames.get(index)
+
+        if host is not None:
+            return host
+
+        return socket.inet_ntoa(struct.pack("!I", self.addresses[index]))
+
+
+    def getController(self, serial, profile="default"):
+        """
+        Return a new, unconnected `ControllerSocket` for a control board.
+
+           :param serial: the serial number of the control board
+           :type serial: SerialNumber or str or int or bytearray
+           :param profile: the socket profile (default: "default")
+           :type profile: str or dict
+
+           :returns: the socket
+           :rtype: ControllerSocket
+
+           :raises KeyError: if the board is not registered
+
+        .. versionadded:: 0.2.0
+        .. function:: getController(serial[, profile = "default"])
+        """
+        index = self.bySerial[_parseSerial(serial)]
+        return ControllerSocket(self.getHost(index), self.ports[index], profile)
+
+
+    def setFlags(self, serial, flags):
+        """
+        Replace a control board's status flags.
+
+           :param serial: the serial number of the control board
+           :type serial: SerialNumber or str or int or bytearray
+           :param flags: the status flags
+           :type flags: int
+
+           :raises KeyError: if the board is not registered
+           :raises OverflowError: if the flags do not fit in a byte
+
+        .. versionadded:: 0.2.0
+        .. function:: setFlags(serial, flags)
+        """
+        self.flags[self.bySerial[_parseSerial(serial)]] = int(flags)
+
+
+    def markSeen(self, serial, when=None):
+        """
+        Record that a control board was heard from, and flag it online.
+
+           :param serial: the serial number of the control board
+           :type serial: SerialNumber or str or int or bytearray
+           :param when: the time, in seconds since the epoch (default: `time.time()`)
+           :type when: float
+
+           :raises KeyError: if the board is not registered
+
+        .. versionadded:: 0.2.0
+        .. function:: markSeen(serial[, when = None])
+        """
+        index = self.bySerial[_parseSerial(serial)]
+
+        self.lastSeen[index] = time.time() if when is None else when
+        self.flags[index] |= FLAG_ONLINE
+
+
+    def getMemoryUsage(self):
+        """
+        Return the bytes used by the registry's typed arrays, excluding the lookup indexes.
+
+           :returns: the number of bytes
+           :rtype: int
+
+        .. versionadded:: 0.2.0
+        .. function:: getMemoryUsage()
+        """
+        return sum(column.itemsize * len(column) for column in
+                   (self.serials, self.addresses, self.ports, self.doors, self.flags, self.lastSeen))
+
+
+    def __contains__(self, serial):
+        """
+        Return whether a control board is registered.
+
+           :param serial: the serial number of the control board
+           :type serial: SerialNumber or str or int or bytearray
+
+           :returns: whether the board is registered
+           :rtype: bool
+
+        .. versionadded:: 0.2.0
+        .. function:: __contains__(serial)
+        """
+        try:
+            return _parseSerial(serial) in self.bySerial
+        except SerialNumberException:
+            return False
+
+
+    def __iter__(self):
+        """
+        Iterate over the serial numbers of the registered boards.
+
+           :returns: an iterator of serial numbers
+           :rtype: iterator
+
+        .. versionadded:: 0.2.0
+        .. function:: __iter__()
+        """
+        return iter(list(self.serials))
+
+
+    def __len__(self):
+        """
+        Return the number of registered boards.
+
+           :returns: the number of boards
+           :rtype: int
+
+        .. versionadded:: 0.2.0
+        .. function:: __len__()
+        """
+        return len(self.serials)
+
+
+    def _getAddressKey(self, index):
+        """
+        Return the address index key, the address and port, of the board at a position.
+
+        .. versionadded:: 0.2.0
+        """
+        host = self.hostnames.get(index)
+        return (self.addresses[index] if host is None else host, self.ports[index])
+
+
+
+
+def _parseSerial(serial):
+    """
+    Return a serial number as an integer, parsing plain integers and decimal strings without building a `SerialNumber`.
+
+    Bounds are not checked for plain integers; `load()` checks them for the whole column at once.
+
+       :param serial: the serial number
+       :type serial: SerialNumber or str or int or bytearray
+
+       :returns: the serial number as an integer
+       :rtype: int
+
+       :raises SerialNumberException: if the serial number is invalid
+
+    .. versionadded:: 0.2.0
+    .. function:: _parseSerial(serial)
+    """
+    if isinstance(serial, INTEGER_TYPES) and not isinstance(serial, bool):
+        return int(serial)
+
+    if isinstance(serial, STRING_TYPES) and len(serial) == 9 and serial.isdigit():
+        return int(serial)
+
+    if not isinstance(serial, SerialNumber):
+        serial = SerialNumber(serial)
+
+    return serial.getInteger()
+
+
+def _getField(record, name, default):
+    """
+    Return a field of a controller record, or a default if it is missing or blank (as empty CSV cells are).
+
+       :param record: the record
+       :type record: dict
+       :param name: the field name
+       :type name: str
+       :param default: the value for a missing or blank field
+
+       :returns: the field value
+
+    .. versionadded:: 0.2.0
+    .. function:: _getField(record, name, default)
+    """
+    value = record.get(name)
+    return default if value is None or value == "" else value
+
+
+def _packAddress(host):
+    """
+    Return an IPv4 address as a 32-bit integer.
+
+       :param host: the host
+       :type host: str
+
+       :returns: the address, or None if the host is not an IPv4 address
+       :rtype: int
+
+    .. versionadded:: 0.2.0
+    .. function:: _packAddress(host)
+    """
+    try:
+        return struct.unpack("!I", socket.inet_pton(socket.AF_INET, host))[0]
+    except (socket.error, ValueError, TypeError):
+        return None
+
+
+def _checkColumn(column, minimum, maximum, name, exception):
+    """
+    Check that every value in a column is within bounds, reporting the first record that is not.
+
+       :param column: the values
+       :type column: array.array
+       :param minimum: the smallest valid value
+       :type minimum: int
+       :param maximum: the largest valid value
+       :type maximum: int
+       :param name: the name of the value, for the error message
+       :type name: str
+       :param exception: the exception type to raise
+       :type exception: type
+
+    .. versionadded:: 0.2.0
+    .. function:: _checkColumn(column, minimum, maximum, name, exception)
+    """
+    if min(column) >= minimum and max(column) <= maximum:
+        return
+
+    row, value = next((row, value) for row, value in enumerate(column, 1) if not minimum <= value <= maximum)
+    raise exception("Invalid controller record #%d: %s out of bounds (%d to %d); received %d." % (row, name, minimum, maximum, value))
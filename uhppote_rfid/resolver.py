@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Provides a shared hostname resolution cache for UHPPOTE RFID control boards.
+
+   :copyright: (c) 2017 by Andrew Vaughan.
+   :license: Apache 2.0, see LICENSE for more details.
+
+.. module:: ResolverCache
+"""
+
+import collections
+import logging
+import socket
+import threading
+import time
+
+
+class ResolverCache(object):
+    """
+    Caches hostname resolution results for a bounded time, so reconnects skip the operating system's resolver.
+
+    .. class:: ResolverCache
+    .. versionadded:: 0.2.0
+    """
+
+    def __init__(self, ttl=300.0, maxEntries=4096):
+        """
+        Initialize a new ResolverCache.
+
+           :param ttl: the number of seconds a resolution result is reused (default: 300.0)
+           :type ttl: float
+           :param maxEntries: the maximum number of cached results (default: 4096)
+           :type maxEntries: int
+
+           :raises ValueError: if the TTL is negative or maxEntries is below 1
+
+        .. versionadded:: 0.2.0
+        .. function:: __init__([ttl = 300.0, maxEntries = 4096])
+        """
+        self.logger = logging.getLogger("UHPPOTE.ResolverCache")
+
+        if float(ttl) < 0:
+            raise ValueError("Invalid TTL for resolver cache. Expected non-negative number; received \"%s\"." % ttl)
+
+        if int(maxEntries) <= 0:
+            raise ValueError("Invalid maximum entries for resolver cache: %d" % int(maxEntries))
+
+        self.ttl = float(ttl)
+        self.maxEntries = int(maxEntries)
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+
+    def resolve(self, host, port, now=None):
+        """
+        Resolve a hostname and port to a socket family and address, using a cached result if it has not expired.
+
+           :param host: the hostname to resolve
+           :type host: str
+           :param port: the port to connect to
+           :type port: int
+           :param now: the current time, in seconds since the epoch (default: `time.time()`)
+           :type now: float
+
+           :returns: a tuple of the socket family and the address to pass to `socket.connect()`
+           :rtype: tuple
+
+           :raises socket.gaierror: if the hostname cannot be resolved
+
+        .. versionadded:: 0.2.0
+        .. function:: resolve(host, port[, now = None])
+        """
+        now = time.time() if now is None else now
+        key = (host.lower(), int(port))
+
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is not None and entry[0] > now:
+                return entry[1], entry[2]
+
+        self.logger.debug("Resolving %s:%d..." % key)
+
+        family, socktype, proto, canonname, address = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)[0]
+
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (now + self.ttl, family, address)
+
+            while len(self.entries) > self.maxEntries:
+                self.entries.popitem(last=False)
+
+        return family, address
+
+
+    def invalidate(self, host=None):
+        """
+        Remove cached results for a hostname, or for all hostnames.
+
+           :param host: the hostname to remove (default: remove all)
+           :type host: str
+
+        .. versionadded:: 0.2.0
+        .. function:: invalidate([host = None])
+        """
+        with self.lock:
+            if host is None:
+                self.entries.clear()
+                return
+
+            for key in [key for key in self.entries if key[0] == host.lower()]:
+                del self.entries[key]
+
+
+    def __len__(self):
+        """
+        Return the number of cached results, including any that have expired but not been replaced.
+
+           :returns: the number of cached results
+           :rtype: int
+
+        .. versionadded:: 0.2.0
+        .. function:: __len__()
+        """
+        return len(self.entries)
+
+
+
+
+DEFAULT_RESOLVER = ResolverCache()
@@ -0,0 +1,483 @@
+# -*- coding: utf-8 -*-
+"""
+Provides lazily-decoded response packets from UHPPOTE RFID control boards.
+
+Responses wrap the raw 64-byte packet returned by `ControllerSocket.receive()` in a `memoryview` without copying it.
+Each field is decoded the first time it is read and cached on the response, so code that reads one or two fields of
+a status packet only pays for those fields.
+
+   :copyright: (c) 2017 by Andrew Vaughan.
+   :license: Apache 2.0, see LICENSE for more details.
+
+.. module:: response
+"""
+
+import datetime
+import struct
+
+from .commands import (FUNCTION_GET_DOOR_CONTROL, FUNCTION_GET_STATUS, FUNCTION_GET_TIME, FUNCTION_GET_TIME_PROFILE,
+                       FUNCTION_OPEN_DOOR, FUNCTION_SET_DOOR_CONTROL, FUNCTION_SET_INTERLOCK, FUNCTION_SET_TIME,
+                       FUNCTION_SET_TIME_PROFILE, MODE_NAMES, PACKET_SIZE, PROFILE_SEGMENTS, START_OF_MESSAGE,
+                       decodeDateTime, fromBCD)
+from .serial_number import SerialNumber
+
+
+class Field(object):
+    """
+    Describes a response field decoded on first access.
+
+    The decoded value is stored on the instance under the field's name, so later reads are ordinary attribute lookups
+    that never reach the field again.
+
+    .. class:: Field
+    .. versionadded:: 0.2.0
+    """
+
+    def __init__(self, name, decoder):
+        """
+        Initialize a new Field.
+
+           :param name: the attribute name the field is assigned to
+           :type name: str
+           :param decoder: a callable given the response's `memoryview`, returning the decoded value
+           :type decoder: callable
+
+        .. versionadded:: 0.2.0
+        .. function:: __init__(name, decoder)
+        """
+        self.name = name
+        self.decoder = decoder
+
+
+    def __get__(self, instance, owner):
+        """
+        Decode the field and cache it on the instance.
+
+           :param instance: the response
+           :type instance: Response
+           :param owner: the response class
+           :type owner: type
+
+           :returns: the decoded value, or this Field when accessed on the class
+           :rtype: object
+
+        .. versionadded:: 0.2.0
+        .. function:: __get__(instance, owner)
+        """
+        if instance is None:
+            return self
+
+        value = self.decoder(instance.view)
+        instance.__dict__[self.name] = value
+        return value
+
+
+def _uint8(offset):
+    """
+    Return a decoder for an unsigned byte.
+
+    .. versionadded:: 0.2.0
+    """
+    return lambda view: struct.unpack_from("<B", view, offset)[0]
+
+
+def _uint32(offset):
+    """
+    Return a decoder for an unsigned 32-bit integer, least-significant byte first.
+
+    .. versionadded:: 0.2.0
+    """
+    return lambda view: struct.unpack_from("<I", view, offset)[0]
+
+
+def _flag(offset):
+    """
+    Return a decoder for a byte treated as a boolean.
+
+    .. versionadded:: 0.2.0
+    """
+    return lambda view: struct.unpack_from("<B", view, offset)[0] != 0
+
+
+def _flags(offset, count):
+    """
+    Return a decoder for consecutive bytes treated as a tuple of booleans.
+
+    .. versionadded:: 0.2.0
+    """
+    return lambda view: tuple(value != 0 for value in struct.unpack_from("<%dB" % count, view, offset))
+
+
+def _dateTime(offset):
+    """
+    Return a decoder for a 7-byte BCD date and time.
+
+    .. versionadded:: 0.2.0
+    """
+    return lambda view: _decodeOptionalDateTime(view[offset:offset + 7])
+
+
+def _date(offset):
+    """
+    Return a decoder for a 4-byte BCD date (`YYYYMMDD`), decoding invalid dates as None.
+
+    .. versionadded:: 0.2.0
+    """
+    def decode(view):
+        data = bytearray(view[offset:offset + 4])
+
+        try:
+            return datetime.date(fromBCD(data[0:2]), fromBCD(data[2:3]), fromBCD(data[3:4]))
+        except ValueError:
+            return None
+
+    return decode
+
+
+def _segments(offset):
+    """
+    Return a decoder for the BCD `HHmm` start and end times of a time profile's segments, as a tuple of
+    `("HH:MM", "HH:MM")` pairs without the unused, all-zero segments.
+
+    .. versionadded:: 0.2.0
+    """
+    def decode(view):
+        data = bytearray(view[offset:offset + 4 * PROFILE_SEGMENTS])
+        segments = []
+
+        for index in range(0, len(data), 4):
+            if any(data[index:index + 4]):
+                segments.append(tuple("%02d:%02d" % (fromBCD(data[at:at + 1]), fromBCD(data[at + 1:at + 2]))
+                                      for at in (index, index + 2)))
+
+        return tuple(segments)
+
+    return decode
+
+
+def _decodeOptionalDateTime(data):
+    """
+    Decode a BCD date and time, returning None for the all-zero value boards report when no time is set.
+
+       :param data: the encoded date and time
+       :type data: memoryview
+
+       :returns: the decoded date and time, or None
+       :rtype: datetime.datetime
+
+    .. versionadded:: 0.2.0
+    .. function:: _decodeOptionalDateTime(data)
+    """
+    if not any(bytearray(data)):
+        return None
+
+    try:
+        return decodeDateTime(data)
+    except ValueError:
+        return None
+
+
+def _decodeSerial(view):
+    """
+    Decode the serial number, stored least-significant byte first.
+
+    .. versionadded:: 0.2.0
+    """
+    return SerialNumber(bytearray(reversed(bytearray(view[4:8]))))
+
+
+def _decodeSystemDateTime(view):
+    """
+    Decode the board's clock from the separate BCD date (`YYMMDD`) and time (`HHmmss`) fields of a status packet.
+
+    .. versionadded:: 0.2.0
+    """
+    date = bytearray(view[51:54])
+    time = bytearray(view[37:40])
+
+    try:
+        return datetime.datetime(
+            2000 + fromBCD(date[0:1]), fromBCD(date[1:2]), fromBCD(date[2:3]),
+            fromBCD(time[0:1]), fromBCD(time[1:2]), fromBCD(time[2:3])
+        )
+    except ValueError:
+        return None
+
+
+class Response(object):
+    """
+    A response packet from a control board, decoded lazily.
+
+    .. class:: Response
+    .. versionadded:: 0.2.0
+    """
+
+    function = Field("function", _uint8(1))
+    serial = Field("serial", _decodeSerial)
+
+    def __init__(self, data):
+        """
+        Wrap a 64-byte response packet without copying it.
+
+           :param data: the response packet
+           :type data: bytearray or bytes or memoryview
+
+           :raises ResponseException: if the packet is not a 64-byte response
+
+        .. versionadded:: 0.2.0
+        .. function:: __init__(data)
+        """
+        self.view = memoryview(data)
+
+        if len(self.view) != PACKET_SIZE or struct.unpack_from("<B", self.view, 0)[0] != START_OF_MESSAGE:
+            raise ResponseException("Malformed response. Expected a %d-byte packet starting with 0x%02x." % (PACKET_SIZE, START_OF_MESSAGE))
+
+
+    def getBytes(self):
+        """
+        Return a copy of the raw response packet.
+
+           :returns: the response packet
+           :rtype: bytearray
+
+        .. versionadded:: 0.2.0
+        .. function:: getBytes()
+        """
+        return bytearray(self.view)
+
+
+    def __getstate__(self):
+        """
+        Decode every field and return them with a copy of the packet, so a response sent to another process, such as
+        from a fleet worker, arrives already decoded.
+
+           :returns: the decoded fields and the packet
+           :rtype: dict
+
+        .. versionadded:: 0.2.0
+        .. function:: __getstate__()
+        """
+        for name in dir(type(self)):
+            if isinstance(getattr(type(self), name), Field):
+                getattr(self, name)
+
+        state = dict(self.__dict__)
+        state["view"] = bytes(self.getBytes())
+        return state
+
+
+    def __setstate__(self, state):
+        """
+        Restore a response from its decoded fields and packet.
+
+           :param state: the decoded fields and the packet
+           :type state: dict
+
+        .. versionadded:: 0.2.0
+        .. function:: __setstate__(state)
+        """
+        self.__dict__.update(state)
+        self.view = memoryview(bytearray(state["view"]))
+
+
+
+
+class StatusResponse(Response):
+    """
+    A response to a status request (function `0x20`).
+
+    .. class:: StatusResponse
+    .. versionadded:: 0.2.0
+    """
+
+    lastEventIndex = Field("lastEventIndex", _uint32(8))
+    eventType = Field("eventType", _uint8(12))
+    eventGranted = Field("eventGranted", _flag(13))
+    eventDoor = Field("eventDoor", _uint8(14))
+    eventDirection = Field("eventDirection", _uint8(15))
+    eventCardNumber = Field("eventCardNumber", _uint32(16))
+    eventTimestamp = Field("eventTimestamp", _dateTime(20))
+    eventReason = Field("eventReason", _uint8(27))
+    doorOpen = Field("doorOpen", _flags(28, 4))
+    doorButton = Field("doorButton", _flags(32, 4))
+    systemError = Field("systemError", _uint8(36))
+    sequenceNumber = Field("sequenceNumber", _uint32(40))
+    specialInfo = Field("specialInfo", _uint8(48))
+    relayState = Field("relayState", _uint8(49))
+    inputState = Field("inputState", _uint8(50))
+    systemDateTime = Field("systemDateTime", _decodeSystemDateTime)
+
+    def isDoorOpen(self, door):
+        """
+        Return whether a door's sensor reports it open.
+
+           :param door: the door number, from 1 to 4
+           :type door: int
+
+           :returns: whether the door is open
+           :rtype: bool
+
+           :raises ValueError: if the door number is invalid
+
+        .. versionadded:: 0.2.0
+        .. function:: isDoorOpen(door)
+        """
+        if not 1 <= int(door) <= 4:
+            raise ValueError("Invalid door. Expected 1 to 4; received \"%s\"." % door)
+
+        return self.doorOpen[int(door) - 1]
+
+
+
+
+class TimeResponse(Response):
+    """
+    A response to a get-time or set-time request (functions `0x32` and `0x30`).
+
+    .. class:: TimeResponse
+    .. versionadded:: 0.2.0
+    """
+
+    dateTime = Field("dateTime", _dateTime(8))
+
+
+
+
+class OpenDoorResponse(Response):
+    """
+    A response to an open-door request (function `0x40`).
+
+    .. class:: OpenDoorResponse
+    .. versionadded:: 0.2.0
+    """
+
+    succeeded = Field("succeeded", _flag(8))
+
+
+
+
+class DoorControlResponse(Response):
+    """
+    A response to a get-door-control or set-door-control request (functions `0x82` and `0x80`).
+
+    .. class:: DoorControlResponse
+    .. versionadded:: 0.2.0
+    """
+
+    door = Field("door", _uint8(8))
+    mode = Field("mode", _uint8(9))
+    delay = Field("delay", _uint8(10))
+
+    def getArguments(self):
+        """
+        Return the door's settings as the arguments of the set-door-control command.
+
+           :returns: the door number, mode name, and delay; unknown modes are given as their number
+           :rtype: tuple
+
+        .. versionadded:: 0.2.0
+        .. function:: getArguments()
+        """
+        return (self.door, MODE_NAMES.get(self.mode, str(self.mode)), self.delay)
+
+
+
+
+class TimeProfileResponse(Response):
+    """
+    A response to a get-time-profile request (function `0x98`).  Boards report profile 0 for an undefined profile.
+
+    .. class:: TimeProfileResponse
+    .. versionadded:: 0.2.0
+    """
+
+    profile = Field("profile", _uint8(8))
+    startDate = Field("startDate", _date(9))
+    endDate = Field("endDate", _date(13))
+    weekdays = Field("weekdays", _flags(17, 7))
+    segments = Field("segments", _segments(24))
+    linked = Field("linked", _uint8(36))
+
+    def getArguments(self):
+        """
+        Return the profile as the arguments of the set-time-profile command.
+
+           :returns: the profile's arguments, or None if the profile is undefined
+           :rtype: tuple
+
+        .. versionadded:: 0.2.0
+        .. function:: getArguments()
+        """
+        if not self.profile or self.startDate is None or self.endDate is None:
+            return None
+
+        return (
+            self.profile,
+            self.startDate.strftime("%Y-%m-%d"),
+            self.endDate.strftime("%Y-%m-%d"),
+            "".join("1" if flag else "0" for flag in self.weekdays),
+        ) + tuple("-".join(segment) for segment in self.segments) + ("linked=%d" % self.linked,)
+
+
+
+
+class ConfirmationResponse(Response):
+    """
+    A response to a request that only reports whether it was applied (functions `0x88` and `0xa2`).
+
+    .. class:: ConfirmationResponse
+    .. versionadded:: 0.2.0
+    """
+
+    succeeded = Field("succeeded", _flag(8))
+
+
+
+
+RESPONSE_TYPES = {
+    FUNCTION_GET_STATUS: StatusResponse,
+    FUNCTION_SET_TIME: TimeResponse,
+    FUNCTION_GET_TIME: TimeResponse,
+    FUNCTION_OPEN_DOOR: OpenDoorResponse,
+    FUNCTION_SET_DOOR_CONTROL: DoorControlResponse,
+    FUNCTION_GET_DOOR_CONTROL: DoorControlResponse,
+    FUNCTION_SET_TIME_PROFILE: ConfirmationResponse,
+    FUNCTION_GET_TIME_PROFILE: TimeProfileResponse,
+    FUNCTION_SET_INTERLOCK: ConfirmationResponse,
+}
+
+
+def parseResponse(data):
+    """
+    Wrap a response packet in the Response class for its function code.
+
+       :param data: the response packet
+       :type data: bytearray or bytes or memoryview
+
+       :returns: the response
+       :rtype: Response
+
+       :raises ResponseException: if the packet is not a 64-byte response
+
+    .. versionadded:: 0.2.0
+    .. function:: parseResponse(data)
+    """
+    response = Response(data)
+    responseType = RESPONSE_TYPES.get(response.function)
+
+    if responseType is None:
+        return response
+
+    return responseType(response.view)
+
+
+
+
+class ResponseException(Exception):
+    """
+    Custom exception raised if a response packet is malformed.
+
+    .. versionadded:: 0.2.0
+    """
+
+    pass
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+Provides round-trip time estimates for control boards, from which connect and receive timeouts are derived.
+
+Estimates follow TCP's retransmission timer (RFC 6298).  Each board, by host and port, keeps a smoothed round-trip
+time and its variation, updated from every measured request::
+
+   RTTVAR = 3/4 * RTTVAR + 1/4 * |SRTT - R|
+   SRTT = 7/8 * SRTT + 1/8 * R
+   RTO = SRTT + 4 * RTTVAR
+
+The timeout is kept between a minimum and a maximum, and doubles whenever it expires, so a board on a fast LAN fails
+fast while one behind a cellular link is given the time it needs.  Estimates can be kept in a JSON file, so a new run
+starts from what the last one learned rather than from the initial timeout.
+
+   :copyright: (c) 2017 by Andrew Vaughan.
+   :license: Apache 2.0, see LICENSE for more details.
+
+.. module:: RTTEstimator
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+
+RTT_ALPHA = 0.125
+RTT_BETA = 0.25
+RTT_K = 4.0
+
+
+class RTTEstimator(object):
+    """
+    Keeps round-trip time estimates and timeouts for many control boards.  One estimator can be shared by every
+    socket in a process.
+
+    .. class:: RTTEstimator
+    .. versionadded:: 0.2.0
+    """
+
+    def __init__(self, path=None, initial=1.0, minimum=0.2, maximum=60.0, saveInterval=60.0):
+        """
+        Initialize a new RTTEstimator, loading saved estimates if a path is given and the file exists.
+
+           :param path: a JSON file to keep estimates in between runs (default: none; estimates are not kept)
+           :type path: str
+           :param initial: the timeout, in seconds, for a board with no estimate (default: 1.0)
+           :type initial: float
+           :param minimum: the shortest timeout, in seconds (default: 0.2)
+           :type minimum: float
+           :param maximum: the longest timeout, in seconds (default: 60.0)
+           :type maximum: float
+           :param saveInterval: the fewest seconds between automatic saves after new measurements (default: 60.0)
+           :type saveInterval: float
+
+           :raises ValueError: if the timeouts are not positive and in order
+
+        .. versionadded:: 0.2.0
+        .. function:: __init__([path = None, initial = 1.0, minimum = 0.2, maximum = 60.0, saveInterval = 60.0])
+        """
+        self.logger = logging.getLogger("UHPPOTE.RTTEstimator")
+
+        if not 0 < float(minimum) <= float(initial) <= float(maximum):
+            raise ValueError("Invalid timeouts for RTT estimator. Expected 0 < minimum <= initial <= maximum; received %s, %s, %s." % (minimum, initial, maximum))
+
+        self.path = path
+        self.initial = float(initial)
+        self.minimum = float(minimum)
+        self.maximum = float(maximum)
+        self.saveInterval = float(saveInterval)
+
+        # [smoothed RTT, RTT variation, timeout] by (host, port); SRTT is None until the first measurement
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.savedAt = time.time()
+
+        if path is not None and os.path.exists(path):
+            self.load()
+
+
+    def getTimeout(self, host, port):
+        """
+        Return the current timeout for a control board.
+
+           :param host: the hostname or IP address of the control board
+           :type host: str
+           :param port: the port of the control board
+           :type port: int
+
+           :returns: the timeout, in seconds
+           :rtype: float
+
+        .. versionadded:: 0.2.0
+        .. function:: getTimeout(host, port)
+        """
+        entry = self.entries.get((host, int(port)))
+        return self.initial if entry is None else entry[2]
+
+
+    def getEstimate(self, host, port):
+        """
+        Return the estimate for a control board.
+
+           :param host: the hostname or IP address of the control board
+           :type host: str
+           :param port: the port of the control board
+           :type port: int
+
+           :returns: the smoothed round-trip time, its variation, and the timeout, in seconds; or None if unmeasured
+           :rtype: tuple
+
+        .. versionadded:: 0.2.0
+        .. function:: getEstimate(host, port)
+        """
+        entry = self.entries.get((host, int(port)))
+        return None if entry is None or entry[0] is None else tuple(entry)
+
+
+    def sample(self, host, port, rtt):
+        """
+        Update a control board's estimate with a measured round trip.  Only measure requests that were answered the
+        first time, with nothing else outstanding, so retries and queueing do not skew the estimate.
+
+           :param host: the hostname or IP address of the control board
+           :type host: str
+           :param port: the port of the control board
+           :type port: int
+           :param rtt: the measured round-trip time, in seconds
+           :type rtt: float
+
+        .. versionadded:: 0.2.0
+        .. function:: sample(host, port, rtt)
+        """
+        rtt = max(0.0, float(rtt))
+        key = (host, int(port))
+
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is None or entry[0] is None:
+                srtt, rttvar = rtt, rtt / 2.0
+            else:
+                rttvar = (1.0 - RTT_BETA) * entry[1] + RTT_BETA * abs(entry[0] - rtt)
+                srtt = (1.0 - RTT_ALPHA) * entry[0] + RTT_ALPHA * rtt
+
+            self.entries[key] = [srtt, rttvar, min(self.maximum, max(self.minimum, srtt + RTT_K * rttvar))]
+
+            # Claim the save while locked, so only one of the threads sampling at once writes the file
+            now = time.time()
+            due = self.path is not None and now - self.savedAt >= self.saveInterval
+
+            if due:
+                self.savedAt = now
+
+        # The response was already received; failing to save must not lose it
+        if due:
+            try:
+                self.save()
+            except (IOError, OSError) as e:
+                self.logger.warning("Unable to save RTT estimates to %s: %s" % (self.path, str(e)))
+
+
+    def backoff(self, host, port):
+        """
+        Double a control board's timeout after it expired, up to the maximum.  The smoothed estimate is kept, and the
+        next measurement brings the timeout back down.
+
+           :param host: the hostname or IP address of the control board
+           :type host: str
+           :param port: the port of the control board
+           :type port: int
+
+           :returns: the new timeout, in seconds
+           :rtype: float
+
+        .. versionadded:: 0.2.0
+        .. function:: backoff(host, port)
+        """
+        key = (host, int(port))
+
+        with self.lock:
+            entry = self.entries.setdefault(key, [None, None, self.initial])
+            entry[2] = min(self.maximum, entry[2] * 2.0)
+
+            self.logger.debug("Timeout for %s:%d backed off to %.3f seconds." % (key[0], key[1], entry[2]))
+            return entry[2]
+
+
+    def load(self):
+        """
+        Replace the estimates with those saved in the estimator's file.  Saved timeouts are clamped to this
+        estimator's minimum and maximum, and a file that cannot be read is ignored.
+
+        .. versionadded:: 0.2.0
+        .. function:: load()
+        """
+        try:
+            with open(self.path) as handle:
+                document = json.load(handle)
+
+            entries = {}
+
+            for target, values in document["estimates"].items():
+                host, _, port = target.rpartition(":")
+                srtt, rttvar = float(values["srtt"]), float(values["rttvar"])
+                entries[(host, int(port))] = [srtt, rttvar, min(self.maximum, max(self.minimum, srtt + RTT_K * rttvar))]
+
+        except (IOError, OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            self.logger.warning("Ignoring unreadable RTT estimates in %s: %s" % (self.path, str(e)))
+            return
+
+        with self.lock:
+            self.entries = entries
+
+
+    def save(self):
+        """
+        Write the measured estimates to the estimator's file, replacing it only once the new file is complete.
+
+           :raises IOError: if the file cannot be written
+
+        .. versionadded:: 0.2.0
+        .. function:: save()
+        """
+        if self.path is None:
+            return
+
+        with self.lock:
+            estimates = dict(("%s:%d" % key, {"srtt": entry[0], "rttvar": entry[1]})
+                             for key, entry in self.entries.items() if entry[0] is not None)
+            self.savedAt = time.time()
+
+        # A file of its own in the same directory, so concurrent saves do not collide and the rename stays atomic
+        descriptor, temporary = tempfile.mkstemp(prefix=os.path.basename(self.path) + ".", suffix=".tmp",
+                                                 dir=os.path.dirname(os.path.abspath(self.path)))
+
+        try:
+            with os.fdopen(descriptor, "w") as handle:
+                json.dump({"version": 1, "estimates": estimates}, handle, sort_keys=True)
+
+            # os.replace is only available from Python 3.3; rename does not replace an existing file on Windows
+            getattr(os, "replace", os.rename)(temporary, self.path)
+
+        except Exception:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+            raise
@@ -8,9 +8,15 @@ Provides serial number support for UHPPOTE RFID control boards.
 .. module:: SerialNumber
 """
 
-import binascii
 import logging
 import string
+import struct
+
+from .compat import INTEGER_TYPES, STRING_TYPES
+
+
+SERIAL_MINIMUM = 0
+SERIAL_MAXIMUM = 999999999
 
 
 class SerialNumber(object):
@@ -39,32 +45,34 @@ class SerialNumber(object):
         be treated as the final four pairs of hexadecimal numbers from the MAC address of the controller board.  The
         MAC address of the controller board can be found by running a Search function on the controller board.
 
-        4-Byte `bytearray`
-        ++++++++++++++++++
-        If a 4-byte `bytearray` is provided, it will be treated as the final four pairs of hexadecimal numbers from
-        the MAC address of the controller board, in order.
+        4-Byte `bytearray` or `bytes`
+        +++++++++++++++++++++++++++++
+        If a 4-byte `bytearray` (or, on Python 3, `bytes`) is provided, it will be treated as the final four pairs of
+        hexadecimal numbers from the MAC address of the controller board, in order.
 
-           :param serial: the serial number as either a string, integer, or bytearray
-           :type serial: str or int or bytearray
+           :param serial: the serial number as either a string, integer, bytearray, or bytes
+           :type serial: str or int or bytearray or bytes
 
            :raisess SerialNumberException: if the provided serial number is in the incorrect format
 
         .. versionadded:: 0.1.0
+        .. versionchanged:: 0.2.0
+           Accepts `bytes` on Python 3.
         .. function:: __init__(serial)
         """
         self.logger = logging.getLogger("UHPPOTE.SerialNumber")
 
         # If this is a bytearray, convert it to a 9-digit integer for transformation later
-        if isinstance(serial, bytearray):
-            self.logger.debug("Serial number provided as bytearray length %d.  Converting from bytes to integer.", len(serial))
+        if isinstance(serial, bytearray) or (isinstance(serial, bytes) and not isinstance(serial, str)):
+            self.logger.debug("Serial number provided as bytes length %d.  Converting from bytes to integer.", len(serial))
 
             if len(serial) != 4:
                 raise SerialNumberException("SerialNumber as bytearray requires exactly 4 bytes.  Received bytearray of length %d." % len(serial))
 
-            self.serialInteger = int(binascii.hexlify(serial), 16)
+            self.serialInteger = struct.unpack(">I", bytes(serial))[0]
 
         # If this is a string, check for different types
-        elif isinstance(serial, str):
+        elif isinstance(serial, STRING_TYPES):
             self.logger.debug("Serial number provided as string (%s).  Converting from hexadecimal to integer.", serial)
 
             # If it's a hexadecimal number in python-format, convert it from base-16
@@ -90,7 +98,7 @@ class SerialNumber(object):
 
 
         # If provided an integer, use it
-        elif isinstance(serial, (int, long)):
+        elif isinstance(serial, INTEGER_TYPES):
             self.logger.debug("Serial number provided as integer (%d).", serial)
             self.serialInteger = int(serial)
 
@@ -100,7 +108,7 @@ class SerialNumber(object):
 
 
         # Check bounds
-        if self.serialInteger < 0 or self.serialInteger > 999999999:
+        if self.serialInteger < SERIAL_MINIMUM or self.serialInteger > SERIAL_MAXIMUM:
             raise SerialNumberException("SerialNumber is out of bounds.  Must be between 0 and 999,999,999.  Received \"%d\"." % self.serialInteger)
 
         self.logger.debug("Serial number stored as %d (%s)." % (self.getInteger(), self.getHexadecimalString()))
@@ -119,6 +127,19 @@ class SerialNumber(object):
         return self.getHexadecimalString()
 
 
+    def __reduce__(self):
+        """
+        Pickle the SerialNumber by its integer value, so it can be sent to another process, such as a fleet worker.
+
+           :returns: the class and the arguments that rebuild the serial number
+           :rtype: tuple
+
+        .. versionadded:: 0.2.0
+        .. SerialNumber:function:: __reduce__()
+        """
+        return (SerialNumber, (self.serialInteger,))
+
+
     def getInteger(self):
         """
         Return the serial number as an integer.
@@ -203,7 +224,7 @@ class SerialNumber(object):
         .. versionadded:: 0.1.0
         .. SerialNumber:function:: getByteArray([reverse = False])
         """
-        return bytearray.fromhex(self.getHexadecimalString(reverse))
+        return bytearray(struct.pack("<I" if reverse else ">I", self.getInteger()))
 
 
 
@@ -0,0 +1,401 @@
+# -*- coding: utf-8 -*-
+"""
+Provides a fleet status table in shared memory, written by one process and read by any number of others.
+
+The table is a memory-mapped file of fixed-size slots, one per control board, found by hashing the serial number.
+Each slot carries a sequence number: the writer makes it odd while changing the slot and even again when done, and a
+reader retries if the number was odd or changed while it read.  Readers therefore take no locks and send nothing to
+the writer, and a status read costs a few microseconds rather than a round trip to the board.
+
+File layout, all little-endian::
+
+   header: <magic: 4s "UHPS"> <version: uint16> <slot size: uint16> <slot count: uint32> <reserved: 4 bytes>
+   slot:   <sequence: uint32> <serial: uint32> <updated: float64> <online: uint8> <door open: uint8>
+           <door button: uint8> <relay state: uint8> <input state: uint8> <system error: uint8> <event type: uint8>
+           <event granted: uint8> <last event index: uint32> <event card number: uint32> <event door: uint8>
+           <event reason: uint8> <padding: 6 bytes>
+
+Door flags are bit masks, with door 1 in the lowest bit.  A serial number of 0 marks an unused slot.
+
+   :copyright: (c) 2017 by Andrew Vaughan.
+   :license: Apache 2.0, see LICENSE for more details.
+
+.. module:: StatusBoard
+"""
+
+import logging
+import mmap
+import os
+import struct
+import time
+
+from .serial_number import SerialNumber
+
+
+STATUS_MAGIC = b"UHPS"
+STATUS_VERSION = 1
+
+STATUS_HEADER = struct.Struct("<4sHHI4x")
+STATUS_SEQUENCE = struct.Struct("<I")
+STATUS_SERIAL = struct.Struct("<I")
+STATUS_BODY = struct.Struct("<dBBBBBBBBIIBB6x")
+STATUS_SLOT_SIZE = STATUS_SEQUENCE.size + STATUS_SERIAL.size + STATUS_BODY.size
+
+STATUS_FIELDS = ("updated", "online", "doorOpen", "doorButton", "relayState", "inputState", "systemError", "eventType",
+                 "eventGranted", "lastEventIndex", "eventCardNumber", "eventDoor", "eventReason")
+
+# Seconds a reader keeps retrying a slot the writer keeps changing, such as one left mid-update by a writer that died
+READ_TIMEOUT = 1.0
+
+
+class StatusBoard(object):
+    """
+    A table of control board status in a memory-mapped file.
+
+    Open it writable in exactly one process; every other process opens it read-only.
+
+    .. class:: StatusBoard
+    .. versionadded:: 0.2.0
+    """
+
+    def __init__(self, path, slots=4096, writable=False):
+        """
+        Open a status table, creating it if opened writable and it does not exist.
+
+           :param path: the path of the table's file; on Linux, a path under /dev/shm keeps it in memory
+           :type path: str
+           :param slots: the number of boards the table holds, when it is created (default: 4096)
+           :type slots: int
+           :param writable: whether this process is the table's writer (default: False)
+           :type writable: bool
+
+           :raises ValueError: if the number of slots is below 1
+           :raises StatusBoardException: if the file is not a status table
+           :raises IOError: if the file cannot be opened
+
+        .. versionadded:: 0.2.0
+        .. function:: __init__(path[, slots = 4096, writable = False])
+        """
+        self.logger = logging.getLogger("UHPPOTE.StatusBoard")
+
+        if int(slots) <= 0:
+            raise ValueError("Invalid number of slots for status table: %d" % int(slots))
+
+        self.path = path
+        self.writable = bool(writable)
+
+        if self.writable and (not os.path.exists(path) or os.path.getsize(path) == 0):
+            self._create(path, int(slots))
+
+        with open(path, "r+b" if self.writable else "rb") as handle:
+            size = os.fstat(handle.fileno()).st_size
+
+            if size < STATUS_HEADER.size:
+                raise StatusBoardException("Invalid status table %s: file is too short." % path)
+
+            self.memory = mmap.mmap(handle.fileno(), size, access=mmap.ACCESS_WRITE if self.writable else mmap.ACCESS_READ)
+
+        magic, version, slotSize, self.slots = STATUS_HEADER.unpack_from(self.memory, 0)
+
+        if magic != STATUS_MAGIC or version != STATUS_VERSION or slotSize != STATUS_SLOT_SIZE or \
+                size < STATUS_HEADER.size + slotSize * self.slots or self.slots == 0:
+            self.memory.close()
+            raise StatusBoardException("Invalid status table %s: unrecognized header." % path)
+
+        # The writer's own index of slots; readers probe the table instead
+        self.indexes = {}
+
+        if self.writable:
+            for index in range(self.slots):
+                serial = self._getSerial(index)
+
+                if serial:
+                    self.indexes[serial] = index
+
+
+    def update(self, serial, status=None, online=True, now=None):
+        """
+        Record a control board's status.  Only the writer may update the table.
+
+           :param serial: the serial number of the control board
+           :type serial: SerialNumber or str or int or bytearray
+           :param status: the board's latest status; if omitted, the last recorded status is kept (default: None)
+           :type status: StatusResponse
+           :param online: whether the board is reachable (default: True)
+           :type online: bool
+           :param now: the time of the update, in seconds since the epoch (default: now)
+           :type now: float
+
+           :raises StatusBoardException: if the table is read-only or full
+           :raises SerialNumberException: if the serial number is invalid
+
+        .. versionadded:: 0.2.0
+        .. function:: update(serial[, status = None, online = True, now = None])
+        """
+        if not self.writable:
+            raise StatusBoardException("Status table %s is open read-only." % self.path)
+
+        serial = _getSerial(serial)
+        index = self.indexes.get(serial)
+
+        if index is None:
+            index = self._allocate(serial)
+
+        offset = STATUS_HEADER.size + index * STATUS_SLOT_SIZE
+        bodyOffset = offset + STATUS_SEQUENCE.size + STATUS_SERIAL.size
+        updated = time.time() if now is None else float(now)
+
+        if status is None:
+            values = list(STATUS_BODY.unpack_from(self.memory, bodyOffset))
+            values[0:2] = [updated, 1 if online else 0]
+        else:
+            values = [
+                updated,
+                1 if online else 0,
+                _toMask(status.doorOpen),
+                _toMask(status.doorButton),
+                status.relayState,
+                status.inputState,
+                status.systemError,
+                status.eventType,
+                1 if status.eventGranted else 0,
+                status.lastEventIndex,
+                status.eventCardNumber,
+                status.eventDoor,
+                status.eventReason,
+            ]
+
+        # Odd while the slot is being written; already odd if a writer died mid-update, so set the bit rather than
+        # adding to it, or the slot would read as changing whenever it is not
+        sequence = STATUS_SEQUENCE.unpack_from(self.memory, offset)[0] | 1
+
+        STATUS_SEQUENCE.pack_into(self.memory, offset, sequence)
+        STATUS_BODY.pack_into(self.memory, bodyOffset, *values)
+        STATUS_SEQUENCE.pack_into(self.memory, offset, (sequence + 1) & 0xffffffff)
+
+
+    def get(self, serial):
+        """
+        Return a control board's latest status without locking or contacting the writer.
+
+           :param serial: the serial number of the control board
+           :type serial: SerialNumber or str or int or bytearray
+
+           :returns: the status, keyed by field name (see `STATUS_FIELDS`), with `serial`; or None if never recorded
+           :rtype: dict
+
+           :raises StatusBoardException: if the slot could not be read consistently
+           :raises SerialNumberException: if the serial number is invalid
+
+        .. versionadded:: 0.2.0
+        .. function:: get(serial)
+        """
+        serial = _getSerial(serial)
+        index = self._find(serial)
+
+        if index is None:
+            return None
+
+        return self._read(index, serial)
+
+
+    def getAll(self):
+        """
+        Return the latest status of every control board in the table.
+
+           :returns: statuses as from `get()`, in table order
+           :rtype: list
+
+           :raises StatusBoardException: if a slot could not be read consistently
+
+        .. versionadded:: 0.2.0
+        .. function:: getAll()
+        """
+        statuses = []
+
+        for index in range(self.slots):
+            serial = self._getSerial(index)
+
+            if serial:
+                statuses.append(self._read(index, serial))
+
+        return statuses
+
+
+    def isDoorOpen(self, serial, door):
+        """
+        Return whether a door's sensor last reported it open.
+
+           :param serial: the serial number of the control board
+           :type serial: SerialNumber or str or int or bytearray
+           :param door: the door number, from 1 to 4
+           :type door: int
+
+           :returns: whether the door is open, or None if the board was never recorded
+           :rtype: bool
+
+           :raises ValueError: if the door number is invalid
+
+        .. versionadded:: 0.2.0
+        .. function:: isDoorOpen(serial, door)
+        """
+        if not 1 <= int(door) <= 4:
+            raise ValueError("Invalid door. Expected 1 to 4; received \"%s\"." % door)
+
+        status = self.get(serial)
+
+        if status is None:
+            return None
+
+        return bool(status["doorOpen"] & 1 << (int(door) - 1))
+
+
+    def close(self):
+        """
+        Unmap the table.  The file is left in place for other processes.
+
+        .. versionadded:: 0.2.0
+        .. function:: close()
+        """
+        self.memory.close()
+
+
+    def _create(self, path, slots):
+        """
+        .. versionadded:: 0.2.0
+        """
+        self.logger.debug("Creating status table %s with %d slots." % (path, slots))
+
+        with open(path, "wb") as handle:
+            handle.write(STATUS_HEADER.pack(STATUS_MAGIC, STATUS_VERSION, STATUS_SLOT_SIZE, slots))
+            handle.truncate(STATUS_HEADER.size + STATUS_SLOT_SIZE * slots)
+
+
+    def _getSerial(self, index):
+        """
+        .. versionadded:: 0.2.0
+        """
+        return STATUS_SERIAL.unpack_from(self.memory, STATUS_HEADER.size + index * STATUS_SLOT_SIZE + STATUS_SEQUENCE.size)[0]
+
+
+    def _find(self, serial):
+        """
+        Return the slot holding a serial number, probing from its hashed slot, or None if it is not in the table.
+
+        .. versionadded:: 0.2.0
+        """
+        index = serial % self.slots
+
+        for _ in range(self.slots):
+            found = self._getSerial(index)
+
+            if found == serial:
+                return index
+
+            if found == 0:
+                return None
+
+            index = (index + 1) % self.slots
+
+        return None
+
+
+    def _allocate(self, serial):
+        """
+        Claim the first free slot from a serial number's hashed slot.  The slot's body is still zero, so readers that
+        see the serial number before its first update read an offline, empty status.
+
+        .. versionadded:: 0.2.0
+        """
+        index = serial % self.slots
+
+        for _ in range(self.slots):
+            if self._getSerial(index) == 0:
+                STATUS_SERIAL.pack_into(self.memory, STATUS_HEADER.size + index * STATUS_SLOT_SIZE + STATUS_SEQUENCE.size,
+                                        serial)
+                self.indexes[serial] = index
+                return index
+
+            index = (index + 1) % self.slots
+
+        raise StatusBoardException("Status table %s is full (%d slots)." % (self.path, self.slots))
+
+
+    def _read(self, index, serial):
+        """
+        Read a slot, retrying while the writer changes it.
+
+        .. versionadded:: 0.2.0
+        """
+        offset = STATUS_HEADER.size + index * STATUS_SLOT_SIZE
+        bodyOffset = offset + STATUS_SEQUENCE.size + STATUS_SERIAL.size
+
+        deadline = None
+        attempt = 0
+
+        while True:
+            before = STATUS_SEQUENCE.unpack_from(self.memory, offset)[0]
+
+            if before & 1 == 0:
+                values = STATUS_BODY.unpack_from(self.memory, bodyOffset)
+
+                if STATUS_SEQUENCE.unpack_from(self.memory, offset)[0] == before:
+                    status = dict(zip(STATUS_FIELDS, values))
+                    status["serial"] = serial
+                    status["online"] = bool(status["online"])
+                    status["eventGranted"] = bool(status["eventGranted"])
+                    return status
+
+            attempt += 1
+
+            # Spin briefly, then yield so a writer in this process can finish
+            if attempt % 16 == 0:
+                if deadline is None:
+                    deadline = time.time() + READ_TIMEOUT
+                elif time.time() > deadline:
+                    break
+
+                time.sleep(0.0001)
+
+        raise StatusBoardException("Status for %d was changing too often to be read." % serial)
+
+
+
+
+def _getSerial(serial):
+    """
+    Return a serial number as an integer.
+
+    .. versionadded:: 0.2.0
+    """
+    if not isinstance(serial, SerialNumber):
+        serial = SerialNumber(serial)
+
+    return serial.getInteger()
+
+
+def _toMask(flags):
+    """
+    Return a sequence of flags as a bit mask, with the first flag in the lowest bit.
+
+    .. versionadded:: 0.2.0
+    """
+    mask = 0
+
+    for bit, flag in enumerate(flags):
+        if flag:
+            mask |= 1 << bit
+
+    return mask
+
+
+
+
+class StatusBoardException(Exception):
+    """
+    Custom exception raised if a status table is invalid, full, or cannot be read or written.
+
+    .. versionadded:: 0.2.0
+    """
+
+    pass
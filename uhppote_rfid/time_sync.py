@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+"""
+Provides concurrent, round-trip-compensated clock synchronization for UHPPOTE RFID control boards.
+
+Boards only report their clock to the whole second, so a single reading can be up to a second off.  Each board is
+sampled several times at different points within the second; every sample bounds the board's offset to a one-second
+window, centred on the local time half a round trip after the request was sent, and the windows are intersected to
+narrow the estimate.  Corrections are sent half a round trip before a whole second, so the new time takes effect on
+the board as the local clock reaches it.
+
+   :copyright: (c) 2017 by Andrew Vaughan.
+   :license: Apache 2.0, see LICENSE for more details.
+
+.. module:: TimeSynchronizer
+"""
+
+import datetime
+import logging
+import threading
+import time
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+from .commands import CommandException, execute
+from .connection_pool import ConnectionPool
+from .response import TimeResponse
+from .serial_number import SerialNumber
+
+
+class TimeSynchronizer(object):
+    """
+    Measures and corrects the clock offset of many control boards at once.
+
+    .. class:: TimeSynchronizer
+    .. versionadded:: 0.2.0
+    """
+
+    def __init__(self, pool=None, samples=4, interval=0.25, tolerance=0.25, concurrency=64, timeout=2.0):
+        """
+        Initialize a new TimeSynchronizer.
+
+           :param pool: the connection pool to use (default: a new `ConnectionPool` timed out by `timeout`)
+           :type pool: ConnectionPool
+           :param samples: the number of clock readings taken from each board (default: 4)
+           :type samples: int
+           :param interval: the seconds between readings; a quarter second spreads four readings across the second
+              (default: 0.25)
+           :type interval: float
+           :param tolerance: the largest offset, in seconds, left uncorrected (default: 0.25)
+           :type tolerance: float
+           :param concurrency: the number of boards synchronized at the same time (default: 64)
+           :type concurrency: int
+           :param timeout: the longest time, in seconds, to wait to connect to or hear from a board, if no pool is
+              given; a board that does not answer in time is reported as failed (default: 2.0)
+           :type timeout: float
+
+           :raises ValueError: if samples or concurrency is below 1, interval or tolerance is negative, or the timeout
+              is not positive
+
+        .. versionadded:: 0.2.0
+        .. function:: __init__([pool = None, samples = 4, interval = 0.25, tolerance = 0.25, concurrency = 64, ...])
+        """
+        self.logger = logging.getLogger("UHPPOTE.TimeSynchronizer")
+
+        if int(samples) <= 0:
+            raise ValueError("Invalid number of samples for time synchronization: %d" % int(samples))
+
+        if int(concurrency) <= 0:
+            raise ValueError("Invalid concurrency for time synchronization: %d" % int(concurrency))
+
+        if float(interval) < 0 or float(tolerance) < 0:
+            raise ValueError("Interval and tolerance cannot be negative.")
+
+        self.pool = pool if pool is not None else ConnectionPool(timeout=timeout)
+        self.samples = int(samples)
+        self.interval = float(interval)
+        self.tolerance = float(tolerance)
+        self.concurrency = int(concurrency)
+
+
+    def measure(self, serial, host, port=60000):
+        """
+        Estimate how far a board's clock is ahead of the local clock.
+
+           :param serial: the serial number of the control board
+           :type serial: SerialNumber or str or int or bytearray
+           :param host: the hostname or IP address of the control board
+           :type host: str
+           :param port: the port of the control board (default: 60000)
+           :type port: int
+
+           :returns: the measurement, with `offset` and `uncertainty` in seconds, and the fastest and slowest round
+              trips as `rtt` and `rttMax`
+           :rtype: dict
+
+           :raises SocketConnectionException: if unable to connect to the control board
+           :raises SocketTransmitException: if the connection is broken during a reading
+           :raises CommandException: if the board's response is invalid
+
+        .. versionadded:: 0.2.0
+        .. function:: measure(serial, host[, port = 60000])
+        """
+        readings = self.pool.call(host, port, lambda controller: self._sample(controller, serial), True)
+
+        lower = max(boardTime - midpoint for boardTime, midpoint, rtt in readings)
+        upper = min(boardTime + 1 - midpoint for boardTime, midpoint, rtt in readings)
+
+        # Network jitter can make the windows disagree; fall back to their average centre
+        if lower > upper:
+            lower = upper = sum(boardTime + 0.5 - midpoint for boardTime, midpoint, rtt in readings) / len(readings)
+
+        rtts = [rtt for boardTime, midpoint, rtt in readings]
+
+        return {
+            "offset": (lower + upper) / 2,
+            "uncertainty": (upper - lower) / 2,
+            "rtt": min(rtts),
+            "rttMax": max(rtts),
+        }
+
+
+    def correct(self, serial, host, port=60000, rtt=0.0):
+        """
+        Set a board's clock to the local time, compensating for half the round trip.
+
+        The call waits for the next whole second, at most one second, so the time sent is exact when it arrives.
+
+           :param serial: the serial number of the control board
+           :type serial: SerialNumber or str or int or bytearray
+           :param host: the hostname or IP address of the control board
+           :type host: str
+           :param port: the port of the control board (default: 60000)
+           :type port: int
+           :param rtt: the round trip time to the board, in seconds (default: 0.0)
+           :type rtt: float
+
+           :raises SocketConnectionException: if unable to connect to the control board
+           :raises SocketTransmitException: if the connection is broken while sending
+           :raises CommandException: if the board's response is invalid
+
+        .. versionadded:: 0.2.0
+        .. function:: correct(serial, host[, port = 60000, rtt = 0.0])
+        """
+        def setTime(controller):
+            now = time.time()
+            target = int(now) + 1
+
+            # Leave enough time to build and send the request
+            if target - rtt / 2 - now < 0.01:
+                target += 1
+
+            time.sleep(max(0.0, target - rtt / 2 - time.time()))
+            execute(controller, serial, "set-time", [datetime.datetime.fromtimestamp(target)])
+
+        self.pool.call(host, port, setTime)
+
+
+    def synchronize(self, boards, correct=True):
+        """
+        Measure, and where needed correct, the clocks of many boards concurrently.
+
+           :param boards: the boards, as `(serial, host, port)` tuples
+           :type boards: iterable
+           :param correct: whether to correct boards whose offset exceeds the tolerance (default: True)
+           :type correct: bool
+
+           :returns: one report per board in input order, with `serial`, `host`, `port`, `ok`, `corrected`, and
+              either the measurement fields or `error`
+           :rtype: list
+
+        .. versionadded:: 0.2.0
+        .. function:: synchronize(boards[, correct = True])
+        """
+        boards = list(boards)
+        reports = [None] * len(boards)
+        pending = queue.Queue()
+
+        for index, board in enumerate(boards):
+            pending.put(index)
+
+        def work():
+            while True:
+                try:
+                    index = pending.get_nowait()
+                except queue.Empty:
+                    return
+
+                serial, host, port = boards[index]
+                reports[index] = self._synchronizeBoard(serial, host, port, correct)
+
+        workers = []
+        for i in range(min(self.concurrency, len(boards))):
+            worker = threading.Thread(target=work, name="UHPPOTE-TimeSynchronizer")
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+
+        for worker in workers:
+            worker.join()
+
+        return reports
+
+
+    def _synchronizeBoard(self, serial, host, port, correct):
+        """
+        Measure one board and correct it if its offset exceeds the tolerance.
+
+           :param serial: the serial number of the control board
+           :type serial: SerialNumber or str or int or bytearray
+           :param host: the hostname or IP address of the control board
+           :type host: str
+           :param port: the port of the control board
+           :type port: int
+           :param correct: whether to correct the board
+           :type correct: bool
+
+           :returns: the board's report
+           :rtype: dict
+
+        .. versionadded:: 0.2.0
+        .. function:: _synchronizeBoard(serial, host, port, correct)
+        """
+        report = {"host": host, "port": int(port), "corrected": False}
+
+        try:
+            serial = SerialNumber(serial) if not isinstance(serial, SerialNumber) else serial
+            report["serial"] = serial.getInteger()
+
+            report.update(self.measure(serial, host, port))
+
+            if correct and abs(report["offset"]) > self.tolerance:
+                self.correct(serial, host, port, report["rtt"])
+                report["corrected"] = True
+
+        except Exception as e:
+            self.logger.debug("Time synchronization of %s:%d failed: %s" % (host, int(port), str(e)))
+            report["ok"] = False
+            report["error"] = "%s: %s" % (type(e).__name__, str(e))
+            return report
+
+        report["ok"] = True
+        return report
+
+
+    def _sample(self, controller, serial):
+        """
+        Take the configured number of clock readings from a connected board.
+
+           :param controller: the connected socket for the control board
+           :type controller: ControllerSocket
+           :param serial: the serial number of the control board
+           :type serial: SerialNumber or str or int or bytearray
+
+           :returns: the readings, as `(board time, local midpoint, round trip)` tuples in seconds
+           :rtype: list
+
+           :raises CommandException: if a response does not include a valid time
+
+        .. versionadded:: 0.2.0
+        .. function:: _sample(controller, serial)
+        """
+        readings = []
+
+        for i in range(self.samples):
+            if i and self.interval:
+                time.sleep(self.interval)
+
+            sent = time.time()
+            response = TimeResponse(execute(controller, serial, "get-time"))
+            received = time.time()
+
+            if response.dateTime is None:
+                raise CommandException("Board reported an invalid time.")
+
+            boardTime = time.mktime(response.dateTime.timetuple())
+            readings.append((boardTime, (sent + received) / 2, received - sent))
+
+        return readings
+
+
+
+
+def summarizeReports(reports):
+    """
+    Summarize the clock skew across a synchronization pass.
+
+       :param reports: the reports returned by `TimeSynchronizer.synchronize()`
+       :type reports: list
+
+       :returns: the number of boards `measured`, `failed` and `corrected`, and the `meanOffset`, `maxOffset`
+          (largest absolute offset), `maxUncertainty` and `meanRtt` in seconds, or None where no board was measured
+       :rtype: dict
+
+    .. versionadded:: 0.2.0
+    .. function:: summarizeReports(reports)
+    """
+    measured = [report for report in reports if report["ok"]]
+    offsets = [report["offset"] for report in measured]
+
+    summary = {
+        "measured": len(measured),
+        "failed": len(reports) - len(measured),
+        "corrected": sum(1 for report in measured if report["corrected"]),
+        "meanOffset": None,
+        "maxOffset": None,
+        "maxUncertainty": None,
+        "meanRtt": None,
+    }
+
+    if measured:
+        summary["meanOffset"] = sum(offsets) / len(offsets)
+        summary["maxOffset"] = max(abs(offset) for offset in offsets)
+        summary["maxUncertainty"] = max(report["uncertainty"] for report in measured)
+        summary["meanRtt"] = sum(report["rtt"] for report in measured) / len(measured)
+
+    return summary
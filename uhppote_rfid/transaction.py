@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+Provides pipelined, verified batches of writes to a UHPPOTE RFID control board.
+
+A `Transaction` sends each write immediately followed by the read that verifies it, keeping up to `window` requests
+in flight rather than waiting for each response in turn.  Boards answer requests in order, so every read reflects the
+write before it, and verifying a batch costs little more than the writes alone.  Items whose write is rejected or whose
+read-back differs are retried, alone, in a further round.
+
+   :copyright: (c) 2017 by Andrew Vaughan.
+   :license: Apache 2.0, see LICENSE for more details.
+
+.. module:: Transaction
+"""
+
+import collections
+import logging
+import socket
+
+from .commands import PACKET_SIZE, CommandException, getCommand
+from .controller_socket import SocketConnectionException, SocketTransmitException
+from .response import parseResponse
+
+
+# Writes with a read that reports what was stored, by the read command and the write arguments it takes
+VERIFIERS = {
+    "set-door-control": ("get-door-control", lambda args: list(args[:1])),
+    "set-time-profile": ("get-time-profile", lambda args: list(args[:1])),
+}
+
+
+class Transaction(object):
+    """
+    A batch of writes to one control board, each verified by reading it back.
+
+    .. class:: Transaction
+    .. versionadded:: 0.2.0
+    """
+
+    def __init__(self, controller, serial, window=16, attempts=3):
+        """
+        Initialize a new, empty Transaction.
+
+           :param controller: the socket for the control board; connected on first use if needed
+           :type controller: ControllerSocket
+           :param serial: the serial number of the control board
+           :type serial: SerialNumber or str or int or bytearray
+           :param window: the most requests in flight at once (default: 16)
+           :type window: int
+           :param attempts: the number of rounds an item is tried before it is reported as failed (default: 3)
+           :type attempts: int
+
+           :raises ValueError: if the window or attempts is below 1
+
+        .. versionadded:: 0.2.0
+        .. function:: __init__(controller, serial[, window = 16, attempts = 3])
+        """
+        self.logger = logging.getLogger("UHPPOTE.Transaction")
+
+        if int(window) <= 0:
+            raise ValueError("Invalid window for transaction: %d" % int(window))
+
+        if int(attempts) <= 0:
+            raise ValueError("Invalid number of attempts for transaction: %d" % int(attempts))
+
+        self.controller = controller
+        self.serial = serial
+        self.window = int(window)
+        self.attempts = int(attempts)
+        self.items = []
+
+
+    def write(self, name, args=None):
+        """
+        Add a write to the transaction.  Writes listed in `VERIFIERS` are read back and compared; any other write is
+        verified only by its own response.
+
+           :param name: the name of the command
+           :type name: str
+           :param args: the command arguments (default: none)
+           :type args: list
+
+           :returns: the position of the item in the outcome report
+           :rtype: int
+
+           :raises CommandException: if the command is unknown or only reads
+           :raises ValueError: if the arguments are invalid
+
+        .. versionadded:: 0.2.0
+        .. function:: write(name[, args = None])
+        """
+        command = getCommand(name)
+
+        if command.readOnly:
+            raise CommandException("Command %s only reads; nothing to write." % name)
+
+        args = list(args or [])
+        item = {
+            "command": name,
+            "args": args,
+            "request": command.buildRequest(self.serial, args),
+            "verify": None,
+            "ok": False,
+            "attempts": 0,
+            "error": None,
+        }
+
+        if name in VERIFIERS:
+            verifyName, verifyArgs = VERIFIERS[name]
+            item["verify"] = getCommand(verifyName).buildRequest(self.serial, verifyArgs(args))
+
+        self.items.append(item)
+        return len(self.items) - 1
+
+
+    def commit(self):
+        """
+        Send every write with its verification, then retry the items that failed until they succeed or run out of
+        attempts.
+
+           :returns: one outcome per write, in order, with `command`, `args`, `ok`, `attempts`, and `error`
+           :rtype: list
+
+        .. versionadded:: 0.2.0
+        .. function:: commit()
+        """
+        pending = [item for item in self.items if not item["ok"]]
+
+        for attempt in range(self.attempts):
+            if not pending:
+                break
+
+            try:
+                if not self.controller.isConnected():
+                    self.controller.connect()
+
+            except SocketConnectionException as e:
+                for item in pending:
+                    item["error"] = "%s: %s" % (type(e).__name__, str(e))
+
+                break
+
+            self._pipeline(pending)
+            pending = [item for item in pending if not item["ok"]]
+
+            if pending:
+                self.logger.debug("%d of %d item(s) failed in round %d." % (len(pending), len(self.items), attempt + 1))
+
+        return [dict((key, item[key]) for key in ("command", "args", "ok", "attempts", "error")) for item in self.items]
+
+
+    def _pipeline(self, items):
+        """
+        Run one round over the given items, keeping the window full, and record each item's outcome.
+
+           :param items: the items to send
+           :type items: list
+
+        .. versionadded:: 0.2.0
+        .. function:: _pipeline(items)
+        """
+        # Each request, in send order, with its item and whether it is the verifying read
+        requests = collections.deque()
+
+        for item in items:
+            item["attempts"] += 1
+            item["error"] = None
+            requests.append((item, False))
+
+            if item["verify"] is not None:
+                requests.append((item, True))
+
+        inflight = collections.deque()
+
+        try:
+            while requests or inflight:
+                while requests and len(inflight) < self.window:
+                    item, verifying = requests.popleft()
+                    self.controller.send(item["verify"] if verifying else item["request"])
+                    inflight.append((item, verifying))
+
+                self._check(inflight[0][0], inflight[0][1], self.controller.receiveFrame(PACKET_SIZE))
+                inflight.popleft()
+
+        except (SocketConnectionException, SocketTransmitException, CommandException, socket.error) as e:
+            # The stream can no longer be trusted to pair responses with requests
+            self.logger.debug("Transaction round aborted: %s" % str(e))
+            self.controller.close()
+
+            for item, verifying in list(inflight) + list(requests):
+                item["ok"] = False
+                item["error"] = "%s: %s" % (type(e).__name__, str(e))
+
+
+    def _check(self, item, verifying, packet):
+        """
+        Record the outcome of one response for an item.
+
+           :param item: the item
+           :type item: dict
+           :param verifying: whether the response answers the verifying read
+           :type verifying: bool
+           :param packet: the response packet
+           :type packet: bytearray
+
+           :raises CommandException: if the response does not answer its request
+
+        .. versionadded:: 0.2.0
+        .. function:: _check(item, verifying, packet)
+        """
+        if not verifying:
+            getCommand(item["command"]).checkResponse(packet)
+            response = parseResponse(packet)
+
+            if getattr(response, "succeeded", True) is False:
+                item["error"] = "Rejected by the control board."
+            elif item["verify"] is None:
+                item["ok"] = True
+
+            return
+
+        command = getCommand(VERIFIERS[item["command"]][0])
+        command.checkResponse(packet)
+
+        if item["error"] is not None:
+            return
+
+        # Compare encoded forms, so equivalent arguments (such as "2" and 2) match
+        stored = parseResponse(packet).getArguments()
+        encoder = getCommand(item["command"]).encoder
+
+        try:
+            item["ok"] = stored is not None and encoder(list(stored)) == encoder(list(item["args"]))
+        except ValueError:
+            item["ok"] = False
+
+        if not item["ok"]:
+            item["error"] = "Read-back differs from the written value."